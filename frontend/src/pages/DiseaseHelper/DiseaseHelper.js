@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   Box,
   Typography,
@@ -43,6 +43,10 @@ import {
 import { useSelector } from 'react-redux';
 import { mlApi } from '../../services/mlApi';
 
+// Server-side symptom search: results per page and typing pause before a request
+const SYMPTOM_PAGE_SIZE = 20;
+const SYMPTOM_SEARCH_DEBOUNCE_MS = 250;
+
 function DiseaseHelper() {
   const { user } = useSelector((state) => state.auth);
   const [patientInfo, setPatientInfo] = useState({
@@ -53,7 +57,11 @@ function DiseaseHelper() {
     patientId: '',
   });
   const [selectedSymptoms, setSelectedSymptoms] = useState([]);
-  const [availableSymptoms, setAvailableSymptoms] = useState([]);
+  const [symptomQuery, setSymptomQuery] = useState('');
+  const [symptomOptions, setSymptomOptions] = useState([]);
+  const [symptomTotal, setSymptomTotal] = useState(0);
+  const [symptomsLoading, setSymptomsLoading] = useState(false);
+  const symptomRequest = useRef(0);
   const [prediction, setPrediction] = useState(null);
   const [similarPatients, setSimilarPatients] = useState([]);
   const [remedies, setRemedies] = useState([]);
@@ -63,29 +71,34 @@ function DiseaseHelper() {
   const [reportGenerated, setReportGenerated] = useState(false);
   const [patientSaved, setPatientSaved] = useState(false);
 
+  // Symptoms are searched on the server as the user types (debounced),
+  // one page at a time; scrolling the list loads the next page
   useEffect(() => {
-    loadSymptoms();
-  }, []);
+    const timer = setTimeout(() => loadSymptomPage(symptomQuery, 0), SYMPTOM_SEARCH_DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+  }, [symptomQuery]);
 
-  const loadSymptoms = async () => {
+  const loadSymptomPage = async (query, offset) => {
+    const request = ++symptomRequest.current;
+    setSymptomsLoading(true);
     try {
-      const response = await mlApi.getSymptomsWithFallback();
-      setAvailableSymptoms(response.symptoms);
+      const page = await mlApi.searchSymptomsWithFallback(query, { limit: SYMPTOM_PAGE_SIZE, offset });
+      // Drop responses overtaken by a newer keystroke
+      if (request !== symptomRequest.current) return;
+      setSymptomOptions(previous => (offset === 0 ? page.symptoms : [...previous, ...page.symptoms]));
+      setSymptomTotal(page.total_count);
     } catch (error) {
-      console.error('Error loading symptoms:', error);
-      // Fallback symptoms
-      const defaultSymptoms = [
-        'fever', 'cough', 'headache', 'fatigue', 'nausea', 'vomiting',
-        'diarrhea', 'abdominal_pain', 'chest_pain', 'shortness_of_breath',
-        'dizziness', 'muscle_pain', 'joint_pain', 'sore_throat', 'runny_nose',
-        'loss_of_appetite', 'weight_loss', 'night_sweats', 'skin_rash',
-        'blurred_vision', 'confusion', 'seizures', 'numbness', 'weakness'
-      ];
-      setAvailableSymptoms(defaultSymptoms.map(symptom => ({
-        id: symptom,
-        name: symptom.replace(/_/g, ' ').replace(/\b\w/g, l => l.toUpperCase()),
-        value: symptom
-      })));
+      console.error('Error searching symptoms:', error);
+    } finally {
+      if (request === symptomRequest.current) setSymptomsLoading(false);
+    }
+  };
+
+  const handleSymptomListScroll = (event) => {
+    const list = event.currentTarget;
+    const nearBottom = list.scrollTop + list.clientHeight >= list.scrollHeight - 40;
+    if (nearBottom && !symptomsLoading && symptomOptions.length < symptomTotal) {
+      loadSymptomPage(symptomQuery, symptomOptions.length);
     }
   };
 
@@ -102,10 +115,10 @@ function DiseaseHelper() {
     setLoading(true);
     
     try {
-      // Create symptoms object for ML API
+      // Create symptoms object for ML API (symptoms not listed count as absent)
       const symptoms = {};
-      availableSymptoms.forEach(symptom => {
-        symptoms[symptom.value] = selectedSymptoms.some(selected => selected.value === symptom.value) ? 1 : 0;
+      selectedSymptoms.forEach(symptom => {
+        symptoms[symptom.value] = 1;
       });
 
       // Get ML prediction
@@ -460,12 +473,24 @@ ${remedies.immediate?.join('\n')}
                   Symptoms Selection
                 </Typography>
                 
+                {/* Options are the server's matches; selected symptoms stay among them
+                    (hidden by filterSelectedOptions) so values from earlier searches still match */}
                 <Autocomplete
                   multiple
-                  options={availableSymptoms}
+                  options={[
+                    ...selectedSymptoms,
+                    ...symptomOptions.filter(option => !selectedSymptoms.some(selected => selected.value === option.value)),
+                  ]}
                   getOptionLabel={(option) => option.name}
+                  isOptionEqualToValue={(option, value) => option.value === value.value}
+                  filterOptions={(options) => options}
+                  loading={symptomsLoading}
                   value={selectedSymptoms}
                   onChange={handleSymptomsChange}
+                  onInputChange={(event, value, reason) => {
+                    if (reason !== 'reset') setSymptomQuery(value);
+                  }}
+                  ListboxProps={{ onScroll: handleSymptomListScroll }}
                   filterSelectedOptions
                   renderInput={(params) => (
                     <TextField
@@ -565,6 +590,23 @@ ${remedies.immediate?.join('\n')}
                   <Typography variant="body2" color="text.secondary">
                     Confidence: {(prediction?.confidence * 100).toFixed(1)}%
                   </Typography>
+                  {prediction?.explanation?.contributions?.length > 0 && (
+                    <Box sx={{ mt: 2 }}>
+                      <Typography variant="subtitle2" sx={{ fontWeight: 600, mb: 1 }}>
+                        Key Symptoms
+                      </Typography>
+                      <Box sx={{ display: 'flex', flexWrap: 'wrap', gap: 1 }}>
+                        {prediction.explanation.contributions.slice(0, 5).map((item) => (
+                          <Chip
+                            key={item.symptom}
+                            label={`${item.symptom.replace(/_/g, ' ')} ${item.contribution >= 0 ? '+' : ''}${(item.contribution * 100).toFixed(1)}%`}
+                            size="small"
+                            variant="outlined"
+                          />
+                        ))}
+                      </Box>
+                    </Box>
+                  )}
                 </CardContent>
               </Card>
             </Grid>
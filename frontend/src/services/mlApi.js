@@ -1,5 +1,18 @@
 const ML_API_BASE_URL = 'http://localhost:5001';
 
+// Offered when the ML service is unavailable
+const MOCK_SYMPTOMS = [
+  'fever', 'cough', 'headache', 'fatigue', 'nausea', 'vomiting',
+  'diarrhea', 'abdominal_pain', 'chest_pain', 'shortness_of_breath',
+  'dizziness', 'muscle_pain', 'joint_pain', 'sore_throat', 'runny_nose',
+  'loss_of_appetite', 'weight_loss', 'night_sweats', 'skin_rash',
+  'blurred_vision', 'confusion', 'seizures', 'numbness', 'weakness'
+].map(symptom => ({
+  id: symptom,
+  name: symptom.replace(/_/g, ' ').replace(/\b\w/g, l => l.toUpperCase()),
+  value: symptom
+}));
+
 class MLApiService {
   async makeRequest(endpoint, options = {}) {
     try {
@@ -32,6 +45,12 @@ class MLApiService {
     return this.makeRequest('/symptoms');
   }
 
+  // Search symptoms by name, synonym or close spelling (best match first)
+  async searchSymptoms(query, { limit = 20, offset = 0 } = {}) {
+    const params = new URLSearchParams({ q: query, limit, offset });
+    return this.makeRequest(`/symptoms?${params}`);
+  }
+
   // Predict disease based on symptoms
   async predictDisease(symptoms, patientInfo = {}) {
     return this.makeRequest('/predict', {
@@ -49,6 +68,7 @@ class MLApiService {
       method: 'POST',
       body: JSON.stringify({
         patients,
+        format: 'records',
       }),
     });
   }
@@ -142,21 +162,28 @@ class MLApiService {
     } catch (error) {
       console.warn('ML service unavailable, using mock symptoms:', error);
       // Return mock symptoms
-      const mockSymptoms = [
-        'fever', 'cough', 'headache', 'fatigue', 'nausea', 'vomiting',
-        'diarrhea', 'abdominal_pain', 'chest_pain', 'shortness_of_breath',
-        'dizziness', 'muscle_pain', 'joint_pain', 'sore_throat', 'runny_nose',
-        'loss_of_appetite', 'weight_loss', 'night_sweats', 'skin_rash',
-        'blurred_vision', 'confusion', 'seizures', 'numbness', 'weakness'
-      ];
+      return {
+        symptoms: MOCK_SYMPTOMS,
+        total_count: MOCK_SYMPTOMS.length,
+        mock: true
+      };
+    }
+  }
 
+  // Server-side symptom search with mock fallback (same page shape)
+  async searchSymptomsWithFallback(query, { limit = 20, offset = 0 } = {}) {
+    try {
+      return await this.searchSymptoms(query, { limit, offset });
+    } catch (error) {
+      console.warn('ML service unavailable, searching mock symptoms:', error);
+      const needle = query.trim().toLowerCase();
+      const matches = MOCK_SYMPTOMS.filter(symptom => symptom.name.toLowerCase().includes(needle));
       return {
-        symptoms: mockSymptoms.map(symptom => ({
-          id: symptom,
-          name: symptom.replace(/_/g, ' ').replace(/\b\w/g, l => l.toUpperCase()),
-          value: symptom
-        })),
-        total_count: mockSymptoms.length,
+        query,
+        symptoms: matches.slice(offset, offset + limit),
+        total_count: matches.length,
+        offset,
+        limit,
         mock: true
       };
     }
@@ -1,20 +1,204 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
-from disease_predictor import DiseasePredictor
+from disease_predictor import DiseasePredictor, SymptomValueError, has_enhanced_models
+import jobs
+import metrics
+import prediction_log
+import shadow
+import functools
+import hmac
+import json
+import threading
+import time
+import wire_format
+from serving_config import ServingConfig
+from model_bundle import memory_usage
 import os
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+metrics.instrument_app(app)  # Request metrics + /metrics endpoint
+serving_config = ServingConfig.from_env()  # Per-worker thread budget
+TOP_K_ERROR = 'top_k must be a positive integer'
 
-# Initialize the disease predictor
+# Endpoint groups served by this process: 'disease' (the routes below) and
+# 'nurse_attendance' (the /ml/nurse-attendance blueprint, whose sklearn
+# estimators load on first use). A disease-only deployment never imports it.
+SERVICES = [name.strip() for name in os.environ.get('ML_SERVICES', 'disease,nurse_attendance').split(',') if name.strip()]
+if 'nurse_attendance' in SERVICES:
+    import nurse_attendance_ml
+    nurse_attendance_ml.serving_config = serving_config  # Same thread budget and models volume as the disease models
+    app.register_blueprint(nurse_attendance_ml.blueprint)
+
+def load_predictor(**kwargs):
+    """(Re)initialize the module-level disease predictor"""
+    global predictor
+    try:
+        predictor = DiseasePredictor(**kwargs)
+        serving_config.apply_to_predictor(predictor)
+        print("Disease predictor initialized successfully")
+    except Exception as e:
+        print(f"Error initializing predictor: {e}")
+        predictor = None
+    return predictor
+
+# Shadow evaluation of a candidate model version; promoting it replaces the
+# serving pointer, which overrides ML_MODEL_DIR and is followed by every worker.
+# The control file names the candidate every worker shadows; shadow_evaluator
+# is this process's copy, loaded (like promoted models) off the request path.
+serving_pointer = shadow.ServingPointer(os.environ.get('ML_SERVING_POINTER', shadow.DEFAULT_POINTER_PATH))
+shadow_control = shadow.ShadowControl(os.environ.get('ML_SHADOW_CONTROL', shadow.DEFAULT_CONTROL_PATH))
+shadow_evaluator = None
+_shadow_lock = threading.Lock()
+_shadow_loads = set()  # control ids being loaded by this process
+_serving_loads = set()  # promoted model directories being loaded by this process
+
+# Initialize the disease predictor (tests and benchmarks set
+# ML_PRELOAD_MODELS=false and install their own predictor)
+predictor = None
+if 'disease' in SERVICES and os.environ.get('ML_PRELOAD_MODELS', 'true').lower() == 'true':
+    load_predictor(model_dir=(serving_pointer.read() or {}).get('model_dir') or os.environ.get('ML_MODEL_DIR', 'models'),
+                   profile=os.environ.get('ML_SERVING_PROFILE', 'full'),
+                   tree_backend=os.environ.get('ML_TREE_BACKEND', 'compiled'),
+                   svm_backend=os.environ.get('ML_SVM_BACKEND', 'sklearn'),
+                   model_memory=os.environ.get('ML_MODEL_MEMORY', 'private'),
+                   exact_match=os.environ.get('ML_EXACT_MATCH', 'true').lower() == 'true',
+                   verbose=os.environ.get('ML_VERBOSE_STARTUP', 'false').lower() == 'true')
+
+# Served requests are queued for the prediction log when ML_PREDICTION_LOG_DIR is set
+prediction_logger = None
 try:
-    predictor = DiseasePredictor()
-    print("Disease predictor initialized successfully")
+    prediction_logger = prediction_log.PredictionLogger.from_env()
 except Exception as e:
-    print(f"Error initializing predictor: {e}")
-    predictor = None
+    print(f"Error starting prediction log: {e}")
+
+def admin_required(view):
+    """Admin endpoints need the X-Admin-Token header to match ML_ADMIN_TOKEN (disabled when unset)"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = os.environ.get('ML_ADMIN_TOKEN')
+        if not token:
+            return jsonify({'error': 'Admin endpoints are disabled (ML_ADMIN_TOKEN is not set)'}), 403
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+            return jsonify({'error': 'Invalid or missing X-Admin-Token'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+def shadow_candidates_dir():
+    """Directory every shadowed model directory must live under"""
+    return os.path.realpath(os.environ.get('ML_SHADOW_CANDIDATES_DIR')
+                            or os.path.join(os.environ.get('ML_JOBS_DIR', jobs.DEFAULT_JOBS_DIR), 'models'))
+
+def start_shadow(model_dir, fraction=None, workers=None):
+    """Have every worker shadow the saved models in model_dir, replacing any running shadow"""
+    if not has_enhanced_models(model_dir):
+        raise FileNotFoundError(f"No complete saved model set in {model_dir}")
+    with open(os.path.join(model_dir, 'metadata.json'), 'r') as f:
+        model_version = json.load(f).get('version', 'unknown')
+    state = shadow_control.start(
+        model_dir, model_version,
+        fraction=float(os.environ.get('ML_SHADOW_FRACTION', shadow.DEFAULT_FRACTION)) if fraction is None else fraction,
+        workers=int(os.environ.get('ML_SHADOW_WORKERS', '1')) if workers is None else workers)
+    sync_shadow(state)
+    return state
+
+def sync_shadow(state):
+    """Make this process's evaluator match the control state; a new candidate loads in the background"""
+    global shadow_evaluator
+    with _shadow_lock:
+        evaluator = shadow_evaluator
+        if evaluator is not None and (state is None or evaluator.shadow_id != state['id']):
+            shadow_evaluator = None
+            evaluator.shutdown()
+        if state is None or shadow_evaluator is not None or state['id'] in _shadow_loads:
+            return
+        _shadow_loads.add(state['id'])
+    threading.Thread(target=_load_shadow, args=(state,), name='shadow-load', daemon=True).start()
+
+def _load_shadow(state):
+    global shadow_evaluator
+    evaluator = None
+    try:
+        evaluator = shadow.ShadowEvaluator.for_model_dir(
+            dict(predictor.settings(), verbose=False), state['model_dir'], fraction=state['fraction'],
+            workers=state['workers'], control=shadow_control, shadow_id=state['id'])
+        serving_config.apply_to_predictor(evaluator.candidate)
+    except Exception as e:
+        print(f"Error loading shadow candidate {state['model_dir']}: {e}")
+    with _shadow_lock:
+        _shadow_loads.discard(state['id'])
+        if evaluator is None:
+            return
+        # Stopped or replaced while loading
+        if (shadow_control.read() or {}).get('id') != state['id']:
+            evaluator.shutdown()
+            return
+        shadow_evaluator = evaluator
+    evaluator.publish()
+
+def switch_to(promoted):
+    """Serve a promoted model version: the shadowed candidate at once, otherwise once loaded in the background"""
+    global predictor, shadow_evaluator
+    with _shadow_lock:
+        evaluator = shadow_evaluator
+        if evaluator is not None and os.path.abspath(evaluator.candidate.model_dir) == promoted['model_dir']:
+            shadow_evaluator = None
+            evaluator.shutdown()
+            predictor = evaluator.candidate
+            print(f"Now serving model version {promoted['model_version']} from {promoted['model_dir']}")
+            return
+        if promoted['model_dir'] in _serving_loads:
+            return
+        _serving_loads.add(promoted['model_dir'])
+    threading.Thread(target=_load_promoted, args=(promoted,), name='promote-load', daemon=True).start()
+
+def _load_promoted(promoted):
+    global predictor
+    try:
+        candidate = DiseasePredictor(**dict(predictor.settings(), model_dir=promoted['model_dir'],
+                                            verbose=False, allow_training=False))
+        serving_config.apply_to_predictor(candidate)
+        # Requests keep the old predictor until this one assignment swaps it in
+        if (serving_pointer.read() or {}).get('model_dir') == promoted['model_dir']:
+            predictor = candidate
+            print(f"Now serving model version {promoted['model_version']} from {promoted['model_dir']}")
+    except Exception as e:
+        print(f"Error switching to promoted models: {e}")
+    finally:
+        with _shadow_lock:
+            _serving_loads.discard(promoted['model_dir'])
+
+if predictor is not None and os.environ.get('ML_SHADOW_MODEL_DIR') and shadow_control.read() is None:
+    try:
+        start_shadow(os.environ['ML_SHADOW_MODEL_DIR'])
+    except Exception as e:
+        print(f"Error starting shadow evaluation: {e}")
+
+@app.before_request
+def follow_shared_state():
+    """Follow the serving pointer and shadow control file other workers may have changed"""
+    if predictor is None:
+        return
+    promoted = serving_pointer.poll()
+    if promoted is not None and os.path.abspath(predictor.model_dir) != promoted['model_dir']:
+        switch_to(promoted)
+    changed, state = shadow_control.poll()
+    if changed:
+        sync_shadow(state)
+
+def _shadow(symptom_matrix, result, serving_ms, profile):
+    """Hand a served request to the shadow evaluator when it is sampled"""
+    evaluator = shadow_evaluator
+    if evaluator is not None and evaluator.sample():
+        evaluator.submit(symptom_matrix, predictor.symptom_columns, predictor.class_catalog()['classes'],
+                         result['probabilities'], serving_ms, profile=profile)
+
+def _log_prediction(symptom_matrix, result, serving_ms, profile):
+    """Queue a served request for the prediction log (dropped, not delayed, under backlog)"""
+    if prediction_logger is not None:
+        prediction_logger.log(request.path, predictor, symptom_matrix, result, serving_ms, profile=profile)
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -22,31 +206,37 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'service': 'ML Disease Predictor',
-        'model_loaded': predictor is not None
+        'model_loaded': predictor is not None,
+        'services': SERVICES
     })
 
 @app.route('/symptoms', methods=['GET'])
 def get_symptoms():
-    """Get list of all available symptoms"""
+    """
+    Get list of all available symptoms
+    
+    ?q= searches by prefix, word, synonym and close spellings (best match
+    first); ?limit= / ?offset= page the results. The entries are built once
+    per model version and the response carries its ETag for If-None-Match.
+    """
     if not predictor:
         return jsonify({'error': 'Model not loaded'}), 500
     
     try:
-        symptoms = predictor.get_all_symptoms()
-        # Format symptoms for better display
-        formatted_symptoms = [
-            {
-                'id': symptom,
-                'name': symptom.replace('_', ' ').title(),
-                'value': symptom
-            }
-            for symptom in symptoms
-        ]
+        index = predictor.symptom_index()
+        if any(param in request.args for param in ('q', 'limit', 'offset')):
+            payload = index.search(request.args.get('q', ''),
+                                   limit=request.args.get('limit', 20, type=int),
+                                   offset=request.args.get('offset', 0, type=int))
+        else:
+            payload = {'symptoms': index.entries, 'total_count': len(index.entries)}
+        # Column order for binary /batch_predict bodies
+        payload['symptoms_etag'] = index.etag
         
-        return jsonify({
-            'symptoms': formatted_symptoms,
-            'total_count': len(formatted_symptoms)
-        })
+        response = jsonify(payload)
+        response.set_etag(index.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -57,7 +247,8 @@ def predict_disease():
         return jsonify({'error': 'Model not loaded'}), 500
     
     try:
-        data = request.get_json()
+        with metrics.stage('json_parse'):
+            data = request.get_json()
         
         if not data:
             return jsonify({'error': 'No data provided'}), 400
@@ -69,13 +260,27 @@ def predict_disease():
         if not symptoms:
             return jsonify({'error': 'No symptoms provided'}), 400
         
-        # Make prediction
-        prediction_result = predictor.predict(symptoms)
+        # Make prediction ('profile': 'fast' selects the distilled model,
+        # 'cascade' the confidence-gated tiers; 'compact': true returns probabilities aligned with GET /classes;
+        # per-symptom contributions are included unless 'explain': false)
+        profile = data.get('profile')
+        unrecognized = {}
+        with metrics.stage('encode'):
+            symptom_matrix = predictor.encode_symptoms([symptoms], unrecognized=unrecognized)
+        started = time.perf_counter()
+        result = predictor.predict_matrix(symptom_matrix, profile=profile)
+        serving_ms = (time.perf_counter() - started) * 1000
+        result['unrecognized'] = unrecognized
+        if data.get('explain', True):
+            predictor.explain(symptom_matrix, result, profile=profile)
+        prediction_result = predictor.prediction_record(result, 0, compact=bool(data.get('compact')))
+        _shadow(symptom_matrix, result, serving_ms, profile)
+        _log_prediction(symptom_matrix, result, serving_ms, profile)
         
         # Add patient info to response
         response = {
             'patient_info': patient_info,
-            'symptoms_analyzed': [k for k, v in symptoms.items() if v == 1],
+            'symptoms_analyzed': [k for k, v in symptoms.items() if v != 0],
             'prediction': prediction_result,
             'timestamp': pd.Timestamp.now().isoformat(),
             'model_info': {
@@ -86,62 +291,228 @@ def predict_disease():
             }
         }
         
-        return jsonify(response)
+        with metrics.stage('serialize'):
+            return jsonify(response)
         
+    except SymptomValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/batch_predict', methods=['POST'])
 def batch_predict():
-    """Predict diseases for multiple patients"""
+    """
+    Predict diseases for multiple patients
+    
+    Results are one prediction object per patient. 'format': 'columnar'
+    returns per-row class indices and probabilities aligned with GET /classes
+    instead, where 'expand_names': true adds disease names,
+    'include_probabilities': true adds every class probability and
+    'explain': true adds per-symptom contributions.
+    
+    Bodies sent as application/x-npy or application/x-symptom-bitset are
+    handled by _binary_batch_predict.
+    """
     if not predictor:
         return jsonify({'error': 'Model not loaded'}), 500
+    if request.mimetype in wire_format.REQUEST_TYPES:
+        return _binary_batch_predict()
     
     try:
-        data = request.get_json()
+        with metrics.stage('json_parse'):
+            data = request.get_json()
         patients = data.get('patients', [])
+        profile = data.get('profile')
+        top_k = _parse_top_k(data.get('top_k', 5))
         
         if not patients:
             return jsonify({'error': 'No patients data provided'}), 400
+        if top_k is None:
+            return jsonify({'error': TOP_K_ERROR}), 400
         
-        results = []
-        for i, patient in enumerate(patients):
-            try:
-                symptoms = patient.get('symptoms', {})
-                patient_info = patient.get('patient_info', {})
-                
-                if symptoms:
-                    prediction = predictor.predict(symptoms)
-                    results.append({
-                        'patient_index': i,
-                        'patient_info': patient_info,
-                        'prediction': prediction,
-                        'status': 'success'
-                    })
-                else:
-                    results.append({
-                        'patient_index': i,
-                        'patient_info': patient_info,
-                        'error': 'No symptoms provided',
-                        'status': 'error'
-                    })
-            except Exception as e:
-                results.append({
-                    'patient_index': i,
-                    'patient_info': patient.get('patient_info', {}),
-                    'error': str(e),
-                    'status': 'error'
-                })
+        # One encode + one model pass for the whole batch
+        symptom_matrix, rows, errors, unrecognized = _encode_patients(patients)
+        result = None
+        if rows:
+            started = time.perf_counter()
+            result = predictor.predict_matrix(symptom_matrix[rows], profile=profile, top_k=top_k)
+            serving_ms = (time.perf_counter() - started) * 1000
+            result['unrecognized'] = {position: unrecognized[i] for position, i in enumerate(rows)
+                                      if i in unrecognized}
+            if data.get('explain'):
+                predictor.explain(symptom_matrix[rows], result, profile=profile)
+            _shadow(symptom_matrix[rows], result, serving_ms, profile)
+            _log_prediction(symptom_matrix[rows], result, serving_ms, profile)
         
+        with metrics.stage('serialize'):
+            if data.get('format') == 'columnar':
+                return jsonify(_batch_columns(patients, rows, result, errors, data))
+            return jsonify(_batch_records(patients, rows, result, errors))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _parse_top_k(value):
+    """top_k option as a positive int, or None if it is not one"""
+    if isinstance(value, bool):
+        return None
+    try:
+        top_k = int(value)
+    except (TypeError, ValueError):
+        return None
+    return top_k if top_k >= 1 else None
+
+def _encode_patients(patients):
+    """
+    (symptom matrix, indices of encodable patients, {index: error},
+    {index: unrecognized symptom names}) for a patients list
+    """
+    errors = {}
+    unrecognized = {}
+    symptom_dicts = []
+    for i, patient in enumerate(patients):
+        symptoms = patient.get('symptoms') if isinstance(patient, dict) else None
+        if not symptoms:
+            errors[i] = 'No symptoms provided'
+            symptoms = {}
+        symptom_dicts.append(symptoms)
+    
+    with metrics.stage('encode'):
+        symptom_matrix = predictor.encode_symptoms(symptom_dicts, errors=errors, unrecognized=unrecognized)
+    rows = [i for i in range(len(patients)) if i not in errors]
+    return symptom_matrix, rows, errors, unrecognized
+
+def _binary_batch_predict():
+    """
+    Batch prediction over a binary symptom matrix (columns in /symptoms order)
+    
+    Options come from the query string (profile, top_k,
+    include_probabilities); the response is an .npz of the columnar arrays.
+    """
+    symptom_catalog = predictor.symptom_catalog()
+    expected_etag = request.headers.get('X-Symptoms-ETag')
+    if expected_etag and expected_etag != symptom_catalog['etag']:
         return jsonify({
-            'results': results,
-            'total_patients': len(patients),
-            'successful_predictions': len([r for r in results if r['status'] == 'success'])
-        })
+            'error': 'Symptom columns changed; refetch /symptoms',
+            'symptoms_etag': symptom_catalog['etag']
+        }), 412
+    
+    try:
+        with metrics.stage('decode'):
+            symptom_matrix = wire_format.decode_matrix(
+                request.get_data(), request.mimetype, len(predictor.symptom_columns))
+        if len(symptom_matrix) == 0:
+            return jsonify({'error': 'No patients data provided'}), 400
+        top_k = _parse_top_k(request.args.get('top_k', 5))
+        if top_k is None:
+            return jsonify({'error': TOP_K_ERROR}), 400
+        
+        started = time.perf_counter()
+        result = predictor.predict_matrix(symptom_matrix, profile=request.args.get('profile'), top_k=top_k)
+        serving_ms = (time.perf_counter() - started) * 1000
+        _shadow(symptom_matrix, result, serving_ms, request.args.get('profile'))
+        _log_prediction(symptom_matrix, result, serving_ms, request.args.get('profile'))
+        arrays = {
+            'top_indices': result['top_indices'].astype(np.int16),
+            'top_probabilities': result['top_probabilities'].astype(np.float32)
+        }
+        if request.args.get('include_probabilities', 'false').lower() == 'true':
+            arrays['probabilities'] = result['probabilities'].astype(np.float32)
+        if 'tiers' in result:
+            arrays['escalated'] = result['tiers'] == 'voting_ensemble'
+        if 'exact_match' in result:
+            arrays['exact_match'] = result['exact_match']
+        if 'confidence' in result:
+            arrays['confidence'] = result['confidence'].astype(np.float32)
         
+        with metrics.stage('serialize'):
+            response = Response(wire_format.encode_arrays(arrays), mimetype=wire_format.NPZ_TYPE)
+        response.headers['X-Model-Version'] = predictor.class_catalog()['version']
+        response.headers['X-Classes-ETag'] = predictor.class_catalog()['etag']
+        return response
+    
+    except wire_format.WireFormatError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _patient_info(patient):
+    return patient.get('patient_info', {}) if isinstance(patient, dict) else {}
+
+def _batch_records(patients, rows, result, errors):
+    """Per-patient batch response (one full prediction object each)"""
+    positions = {patient_index: position for position, patient_index in enumerate(rows)}
+    results = []
+    for i, patient in enumerate(patients):
+        if i in positions:
+            results.append({
+                'patient_index': i,
+                'patient_info': _patient_info(patient),
+                'prediction': predictor.prediction_record(result, positions[i]),
+                'status': 'success'
+            })
+        else:
+            results.append({
+                'patient_index': i,
+                'patient_info': _patient_info(patient),
+                'error': errors[i],
+                'status': 'error'
+            })
+    return {
+        'results': results,
+        'total_patients': len(patients),
+        'successful_predictions': len(rows)
+    }
+
+def _batch_columns(patients, rows, result, errors, options):
+    """Columnar batch response; rows are identified by patient_index"""
+    catalog = predictor.class_catalog()
+    columns = {'patient_index': rows, 'top_indices': [], 'top_probabilities': []}
+    if result is not None:
+        top_indices = result['top_indices'].tolist()
+        columns['top_indices'] = top_indices
+        columns['top_probabilities'] = result['top_probabilities'].tolist()
+        columns['primary_model'] = result['primary_model']
+        if 'confidence' in result:
+            columns['confidence'] = result['confidence'].tolist()
+        if 'tiers' in result:
+            columns['tier'] = result['tiers'].tolist()
+        if 'exact_match' in result:
+            columns['exact_match'] = result['exact_match'].tolist()
+        if 'explanations' in result:
+            columns['explanations'] = [predictor.explanation_record(explanation)['contributions']
+                                       for explanation in result['explanations']]
+        if options.get('expand_names'):
+            classes = catalog['classes']
+            columns['predicted_condition'] = [classes[top[0]] for top in top_indices]
+            columns['top_diseases'] = [[classes[idx] for idx in top] for top in top_indices]
+        if options.get('include_probabilities'):
+            columns['probabilities'] = result['probabilities'].tolist()
+    return {
+        'model_version': catalog['version'],
+        'classes_etag': catalog['etag'],
+        'results': columns,
+        'errors': [{'patient_index': i, 'error': errors[i]} for i in sorted(errors)],
+        # Symptom names that matched no column (ignored for prediction)
+        'unrecognized_symptoms': [{'patient_index': rows[position], 'symptoms': names}
+                                  for position, names in sorted((result or {}).get('unrecognized', {}).items())],
+        'total_patients': len(patients),
+        'successful_predictions': len(rows)
+    }
+
+@app.route('/classes', methods=['GET'])
+def get_classes():
+    """Class list that prediction probability arrays and indices refer to"""
+    if not predictor:
+        return jsonify({'error': 'Model not loaded'}), 500
+    
+    catalog = predictor.class_catalog()
+    response = jsonify(catalog)
+    # Changes only with the model version; clients revalidate with If-None-Match
+    response.set_etag(catalog['etag'])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
 @app.route('/model_info', methods=['GET'])
 def get_model_info():
     """Get information about the ML model"""
@@ -193,11 +564,243 @@ def get_model_performance():
                 'accuracy': model_summary.get('best_model_accuracy', 0)
             },
             'models_available': model_summary['models_trained'],
+            'fast_profile': predictor.fast_profile_report,
+            'cascade': predictor.cascade.describe() if predictor.cascade else None,
+            'pattern_table': predictor.pattern_table.stats() if predictor.pattern_table is not None else None,
+            'calibration': {
+                profile: {
+                    'method': report['method'],
+                    'raw_ece': report['raw']['expected_calibration_error'],
+                    'calibrated_ece': report['calibrated']['expected_calibration_error']
+                }
+                for profile, report in (predictor.calibration_report or {}).items()
+            },
+            'explanation_cache': predictor.explanation_cache.stats() if predictor.explanation_cache is not None else None,
+            'prediction_log': prediction_logger.describe() if prediction_logger is not None else None,
+            'serving_profile': predictor.profile,
+            'serving_config': serving_config.describe(),
+            'model_memory': {
+                'mode': predictor.model_memory,
+                'worker_pid': os.getpid(),
+                'usage': memory_usage()
+            },
             'status': model_summary.get('status', 'Ready')
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/shadow', methods=['GET'])
+def get_shadow():
+    """Agreement, probability drift and latency of the shadowed candidate, merged over every worker"""
+    state = shadow_control.read()
+    evaluator = shadow_evaluator
+    if evaluator is not None:
+        evaluator.publish()
+    return jsonify({
+        'active': state is not None,
+        'worker_pid': os.getpid(),
+        'loaded': evaluator is not None,
+        'serving': {'model_dir': os.path.abspath(predictor.model_dir) if predictor else None,
+                    'model_version': predictor.metadata.get('version', 'unknown') if predictor else None},
+        'shadow': shadow_control.describe(state) if state is not None else None
+    })
+
+@app.route('/shadow', methods=['POST'])
+@admin_required
+def post_shadow():
+    """
+    Start shadowing a candidate model version
+    
+    Body: {'job_id': ...} of a succeeded retrain job or {'model_dir': ...}
+    under ML_SHADOW_CANDIDATES_DIR, optional 'fraction' of requests to
+    re-score and scoring 'workers'. The directory must already hold the
+    full saved model set; each worker loads it in the background.
+    """
+    if not predictor:
+        return jsonify({'error': 'Model not loaded'}), 500
+    try:
+        data = request.get_json() or {}
+        model_dir = data.get('model_dir')
+        if data.get('job_id'):
+            job = get_job_store().get(data['job_id'])
+            if job is None or job['kind'] != 'retrain' or job['status'] != 'succeeded':
+                return jsonify({'error': 'Job is not a succeeded retrain job'}), 400
+            model_dir = job['result']['model_dir']
+        elif model_dir:
+            root = shadow_candidates_dir()
+            model_dir = os.path.realpath(model_dir)
+            if os.path.commonpath([model_dir, root]) != root:
+                return jsonify({'error': f'model_dir must be under {root}'}), 400
+        if not model_dir:
+            return jsonify({'error': 'No model_dir or job_id provided'}), 400
+        fraction = data.get('fraction')
+        if fraction is not None and not 0 <= float(fraction) <= 1:
+            return jsonify({'error': 'fraction must be between 0 and 1'}), 400
+        state = start_shadow(model_dir, fraction=None if fraction is None else float(fraction),
+                             workers=data.get('workers'))
+        return jsonify({'active': True, 'shadow': shadow_control.describe(state)}), 201
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/shadow', methods=['DELETE'])
+@admin_required
+def delete_shadow():
+    """Stop shadowing in every worker; returns the final comparison"""
+    state = shadow_control.read()
+    if state is None:
+        return jsonify({'error': 'No candidate is being shadowed'}), 404
+    sync_shadow(None)
+    final = shadow_control.describe(state)
+    shadow_control.stop()
+    return jsonify({'active': False, 'shadow': final})
+
+@app.route('/shadow/promote', methods=['POST'])
+@admin_required
+def promote_shadow():
+    """Serve the shadowed candidate; one pointer rename switches every worker"""
+    state = shadow_control.read()
+    if state is None:
+        return jsonify({'error': 'No candidate is being shadowed'}), 409
+    evaluator = shadow_evaluator
+    if evaluator is not None:
+        evaluator.publish()
+    final = shadow_control.describe(state)
+    pointer = serving_pointer.promote(state['model_dir'], state['model_version'])
+    shadow_control.stop()
+    switch_to(pointer)
+    sync_shadow(None)
+    return jsonify({'promoted': pointer, 'shadow': final})
+
+# Background jobs: started on first use, backed by a SQLite queue
+job_store = None
+job_runner = None
+_job_runner_lock = threading.Lock()
+
+def get_job_store():
+    """The job queue, with this process's runner started once models are loaded"""
+    global job_store, job_runner
+    with _job_runner_lock:
+        if job_store is None:
+            job_store = jobs.JobStore()
+        if job_runner is None and predictor is not None:
+            job_runner = jobs.JobRunner(job_store, predictor.settings())
+    return job_store
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue a batch scoring or retraining job
+    
+    Batch jobs take the /batch_predict body (JSON patients or a binary
+    symptom matrix with ?kind=batch_predict); {'kind': 'retrain'} trains a
+    new model set without touching the served one. Returns 202 with the job.
+    """
+    if not predictor:
+        return jsonify({'error': 'Model not loaded'}), 500
+    
+    try:
+        store = get_job_store()
+        errors = {}
+        unrecognized = {}
+        if request.mimetype in wire_format.REQUEST_TYPES:
+            options = request.args
+            kind = options.get('kind', 'batch_predict')
+            symptom_matrix = wire_format.decode_matrix(
+                request.get_data(), request.mimetype, len(predictor.symptom_columns))
+            rows = list(range(len(symptom_matrix)))
+        else:
+            options = request.get_json() or {}
+            kind = options.get('kind', 'batch_predict')
+            if kind == 'batch_predict':
+                symptom_matrix, rows, errors, unrecognized = _encode_patients(options.get('patients', []))
+        
+        if kind == 'batch_predict':
+            if not rows:
+                return jsonify({'error': 'No patients data provided'}), 400
+            top_k = _parse_top_k(options.get('top_k', 5))
+            if top_k is None:
+                return jsonify({'error': TOP_K_ERROR}), 400
+            params = {
+                # Scored by the model served now, even if another is promoted before it runs
+                'model_dir': os.path.abspath(predictor.model_dir),
+                'profile': options.get('profile'),
+                'top_k': top_k,
+                'errors': [{'patient_index': i, 'error': errors[i]} for i in sorted(errors)],
+                'unrecognized_symptoms': [{'patient_index': i, 'symptoms': unrecognized[i]}
+                                          for i in sorted(unrecognized) if i not in errors]
+            }
+            job_id = store.submit('batch_predict', params, symptom_matrix[rows], rows)
+        elif kind == 'retrain':
+            job_id = store.submit('retrain')
+        else:
+            return jsonify({'error': f'Unknown job kind: {kind}'}), 400
+        job_runner.wake()
+        
+        response = jsonify(_job_response(store.get(job_id)))
+        response.headers['Location'] = f'/jobs/{job_id}'
+        return response, 202
+    
+    except wire_format.WireFormatError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _job_response(job):
+    job = dict(job)
+    job['links'] = {'self': f"/jobs/{job['id']}", 'cancel': f"/jobs/{job['id']}/cancel"}
+    if job['kind'] == 'batch_predict':
+        job['links']['results'] = f"/jobs/{job['id']}/results"
+    return job
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """Most recent jobs, optionally filtered by ?status="""
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    return jsonify({'jobs': [_job_response(job) for job in get_job_store().list(request.args.get('status'), limit)]})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status and progress"""
+    job = get_job_store().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(_job_response(job))
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def get_job_results(job_id):
+    """One page of a batch job's columnar results (rows scored so far)"""
+    store = get_job_store()
+    job = store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['kind'] != 'batch_predict':
+        return jsonify({'error': 'Job has no paged results', 'result': job['result']}), 400
+    
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 500, type=int), 1), 5000)
+    return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'offset': offset,
+        'limit': limit,
+        'done': job['done'],
+        'total': job['total'],
+        'result': job['result'],
+        'results': store.results(job_id, offset, limit),
+        'errors': job['params'].get('errors', []) if offset == 0 else [],
+        'unrecognized_symptoms': job['params'].get('unrecognized_symptoms', []) if offset == 0 else []
+    })
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued job, or ask a running one to stop after its current chunk"""
+    job = get_job_store().cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(_job_response(job))
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint not found'}), 404
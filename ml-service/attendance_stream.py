@@ -0,0 +1,324 @@
+"""
+Real-time attendance event stream processor
+Features:
+- Ingests clock-in / clock-out / break / absence events as they happen (no history in the request)
+- Tumbling daily and weekly aggregates per nurse and per unit, updated in O(1) per event
+- Anomaly rules (long/short shift, excessive breaks, uncharacteristic late arrival) evaluated
+  as each event arrives, and the 7-day absence / late-arrival rate alerts per unit
+- Alerts are emitted immediately: returned to the ingesting request, kept in a bounded
+  feed with sequence ids, and passed to any registered callback
+- State snapshots (pickle, atomic replace) so a restart resumes where it left off
+- One owner process: the state lives in memory, so a server configured with more than one
+  worker (ML_WORKERS > 1) refuses to start the stream; serve /events, /alerts and /aggregates
+  from a single-worker attendance service instead (see docker-compose.yml)
+
+Events are dicts with nurse_id, type and timestamp (ISO string or Unix seconds), plus
+unit (remembered per nurse) and, for clock_in, late: true. Types:
+    clock_in, clock_out (optional totalHours), break_start, break_end, absence
+
+Environment variables:
+    ML_WORKERS                      server worker processes; the stream only runs when this is 1
+    ML_ATTENDANCE_SNAPSHOT          snapshot file (default ml-service/.attendance/stream.pkl)
+    ML_ATTENDANCE_SNAPSHOT_SECONDS  seconds between automatic snapshots (default 30, 0 disables)
+"""
+
+import os
+import pickle
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+
+# Rules shared with NurseAttendanceML's batch analyses
+LONG_SHIFT_HOURS = 12
+SHORT_SHIFT_HOURS = 2
+EXCESSIVE_BREAKS = 5
+ABSENCE_ALERT_RATE = 15  # percent of attendance records in the last 7 days
+LATE_ALERT_RATE = 20
+ALERT_WINDOW_DAYS = 7
+LATE_LOOKBACK_DAYS = 30
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.attendance', 'stream.pkl')
+SNAPSHOT_FORMAT_VERSION = 1
+# Rate alerts need this many records in the window before they can fire
+MIN_ALERT_RECORDS = 10
+# Events older than the newest day seen minus this many days are rejected
+ALLOWED_LATENESS_DAYS = 2
+# Windows kept for queries and rules; older ones are evicted as days close
+DAILY_RETENTION_DAYS = 35
+WEEKLY_RETENTION_WEEKS = 8
+MAX_ALERTS = 10000
+
+EVENT_TYPES = ('clock_in', 'clock_out', 'break_start', 'break_end', 'absence')
+# Aggregate slots: attendance records, present, late, absent, hours, breaks
+RECORDS, PRESENT, LATE, ABSENT, HOURS, BREAKS = range(6)
+AGGREGATE_FIELDS = ('records', 'present', 'late', 'absent', 'hours', 'breaks')
+
+
+class EventError(ValueError):
+    """An event that cannot be applied (malformed, out of order or too late)"""
+
+
+class StreamOwnershipError(RuntimeError):
+    """The stream would be started in a server whose workers would each hold part of its state"""
+
+
+def _timestamp(value):
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    if isinstance(value, datetime):
+        return value
+    raise EventError(f"Invalid timestamp: {value!r}")
+
+
+class StreamProcessor:
+    """Incremental attendance aggregates, anomaly rules and rate alerts"""
+
+    def __init__(self, snapshot_path=None, snapshot_seconds=30, min_alert_records=MIN_ALERT_RECORDS,
+                 on_alert=None):
+        self.snapshot_path = snapshot_path
+        self.snapshot_seconds = snapshot_seconds
+        self.min_alert_records = min_alert_records
+        self.on_alert = on_alert
+        self._lock = threading.Lock()
+        self._last_snapshot = time.time()
+        self._reset()
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.restore(snapshot_path)
+
+    @classmethod
+    def from_env(cls, workers=1, **kwargs):
+        """
+        The stream for a server with this many worker processes
+
+        Each worker would see only the events routed to it, number alerts on
+        its own and overwrite the others' snapshot, so more than one refuses.
+        """
+        if workers > 1:
+            raise StreamOwnershipError(
+                f"The attendance stream keeps its state in one process and {workers} workers are configured; "
+                "serve /events, /alerts and /aggregates from a single-worker attendance service (ML_WORKERS=1)")
+        return cls(snapshot_path=os.environ.get('ML_ATTENDANCE_SNAPSHOT', DEFAULT_SNAPSHOT_PATH),
+                   snapshot_seconds=float(os.environ.get('ML_ATTENDANCE_SNAPSHOT_SECONDS', '30')), **kwargs)
+
+    def _reset(self):
+        self.daily = {}       # ('nurse' | 'unit', key, day) -> aggregate slots
+        self.weekly = {}      # ('nurse' | 'unit', key, week start) -> aggregate slots
+        self.days = {}        # (nurse_id, day) -> status of that attendance record
+        self.nurses = {}      # nurse_id -> {'unit', 'shift_start', 'shift_breaks', 'late_days'}
+        self.alerts = deque(maxlen=MAX_ALERTS)
+        self.active_rate_alerts = set()  # (unit, kind) currently above threshold
+        self.sequence = 0
+        self.watermark = None  # newest day seen
+        self.counts = {'events': 0, 'rejected': 0, 'alerts': 0}
+
+    def ingest(self, events):
+        """
+        Apply events in order
+
+        Returns (accepted count, [{'index', 'error'}] for rejected events,
+        alerts raised by this batch).
+        """
+        raised = []
+        rejected = []
+        with self._lock:
+            for index, event in enumerate(events):
+                try:
+                    self._apply(event, raised)
+                except (EventError, KeyError, TypeError, ValueError) as e:
+                    rejected.append({'index': index, 'error': str(e) if not isinstance(e, KeyError)
+                                     else f"Missing field {e}"})
+            self.counts['events'] += len(events) - len(rejected)
+            self.counts['rejected'] += len(rejected)
+            snapshot_due = (self.snapshot_path and self.snapshot_seconds
+                            and time.time() - self._last_snapshot >= self.snapshot_seconds)
+            if snapshot_due:
+                self._save_snapshot(self.snapshot_path)
+        if self.on_alert is not None:
+            for alert in raised:
+                self.on_alert(alert)
+        return len(events) - len(rejected), rejected, raised
+
+    def _apply(self, event, raised):
+        kind = event['type']
+        if kind not in EVENT_TYPES:
+            raise EventError(f"Unknown event type: {kind!r}")
+        nurse_id = str(event['nurse_id'])
+        at = _timestamp(event['timestamp'])
+        day = at.date()
+        if self.watermark is not None and (self.watermark - day).days > ALLOWED_LATENESS_DAYS:
+            raise EventError(f"Event for {day} is older than the {ALLOWED_LATENESS_DAYS}-day lateness allowance")
+        if self.watermark is None or day > self.watermark:
+            self._advance(day)
+
+        nurse = self.nurses.get(nurse_id)
+        if nurse is None:
+            nurse = self.nurses[nurse_id] = {'unit': 'All', 'shift_start': None, 'shift_breaks': 0,
+                                             'late_days': deque()}
+        if event.get('unit') is not None:
+            nurse['unit'] = str(event['unit'])
+        unit = nurse['unit']
+
+        if kind == 'clock_in':
+            late = bool(event.get('late'))
+            if late:
+                lookback = day - timedelta(days=LATE_LOOKBACK_DAYS)
+                late_days = nurse['late_days']
+                while late_days and late_days[0] < lookback:
+                    late_days.popleft()
+                if not late_days:
+                    self._raise(raised, 'anomaly', 'Medium', at, unit, 'Uncharacteristic late arrival', nurse_id)
+                if not late_days or late_days[-1] != day:
+                    late_days.append(day)
+            nurse['shift_start'] = at
+            nurse['shift_breaks'] = 0
+            self._record_status(nurse_id, unit, day, LATE if late else PRESENT, at, raised)
+        elif kind == 'absence':
+            self._record_status(nurse_id, unit, day, ABSENT, at, raised)
+        elif kind == 'break_start':
+            if nurse['shift_start'] is None:
+                raise EventError(f"Nurse {nurse_id} is not clocked in")
+            nurse['shift_breaks'] += 1
+            self._add(nurse_id, unit, day, BREAKS, 1)
+            if nurse['shift_breaks'] == EXCESSIVE_BREAKS + 1:
+                self._raise(raised, 'anomaly', 'Low', at, unit, 'Excessive breaks', nurse_id)
+        elif kind == 'clock_out':
+            if nurse['shift_start'] is None:
+                raise EventError(f"Nurse {nurse_id} is not clocked in")
+            hours = event.get('totalHours')
+            if hours is None:
+                hours = (at - nurse['shift_start']).total_seconds() / 3600
+            hours = float(hours)
+            # Hours count toward the day the shift started
+            self._add(nurse_id, unit, nurse['shift_start'].date(), HOURS, hours)
+            nurse['shift_start'] = None
+            if hours > LONG_SHIFT_HOURS:
+                self._raise(raised, 'anomaly', 'Medium', at, unit, 'Unusually long shift', nurse_id)
+            elif hours < SHORT_SHIFT_HOURS:
+                self._raise(raised, 'anomaly', 'Low', at, unit, 'Unusually short shift', nurse_id)
+        # break_end needs no state: breaks are counted when they start
+
+    def _record_status(self, nurse_id, unit, day, slot, at, raised):
+        """Count a nurse's attendance record for the day (the first status event wins)"""
+        if (nurse_id, day) in self.days:
+            return
+        self.days[nurse_id, day] = slot
+        self._add(nurse_id, unit, day, RECORDS, 1)
+        self._add(nurse_id, unit, day, slot, 1)
+        self._check_rates(unit, day, at, raised)
+
+    def _add(self, nurse_id, unit, day, slot, amount):
+        week = day - timedelta(days=day.weekday())
+        for windows, start in ((self.daily, day), (self.weekly, week)):
+            for key in (('nurse', nurse_id, start), ('unit', unit, start)):
+                aggregate = windows.get(key)
+                if aggregate is None:
+                    aggregate = windows[key] = [0, 0, 0, 0, 0.0, 0]
+                aggregate[slot] += amount
+
+    def _check_rates(self, unit, day, at, raised):
+        """Absence / late-arrival rate alerts over the unit's last ALERT_WINDOW_DAYS days"""
+        records = absent = late = 0
+        for offset in range(ALERT_WINDOW_DAYS):
+            aggregate = self.daily.get(('unit', unit, day - timedelta(days=offset)))
+            if aggregate is not None:
+                records += aggregate[RECORDS]
+                absent += aggregate[ABSENT]
+                late += aggregate[LATE]
+        if records < self.min_alert_records:
+            return
+        for kind, count, threshold, level, message, action in (
+                ('absence_rate', absent, ABSENCE_ALERT_RATE, 'High', 'Absence rate is {rate:.1f}% in the last 7 days',
+                 'Investigate causes and arrange backup staff'),
+                ('late_rate', late, LATE_ALERT_RATE, 'Medium', 'Late arrival rate is {rate:.1f}%',
+                 'Review shift timings and transportation issues')):
+            rate = count / records * 100
+            # Edge-triggered: one alert when the rate crosses the threshold
+            if rate > threshold and (unit, kind) not in self.active_rate_alerts:
+                self.active_rate_alerts.add((unit, kind))
+                self._raise(raised, kind, level, at, unit, message.format(rate=rate), action=action,
+                            rate=round(rate, 2))
+            elif rate <= threshold:
+                self.active_rate_alerts.discard((unit, kind))
+
+    def _raise(self, raised, kind, level, at, unit, message, nurse_id=None, **details):
+        self.sequence += 1
+        alert = dict({'id': self.sequence, 'type': kind, 'level': level, 'timestamp': at.isoformat(),
+                      'unit': unit, 'nurse_id': nurse_id, 'message': message}, **details)
+        self.alerts.append(alert)
+        self.counts['alerts'] += 1
+        raised.append(alert)
+
+    def _advance(self, day):
+        """Move the watermark to day and evict windows that fell out of retention"""
+        self.watermark = day
+        daily_cutoff = day - timedelta(days=DAILY_RETENTION_DAYS)
+        weekly_cutoff = day - timedelta(weeks=WEEKLY_RETENTION_WEEKS)
+        self.daily = {key: value for key, value in self.daily.items() if key[2] >= daily_cutoff}
+        self.weekly = {key: value for key, value in self.weekly.items() if key[2] >= weekly_cutoff}
+        self.days = {key: value for key, value in self.days.items() if key[1] >= daily_cutoff}
+
+    def alerts_after(self, after=0, limit=100):
+        """Alerts with id > after, oldest first"""
+        with self._lock:
+            return [alert for alert in self.alerts if alert['id'] > after][:limit]
+
+    def aggregates(self, window='daily', scope='nurse', key=None, start=None, end=None):
+        """Aggregate rows of one window size and scope, optionally for one key and a date range"""
+        if window not in ('daily', 'weekly') or scope not in ('nurse', 'unit'):
+            raise ValueError("window must be 'daily' or 'weekly' and scope 'nurse' or 'unit'")
+        start = date.fromisoformat(start) if isinstance(start, str) else start
+        end = date.fromisoformat(end) if isinstance(end, str) else end
+        with self._lock:
+            windows = self.daily if window == 'daily' else self.weekly
+            rows = [
+                dict({scope: name, 'window_start': window_start.isoformat()},
+                     **dict(zip(AGGREGATE_FIELDS, values)))
+                for (kind, name, window_start), values in windows.items()
+                if kind == scope and (key is None or name == str(key))
+                and (start is None or window_start >= start) and (end is None or window_start <= end)
+            ]
+        return sorted(rows, key=lambda row: (row['window_start'], row[scope]))
+
+    def describe(self):
+        with self._lock:
+            return dict(self.counts, nurses=len(self.nurses), daily_windows=len(self.daily),
+                        weekly_windows=len(self.weekly), watermark=self.watermark and self.watermark.isoformat(),
+                        snapshot_path=self.snapshot_path)
+
+    def snapshot(self, path=None):
+        with self._lock:
+            self._save_snapshot(path or self.snapshot_path)
+
+    def _save_snapshot(self, path):
+        state = {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'daily': self.daily, 'weekly': self.weekly, 'days': self.days, 'nurses': self.nurses,
+            'alerts': list(self.alerts), 'active_rate_alerts': self.active_rate_alerts,
+            'sequence': self.sequence, 'watermark': self.watermark, 'counts': self.counts
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(f'{path}.tmp-{os.getpid()}', 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f'{path}.tmp-{os.getpid()}', path)
+        self._last_snapshot = time.time()
+
+    def restore(self, path):
+        """Resume from a snapshot; an unreadable or incompatible one leaves the state empty"""
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print(f"Warning: could not read attendance stream snapshot: {e}")
+            return False
+        if state.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+            return False
+        with self._lock:
+            self.daily, self.weekly, self.days = state['daily'], state['weekly'], state['days']
+            self.nurses = state['nurses']
+            self.alerts = deque(state['alerts'], maxlen=MAX_ALERTS)
+            self.active_rate_alerts = state['active_rate_alerts']
+            self.sequence, self.watermark, self.counts = state['sequence'], state['watermark'], state['counts']
+        return True
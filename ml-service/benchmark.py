@@ -0,0 +1,799 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the ml-service hot paths
+Cases:
+- DiseasePredictor cold start, single predict latency
+- Serving startup profile: -X importtime breakdown and a timed construction
+  trace, checked against STARTUP_BUDGET
+- /batch_predict throughput at several batch sizes
+- JSON vs binary (.npy, packed bitset) batch wire formats end to end
+- Single predict latency while a background batch job is running
+- Aggregate throughput for worker-process x thread-budget mixes
+- Per-worker RSS / PSS with private vs shared (memory-mapped) models
+- NurseAttendanceML feature builders and endpoints on synthetic data
+
+Runs offline through Flask's test client. Results are written as JSON;
+--compare flags regressions against a stored baseline run.
+
+Usage:
+    python benchmark.py --output bench.json
+    python benchmark.py --quick --compare bench.json --tolerance 0.25
+    python benchmark.py --startup-profile --model-dir models
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARKS = []
+
+# Serving cold-start targets in seconds: importing the service module, and
+# constructing DiseasePredictor from saved models (unpickling included)
+STARTUP_BUDGET = {'import_s': 2.0, 'construct_s': 10.0}
+# DiseasePredictor steps timed by the construction trace (nested steps are
+# included in their parents; joblib.load totals every pickle read)
+STARTUP_PHASES = ('load_datasets', 'preprocess_data', 'load_or_train', 'attach_model_bundle', 'compile_members',
+                  'load_fast_profile', 'load_cascade', 'load_calibration', 'load_pattern_table')
+
+# Sizes per mode; the nurse feature builders are quadratic in history length
+SIZES = {
+    'full': {
+        'predict_calls': 200,
+        'batch_sizes': [1, 10, 100, 1000],
+        'mix_workers': [1, 2, 4],
+        'wire_rows': [1000, 100000],
+        'mix_seconds': 5.0,
+        'memory_workers': 4,
+        'attendance_rows': [100, 400, 1600],
+        'roster_sizes': [1000, 10000, 50000]
+    },
+    'quick': {
+        'predict_calls': 30,
+        'batch_sizes': [1, 10, 100],
+        'mix_workers': [1, 2],
+        'wire_rows': [1000],
+        'mix_seconds': 1.5,
+        'memory_workers': 2,
+        'attendance_rows': [50, 200],
+        'roster_sizes': [1000, 10000]
+    }
+}
+
+
+def benchmark(group):
+    """Register a benchmark case under a group name"""
+    def register(func):
+        BENCHMARKS.append((group, func))
+        return func
+    return register
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds"""
+    samples_ms = np.asarray(samples) * 1000
+    return {
+        'mean_ms': float(samples_ms.mean()),
+        'p50_ms': float(np.percentile(samples_ms, 50)),
+        'p95_ms': float(np.percentile(samples_ms, 95))
+    }
+
+
+def time_call(func, repeat=5, warmup=1):
+    """Run func warmup + repeat times and return the per-call durations"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the services' progress prints while timing (yields the captured output)"""
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        yield output
+
+
+def traced(owner, names, totals):
+    """Wrap owner.<name> so each call adds its duration (seconds) to totals[name]"""
+    for name in names:
+        func = getattr(owner, name)
+
+        def timed(*args, _func=func, _name=name, **kwargs):
+            start = time.perf_counter()
+            try:
+                return _func(*args, **kwargs)
+            finally:
+                totals[_name] = totals.get(_name, 0.0) + time.perf_counter() - start
+        setattr(owner, name, timed)
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+# ---------------------------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------------------------
+
+def synthetic_symptoms(symptom_columns, n, seed=0, active=(3, 8)):
+    """n symptom dicts with a handful of active symptoms each"""
+    rng = np.random.default_rng(seed)
+    patients = []
+    for _ in range(n):
+        count = rng.integers(active[0], active[1] + 1)
+        chosen = rng.choice(len(symptom_columns), size=count, replace=False)
+        patients.append({symptom_columns[i]: 1 for i in chosen})
+    return patients
+
+
+def synthetic_attendance(n_rows, n_nurses=None, seed=0):
+    """Attendance records shaped like the backend's Attendance documents"""
+    rng = np.random.default_rng(seed)
+    n_nurses = n_nurses or max(1, n_rows // 30)
+    days = int(np.ceil(n_rows / n_nurses))
+    # History ends today so the 7-day alert window has data
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+    records = []
+    for i in range(n_rows):
+        status = rng.choice(['Present', 'Absent', 'Late'], p=[0.8, 0.1, 0.1])
+        hours = 0.0 if status == 'Absent' else float(np.clip(rng.normal(8, 2), 1, 14))
+        records.append({
+            'nurse_id': f'N{i % n_nurses}',
+            'name': f'Nurse {i % n_nurses}',
+            'unit': ['ICU', 'ER', 'Ward A', 'Ward B'][(i % n_nurses) % 4],
+            'date': (start + timedelta(days=(i // n_nurses) % days)).strftime('%Y-%m-%d'),
+            'shift': rng.choice(['Morning', 'Evening', 'Night']),
+            'status': status,
+            'totalHours': hours,
+            'breaks': [{}] * int(rng.integers(0, 4))
+        })
+    return records
+
+
+def synthetic_roster(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'nurse_id': [f'N{i}' for i in range(n)],
+        'name': [f'Nurse {i}' for i in range(n)],
+        'unit': rng.choice(['ICU', 'ER', 'Ward A', 'Ward B'], n),
+        'totalHours': rng.normal(38, 6, n)
+    })
+
+
+# ---------------------------------------------------------------------------
+# Disease predictor cases
+# ---------------------------------------------------------------------------
+
+@benchmark('predictor')
+def bench_predictor_cold_start(ctx):
+    """Fresh interpreter: import + DiseasePredictor() from saved models"""
+    script = (
+        "import sys, time; t = time.perf_counter(); sys.path.insert(0, %r);"
+        "from disease_predictor import DiseasePredictor;"
+        "DiseasePredictor(model_dir=%r);"
+        "print(time.perf_counter() - t)"
+    ) % (SERVICE_DIR, ctx['model_dir'])
+    samples = []
+    for _ in range(ctx['cold_start_runs']):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                cwd=SERVICE_DIR, check=True).stdout
+        samples.append(time.perf_counter() - start)
+        in_process = float(output.strip().splitlines()[-1])
+    return {
+        'cold_start_s': float(np.median(samples)),
+        'construct_s': in_process
+    }
+
+
+STARTUP_TRACE_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {service_dir!r})
+import disease_predictor
+import_s = time.perf_counter() - started
+from benchmark import STARTUP_PHASES, quiet, traced
+phases = {{}}
+traced(disease_predictor.DiseasePredictor, STARTUP_PHASES, phases)
+traced(disease_predictor.joblib, ['load'], phases)
+sklearn_at_import = any(name.split('.')[0] == 'sklearn' for name in sys.modules)
+start = time.perf_counter()
+with quiet() as output:
+    predictor = disease_predictor.DiseasePredictor(model_dir={model_dir!r}, dataset_cache_dir={cache_dir!r},
+                                                   model_memory={mode!r}, verbose={verbose!r})
+construct_s = time.perf_counter() - start
+print(json.dumps({{
+    'import_s': import_s,
+    'construct_s': construct_s,
+    'phases_s': {{('joblib_load' if name == 'load' else name): value for name, value in phases.items()}},
+    'log_lines': len(output.getvalue().splitlines()),
+    'sklearn_at_import': sklearn_at_import,
+    'splits_built': predictor.X_train is not None
+}}))
+"""
+
+
+def import_profile(module='disease_predictor', top=10):
+    """
+    `python -X importtime -c "import <module>"` in a fresh interpreter
+
+    Returns the module's cumulative import time, its slowest direct imports
+    and the self time summed per top-level package (which package the time
+    is actually spent in, whoever imported it).
+    """
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, cwd=SERVICE_DIR, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us) / 1000, int(cumulative_us) / 1000))
+    # A module's children are the deeper rows printed just before it
+    end = max(i for i, row in enumerate(rows) if row[0] == module and row[1] == 0)
+    begin = end
+    while begin > 0 and rows[begin - 1][1] > 0:
+        begin -= 1
+    direct = [row for row in rows[begin:end] if row[1] == 1]
+    packages = {}
+    for name, _, self_ms, _ in rows[begin:end + 1]:
+        packages[name.split('.')[0]] = packages.get(name.split('.')[0], 0.0) + self_ms
+    return {
+        'module': module,
+        'total_ms': rows[end][3],
+        'direct_ms': {name: cumulative for name, _, _, cumulative in sorted(direct, key=lambda row: -row[3])[:top]},
+        'packages_ms': dict(sorted(packages.items(), key=lambda item: -item[1])[:top])
+    }
+
+
+def construction_trace(model_dir, dataset_cache_dir=None, model_memory='private', verbose=False):
+    """Fresh interpreter: import time, then each DiseasePredictor construction step"""
+    script = STARTUP_TRACE_SCRIPT.format(service_dir=SERVICE_DIR, model_dir=model_dir, cache_dir=dataset_cache_dir,
+                                         mode=model_memory, verbose=verbose)
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                            cwd=SERVICE_DIR, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def startup_profile(model_dir, dataset_cache_dir=None, model_memory='private', verbose=False):
+    """Import breakdown plus construction trace, with any STARTUP_BUDGET overruns"""
+    trace = construction_trace(model_dir, dataset_cache_dir, model_memory=model_memory, verbose=verbose)
+    return {
+        'imports': import_profile('disease_predictor'),
+        'trace': trace,
+        'budget_s': STARTUP_BUDGET,
+        'over_budget': [key for key, limit in STARTUP_BUDGET.items() if trace[key] > limit]
+    }
+
+
+@benchmark('predictor')
+def bench_startup_profile(ctx):
+    """Serving start in a fresh interpreter, per step (see startup_profile)"""
+    results = {}
+    for mode in ('private', 'shared'):
+        trace = construction_trace(ctx['model_dir'], model_memory=mode)
+        results[f'{mode}_import_ms'] = trace['import_s'] * 1000
+        results[f'{mode}_construct_ms'] = trace['construct_s'] * 1000
+        for phase, seconds in trace['phases_s'].items():
+            results[f'{mode}_{phase}_ms'] = seconds * 1000
+    results['import_profile_ms'] = import_profile('disease_predictor')['total_ms']
+    return results
+
+
+@benchmark('predictor')
+def bench_predict_latency(ctx):
+    predictor = ctx['predictor']
+    patients = synthetic_symptoms(predictor.symptom_columns, ctx['sizes']['predict_calls'], seed=1)
+    samples = []
+    with quiet():
+        predictor.predict(patients[0])
+        for symptoms in patients:
+            start = time.perf_counter()
+            predictor.predict(symptoms)
+            samples.append(time.perf_counter() - start)
+    return {f'predict_{key}': value for key, value in summarize(samples).items()}
+
+
+@benchmark('predictor')
+def bench_batch_predict(ctx):
+    client = ctx['disease_client']
+    predictor = ctx['predictor']
+    results = {}
+    for size in ctx['sizes']['batch_sizes']:
+        payload = {'patients': [{'symptoms': s} for s in synthetic_symptoms(predictor.symptom_columns, size, seed=2)],
+                   'format': 'columnar'}
+        repeat = 3 if size <= 100 else 1
+
+        def call():
+            response = client.post('/batch_predict', json=payload)
+            assert response.status_code == 200, response.get_data(as_text=True)
+
+        with quiet():
+            samples = time_call(call, repeat=repeat, warmup=1 if size <= 100 else 0)
+        results[f'batch_{size}_rows_per_s'] = float(size / np.median(samples))
+        results[f'batch_{size}_p50_ms'] = summarize(samples)['p50_ms']
+    return results
+
+
+@benchmark('predictor')
+def bench_wire_formats(ctx):
+    """End-to-end /batch_predict: client encode + request + server + client decode"""
+    import metrics
+    import wire_format
+
+    # Server-side time spent outside the models: parsing/decoding the body,
+    # building the feature matrix and serializing the response
+    wire_stages = ('json_parse', 'encode', 'decode', 'serialize')
+
+    def wire_seconds():
+        return sum(metrics.STAGE_LATENCY.total(stage, '') for stage in wire_stages)
+
+    client = ctx['disease_client']
+    columns = ctx['predictor'].symptom_columns
+    results = {}
+    for rows in ctx['sizes']['wire_rows']:
+        rng = np.random.default_rng(rows)
+        matrix = (rng.random((rows, len(columns))) < 0.04).astype(np.uint8)
+        matrix[np.arange(rows), rng.integers(0, len(columns), rows)] = 1
+        patients = [{'symptoms': {columns[j]: 1 for j in np.flatnonzero(row)}} for row in matrix]
+
+        def post_json():
+            response = client.post('/batch_predict', json={'patients': patients, 'format': 'columnar'})
+            assert response.status_code == 200, response.get_data(as_text=True)
+            response.get_json()
+
+        def post_binary(content_type, encode):
+            def call():
+                response = client.post('/batch_predict', data=encode(matrix), content_type=content_type)
+                assert response.status_code == 200, response.get_data(as_text=True)
+                wire_format.decode_arrays(response.get_data())
+            return call
+
+        calls = {
+            'json': post_json,
+            'npy': post_binary(wire_format.NPY_TYPE, wire_format.encode_npy),
+            'bitset': post_binary(wire_format.BITSET_TYPE, wire_format.encode_bitset)
+        }
+        request_bytes = {
+            'json': len(json.dumps({'patients': patients})),
+            'npy': len(wire_format.encode_npy(matrix)),
+            'bitset': len(wire_format.encode_bitset(matrix))
+        }
+        repeat = 3 if rows <= 10000 else 1
+        for name, call in calls.items():
+            warmup = 1 if rows <= 10000 else 0
+            before = wire_seconds()
+            with quiet():
+                samples = time_call(call, repeat=repeat, warmup=warmup)
+            results[f'{name}_{rows}_rows_per_s'] = float(rows / np.median(samples))
+            results[f'{name}_{rows}_server_wire_ms'] = (wire_seconds() - before) * 1000 / (repeat + warmup)
+            results[f'{name}_{rows}_request_bytes'] = request_bytes[name]
+    return results
+
+
+@benchmark('predictor')
+def bench_predict_during_job(ctx):
+    """predict latency idle vs while a job worker scores a large batch"""
+    import jobs
+
+    predictor = ctx['predictor']
+    patients = synthetic_symptoms(predictor.symptom_columns, ctx['sizes']['predict_calls'], seed=4)
+
+    def predict_p50():
+        samples = []
+        with quiet():
+            for symptoms in patients:
+                start = time.perf_counter()
+                predictor.predict(symptoms)
+                samples.append(time.perf_counter() - start)
+        return summarize(samples)['p50_ms']
+
+    results = {'idle_p50_ms': predict_p50()}
+    rng = np.random.default_rng(5)
+    matrix = (rng.random((50000, len(predictor.symptom_columns))) < 0.04).astype(np.uint8)
+    with tempfile.TemporaryDirectory() as jobs_dir:
+        store = jobs.JobStore(jobs_dir)
+        runner = jobs.JobRunner(store, predictor.settings(), concurrency=1)
+        try:
+            job_id = store.submit('batch_predict', {}, matrix, np.arange(len(matrix)))
+            runner.wake()
+            # Measure once the worker has loaded its models and is scoring
+            deadline = time.monotonic() + 120
+            while store.get(job_id)['done'] == 0 and time.monotonic() < deadline:
+                time.sleep(0.2)
+            results['during_job_p50_ms'] = predict_p50()
+            store.cancel(job_id)
+        finally:
+            runner.shutdown()
+    return results
+
+
+@benchmark('predictor')
+def bench_member_backends(ctx):
+    """Per-member predict_proba latency, sklearn vs the compiled backends"""
+    from forest_inference import CompiledBoosting, CompiledForest
+    from svm_serving import CompiledSVC
+
+    predictor = ctx['predictor']
+    voting = predictor.models.get('voting_ensemble')
+    if voting is None:
+        return {}
+    compilers = {'rf': CompiledForest.from_sklearn, 'et': CompiledForest.from_sklearn,
+                 'gb': CompiledBoosting.from_sklearn, 'svm': CompiledSVC.from_sklearn}
+    X = predictor.selected_feature_splits()[1]
+    rows = max(ctx['sizes']['batch_sizes'])
+    X_batch = X[np.arange(rows) % len(X)]
+    results = {}
+    for key, member in voting.named_estimators_.items():
+        backends = {'sklearn': member}
+        if key in compilers:
+            backends['compiled'] = compilers[key](member)
+        for backend, model in backends.items():
+            if model is None:
+                continue
+            single = time_call(lambda: model.predict_proba(X[:1]), repeat=ctx['sizes']['predict_calls'])
+            batch = time_call(lambda: model.predict_proba(X_batch), repeat=3)
+            results[f'{key}_{backend}_row_p50_ms'] = summarize(single)['p50_ms']
+            results[f'{key}_{backend}_batch_rows_per_s'] = float(rows / np.median(batch))
+    return results
+
+
+MIX_WORKER_SCRIPT = """
+import sys, time
+sys.path.insert(0, {service_dir!r})
+from benchmark import quiet, synthetic_symptoms
+from disease_predictor import DiseasePredictor
+from serving_config import ServingConfig
+with quiet():
+    predictor = DiseasePredictor(model_dir={model_dir!r}, tree_backend='sklearn')
+ServingConfig(workers={workers}, estimator_jobs={jobs}, native_threads={threads},
+              enabled={enabled}).apply_to_predictor(predictor)
+patients = synthetic_symptoms(predictor.symptom_columns, 50, seed={seed})
+print('ready', flush=True)
+sys.stdin.readline()
+calls = 0
+end = time.perf_counter() + {seconds}
+with quiet():
+    while time.perf_counter() < end:
+        predictor.predict(patients[calls % len(patients)])
+        calls += 1
+print(calls / {seconds}, flush=True)
+"""
+
+
+@benchmark('predictor')
+def bench_worker_thread_mix(ctx):
+    """
+    Aggregate predict throughput for N worker processes x thread budget
+
+    Uses the sklearn forest backend so estimator n_jobs is actually exercised;
+    'inherit' leaves the pickled n_jobs and native thread pools untouched.
+    """
+    from serving_config import cpu_count
+
+    cpus = cpu_count()
+    budgets = [('inherit', None)] + [(f't{n}', n) for n in sorted({1, cpus})]
+    results = {}
+    for workers in ctx['sizes']['mix_workers']:
+        for label, threads in budgets:
+            settings = dict(service_dir=SERVICE_DIR, model_dir=ctx['model_dir'], workers=workers,
+                            jobs=threads, threads=threads, enabled=threads is not None,
+                            seconds=ctx['sizes']['mix_seconds'])
+            children = [
+                subprocess.Popen([sys.executable, '-c', MIX_WORKER_SCRIPT.format(seed=i, **settings)],
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, cwd=SERVICE_DIR)
+                for i in range(workers)
+            ]
+            # Start the timed loops together once every worker has loaded
+            for child in children:
+                assert child.stdout.readline().strip() == 'ready'
+            for child in children:
+                child.stdin.write('go\n')
+                child.stdin.flush()
+            total = 0.0
+            for child in children:
+                output, _ = child.communicate()
+                total += float(output.strip().splitlines()[-1])
+            results[f'w{workers}_{label}_rows_per_s'] = total
+    return results
+
+
+MEMORY_WORKER_SCRIPT = """
+import json, sys
+sys.path.insert(0, {service_dir!r})
+from benchmark import quiet, synthetic_symptoms
+from model_bundle import memory_usage
+before = memory_usage()
+from disease_predictor import DiseasePredictor
+with quiet():
+    predictor = DiseasePredictor(model_dir={model_dir!r}, model_memory={mode!r})
+    # Touch every member so their pages are resident
+    predictor.predict_batch(synthetic_symptoms(predictor.symptom_columns, 300, seed=0))
+print('ready', flush=True)
+sys.stdin.readline()
+print(json.dumps({{'before': before, 'after': memory_usage()}}), flush=True)
+"""
+
+
+@benchmark('predictor')
+def bench_worker_memory(ctx):
+    """
+    Per-worker RSS / PSS with N workers loaded at once, private vs shared models
+
+    PSS splits shared pages between the processes mapping them, so the
+    shared-mode saving shows up there rather than in RSS.
+    """
+    from model_bundle import memory_usage
+
+    if memory_usage() is None:
+        return {}
+    workers = ctx['sizes']['memory_workers']
+    results = {}
+    for mode in ('private', 'shared'):
+        children = [
+            subprocess.Popen([sys.executable, '-c', MEMORY_WORKER_SCRIPT.format(
+                service_dir=SERVICE_DIR, model_dir=ctx['model_dir'], mode=mode)],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, cwd=SERVICE_DIR)
+            for _ in range(workers)
+        ]
+        # Sample once every worker is loaded so shared pages are counted once
+        for child in children:
+            assert child.stdout.readline().strip() == 'ready'
+        for child in children:
+            child.stdin.write('go\n')
+            child.stdin.flush()
+        usage = [json.loads(child.communicate()[0].strip().splitlines()[-1]) for child in children]
+        for stage in ('before', 'after'):
+            for field in ('rss_mb', 'pss_mb'):
+                values = [worker[stage][field] for worker in usage]
+                results[f'{mode}_{stage}_{field}'] = float(np.mean(values))
+        results[f'{mode}_total_pss_mb'] = float(sum(worker['after']['pss_mb'] for worker in usage))
+    results['workers'] = workers
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Nurse attendance cases
+# ---------------------------------------------------------------------------
+
+@benchmark('nurse')
+def bench_nurse_feature_builders(ctx):
+    from nurse_attendance_ml import NurseAttendanceML
+    ml = NurseAttendanceML()
+    builders = [
+        'previous_absences', 'consecutive_days', 'weekly_hours', 'break_frequency', 'late_arrivals'
+    ]
+    results = {}
+    for rows in ctx['sizes']['attendance_rows']:
+        df = ml._attendance_frame(synthetic_attendance(rows, seed=3))
+        for name in builders:
+            builder = getattr(ml, f'_calculate_{name}')
+            samples = time_call(lambda: builder(df), repeat=3 if rows <= 200 else 1, warmup=0)
+            results[f'{name}_{rows}_ms'] = float(np.median(samples) * 1000)
+        samples = time_call(lambda: ml.prepare_features(df), repeat=1, warmup=0)
+        results[f'prepare_features_{rows}_ms'] = float(samples[0] * 1000)
+    return results
+
+
+@benchmark('nurse')
+def bench_nurse_endpoints(ctx):
+    client = ctx['nurse_client']
+    results = {}
+
+    def post(path, payload):
+        response = client.post(path, json=payload)
+        assert response.status_code == 200, f'{path}: {response.get_data(as_text=True)[:200]}'
+
+    record = synthetic_attendance(1, seed=4)[0]
+    samples = time_call(lambda: post('/ml/nurse-attendance/predict-absence', record), repeat=10)
+    results['predict_absence_p50_ms'] = summarize(samples)['p50_ms']
+
+    nurses = [dict(r, id=r['nurse_id']) for r in synthetic_attendance(50, n_nurses=50, seed=5)]
+    samples = time_call(lambda: post('/ml/nurse-attendance/optimize-schedule',
+                                     {'nurses': nurses, 'requirements': {'Morning': 5}}), repeat=3)
+    results['optimize_schedule_50_p50_ms'] = summarize(samples)['p50_ms']
+
+    for rows in ctx['sizes']['attendance_rows']:
+        records = synthetic_attendance(rows, seed=6)
+        for name, path, payload in [
+            ('detect_anomalies', '/ml/nurse-attendance/detect-anomalies', records),
+            ('predict_staffing', '/ml/nurse-attendance/predict-staffing', {'historical_data': records}),
+            ('insights', '/ml/nurse-attendance/insights', records)
+        ]:
+            samples = time_call(lambda: post(path, payload), repeat=1, warmup=0)
+            results[f'{name}_{rows}_ms'] = float(samples[0] * 1000)
+
+    for size in ctx['sizes']['roster_sizes']:
+        roster = synthetic_roster(size, seed=7).to_dict('records')
+        samples = time_call(lambda: post('/ml/nurse-attendance/analyze-workload', {'roster': roster}), repeat=1)
+        results[f'analyze_workload_{size}_ms'] = float(samples[0] * 1000)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def _has_trained_models(model_dir):
+    required = ['random_forest.pkl', 'svm.pkl', 'gradient_boosting.pkl', 'metadata.json']
+    return all(os.path.exists(os.path.join(model_dir, name)) for name in required)
+
+
+def build_context(args, groups):
+    ctx = {
+        'sizes': SIZES['quick' if args.quick else 'full'],
+        'model_dir': os.path.abspath(args.model_dir),
+        'cold_start_runs': 1 if args.quick else 3
+    }
+
+    if 'predictor' in groups:
+        from disease_predictor import DiseasePredictor
+        os.environ['ML_PRELOAD_MODELS'] = 'false'
+        with quiet():
+            ctx['predictor'] = DiseasePredictor(model_dir=ctx['model_dir'])
+            import app as disease_app
+        disease_app.predictor = ctx['predictor']
+        ctx['disease_client'] = disease_app.app.test_client()
+
+    if 'nurse' in groups:
+        import nurse_attendance_ml
+        # The absence model is loaded from ./models, so train one on synthetic
+        # history inside a scratch directory
+        ctx['scratch'] = tempfile.TemporaryDirectory()
+        with working_directory(ctx['scratch'].name):
+            os.makedirs('models')
+            history = nurse_attendance_ml.ml_system._attendance_frame(synthetic_attendance(300, seed=8))
+            nurse_attendance_ml.ml_system.train_absence_predictor(history)
+        ctx['nurse_client'] = nurse_attendance_ml.create_app().test_client()
+    return ctx
+
+
+def run_benchmarks(args):
+    groups = set(args.groups)
+    if 'predictor' in groups and not _has_trained_models(args.model_dir) and not args.allow_training:
+        print(f"Skipping predictor benchmarks: no trained models in {args.model_dir} "
+              "(pass --allow-training to train them first)")
+        groups.discard('predictor')
+
+    ctx = build_context(args, groups)
+    results = {}
+    for group, func in BENCHMARKS:
+        if group not in groups:
+            continue
+        name = func.__name__.replace('bench_', '')
+        print(f"Running {name}...")
+        results[name] = func(ctx)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'mode': 'quick' if args.quick else 'full',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'sklearn': _sklearn_version()
+        },
+        'results': results
+    }
+
+
+def _sklearn_version():
+    try:
+        import sklearn
+        return sklearn.__version__
+    except ImportError:
+        return None
+
+
+def higher_is_better(metric):
+    return metric.endswith('_per_s')
+
+
+def compare_results(current, baseline, tolerance=0.25):
+    """
+    Compare two result payloads metric by metric
+
+    Returns a list of rows with the relative change; a row is a regression
+    when the metric got worse by more than tolerance (0.25 = 25%).
+    """
+    rows = []
+    for case, metrics in current['results'].items():
+        base_metrics = baseline.get('results', {}).get(case, {})
+        for metric, value in metrics.items():
+            base = base_metrics.get(metric)
+            if base is None or base == 0:
+                continue
+            change = (value - base) / base
+            worse = -change if higher_is_better(metric) else change
+            rows.append({
+                'case': case,
+                'metric': metric,
+                'baseline': base,
+                'current': value,
+                'change': change,
+                'regression': worse > tolerance
+            })
+    return rows
+
+
+def print_comparison(rows):
+    for row in rows:
+        flag = 'REGRESSION' if row['regression'] else ''
+        print(f"{row['case']:<24} {row['metric']:<36} {row['baseline']:>12.3f} -> {row['current']:>12.3f} "
+              f"({row['change']:+.1%}) {flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the ml-service hot paths')
+    parser.add_argument('--quick', action='store_true', help='Smaller sizes for a fast smoke run')
+    parser.add_argument('--groups', nargs='+', default=['predictor', 'nurse'], choices=['predictor', 'nurse'])
+    parser.add_argument('--model-dir', default=os.path.join(SERVICE_DIR, 'models'))
+    parser.add_argument('--allow-training', action='store_true',
+                        help='Train the disease models if the model dir has none')
+    parser.add_argument('--output', help='Write results JSON to this path')
+    parser.add_argument('--compare', help='Baseline results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Relative slowdown that counts as a regression')
+    parser.add_argument('--startup-profile', action='store_true',
+                        help='Print the serving startup profile for --model-dir and exit (1 when over budget)')
+    parser.add_argument('--model-memory', default='private', choices=['private', 'shared'],
+                        help='Model loading mode for --startup-profile')
+    args = parser.parse_args(argv)
+
+    if args.startup_profile:
+        profile = startup_profile(os.path.abspath(args.model_dir), model_memory=args.model_memory)
+        print(json.dumps(profile, indent=2))
+        for key in profile['over_budget']:
+            print(f"{key} {profile['trace'][key]:.2f}s is over the {STARTUP_BUDGET[key]:.2f}s budget")
+        return 1 if profile['over_budget'] else 0
+
+    payload = run_benchmarks(args)
+    text = json.dumps(payload, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+        print(f"Results written to {args.output}")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        rows = compare_results(payload, baseline, args.tolerance)
+        print_comparison(rows)
+        regressions = [row for row in rows if row['regression']]
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Probability calibration stored as interpolation tables
+Features:
+- Isotonic or Platt (sigmoid) calibrators fitted on held-out scores and labels
+- Either one is reduced to a short table of (raw score, calibrated probability) knots, so
+  serving is a single vectorized np.interp per batch and the table is plain JSON
+- Reliability diagnostics: per-bin mean score vs observed rate, expected calibration error, Brier score
+- Threshold tables: precision / recall / flagged rate at each cut-off on the calibrated scale,
+  so consumers can choose cut-offs without re-running the models
+
+Usage (fit the confidence calibration of the saved disease models):
+    python calibration.py [--model-dir models] [--method auto|isotonic|platt]
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+# Isotonic regression overfits small held-out sets; below this Platt scaling is used
+ISOTONIC_MIN_SAMPLES = 500
+# Knots of the Platt sigmoid's table (raw scores are probabilities in [0, 1])
+PLATT_KNOTS = 101
+RELIABILITY_BINS = 10
+DEFAULT_THRESHOLDS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+
+
+class CalibrationTable:
+    """Monotone map from raw scores to calibrated probabilities, as interpolation knots"""
+
+    def __init__(self, x, y, method, n_samples):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.method = method
+        self.n_samples = int(n_samples)
+
+    def apply(self, scores):
+        """Calibrated probabilities for an array of raw scores (clipped to the end knots)"""
+        return np.interp(scores, self.x, self.y)
+
+    def to_dict(self):
+        return {
+            'method': self.method,
+            'n_samples': self.n_samples,
+            'x': self.x.tolist(),
+            'y': self.y.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['x'], data['y'], data['method'], data['n_samples'])
+
+
+def fit_calibration(scores, labels, method='auto'):
+    """
+    CalibrationTable mapping scores to P(label == 1)
+
+    method is 'isotonic', 'platt' or 'auto' (isotonic from
+    ISOTONIC_MIN_SAMPLES rows). Labels of a single class give a constant
+    table at the Laplace-smoothed rate instead of a degenerate fit.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    labels = np.asarray(labels).astype(np.int64)
+    n = len(scores)
+    positives = int(labels.sum())
+    if positives in (0, n):
+        rate = (positives + 1) / (n + 2)
+        return CalibrationTable([0.0, 1.0], [rate, rate], 'constant', n)
+
+    if method == 'auto':
+        method = 'isotonic' if n >= ISOTONIC_MIN_SAMPLES else 'platt'
+    if method == 'isotonic':
+        from sklearn.isotonic import IsotonicRegression
+
+        isotonic = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds='clip').fit(scores, labels)
+        return CalibrationTable(isotonic.X_thresholds_, isotonic.y_thresholds_, 'isotonic', n)
+    if method == 'platt':
+        from sklearn.linear_model import LogisticRegression
+
+        sigmoid = LogisticRegression(C=1e6).fit(_logit(scores)[:, None], labels)
+        knots = np.linspace(0.0, 1.0, PLATT_KNOTS)
+        return CalibrationTable(knots, sigmoid.predict_proba(_logit(knots)[:, None])[:, 1], 'platt', n)
+    raise ValueError(f"Unknown calibration method: {method}")
+
+
+def _logit(scores, eps=1e-6):
+    scores = np.clip(scores, eps, 1 - eps)
+    return np.log(scores / (1 - scores))
+
+
+def reliability(probabilities, labels, n_bins=RELIABILITY_BINS):
+    """Per-bin mean probability vs observed rate, expected calibration error and Brier score"""
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    labels = np.asarray(labels).astype(np.float64)
+    bins = np.minimum((probabilities * n_bins).astype(np.int64), n_bins - 1)
+    counts = np.bincount(bins, minlength=n_bins)
+    score_sums = np.bincount(bins, weights=probabilities, minlength=n_bins)
+    label_sums = np.bincount(bins, weights=labels, minlength=n_bins)
+    filled = counts > 0
+    mean_scores = np.divide(score_sums, counts, out=np.zeros(n_bins), where=filled)
+    rates = np.divide(label_sums, counts, out=np.zeros(n_bins), where=filled)
+    n = max(len(probabilities), 1)
+    return {
+        'n_samples': int(len(probabilities)),
+        'expected_calibration_error': float(np.sum(counts / n * np.abs(mean_scores - rates))),
+        'brier_score': float(np.mean((probabilities - labels) ** 2)) if len(probabilities) else None,
+        'bins': [
+            {'lower': b / n_bins, 'upper': (b + 1) / n_bins, 'count': int(counts[b]),
+             'mean_probability': float(mean_scores[b]), 'observed_rate': float(rates[b])}
+            for b in np.flatnonzero(filled)
+        ]
+    }
+
+
+def threshold_table(probabilities, labels, thresholds=DEFAULT_THRESHOLDS):
+    """Precision, recall and flagged rate of `probability >= threshold` per threshold"""
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    labels = np.asarray(labels).astype(bool)
+    positives = int(labels.sum())
+    rows = []
+    for threshold in thresholds:
+        flagged = probabilities >= threshold
+        n_flagged = int(flagged.sum())
+        hits = int(np.count_nonzero(flagged & labels))
+        rows.append({
+            'threshold': float(threshold),
+            'flagged_rate': n_flagged / len(labels) if len(labels) else 0.0,
+            'precision': hits / n_flagged if n_flagged else None,
+            'recall': hits / positives if positives else None
+        })
+    return rows
+
+
+def calibration_report(scores, labels, method='auto', thresholds=DEFAULT_THRESHOLDS):
+    """
+    Fit a calibration table and describe it
+
+    Returns (CalibrationTable, report dict with the table, raw and calibrated
+    reliability and the calibrated threshold table)
+    """
+    table = fit_calibration(scores, labels, method=method)
+    calibrated = table.apply(scores)
+    return table, {
+        'method': table.method,
+        'table': table.to_dict(),
+        'raw': reliability(scores, labels),
+        'calibrated': reliability(calibrated, labels),
+        'thresholds': threshold_table(calibrated, labels, thresholds)
+    }
+
+
+def main(argv=None):
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from disease_predictor import DiseasePredictor
+
+    parser = argparse.ArgumentParser(description='Fit the confidence calibration of the saved models')
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--method', default='auto', choices=('auto', 'isotonic', 'platt'))
+    args = parser.parse_args(argv)
+
+    predictor = DiseasePredictor(model_dir=args.model_dir)
+    predictor.calibrate_confidence(method=args.method)
+    predictor.save_calibration()
+    for profile, report in predictor.calibration_report.items():
+        print(f"{profile:<8} {report['method']:<9} ECE {report['raw']['expected_calibration_error']:.4f} -> "
+              f"{report['calibrated']['expected_calibration_error']:.4f}  Brier "
+              f"{report['raw']['brier_score']:.4f} -> {report['calibrated']['brier_score']:.4f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Confidence-gated cascade over the ensemble members
+Features:
+- First tier: one cheap member answers rows whose top-1 minus top-2 probability margin clears a threshold
+- Ambiguous rows escalate to the full soft vote (reusing the first tier's probabilities)
+- Accuracy / escalation / latency report per (member, threshold) on the validation split and Testing.csv
+- Picks the setting with the lowest expected latency within tolerance of the full ensemble
+
+Usage (report and store the cascade settings for the saved models):
+    python cascade.py [--model-dir models] [--tolerance 0.01]
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from distillation import DEFAULT_TOLERANCE, single_row_latency_ms
+
+DEFAULT_THRESHOLDS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+# Used until a report has picked the member and threshold for a model version
+DEFAULT_MEMBER = 'extra_trees'
+DEFAULT_THRESHOLD = 0.5
+
+
+class Cascade:
+    """First-tier member and margin threshold of the "cascade" serving profile"""
+
+    def __init__(self, member, threshold):
+        self.member = member
+        self.threshold = float(threshold)
+
+    @classmethod
+    def from_report(cls, report):
+        selected = (report or {}).get('selected')
+        if not selected:
+            return cls(DEFAULT_MEMBER, DEFAULT_THRESHOLD)
+        return cls(selected['member'], selected['threshold'])
+
+    def confident(self, proba):
+        """Rows the first tier may answer on its own"""
+        return top_margin(proba) >= self.threshold
+
+    def describe(self):
+        return {'member': self.member, 'threshold': self.threshold}
+
+
+def top_margin(proba):
+    """Top-1 minus top-2 probability per row"""
+    if proba.shape[1] < 2:
+        return np.ones(len(proba))
+    top_two = np.partition(proba, -2, axis=1)[:, -2:]
+    return top_two[:, 1] - top_two[:, 0]
+
+
+def cascade_report(predictor, thresholds=DEFAULT_THRESHOLDS, tolerance=DEFAULT_TOLERANCE):
+    """
+    Accuracy / latency trade-off of every (first-tier member, threshold) pair
+
+    Member probabilities are computed once per split and every cascade is
+    scored from them. expected_latency_ms models one row as the first tier
+    plus, at the validation escalation rate, the remaining members;
+    latency_ms is measured on single validation rows.
+
+    Returns:
+        (Cascade or None, report dict)
+    """
+    _, X_val, X_test = predictor.selected_feature_splits()
+    classes = np.asarray(predictor._classes())
+    eval_sets = {'validation': (X_val, predictor.y_val), 'test': (X_test, predictor.y_test)}
+    member_models = dict(predictor._serving_members())
+
+    member_latency = {name: single_row_latency_ms(model.predict_proba, X_val)
+                      for name, model in member_models.items()}
+    full_latency = sum(member_latency.values())
+
+    split_probabilities = {split: predictor._member_probabilities(X) for split, (X, _) in eval_sets.items()}
+    split_combined = {split: predictor._ensemble_probabilities(probabilities)[0]
+                      for split, probabilities in split_probabilities.items()}
+
+    teacher = {'name': 'full_ensemble', 'expected_latency_ms': full_latency}
+    for split, (_, y) in eval_sets.items():
+        predicted = classes[np.argmax(split_combined[split], axis=1)]
+        teacher[f'{split}_accuracy'] = float(np.mean(predicted == np.asarray(y)))
+
+    candidates = []
+    for member in member_models:
+        for threshold in thresholds:
+            cascade = Cascade(member, threshold)
+            report = dict(cascade.describe(), name=f'{member}@{threshold:g}')
+            for split, (_, y) in eval_sets.items():
+                member_proba = split_probabilities[split][member]
+                escalated = ~cascade.confident(member_proba)
+                answer = np.where(escalated[:, None], split_combined[split], member_proba)
+                predicted = classes[np.argmax(answer, axis=1)]
+                report[f'{split}_accuracy'] = float(np.mean(predicted == np.asarray(y)))
+                report[f'{split}_escalation_rate'] = float(np.mean(escalated))
+            report['expected_latency_ms'] = (member_latency[member] + report['validation_escalation_rate']
+                                             * (full_latency - member_latency[member]))
+            report['latency_ms'] = single_row_latency_ms(
+                lambda X, c=cascade: predictor._cascade_probabilities(X, c)[1], X_val)
+            candidates.append(report)
+
+    eligible = [r for r in candidates if r['validation_accuracy'] >= teacher['validation_accuracy'] - tolerance]
+    selected = min(eligible, key=lambda r: r['expected_latency_ms']) if eligible else None
+    report = {
+        'tolerance': tolerance,
+        'teacher': teacher,
+        'member_latency_ms': member_latency,
+        'selected': selected,
+        'candidates': candidates
+    }
+    return (Cascade.from_report(report) if selected else None), report
+
+
+def print_report(report):
+    print(f"{'cascade':<32} {'val acc':>8} {'test acc':>8} {'val esc':>8} {'test esc':>8} "
+          f"{'exp ms':>8} {'ms/row':>8}")
+    teacher = report['teacher']
+    print(f"{teacher['name']:<32} {teacher['validation_accuracy']:>8.4f} {teacher['test_accuracy']:>8.4f} "
+          f"{1:>8.3f} {1:>8.3f} {teacher['expected_latency_ms']:>8.3f} {'':>8}")
+    selected = (report['selected'] or {}).get('name')
+    for row in report['candidates']:
+        marker = ' *' if row['name'] == selected else ''
+        print(f"{row['name']:<32} {row['validation_accuracy']:>8.4f} {row['test_accuracy']:>8.4f} "
+              f"{row['validation_escalation_rate']:>8.3f} {row['test_escalation_rate']:>8.3f} "
+              f"{row['expected_latency_ms']:>8.3f} {row['latency_ms']:>8.3f}{marker}")
+
+
+def main(argv=None):
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from disease_predictor import DiseasePredictor
+
+    parser = argparse.ArgumentParser(description='Pick the cascade tier and margin threshold')
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--thresholds', type=float, nargs='+', default=list(DEFAULT_THRESHOLDS))
+    args = parser.parse_args(argv)
+
+    predictor = DiseasePredictor(model_dir=args.model_dir)
+    predictor.tune_cascade(tolerance=args.tolerance, thresholds=args.thresholds)
+    predictor.save_cascade()
+    print_report(predictor.cascade_report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Shared pytest fixtures for the ml-service tests
+
+The real training run takes tens of minutes, so the ``predictor`` fixture
+writes a set of small models in the same on-disk layout and lets
+DiseasePredictor go through its normal loading path.
+"""
+
+import json
+import os
+import sys
+import warnings
+
+import joblib
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+# Importing app.py must not load (or train) the real models
+os.environ.setdefault('ML_PRELOAD_MODELS', 'false')
+
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, VotingClassifier, ExtraTreesClassifier
+from sklearn.feature_selection import SelectKBest, f_classif
+from sklearn.metrics import accuracy_score
+from sklearn.neural_network import MLPClassifier
+from sklearn.svm import SVC
+
+from dataset_cache import load_symptom_csv
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+TRAINING_CSV = os.path.join(REPO_ROOT, 'Training.csv')
+TESTING_CSV = os.path.join(REPO_ROOT, 'Testing.csv')
+
+
+def write_small_models(model_dir, cache_dir):
+    """Fit quick versions of the ensemble members and save them like save_models"""
+    train = load_symptom_csv(TRAINING_CSV, cache_dir=cache_dir)
+    test = load_symptom_csv(TESTING_CSV, cache_dir=cache_dir)
+    X = np.asarray(train.features)
+    y = np.asarray(train.label_series())
+    X_test = np.asarray(test.features)
+    y_test = np.asarray(test.label_series())
+
+    selector = SelectKBest(score_func=f_classif, k=100)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        X = selector.fit_transform(X, y)
+    X_test = selector.transform(X_test)
+
+    models = {
+        'random_forest': RandomForestClassifier(n_estimators=10, max_depth=15, random_state=42),
+        'svm': SVC(probability=True, random_state=42),
+        'gradient_boosting': GradientBoostingClassifier(n_estimators=3, max_depth=3, random_state=42),
+        'extra_trees': ExtraTreesClassifier(n_estimators=10, max_depth=15, random_state=42),
+        'neural_network': MLPClassifier(hidden_layer_sizes=(32,), max_iter=50, random_state=42)
+    }
+    with warnings.catch_warnings():
+        # The deliberately tiny MLP does not converge in 50 iterations
+        warnings.simplefilter('ignore', ConvergenceWarning)
+        for model in models.values():
+            model.fit(X, y)
+    voting = VotingClassifier(
+        estimators=[
+            ('rf', models['random_forest']),
+            ('svm', models['svm']),
+            ('gb', models['gradient_boosting']),
+            ('et', models['extra_trees']),
+            ('nn', models['neural_network'])
+        ],
+        voting='soft'
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', ConvergenceWarning)
+        voting.fit(X, y)
+    models['voting_ensemble'] = voting
+
+    os.makedirs(model_dir, exist_ok=True)
+    performance = {}
+    for name, model in models.items():
+        joblib.dump(model, os.path.join(model_dir, f'{name}.pkl'))
+        accuracy = float(accuracy_score(y_test, model.predict(X_test)))
+        performance[name] = {
+            'validation_accuracy': accuracy,
+            'test_accuracy': accuracy,
+            'cv_mean_accuracy': accuracy,
+            'cv_std_accuracy': 0.0
+        }
+    joblib.dump(selector, os.path.join(model_dir, 'feature_selector.pkl'))
+    joblib.dump(train.columns, os.path.join(model_dir, 'symptom_columns.pkl'))
+    with open(os.path.join(model_dir, 'metadata.json'), 'w') as f:
+        json.dump({
+            'version': 'test',
+            'selected_features': 100,
+            'diseases': train.classes,
+            'performance': performance,
+            'models': list(models.keys())
+        }, f)
+
+
+@pytest.fixture(scope='session')
+def model_dir(tmp_path_factory):
+    root = tmp_path_factory.mktemp('ml-models')
+    write_small_models(str(root / 'models'), str(root / 'cache'))
+    return str(root / 'models')
+
+
+@pytest.fixture(scope='session')
+def predictor(model_dir):
+    from disease_predictor import DiseasePredictor
+    predictor = DiseasePredictor(
+        training_csv_path=TRAINING_CSV,
+        testing_csv_path=TESTING_CSV,
+        dataset_cache_dir=os.path.join(os.path.dirname(model_dir), 'cache'),
+        model_dir=model_dir
+    )
+    # Tests draw realistic inputs from the validation split and training patterns
+    predictor.ensure_splits()
+    return predictor
+
+
+@pytest.fixture
+def client(predictor):
+    import app as disease_app
+    disease_app.predictor = predictor
+    return disease_app.app.test_client()
@@ -0,0 +1,186 @@
+"""
+Binary dataset cache for the symptom CSVs
+Features:
+- Explicit dtype parsing (uint8 symptoms, categorical prognosis)
+- .npy cache files keyed by the CSV content hash
+- Memory-mapped loads once the cache exists
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+CACHE_FORMAT_VERSION = 1
+LABEL_COLUMN = 'prognosis'
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.dataset_cache')
+
+
+class SymptomDataset:
+    """Binary symptom matrix with categorical-coded labels"""
+
+    def __init__(self, features, labels, columns, classes, source, from_cache=False):
+        self.features = features      # (n_rows, n_symptoms) uint8, possibly memory-mapped
+        self.labels = labels          # (n_rows,) int16 codes into classes
+        self.columns = list(columns)
+        self.classes = list(classes)
+        self.source = source
+        self.from_cache = from_cache
+
+    def __len__(self):
+        return len(self.labels)
+
+    def label_series(self):
+        """Labels as a pandas categorical Series (codes are shared, not copied)"""
+        return pd.Series(pd.Categorical.from_codes(self.labels, categories=self.classes))
+
+
+def default_cache_dir():
+    """Cache directory, overridable with ML_DATASET_CACHE_DIR"""
+    return os.environ.get('ML_DATASET_CACHE_DIR', DEFAULT_CACHE_DIR)
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_symptom_csv(csv_path, cache_dir=None, use_cache=True):
+    """
+    Load a symptom CSV, going through the binary cache when possible
+
+    The first load parses the CSV with an explicit dtype map and writes
+    ``<name>-<hash>.features.npy`` / ``.labels.npy`` / ``.json`` into the
+    cache directory. Later loads of the same content memory-map the
+    feature matrix instead of parsing.
+    """
+    if not use_cache:
+        return _parse_symptom_csv(csv_path)
+
+    cache_dir = cache_dir or default_cache_dir()
+    digest = _cached_digest(csv_path, cache_dir)
+    paths = _cache_paths(csv_path, digest, cache_dir)
+
+    dataset = _read_cache(paths, csv_path)
+    if dataset is not None:
+        return dataset
+
+    dataset = _parse_symptom_csv(csv_path)
+    try:
+        _write_cache(dataset, paths, digest)
+    except OSError as e:
+        # A read-only deployment can still serve from the parsed CSV
+        print(f"Warning: could not write dataset cache: {e}")
+    return dataset
+
+
+def _parse_symptom_csv(csv_path):
+    """Parse the CSV with uint8 symptom columns and a categorical label"""
+    header = pd.read_csv(csv_path, nrows=0).columns
+    # Trailing commas produce empty 'Unnamed: N' columns; they carry no data
+    columns = [c for c in header if c != LABEL_COLUMN and not c.startswith('Unnamed:')]
+    dtypes = {column: np.uint8 for column in columns}
+    dtypes[LABEL_COLUMN] = 'category'
+    usecols = columns + [LABEL_COLUMN]
+
+    try:
+        frame = pd.read_csv(csv_path, usecols=usecols, dtype=dtypes)
+    except ValueError:
+        # Missing symptom values cannot parse as uint8; treat them as absent
+        dtypes.update({column: np.float32 for column in columns})
+        frame = pd.read_csv(csv_path, usecols=usecols, dtype=dtypes)
+        frame[columns] = frame[columns].fillna(0)
+
+    features = np.empty((len(frame), len(columns)), dtype=np.uint8)
+    for idx, column in enumerate(columns):
+        features[:, idx] = frame[column].to_numpy()
+
+    prognosis = frame[LABEL_COLUMN]
+    labels = prognosis.cat.codes.to_numpy().astype(np.int16)
+    return SymptomDataset(features, labels, columns, prognosis.cat.categories, csv_path)
+
+
+def _cached_digest(csv_path, cache_dir):
+    """Content hash of csv_path, reused while its size and mtime are unchanged"""
+    stat = os.stat(csv_path)
+    key = os.path.abspath(csv_path)
+    index_path = os.path.join(cache_dir, 'digests.json')
+
+    index = {}
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+
+    entry = index.get(key)
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return entry['digest']
+
+    digest = file_digest(csv_path)
+    index[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': digest}
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        _atomic_write_json(index_path, index)
+    except OSError:
+        pass
+    return digest
+
+
+def _cache_paths(csv_path, digest, cache_dir):
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    prefix = os.path.join(cache_dir, f"{stem}-{digest[:16]}")
+    return {
+        'features': prefix + '.features.npy',
+        'labels': prefix + '.labels.npy',
+        'meta': prefix + '.json'
+    }
+
+
+def _read_cache(paths, csv_path):
+    """Memory-map a complete cache entry, or return None"""
+    # The metadata file is written last, so its presence marks a complete entry
+    if not os.path.exists(paths['meta']):
+        return None
+    try:
+        with open(paths['meta'], 'r') as f:
+            meta = json.load(f)
+        if meta.get('format_version') != CACHE_FORMAT_VERSION:
+            return None
+        features = np.load(paths['features'], mmap_mode='r')
+        labels = np.load(paths['labels'])
+    except (OSError, ValueError) as e:
+        print(f"Warning: ignoring unreadable dataset cache: {e}")
+        return None
+    return SymptomDataset(features, labels, meta['columns'], meta['classes'], csv_path, from_cache=True)
+
+
+def _write_cache(dataset, paths, digest):
+    os.makedirs(os.path.dirname(paths['features']), exist_ok=True)
+    for key, array in (('features', dataset.features), ('labels', dataset.labels)):
+        tmp_path = f"{paths[key]}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, paths[key])
+    _atomic_write_json(paths['meta'], {
+        'format_version': CACHE_FORMAT_VERSION,
+        'digest': digest,
+        'source': os.path.abspath(dataset.source),
+        'rows': len(dataset),
+        'columns': dataset.columns,
+        'classes': dataset.classes
+    })
+
+
+def _atomic_write_json(path, payload):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
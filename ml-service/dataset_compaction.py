@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Training-set compaction
+Features:
+- Collapses identical (symptom features, label) rows into one row weighted by its count
+- Group id per symptom pattern so CV folds never split duplicates between train and test
+- Tree size limits translated from row counts to sample weights
+- Before/after report of training wall time and accuracy
+
+Usage (trains the full pipeline twice in scratch model directories):
+    python dataset_compaction.py [--output compaction.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+
+class CompactTrainingSet:
+    """Unique training rows with their duplicate counts as sample weights"""
+
+    def __init__(self, X, y, sample_weight, groups, n_rows):
+        self.X = X
+        self.y = y
+        self.sample_weight = sample_weight  # rows each unique row stands for
+        self.groups = groups                # symptom pattern id (rows differing only in label share one)
+        self.n_rows = n_rows
+
+    @classmethod
+    def from_rows(cls, X, y):
+        X = np.asarray(X)
+        _, pattern_ids = np.unique(X, axis=0, return_inverse=True)
+        pattern_ids = pattern_ids.ravel()
+        label_codes = np.unique(np.asarray(y).astype(str), return_inverse=True)[1].ravel()
+        # One row per (pattern, label); first occurrence order keeps fits deterministic
+        _, first, counts = np.unique(np.column_stack([pattern_ids, label_codes]), axis=0,
+                                     return_index=True, return_counts=True)
+        order = np.argsort(first)
+        first, counts = first[order], counts[order]
+        y_unique = y.iloc[first].reset_index(drop=True) if hasattr(y, 'iloc') else np.asarray(y)[first]
+        return cls(X[first], y_unique, counts.astype(np.float64), pattern_ids[first], len(X))
+
+    def fit_params(self):
+        return {'sample_weight': self.sample_weight}
+
+    def expanded(self):
+        """
+        (X, y, groups) with each unique row repeated by its count
+
+        For estimators whose fit takes no sample_weight on the pinned sklearn
+        (MLPClassifier before 1.7, and so a VotingClassifier containing one).
+        """
+        rows = np.repeat(np.arange(len(self.X)), self.sample_weight.astype(np.int64))
+        y = self.y.iloc[rows].reset_index(drop=True) if hasattr(self.y, 'iloc') else np.asarray(self.y)[rows]
+        return self.X[rows], y, self.groups[rows]
+
+    def describe(self):
+        return {
+            'rows': self.n_rows,
+            'unique_rows': len(self.X),
+            'symptom_patterns': int(len(np.unique(self.groups))),
+            'compaction_ratio': self.n_rows / len(self.X) if len(self.X) else None
+        }
+
+
+def weighted_tree_params(params, n_rows):
+    """
+    Tree size limits for unique weighted rows that match params on the full rows
+
+    min_samples_leaf becomes the equivalent min_weight_fraction_leaf (leaf
+    weight is the original row count). min_samples_split has no weighted
+    form; it drops to 2, since a node holding two unique rows already stands
+    for at least that many original rows. Works on estimator kwargs and on
+    GridSearchCV grids (lists of values).
+    """
+    params = dict(params)
+    leaf = params.pop('min_samples_leaf', None)
+    if leaf is not None:
+        params['min_samples_leaf'] = [1] if isinstance(leaf, list) else 1
+        params['min_weight_fraction_leaf'] = ([value / n_rows for value in leaf] if isinstance(leaf, list)
+                                              else leaf / n_rows)
+    if 'min_samples_split' in params:
+        params['min_samples_split'] = [2] if isinstance(params['min_samples_split'], list) else 2
+    return params
+
+
+def cv_fit_kwargs(fit_params):
+    """cross_val_score keyword for per-fit params ('params' from sklearn 1.4, 'fit_params' before)"""
+    import inspect
+
+    from sklearn.model_selection import cross_val_score
+
+    key = 'params' if 'params' in inspect.signature(cross_val_score).parameters else 'fit_params'
+    return {key: fit_params}
+
+
+def group_folds(n_splits, seed=42):
+    """Class-stratified folds that keep each symptom pattern on one side"""
+    from sklearn.model_selection import StratifiedGroupKFold
+
+    return StratifiedGroupKFold(n_splits=n_splits, shuffle=True, random_state=seed)
+
+
+def compaction_report(training_csv_path=None, testing_csv_path=None, dataset_cache_dir=None):
+    """Train the full pipeline without and with compaction; wall time and accuracy of each"""
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from disease_predictor import DiseasePredictor
+
+    report = {}
+    for label, compact in (('before', False), ('after', True)):
+        with tempfile.TemporaryDirectory() as model_dir:
+            predictor = DiseasePredictor(training_csv_path=training_csv_path, testing_csv_path=testing_csv_path,
+                                         dataset_cache_dir=dataset_cache_dir, model_dir=model_dir,
+                                         compact_training=compact)
+        report[label] = {
+            'training': predictor.training_report,
+            'accuracy': {
+                name: {'validation': perf['validation_accuracy'], 'test': perf['test_accuracy'],
+                       'cv_mean': perf['cv_mean_accuracy']}
+                for name, perf in predictor.model_performance.items()
+            }
+        }
+    report['speedup'] = (report['before']['training']['total_seconds']
+                         / report['after']['training']['total_seconds'])
+    return report
+
+
+def print_report(report):
+    print(f"{'model':<20} {'fit s':>9} {'-> fit s':>9} {'val acc':>8} {'-> val':>8} {'test acc':>8} {'-> test':>8}")
+    before, after = report['before'], report['after']
+    for name in before['accuracy']:
+        b, a = before['accuracy'][name], after['accuracy'][name]
+        print(f"{name:<20} {before['training']['fit_seconds'].get(name, 0):>9.2f} "
+              f"{after['training']['fit_seconds'].get(name, 0):>9.2f} {b['validation']:>8.4f} "
+              f"{a['validation']:>8.4f} {b['test']:>8.4f} {a['test']:>8.4f}")
+    print(f"train_models: {before['training']['total_seconds']:.1f}s -> {after['training']['total_seconds']:.1f}s "
+          f"({report['speedup']:.1f}x) on {after['training']['rows']['unique_rows']} of "
+          f"{after['training']['rows']['rows']} rows")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Training wall time and accuracy with and without compaction')
+    parser.add_argument('--training-csv')
+    parser.add_argument('--testing-csv')
+    parser.add_argument('--dataset-cache-dir')
+    parser.add_argument('--output', help='Write the report as JSON')
+    args = parser.parse_args(argv)
+
+    report = compaction_report(args.training_csv, args.testing_csv, args.dataset_cache_dir)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,19 +1,88 @@
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, VotingClassifier, ExtraTreesClassifier
-from sklearn.svm import SVC
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split, cross_val_score, GridSearchCV
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
-from sklearn.feature_selection import SelectKBest, f_classif, RFE
-from sklearn.neural_network import MLPClassifier
 import joblib
+import hashlib
 import os
 import json
+import time
 from datetime import datetime
+from dataset_cache import load_symptom_csv
+import metrics
+
+# VotingClassifier member keys -> model names used everywhere else
+VOTING_MEMBER_NAMES = {
+    'rf': 'random_forest',
+    'svm': 'svm',
+    'gb': 'gradient_boosting',
+    'et': 'extra_trees',
+    'nn': 'neural_network'
+}
+
+# Tree-ensemble members served through forest_inference's compiled arrays
+COMPILED_TREE_MEMBERS = ('random_forest', 'extra_trees', 'gradient_boosting')
+# Profiles the exact-match table can answer (it stores full-ensemble outputs)
+PATTERN_TABLE_PROFILES = ('full', 'cascade')
+# Models fitted on the compacted rows expanded back by their counts: on the
+# pinned sklearn (1.3) MLPClassifier.fit takes no sample_weight, nor does a
+# VotingClassifier that contains it
+UNWEIGHTED_MODELS = ('neural_network', 'voting_ensemble')
+# Profiles whose top-1 confidence gets its own calibration table
+CALIBRATED_PROFILES = ('full', 'fast', 'cascade')
+# Pattern-grouped folds whose held-out scores the calibration tables are fitted on
+CALIBRATION_FOLDS = 5
+# Files a model directory needs before it can be loaded without training
+ENHANCED_MODEL_FILES = ('random_forest.pkl', 'svm.pkl', 'gradient_boosting.pkl', 'extra_trees.pkl',
+                        'neural_network.pkl', 'voting_ensemble.pkl', 'feature_selector.pkl', 'metadata.json')
+
+class SymptomValueError(ValueError):
+    """A symptom value that is not a number or boolean (reported as a 400)"""
+
+def symptom_flag(symptom, value):
+    """1 if a numeric / boolean symptom value is set, 0 if not; anything else is rejected"""
+    if isinstance(value, (bool, int, float, np.number)) and np.isfinite(value):
+        return int(value != 0)
+    raise SymptomValueError(f"Invalid value for symptom '{symptom}': {value!r} (expected 0 or 1)")
+
+def fitted_soft_vote(estimators):
+    """
+    VotingClassifier(voting='soft') over already-fitted (name, model) pairs
+    
+    Sets the fitted attributes VotingClassifier.fit would, without cloning
+    and refitting the members; they must share one set of classes.
+    """
+    from sklearn.ensemble import VotingClassifier
+    from sklearn.preprocessing import LabelEncoder
+    from sklearn.utils import Bunch
+    
+    classes = estimators[0][1].classes_
+    for name, model in estimators:
+        if not np.array_equal(model.classes_, classes):
+            raise ValueError(f"Member {name} was fitted on different classes")
+    voting = VotingClassifier(estimators=list(estimators), voting='soft')
+    voting.estimators_ = [model for _, model in estimators]
+    voting.named_estimators_ = Bunch(**dict(estimators))
+    voting.le_ = LabelEncoder().fit(classes)
+    voting.classes_ = voting.le_.classes_
+    return voting
+
+def has_enhanced_models(model_dir):
+    """True if model_dir holds the full enhanced model set (so loading it never trains)"""
+    return all(os.path.isfile(os.path.join(model_dir, name)) for name in ENHANCED_MODEL_FILES)
+
+def top_k_indices(probabilities, k):
+    """Column indices of the k largest values per row, largest first"""
+    if k < 1:
+        # argpartition(..., -0) would select the whole row
+        raise ValueError(f"k must be at least 1, got {k}")
+    k = min(k, probabilities.shape[1])
+    candidates = np.argpartition(probabilities, -k, axis=1)[:, -k:]
+    order = np.argsort(-np.take_along_axis(probabilities, candidates, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
 
 class DiseasePredictor:
-    def __init__(self, training_csv_path=None, testing_csv_path=None):
+    def __init__(self, training_csv_path=None, testing_csv_path=None, dataset_cache_dir=None, model_dir='models',
+                 profile='full', tree_backend='compiled', svm_backend='sklearn', model_memory='private',
+                 exact_match=True, compact_training=True, verbose=True, allow_training=True):
         # Try multiple paths for Training.csv and Testing.csv
         if training_csv_path is None:
             possible_training_paths = [
@@ -43,30 +112,67 @@ class DiseasePredictor:
         
         self.training_csv_path = training_csv_path
         self.testing_csv_path = testing_csv_path
+        self.dataset_cache_dir = dataset_cache_dir
+        self.model_dir = model_dir
+        self.profile = profile  # 'full' ensemble, distilled 'fast' model or confidence-gated 'cascade'
+        self.tree_backend = tree_backend  # 'compiled' flat-array forests or 'sklearn'
+        self.svm_backend = svm_backend  # 'compiled' batched-kernel SVC or 'sklearn'
+        self.model_memory = model_memory  # 'private' pickles or the 'shared' memory-mapped bundle
+        self.exact_match = exact_match  # answer known symptom patterns from the precomputed table
+        self.compact_training = compact_training  # fit on unique weighted rows with pattern-grouped CV
+        self.verbose = verbose  # progress lines while loading (warnings and errors are always printed)
+        self.allow_training = allow_training  # train when model_dir has no loadable models (else raise)
         self.models = {}
-        self.scaler = StandardScaler()
         self.symptom_columns = []
         self.model_performance = {}
         self.training_data = None
         self.testing_data = None
+        # Train / validation / test splits, built by ensure_splits for training,
+        # tuning, calibration and the pattern table (serving never needs them)
+        self.X_train = self.X_val = self.X_test = None
+        self.y_train = self.y_val = self.y_test = None
+        self.training_patterns = None
+        self.training_samples = 0
+        self.testing_samples = 0
+        self.diseases = []
+        self.metadata = {}
+        self.fast_model = None
+        self.fast_profile_report = None
+        self.cascade = None
+        self.cascade_report = None
+        self.calibration = {}
+        self.calibration_report = None
+        self.compiled_members = {}
+        self.pattern_table = None
+        self.training_set = None
+        self.training_report = None
+        self.explanation_cache = None
+        self._catalogs = {}
+        self._symptom_index = None
         
-        # Load datasets and train models
-        self.load_datasets()
-        self.preprocess_data()
+        # Saved models carry their feature columns and classes, so serving
+        # reads no dataset; training and the splits load them (ensure_datasets)
+        if not self.load_saved_schema():
+            self.ensure_datasets()
         self.load_or_train()
     
+    def _log(self, message):
+        if self.verbose:
+            print(message)
+    
     def load_datasets(self):
         """Load Training.csv for training and Testing.csv for validation"""
-        print("Loading datasets...")
-        self.training_data = pd.read_csv(self.training_csv_path)
-        self.testing_data = pd.read_csv(self.testing_csv_path)
+        self._log("Loading datasets...")
+        self.training_data = load_symptom_csv(self.training_csv_path, cache_dir=self.dataset_cache_dir)
+        self.testing_data = load_symptom_csv(self.testing_csv_path, cache_dir=self.dataset_cache_dir)
         
-        print(f"Loaded {len(self.training_data)} training samples from {self.training_csv_path}")
-        print(f"Loaded {len(self.testing_data)} testing samples from {self.testing_csv_path}")
+        source = 'cache' if self.training_data.from_cache else 'CSV'
+        self._log(f"Loaded {len(self.training_data)} training samples from {self.training_csv_path} ({source})")
+        self._log(f"Loaded {len(self.testing_data)} testing samples from {self.testing_csv_path}")
         
         # Validate data consistency
-        training_features = set(self.training_data.columns[:-1])  # Exclude 'prognosis'
-        testing_features = set(self.testing_data.columns[:-1])    # Exclude 'prognosis'
+        training_features = set(self.training_data.columns)
+        testing_features = set(self.testing_data.columns)
         
         if training_features != testing_features:
             missing_in_test = training_features - testing_features
@@ -76,64 +182,129 @@ class DiseasePredictor:
             if missing_in_train:
                 print(f"Warning: Features missing in training data: {missing_in_train}")
         
-        print(f"Number of features: {len(training_features)}")
-        print(f"Number of diseases in training: {len(self.training_data['prognosis'].unique())}")
-        print(f"Number of diseases in testing: {len(self.testing_data['prognosis'].unique())}")
+        self._log(f"Number of features: {len(training_features)}")
+        self._log(f"Number of diseases in training: {len(self.training_data.classes)}")
+        self._log(f"Number of diseases in testing: {len(self.testing_data.classes)}")
     
     def preprocess_data(self):
         """Preprocess and validate data quality"""
-        print("Preprocessing data...")
-        
-        # Separate features and labels for training data
-        self.X_train_full = self.training_data.drop('prognosis', axis=1)
-        self.y_train_full = self.training_data['prognosis']
+        self._log("Preprocessing data...")
         
-        # Separate features and labels for testing data
-        self.X_test = self.testing_data.drop('prognosis', axis=1)
-        self.y_test = self.testing_data['prognosis']
+        # Keep the training column order so feature positions are stable
+        # across processes (the saved models depend on it)
+        testing_positions = {column: idx for idx, column in enumerate(self.testing_data.columns)}
+        feature_columns = [column for column in self.training_data.columns if column in testing_positions]
+        if len(feature_columns) != len(self.training_data.columns):
+            print(f"Warning: Using {len(feature_columns)} common features out of {len(self.training_data.columns)} training features")
+        self.symptom_columns = feature_columns
+        self._symptom_positions = {symptom: idx for idx, symptom in enumerate(feature_columns)}
         
-        # Handle missing values by filling with 0 (assuming symptoms are binary)
-        print("Handling missing values...")
-        self.X_train_full = self.X_train_full.fillna(0)
-        self.X_test = self.X_test.fillna(0)
+        self.training_samples = len(self.training_data)
+        self.testing_samples = len(self.testing_data)
+        self.diseases = list(self.training_data.classes)
+    
+    def load_saved_schema(self):
+        """
+        Feature columns, classes and sample counts from the saved models
         
-        # Ensure all values are numeric and convert to int (for binary symptoms)
-        self.X_train_full = self.X_train_full.astype(int)
-        self.X_test = self.X_test.astype(int)
+        True when model_dir holds the full enhanced model set with its
+        symptom_columns.pkl and class list; False leaves them to the datasets.
+        """
+        columns_file = os.path.join(self.model_dir, 'symptom_columns.pkl')
+        if not has_enhanced_models(self.model_dir) or not os.path.exists(columns_file):
+            return False
+        try:
+            with open(os.path.join(self.model_dir, 'metadata.json'), 'r') as f:
+                metadata = json.load(f)
+            diseases = metadata['diseases']
+            columns = list(joblib.load(columns_file))
+        except Exception as e:
+            print(f"Error reading saved feature columns and classes: {e}")
+            return False
+        self.symptom_columns = columns
+        self._symptom_positions = {symptom: idx for idx, symptom in enumerate(columns)}
+        self.diseases = list(diseases)
+        self.training_samples = metadata.get('training_samples', 0)
+        self.testing_samples = metadata.get('testing_samples', 0)
+        return True
+    
+    def ensure_datasets(self):
+        """Read and validate the datasets unless this process already has them (or their splits)"""
+        if self.training_data is not None or self.X_train is not None:
+            return
+        saved_columns = list(self.symptom_columns)
+        self.load_datasets()
+        self.preprocess_data()
+        if saved_columns:
+            # Keep the column order the loaded models were trained with
+            self._align_symptom_columns(saved_columns)
+    
+    def split_datasets(self):
+        """
+        Train / validation / test matrices and the distinct training patterns
         
-        # Store symptom columns
-        self.symptom_columns = list(self.X_train_full.columns)
+        Called through ensure_splits by the methods that need them (training,
+        tuning, calibration and the pattern table); serving does not.
+        """
+        from sklearn.model_selection import train_test_split
         
-        # Ensure both datasets have the same features
-        common_features = list(set(self.X_train_full.columns) & set(self.X_test.columns))
-        if len(common_features) != len(self.X_train_full.columns):
-            print(f"Warning: Using {len(common_features)} common features out of {len(self.X_train_full.columns)} training features")
-            self.X_train_full = self.X_train_full[common_features]
-            self.X_test = self.X_test[common_features]
-            self.symptom_columns = common_features
+        # The loader already stores symptoms as uint8 (missing values -> 0)
+        # and labels as categorical codes; columns follow the saved models' order
+        X_train_full = self._select_columns(self.training_data, self.symptom_columns)
+        y_train_full = self.training_data.label_series()
+        # Distinct symptom patterns (a few hundred) for the exact-match tier
+        self.training_patterns = np.unique(X_train_full, axis=0)
+        self.X_test = np.ascontiguousarray(self._select_columns(self.testing_data, self.symptom_columns))
+        self.y_test = self.testing_data.label_series()
         
         # Create validation split from training data (80% train, 20% validation)
         self.X_train, self.X_val, self.y_train, self.y_val = train_test_split(
-            self.X_train_full, self.y_train_full, 
+            X_train_full, y_train_full, 
             test_size=0.2, 
             random_state=42, 
-            stratify=self.y_train_full
+            stratify=y_train_full
         )
         
-        print(f"Training set: {len(self.X_train)} samples")
-        print(f"Validation set: {len(self.X_val)} samples")
-        print(f"Test set: {len(self.X_test)} samples")
-        print(f"Features: {len(self.symptom_columns)}")
+        # The splits hold everything training needs; release the raw datasets
+        self.training_data = None
+        self.testing_data = None
+        del X_train_full, y_train_full
         
-        # Check for any remaining NaN values
-        if self.X_train.isnull().any().any():
-            print("Warning: NaN values still present in training data")
-        if self.X_test.isnull().any().any():
-            print("Warning: NaN values still present in test data")
+        self._log(f"Training set: {len(self.X_train)} samples")
+        self._log(f"Validation set: {len(self.X_val)} samples")
+        self._log(f"Test set: {len(self.X_test)} samples")
+        self._log(f"Features: {len(self.symptom_columns)}")
+    
+    def ensure_splits(self):
+        """Build the splits unless this process already has them"""
+        if self.X_train is None:
+            self.ensure_datasets()
+            self.split_datasets()
+    
+    @staticmethod
+    def _select_columns(dataset, columns):
+        """Feature matrix of dataset restricted to columns, without copying when possible"""
+        if dataset.columns == columns:
+            return dataset.features
+        positions = {column: idx for idx, column in enumerate(dataset.columns)}
+        return dataset.features[:, [positions[column] for column in columns]]
+    
+    def _align_symptom_columns(self, saved_columns):
+        """Reorder feature matrices to the column order the models were trained with"""
+        if list(saved_columns) == self.symptom_columns or set(saved_columns) != set(self.symptom_columns):
+            return
+        if self.X_train is not None:
+            order = [self._symptom_positions[symptom] for symptom in saved_columns]
+            self.X_train = self.X_train[:, order]
+            self.X_val = self.X_val[:, order]
+            self.X_test = self.X_test[:, order]
+            self.training_patterns = self.training_patterns[:, order]
+        self.symptom_columns = list(saved_columns)
+        self._symptom_positions = {symptom: idx for idx, symptom in enumerate(self.symptom_columns)}
     
     def load_or_train(self):
         """Load existing enhanced models or train new ones"""
-        model_dir = 'models'
+        model_dir = self.model_dir
         
         # Check for enhanced model files first
         enhanced_model_files = {
@@ -145,6 +316,7 @@ class DiseasePredictor:
             'voting_ensemble': os.path.join(model_dir, 'voting_ensemble.pkl'),
             'feature_selector': os.path.join(model_dir, 'feature_selector.pkl')
         }
+        symptom_columns_file = os.path.join(model_dir, 'symptom_columns.pkl')
         
         basic_model_files = {
             'random_forest': os.path.join(model_dir, 'random_forest.pkl'),
@@ -161,54 +333,92 @@ class DiseasePredictor:
         
         if enhanced_models_exist and metadata_exists:
             try:
-                print("Loading existing enhanced models...")
-                self.models['random_forest'] = joblib.load(enhanced_model_files['random_forest'])
-                self.models['svm'] = joblib.load(enhanced_model_files['svm'])
-                self.models['gradient_boosting'] = joblib.load(enhanced_model_files['gradient_boosting'])
-                self.models['extra_trees'] = joblib.load(enhanced_model_files['extra_trees'])
-                self.models['neural_network'] = joblib.load(enhanced_model_files['neural_network'])
-                self.models['voting_ensemble'] = joblib.load(enhanced_model_files['voting_ensemble'])
-                self.feature_selector = joblib.load(enhanced_model_files['feature_selector'])
-                
+                self._log("Loading existing enhanced models...")
                 with open(metadata_file, 'r') as f:
                     metadata = json.load(f)
                     self.model_performance = metadata.get('performance', {})
+                self.metadata = metadata
                 
-                print("Enhanced models loaded successfully")
-                print(f"Model version: {metadata.get('version', 'unknown')}")
-                print(f"Available models: {list(self.models.keys())}")
-                print(f"Enhanced accuracy with {metadata.get('selected_features', 'N/A')} selected features")
+                if self.model_memory == 'shared':
+                    self.attach_model_bundle()
+                else:
+                    # The soft vote carries its own fitted members and those are the
+                    # ones served, so the per-member pickles (a second copy of every
+                    # model) are not loaded
+                    voting = joblib.load(enhanced_model_files['voting_ensemble'])
+                    self.models = {VOTING_MEMBER_NAMES.get(key, key): model
+                                   for key, model in voting.named_estimators_.items()}
+                    self.models['voting_ensemble'] = voting
+                    self.feature_selector = joblib.load(enhanced_model_files['feature_selector'])
+                    if os.path.exists(symptom_columns_file):
+                        self._align_symptom_columns(joblib.load(symptom_columns_file))
+                    self.compile_members()
+                self.load_fast_profile()
+                self.load_cascade()
+                self.load_calibration()
+                self.load_pattern_table()
+                
+                self._log("Enhanced models loaded successfully")
+                self._log(f"Model version: {metadata.get('version', 'unknown')}")
+                self._log(f"Available models: {list(self.models.keys())}")
+                self._log(f"Enhanced accuracy with {metadata.get('selected_features', 'N/A')} selected features")
                 return
             except Exception as e:
                 print(f"Error loading enhanced models: {e}")
                 print("Training new enhanced models...")
         elif basic_models_exist and metadata_exists:
             try:
-                print("Loading existing basic models...")
+                self._log("Loading existing basic models...")
                 self.models['random_forest'] = joblib.load(basic_model_files['random_forest'])
                 self.models['svm'] = joblib.load(basic_model_files['svm'])
                 self.models['gradient_boosting'] = joblib.load(basic_model_files['gradient_boosting'])
+                if os.path.exists(symptom_columns_file):
+                    self._align_symptom_columns(joblib.load(symptom_columns_file))
                 
                 with open(metadata_file, 'r') as f:
                     metadata = json.load(f)
                     self.model_performance = metadata.get('performance', {})
+                self.metadata = metadata
+                self.compile_members()
+                self.load_cascade()
+                self.load_calibration()
+                self.load_pattern_table()
                 
-                print("Basic models loaded successfully")
-                print(f"Model version: {metadata.get('version', 'unknown')}")
+                self._log("Basic models loaded successfully")
+                self._log(f"Model version: {metadata.get('version', 'unknown')}")
                 print("Note: Enhanced models not available, using basic models")
                 return
             except Exception as e:
                 print(f"Error loading basic models: {e}")
                 print("Training new enhanced models...")
         
+        if not self.allow_training:
+            raise FileNotFoundError(f"No loadable enhanced models in {model_dir}")
+        
         # Train new enhanced models
+        self.ensure_datasets()
         self.train_models()
         self.evaluate_models()
+        self.distill_fast_profile()
         self.save_models()
+        # Tuned on the served (compiled) members so its latencies are realistic
+        self.tune_cascade()
+        self.save_cascade()
+        self.calibrate_confidence()
+        self.save_calibration()
+        self.refresh_pattern_table()
     
     def train_models(self):
         """Train multiple ML models with hyperparameter tuning for ensemble approach"""
+        # Training-only estimators and search utilities load here, not at import
+        from sklearn.ensemble import ExtraTreesClassifier, GradientBoostingClassifier, RandomForestClassifier
+        from sklearn.feature_selection import SelectKBest, f_classif
+        from sklearn.model_selection import GridSearchCV
+        from sklearn.neural_network import MLPClassifier
+        from sklearn.svm import SVC
+        
         print("Training enhanced ML models with hyperparameter optimization...")
+        self.ensure_splits()
         
         # Feature selection for better performance
         print("Performing feature selection...")
@@ -227,6 +437,27 @@ class DiseasePredictor:
         
         print(f"Selected {X_train_selected.shape[1]} most important features")
         
+        # Training.csv repeats each symptom pattern many times: fit on the
+        # unique rows weighted by their counts, with CV folds grouped by
+        # pattern so duplicates cannot sit on both sides of a split
+        if self.compact_training:
+            from dataset_compaction import CompactTrainingSet, group_folds, weighted_tree_params
+            
+            self.training_set = CompactTrainingSet.from_rows(self.X_train, self.y_train)
+            X_fit, y_fit = self.training_set.X, self.training_set.y
+            fit_params = self.training_set.fit_params()
+            search_params = dict(fit_params, groups=self.training_set.groups)
+            X_rows, y_rows, _ = self.training_set.expanded()
+            cv = group_folds(3)
+            print(f"Compacted {self.training_set.n_rows} training rows to {len(X_fit)} unique rows")
+        else:
+            self.training_set = None
+            X_fit, y_fit = self.X_train, self.y_train
+            X_rows, y_rows = X_fit, y_fit
+            fit_params, search_params, cv = {}, {}, 3
+        fit_seconds = {}
+        started = time.perf_counter()
+        
         # Enhanced Random Forest with hyperparameter tuning
         print("Training Enhanced Random Forest...")
         rf_params = {
@@ -235,14 +466,18 @@ class DiseasePredictor:
             'min_samples_split': [2, 5],
             'min_samples_leaf': [1, 2]
         }
+        if self.compact_training:
+            rf_params = weighted_tree_params(rf_params, self.training_set.n_rows)
         rf_grid = GridSearchCV(
             RandomForestClassifier(random_state=42, n_jobs=-1),
             rf_params,
-            cv=3,
+            cv=cv,
             scoring='accuracy',
             n_jobs=-1
         )
-        rf_grid.fit(self.X_train, self.y_train)
+        fit_start = time.perf_counter()
+        rf_grid.fit(X_fit, y_fit, **search_params)
+        fit_seconds['random_forest'] = time.perf_counter() - fit_start
         self.models['random_forest'] = rf_grid.best_estimator_
         print(f"Best RF params: {rf_grid.best_params_}")
         
@@ -256,11 +491,13 @@ class DiseasePredictor:
         svm_grid = GridSearchCV(
             SVC(probability=True, random_state=42),
             svm_params,
-            cv=3,
+            cv=cv,
             scoring='accuracy',
             n_jobs=-1
         )
-        svm_grid.fit(self.X_train, self.y_train)
+        fit_start = time.perf_counter()
+        svm_grid.fit(X_fit, y_fit, **search_params)
+        fit_seconds['svm'] = time.perf_counter() - fit_start
         self.models['svm'] = svm_grid.best_estimator_
         print(f"Best SVM params: {svm_grid.best_params_}")
         
@@ -274,25 +511,31 @@ class DiseasePredictor:
         gb_grid = GridSearchCV(
             GradientBoostingClassifier(random_state=42),
             gb_params,
-            cv=3,
+            cv=cv,
             scoring='accuracy',
             n_jobs=-1
         )
-        gb_grid.fit(self.X_train, self.y_train)
+        fit_start = time.perf_counter()
+        gb_grid.fit(X_fit, y_fit, **search_params)
+        fit_seconds['gradient_boosting'] = time.perf_counter() - fit_start
         self.models['gradient_boosting'] = gb_grid.best_estimator_
         print(f"Best GB params: {gb_grid.best_params_}")
         
         # Extra Trees Classifier (additional ensemble method)
         print("Training Extra Trees Classifier...")
+        et_params = {'min_samples_split': 5, 'min_samples_leaf': 2}
+        if self.compact_training:
+            et_params = weighted_tree_params(et_params, self.training_set.n_rows)
         self.models['extra_trees'] = ExtraTreesClassifier(
             n_estimators=200,
             max_depth=20,
-            min_samples_split=5,
-            min_samples_leaf=2,
             random_state=42,
-            n_jobs=-1
+            n_jobs=-1,
+            **et_params
         )
-        self.models['extra_trees'].fit(self.X_train, self.y_train)
+        fit_start = time.perf_counter()
+        self.models['extra_trees'].fit(X_fit, y_fit, **fit_params)
+        fit_seconds['extra_trees'] = time.perf_counter() - fit_start
         
         # Neural Network (MLP)
         print("Training Neural Network...")
@@ -303,27 +546,43 @@ class DiseasePredictor:
             early_stopping=True,
             validation_fraction=0.1
         )
-        self.models['neural_network'].fit(self.X_train, self.y_train)
+        fit_start = time.perf_counter()
+        self.models['neural_network'].fit(X_rows, y_rows)
+        fit_seconds['neural_network'] = time.perf_counter() - fit_start
         
-        # Create Voting Classifier (Ensemble of all models)
+        # Create Voting Classifier (Ensemble of all models): soft vote over the
+        # members fitted above, not VotingClassifier.fit, which would clone and
+        # retrain all five
         print("Creating Voting Ensemble...")
-        self.models['voting_ensemble'] = VotingClassifier(
-            estimators=[
-                ('rf', self.models['random_forest']),
-                ('svm', self.models['svm']),
-                ('gb', self.models['gradient_boosting']),
-                ('et', self.models['extra_trees']),
-                ('nn', self.models['neural_network'])
-            ],
-            voting='soft'  # Use probability-based voting
-        )
-        self.models['voting_ensemble'].fit(self.X_train, self.y_train)
+        fit_start = time.perf_counter()
+        self.models['voting_ensemble'] = fitted_soft_vote([
+            ('rf', self.models['random_forest']),
+            ('svm', self.models['svm']),
+            ('gb', self.models['gradient_boosting']),
+            ('et', self.models['extra_trees']),
+            ('nn', self.models['neural_network'])
+        ])
+        fit_seconds['voting_ensemble'] = time.perf_counter() - fit_start
+        
+        self.training_report = {
+            'compact': self.compact_training,
+            'rows': (self.training_set.describe() if self.training_set is not None
+                     else {'rows': len(self.X_train), 'unique_rows': len(self.X_train)}),
+            'cv': type(cv).__name__ if self.compact_training else f'{cv}-fold',
+            'fit_seconds': fit_seconds,
+            'total_seconds': time.perf_counter() - started
+        }
+        print(f"Model fitting took {self.training_report['total_seconds']:.1f}s")
         
         print("Enhanced model training completed with improved accuracy!")
     
     def evaluate_models(self):
         """Evaluate models on validation and test sets"""
+        from sklearn.metrics import accuracy_score, classification_report
+        from sklearn.model_selection import cross_val_score
+        
         print("Evaluating models...")
+        self.ensure_splits()
         
         self.model_performance = {}
         
@@ -338,8 +597,21 @@ class DiseasePredictor:
             test_pred = model.predict(self.X_test)
             test_accuracy = accuracy_score(self.y_test, test_pred)
             
-            # Cross-validation on training data
-            cv_scores = cross_val_score(model, self.X_train, self.y_train, cv=5, scoring='accuracy')
+            # Cross-validation on training data (pattern-grouped on the compacted set)
+            if self.training_set is not None and name in UNWEIGHTED_MODELS:
+                from dataset_compaction import group_folds
+                
+                X_rows, y_rows, groups = self.training_set.expanded()
+                cv_scores = cross_val_score(model, X_rows, y_rows, cv=group_folds(5), scoring='accuracy',
+                                            groups=groups)
+            elif self.training_set is not None:
+                from dataset_compaction import cv_fit_kwargs, group_folds
+                
+                cv_scores = cross_val_score(model, self.training_set.X, self.training_set.y, cv=group_folds(5),
+                                            scoring='accuracy', groups=self.training_set.groups,
+                                            **cv_fit_kwargs(self.training_set.fit_params()))
+            else:
+                cv_scores = cross_val_score(model, self.X_train, self.y_train, cv=5, scoring='accuracy')
             
             # Classification report
             test_report = classification_report(self.y_test, test_pred, output_dict=True)
@@ -361,8 +633,9 @@ class DiseasePredictor:
         """Save trained models with versioning"""
         print("Saving enhanced models...")
         
-        model_dir = 'models'
+        model_dir = self.model_dir
         os.makedirs(model_dir, exist_ok=True)
+        self.ensure_splits()
         
         # Save all individual models
         joblib.dump(self.models['random_forest'], os.path.join(model_dir, 'random_forest.pkl'))
@@ -380,156 +653,662 @@ class DiseasePredictor:
         metadata = {
             'version': datetime.now().strftime('%Y%m%d_%H%M%S'),
             'training_date': datetime.now().isoformat(),
-            'training_samples': len(self.training_data),
-            'testing_samples': len(self.testing_data),
+            'training_samples': self.training_samples,
+            'testing_samples': self.testing_samples,
             'validation_samples': len(self.X_val),
             'original_features': len(self.symptom_columns),
             'selected_features': self.X_train.shape[1],
-            'diseases': list(self.y_train_full.unique()),
-            'num_diseases': len(self.y_train_full.unique()),
+            'diseases': self.diseases,
+            'num_diseases': len(self.diseases),
             'performance': self.model_performance,
             'training_csv': self.training_csv_path,
             'testing_csv': self.testing_csv_path,
             'models': list(self.models.keys()),
             'feature_selection': 'SelectKBest with f_classif',
             'hyperparameter_tuning': True,
-            'ensemble_method': 'Voting Classifier with soft voting'
+            'ensemble_method': 'Voting Classifier with soft voting',
+            'training': self.training_report
         }
+        if self.fast_model is not None:
+            metadata['fast_profile'] = self.fast_profile_report
+            joblib.dump(self.fast_model, os.path.join(model_dir, 'fast_model.pkl'))
+        self.metadata = metadata
         
         with open(os.path.join(model_dir, 'metadata.json'), 'w') as f:
             json.dump(metadata, f, indent=2)
+        self.compile_members()
         
         print("Enhanced models saved successfully with improved accuracy!")
     
-    def predict(self, symptoms_dict):
-        """Make enhanced ensemble prediction with confidence scores"""
-        # Create feature vector
-        feature_vector = np.zeros(len(self.symptom_columns))
+    def compile_members(self):
+        """Swap served members for their compiled backends where enabled"""
+        self.compiled_members = {}
+        version = self.metadata.get('version', 'unknown')
+        for name, model in self._serving_members():
+            if name in COMPILED_TREE_MEMBERS and self.tree_backend == 'compiled':
+                from forest_inference import CompiledTrees, load_or_compile
+                if isinstance(model, CompiledTrees):
+                    continue
+                # Flat tree arrays are stored per model version
+                directory = os.path.join(self.model_dir, 'compiled', name)
+                compiled = load_or_compile(model, directory, version)
+                if compiled is not None:
+                    self.compiled_members[name] = compiled
+            elif name == 'svm' and self.svm_backend == 'compiled':
+                from svm_serving import CompiledSVC
+                compiled = CompiledSVC.from_sklearn(model)
+                if compiled is not None:
+                    self.compiled_members[name] = compiled
+        if self.compiled_members:
+            self._log(f"Compiled members: {list(self.compiled_members.keys())}")
+    
+    def attach_model_bundle(self):
+        """
+        Serve the voting ensemble from the memory-mapped bundle shared by all workers
         
-        for symptom, value in symptoms_dict.items():
-            symptom_clean = symptom.lower().replace(' ', '_')
-            if symptom_clean in self.symptom_columns:
-                idx = self.symptom_columns.index(symptom_clean)
-                feature_vector[idx] = value
+        Tree members are always compiled arrays here (no sklearn fallback for
+        large batches); the individual *.pkl models are not loaded.
+        """
+        from model_bundle import ensure_bundle, load_bundle
         
-        # Apply feature selection if available
-        if hasattr(self, 'feature_selector') and self.feature_selector is not None:
-            feature_vector = self.feature_selector.transform([feature_vector])[0]
+        directory = ensure_bundle(self.model_dir, self.metadata.get('version', 'unknown'))
+        voting, self.feature_selector, symptom_columns = load_bundle(directory)
+        if symptom_columns is not None:
+            self._align_symptom_columns(symptom_columns)
+        self.models = {VOTING_MEMBER_NAMES.get(key, key): model for key, model in voting.named_estimators_.items()}
+        self.models['voting_ensemble'] = voting
+        self.compile_members()
+        self._log(f"Attached shared model bundle: {directory}")
+    
+    def selected_feature_splits(self):
+        """Train/validation/test matrices in the feature space the models expect"""
+        self.ensure_splits()
+        splits = (self.X_train, self.X_val, self.X_test)
+        if getattr(self, 'feature_selector', None) is not None and self.X_train.shape[1] == len(self.symptom_columns):
+            splits = tuple(self.feature_selector.transform(X) for X in splits)
+        return splits
+    
+    def distill_fast_profile(self, tolerance=None):
+        """Pick the fast serving model (ensemble subset or distilled student)"""
+        from distillation import DEFAULT_TOLERANCE, distill
+        
+        print("Distilling fast serving profile...")
+        self.fast_model, self.fast_profile_report = distill(
+            self, tolerance=DEFAULT_TOLERANCE if tolerance is None else tolerance)
+        print(f"Fast profile model: {self.fast_profile_report['selected']}")
+    
+    def save_fast_profile(self):
+        """Persist the fast model next to the ensemble and record its report"""
+        if self.fast_model is None:
+            return
+        joblib.dump(self.fast_model, os.path.join(self.model_dir, 'fast_model.pkl'))
+        self.metadata['fast_profile'] = self.fast_profile_report
+        with open(os.path.join(self.model_dir, 'metadata.json'), 'w') as f:
+            json.dump(self.metadata, f, indent=2)
+    
+    def load_fast_profile(self):
+        """Load the fast model saved with this model version, if any"""
+        path = os.path.join(self.model_dir, 'fast_model.pkl')
+        if os.path.exists(path):
+            self.fast_model = joblib.load(path)
+            self.fast_profile_report = self.metadata.get('fast_profile')
+        elif self.profile == 'fast':
+            print("Warning: no fast model saved; serving the full ensemble")
+    
+    def tune_cascade(self, tolerance=None, thresholds=None):
+        """Pick the cascade's first-tier member and margin threshold"""
+        from cascade import DEFAULT_THRESHOLDS, DEFAULT_TOLERANCE, Cascade, cascade_report
+        
+        print("Tuning cascade profile...")
+        selected, self.cascade_report = cascade_report(
+            self, thresholds=thresholds or DEFAULT_THRESHOLDS,
+            tolerance=DEFAULT_TOLERANCE if tolerance is None else tolerance)
+        self.cascade = selected or Cascade.from_report(None)
+        print(f"Cascade: {self.cascade.describe()}")
+    
+    def save_cascade(self):
+        """Record the cascade settings and report with this model version"""
+        if self.cascade_report is None:
+            return
+        self.metadata['cascade'] = self.cascade_report
+        with open(os.path.join(self.model_dir, 'metadata.json'), 'w') as f:
+            json.dump(self.metadata, f, indent=2)
+    
+    def load_cascade(self):
+        """Cascade settings saved with this model version, else the defaults"""
+        from cascade import Cascade
+        
+        self.cascade_report = self.metadata.get('cascade')
+        self.cascade = Cascade.from_report(self.cascade_report)
+    
+    def calibrate_confidence(self, method='auto'):
+        """
+        Fit a top-1 confidence calibration per serving profile
+        
+        The raw confidence (the combined probability of the predicted class)
+        is mapped to the observed accuracy on out-of-fold scores: the
+        training split is cut into folds grouped by symptom pattern and each
+        fold is scored by members refitted without it, so no scored pattern
+        (Training.csv repeats each many times) was seen in fitting. Reports
+        reliability diagnostics and an accept-threshold table per profile;
+        'test' repeats the calibrated diagnostics on Testing.csv.
+        """
+        from calibration import calibration_report, reliability
+        from dataset_compaction import group_folds
+        
+        print("Calibrating prediction confidence...")
+        X_train, _, X_test = self.selected_feature_splits()
+        y_train = np.asarray(self.y_train)
+        classes = np.asarray(self._classes())
+        profiles = [profile for profile in CALIBRATED_PROFILES if profile != 'fast' or self.fast_model is not None]
+        
+        scores = {profile: np.zeros(len(X_train)) for profile in profiles}
+        correct = {profile: np.zeros(len(X_train), dtype=bool) for profile in profiles}
+        groups = np.unique(X_train, axis=0, return_inverse=True)[1].ravel()
+        for fit_rows, held_out in group_folds(CALIBRATION_FOLDS).split(X_train, y_train, groups):
+            fold = self._fold_predictor(X_train[fit_rows], y_train[fit_rows])
+            # A fold may miss a class whose patterns all sit in its held-out part
+            fold_classes = np.asarray(fold._classes())
+            for profile in profiles:
+                combined = fold._calibration_probabilities(X_train[held_out], profile)
+                scores[profile][held_out] = combined.max(axis=1)
+                correct[profile][held_out] = fold_classes[np.argmax(combined, axis=1)] == y_train[held_out]
+        
+        self.calibration, self.calibration_report = {}, {}
+        for profile in profiles:
+            table, report = calibration_report(scores[profile], correct[profile], method=method)
+            combined = self._calibration_probabilities(X_test, profile)
+            test_correct = classes[np.argmax(combined, axis=1)] == np.asarray(self.y_test)
+            report['test'] = reliability(table.apply(combined.max(axis=1)), test_correct)
+            report['held_out'] = {'folds': CALIBRATION_FOLDS, 'grouped_by': 'symptom_pattern', 'rows': len(X_train)}
+            self.calibration[profile], self.calibration_report[profile] = table, report
+            print(f"{profile}: {self.calibration[profile].method} calibration, ECE "
+                  f"{self.calibration_report[profile]['raw']['expected_calibration_error']:.4f} -> "
+                  f"{self.calibration_report[profile]['calibrated']['expected_calibration_error']:.4f}")
+    
+    def _calibration_probabilities(self, feature_matrix, profile):
+        """Combined probabilities the profile serves (its raw confidence is their maximum)"""
+        if profile == 'cascade':
+            return self._cascade_probabilities(feature_matrix)[1]
+        return self._profile_probabilities(feature_matrix, profile)[1]
+    
+    def _fold_predictor(self, X, y):
+        """
+        Shallow copy of this predictor with its members refitted on (X, y)
+        
+        Same hyperparameters, sample weighting and soft-vote weights as the
+        served members; a distilled fast student is refitted on the fold
+        ensemble's soft labels, and the cascade keeps its settings.
+        """
+        import copy
+        
+        from sklearn.base import clone
+        
+        if self.compact_training:
+            from dataset_compaction import CompactTrainingSet
+            
+            compact = CompactTrainingSet.from_rows(X, y)
+            X_fit, y_fit, fit_params = compact.X, compact.y, compact.fit_params()
         else:
-            feature_vector = [feature_vector]
+            X_fit, y_fit, fit_params = X, y, {}
         
-        # Get predictions from all models
-        predictions = {}
-        probabilities = {}
+        voting = self.models.get('voting_ensemble')
+        members = (list(voting.named_estimators_.items()) if voting is not None
+                   else [(name, model) for name, model in self.models.items()])
+        refitted = []
+        for key, model in members:
+            estimator = clone(model)
+            if VOTING_MEMBER_NAMES.get(key, key) in UNWEIGHTED_MODELS:
+                estimator.fit(X, y)
+            else:
+                estimator.fit(X_fit, y_fit, **fit_params)
+            refitted.append((key, estimator))
         
-        # Use voting ensemble if available (best performance)
-        if 'voting_ensemble' in self.models:
+        fold = copy.copy(self)
+        fold.compiled_members = {}
+        fold.models = {VOTING_MEMBER_NAMES.get(key, key): model for key, model in refitted}
+        if voting is not None:
+            fold.models['voting_ensemble'] = fitted_soft_vote(refitted)
+            fold.models['voting_ensemble'].weights = voting.weights
+        if self.fast_model is not None and self.fast_model.kind == 'student':
+            from distillation import FastModel, soft_label_dataset
+            
+            fold_classes = fold._classes()
+            teacher = fold._ensemble_probabilities(fold._member_probabilities(X))[0]
+            X_soft, y_soft, w_soft = soft_label_dataset(X, teacher, fold_classes)
+            student = clone(self.fast_model.estimator).fit(X_soft, y_soft, sample_weight=w_soft)
+            fold.fast_model = FastModel('student', self.fast_model.name, fold_classes, estimator=student)
+        return fold
+    
+    def save_calibration(self):
+        """Record the calibration tables and diagnostics with this model version"""
+        if self.calibration_report is None:
+            return
+        self.metadata['calibration'] = self.calibration_report
+        with open(os.path.join(self.model_dir, 'metadata.json'), 'w') as f:
+            json.dump(self.metadata, f, indent=2)
+    
+    def load_calibration(self):
+        """Calibration tables saved with this model version (raw confidence without them)"""
+        from calibration import CalibrationTable
+        
+        self.calibration_report = self.metadata.get('calibration')
+        self.calibration = {profile: CalibrationTable.from_dict(report['table'])
+                            for profile, report in (self.calibration_report or {}).items()}
+    
+    def refresh_pattern_table(self, observed_patterns=None, top_misses=1000):
+        """
+        Rebuild and save the exact-match table for this model version
+        
+        Keeps the training patterns and any patterns already stored, and adds
+        the top_misses most frequent patterns that missed the current table
+        plus observed_patterns (e.g. from production logs, most frequent first).
+        """
+        from pattern_table import build_pattern_table
+        
+        self.ensure_splits()
+        patterns = [self.training_patterns]
+        if self.pattern_table is not None:
+            patterns.append(self.pattern_table.unpacked_patterns())
+            patterns.append(self.pattern_table.top_misses(top_misses))
+        if observed_patterns is not None:
+            patterns.append(np.asarray(observed_patterns, dtype=np.uint8))
+        print("Building exact-match pattern table...")
+        table = build_pattern_table(self, np.vstack(patterns))
+        table.save(self.model_dir)
+        print(f"Pattern table: {len(table)} patterns")
+        self.pattern_table = table if self.exact_match else None
+        return table
+    
+    def load_pattern_table(self):
+        """Exact-match table saved for this model version, if enabled and present"""
+        if not self.exact_match:
+            return
+        from pattern_table import PatternTable
+        
+        self.pattern_table = PatternTable.load(self.model_dir, self.metadata.get('version', 'unknown'),
+                                               len(self.symptom_columns))
+    
+    def encode_symptoms(self, symptom_dicts, errors=None, unrecognized=None):
+        """
+        Binary symptom matrix (rows x symptom_columns) for a list of symptom dicts
+        
+        Names are resolved through the symptom index (display names, stray
+        spaces and synonyms all map to their column). With an errors dict,
+        rows whose values cannot be encoded are left empty and their messages
+        recorded by row index instead of raising; with an unrecognized dict,
+        names matching no symptom are listed by row index. Any non-zero
+        number counts as present; other values raise SymptomValueError.
+        """
+        index = self.symptom_index()
+        matrix = np.zeros((len(symptom_dicts), len(self.symptom_columns)), dtype=np.uint8)
+        for row, symptoms in enumerate(symptom_dicts):
             try:
-                pred_proba = self.models['voting_ensemble'].predict_proba(feature_vector)[0]
-                predictions['voting_ensemble'] = self.models['voting_ensemble'].predict(feature_vector)[0]
-                probabilities['voting_ensemble'] = pred_proba
-                
-                # Also get individual model predictions for comparison
-                for name, model in self.models.items():
-                    if name != 'voting_ensemble':
-                        try:
-                            pred_proba_individual = model.predict_proba(feature_vector)[0]
-                            predictions[name] = model.predict(feature_vector)[0]
-                            probabilities[name] = pred_proba_individual
-                        except:
-                            continue
+                for symptom, value in symptoms.items():
+                    idx = index.position(symptom)
+                    if idx is not None:
+                        matrix[row, idx] = symptom_flag(symptom, value)
+                    elif unrecognized is not None:
+                        unrecognized.setdefault(row, []).append(symptom)
             except Exception as e:
-                print(f"Error with voting ensemble: {e}")
-                # Fallback to individual models
-                for name, model in self.models.items():
-                    if name != 'voting_ensemble':
-                        try:
-                            pred_proba = model.predict_proba(feature_vector)[0]
-                            predictions[name] = model.predict(feature_vector)[0]
-                            probabilities[name] = pred_proba
-                        except:
-                            continue
+                if errors is None:
+                    raise
+                matrix[row] = 0
+                errors[row] = str(e)
+        return matrix
+    
+    def predict_matrix(self, symptom_matrix, profile=None, top_k=5, record_misses=True):
+        """
+        Vectorized prediction for an encoded symptom matrix
+        
+        Returns arrays aligned with class_catalog()['classes']: the combined
+        probabilities, the top_k class indices and probabilities per row and
+        each member's predicted class index. The cascade profile adds the
+        tier that answered each row, and a calibrated profile the calibrated
+        top-1 'confidence'. When the exact-match table is consulted
+        (full and cascade profiles), rows with a stored pattern skip the
+        models and 'exact_match' marks them; record_misses=False keeps
+        synthetic rows out of the table's refresh candidates.
+        """
+        profile = profile or self.profile
+        slots = None
+        if self.pattern_table is not None and profile in PATTERN_TABLE_PROFILES:
+            with metrics.stage('pattern_lookup'):
+                slots = self.pattern_table.lookup(symptom_matrix, record_misses=record_misses)
+            if metrics.ENABLED:
+                hits = int(np.count_nonzero(slots >= 0))
+                metrics.PATTERN_TABLE_ROWS.inc('hit', amount=hits)
+                metrics.PATTERN_TABLE_ROWS.inc('miss', amount=len(slots) - hits)
+        
+        if slots is not None and np.any(slots >= 0):
+            member_predictions, ensemble_proba, primary_model, tiers = self._pattern_outputs(
+                symptom_matrix, profile, slots)
         else:
-            # Use individual models
-            for name, model in self.models.items():
-                try:
-                    pred_proba = model.predict_proba(feature_vector)[0]
-                    predictions[name] = model.predict(feature_vector)[0]
-                    probabilities[name] = pred_proba
-                except:
-                    continue
+            member_predictions, ensemble_proba, primary_model, tiers = self._model_outputs(symptom_matrix, profile)
         
-        if not probabilities:
-            raise Exception("No models available for prediction")
+        with metrics.stage('top_k'):
+            top_indices = top_k_indices(ensemble_proba, top_k)
+        result = {
+            'probabilities': ensemble_proba,
+            'top_indices': top_indices,
+            'top_probabilities': np.take_along_axis(ensemble_proba, top_indices, axis=1),
+            'member_predictions': member_predictions,
+            'primary_model': primary_model
+        }
+        if tiers is not None:
+            result['tiers'] = tiers
+        if slots is not None:
+            result['exact_match'] = slots >= 0
+        table = self.calibration.get(profile)
+        if table is not None:
+            result['confidence'] = table.apply(result['top_probabilities'][:, 0])
+        return result
+    
+    def _model_outputs(self, symptom_matrix, profile):
+        """
+        Run the models of a serving profile on an encoded symptom matrix
         
-        # Use voting ensemble result if available, otherwise ensemble prediction
-        if 'voting_ensemble' in probabilities:
-            ensemble_proba = probabilities['voting_ensemble']
-            primary_model = 'voting_ensemble'
+        Returns (member predicted class indices by name, combined
+        probabilities, primary model name, cascade tiers or None)
+        """
+        # Apply feature selection if available
+        with metrics.stage('feature_selection'):
+            if hasattr(self, 'feature_selector') and self.feature_selector is not None:
+                symptom_matrix = self.feature_selector.transform(symptom_matrix)
+        
+        tiers = None
+        if profile == 'cascade':
+            probabilities, ensemble_proba, escalated = self._cascade_probabilities(symptom_matrix)
+            primary_model = f'cascade:{self.cascade.member}'
+            tiers = np.where(escalated, 'voting_ensemble', self.cascade.member)
         else:
-            # Ensemble prediction (weighted average based on validation performance)
-            if self.model_performance:
-                weights = {}
-                total_weight = 0
-                for name in probabilities.keys():
-                    if name in self.model_performance:
-                        weight = self.model_performance[name]['validation_accuracy']
-                        weights[name] = weight
-                        total_weight += weight
-                
-                # Normalize weights
-                if total_weight > 0:
-                    for name in weights:
-                        weights[name] /= total_weight
-                else:
-                    weights = {name: 1/len(probabilities) for name in probabilities.keys()}
-            else:
-                # Equal weights if no performance data
-                weights = {name: 1/len(probabilities) for name in probabilities.keys()}
-            
-            # Calculate ensemble probabilities
-            ensemble_proba = np.zeros(len(list(probabilities.values())[0]))
-            for name, proba in probabilities.items():
-                ensemble_proba += weights[name] * proba
-            
-            primary_model = 'ensemble'
+            probabilities, ensemble_proba, primary_model = self._profile_probabilities(symptom_matrix, profile)
+        member_predictions = {name: np.argmax(proba, axis=1) for name, proba in probabilities.items()}
+        return member_predictions, ensemble_proba, primary_model, tiers
+    
+    def _pattern_outputs(self, symptom_matrix, profile, slots):
+        """_model_outputs with stored rows answered from the pattern table"""
+        table = self.pattern_table
+        hits = slots >= 0
+        misses = np.flatnonzero(~hits)
+        combined = np.empty((len(slots), table.probabilities.shape[1]))
+        combined[hits] = table.probabilities[slots[hits]]
         
-        # Get top predictions
-        if 'voting_ensemble' in self.models:
-            classes = self.models['voting_ensemble'].classes_
+        if profile == 'cascade':
+            names = [self.cascade.member]
+            primary_model = f'cascade:{self.cascade.member}'
+            tiers = np.full(len(slots), 'pattern_table', dtype='<U32')
         else:
-            classes = list(self.models.values())[0].classes_
-            
-        top_indices = np.argsort(ensemble_proba)[-5:][::-1]
-        top_predictions = []
+            names = list(table.member_predictions)
+            primary_model = table.primary_model
+            tiers = None
+        member_predictions = {}
+        for name in names:
+            if name in table.member_predictions:
+                member_predictions[name] = np.empty(len(slots), dtype=np.int64)
+                member_predictions[name][hits] = table.member_predictions[name][slots[hits]]
+        
+        if len(misses):
+            miss_predictions, combined[misses], primary_model, miss_tiers = self._model_outputs(
+                symptom_matrix[misses], profile)
+            # Members that failed on the missed rows have no prediction for them
+            member_predictions = {name: predicted for name, predicted in member_predictions.items()
+                                  if name in miss_predictions}
+            for name, predicted in member_predictions.items():
+                predicted[misses] = miss_predictions[name]
+            if tiers is not None:
+                tiers[misses] = miss_tiers
+        return member_predictions, combined, primary_model, tiers
+    
+    def predict_batch(self, symptom_dicts, profile=None, top_k=5, explain=False):
+        """predict_matrix for a list of symptom dicts, plus the unrecognized names per row"""
+        unrecognized = {}
+        with metrics.stage('encode'):
+            symptom_matrix = self.encode_symptoms(symptom_dicts, unrecognized=unrecognized)
+        result = self.predict_matrix(symptom_matrix, profile=profile, top_k=top_k)
+        result['unrecognized'] = unrecognized
+        if explain:
+            self.explain(symptom_matrix, result, profile=profile)
+        return result
+    
+    def predict(self, symptoms_dict, profile=None, compact=False, explain=False):
+        """Make enhanced ensemble prediction with confidence scores"""
+        return self.prediction_record(self.predict_batch([symptoms_dict], profile=profile, explain=explain), 0,
+                                      compact=compact)
+    
+    def explain(self, symptom_matrix, result, profile=None):
+        """
+        Add leave-one-symptom-out contributions to a predict_matrix result
         
-        for idx in top_indices:
-            disease = classes[idx]
-            probability = ensemble_proba[idx]
-            top_predictions.append({
-                'disease': disease,
-                'probability': float(probability)
-            })
+        result['explanations'] holds (predicted class index, [(symptom
+        position, contribution), ...]) per row; repeated symptom patterns are
+        served from the explanation cache.
+        """
+        from explanations import ExplanationCache, explain_matrix
         
+        if self.explanation_cache is None:
+            self.explanation_cache = ExplanationCache()
+        with metrics.stage('explain'):
+            result['explanations'] = explain_matrix(self, symptom_matrix, result, profile=profile or self.profile,
+                                                    cache=self.explanation_cache)
+        return result
+    
+    def explanation_record(self, explanation):
+        """JSON form of one row's explanation: contributions by symptom name, largest first"""
+        class_index, contributions = explanation
         return {
+            'disease': self.class_catalog()['classes'][class_index],
+            'method': 'leave_one_symptom_out',
+            'contributions': [{'symptom': self.symptom_columns[position], 'contribution': contribution}
+                              for position, contribution in contributions]
+        }
+    
+    def prediction_record(self, result, row, compact=False):
+        """
+        Per-patient response dict for one row of a predict_matrix result
+        
+        compact=True returns the probabilities as a list aligned with the
+        published class list instead of the all_probabilities name mapping.
+        """
+        classes = self.class_catalog()['classes']
+        top_predictions = [
+            {'disease': classes[idx], 'probability': probability}
+            for idx, probability in zip(result['top_indices'][row].tolist(),
+                                        result['top_probabilities'][row].tolist())
+        ]
+        record = {
             'predicted_condition': top_predictions[0]['disease'],
-            'confidence': float(top_predictions[0]['probability']),
-            'all_probabilities': {classes[i]: float(ensemble_proba[i]) for i in range(len(classes))},
+            'confidence': top_predictions[0]['probability'],
+        }
+        if 'confidence' in result:
+            # Calibrated probability that the prediction is right; the soft-vote value stays available
+            record['confidence'] = float(result['confidence'][row])
+            record['raw_confidence'] = top_predictions[0]['probability']
+        if compact:
+            record['probabilities'] = result['probabilities'][row].tolist()
+            record['classes_etag'] = self.class_catalog()['etag']
+        else:
+            record['all_probabilities'] = dict(zip(classes, result['probabilities'][row].tolist()))
+        record.update({
             'top_predictions': top_predictions,
-            'individual_predictions': {name: pred for name, pred in predictions.items()},
+            'individual_predictions': {
+                name: classes[predicted[row]] for name, predicted in result['member_predictions'].items()
+            },
             'model_performance': self.get_model_summary(),
-            'primary_model': primary_model,
+            'primary_model': result['primary_model'],
             'enhanced_features': hasattr(self, 'feature_selector') and self.feature_selector is not None
-        }
+        })
+        if 'tiers' in result:
+            record['tier'] = str(result['tiers'][row])
+        if 'exact_match' in result:
+            record['exact_match'] = bool(result['exact_match'][row])
+        if 'unrecognized' in result:
+            record['unrecognized_symptoms'] = result['unrecognized'].get(row, [])
+        if 'explanations' in result:
+            record['explanation'] = self.explanation_record(result['explanations'][row])
+        return record
+    
+    def class_catalog(self):
+        """Class list the probability arrays are aligned with, versioned with the models"""
+        return self._catalog('classes', lambda: [str(c) for c in self._classes()])
+    
+    def symptom_catalog(self):
+        """Symptom order of encoded feature matrices (binary batch requests)"""
+        return self._catalog('symptoms', lambda: list(self.symptom_columns))
+    
+    def symptom_index(self):
+        """Search index and name normalization map, rebuilt when the symptom catalog changes"""
+        from symptom_index import SymptomIndex
+        
+        catalog = self.symptom_catalog()
+        if self._symptom_index is None or self._symptom_index.etag != catalog['etag']:
+            self._symptom_index = SymptomIndex(catalog['symptoms'], catalog['etag'])
+        return self._symptom_index
+    
+    def _catalog(self, kind, build_names):
+        version = self.metadata.get('version', 'unknown')
+        catalog = self._catalogs.get(kind)
+        if catalog is None or catalog['version'] != version:
+            names = build_names()
+            digest = hashlib.sha256('\n'.join(names).encode('utf-8')).hexdigest()[:16]
+            catalog = self._catalogs[kind] = {'version': version, 'etag': f'{version}-{digest}', kind: names}
+        return catalog
+    
+    def _serving_members(self):
+        """(name, fitted model) pairs evaluated for each prediction"""
+        voting = self.models.get('voting_ensemble')
+        if voting is not None:
+            # The soft vote averages its own fitted members
+            members = [(VOTING_MEMBER_NAMES.get(key, key), model)
+                       for key, model in voting.named_estimators_.items()]
+        else:
+            members = list(self.models.items())
+        return [(name, self.compiled_members.get(name, model)) for name, model in members]
+    
+    def _profile_probabilities(self, feature_matrix, profile):
+        """
+        Member and combined probabilities for a serving profile
+        
+        Returns (member probabilities by name, combined matrix, primary model name)
+        """
+        if profile == 'fast' and self.fast_model is not None:
+            fast = self.fast_model
+            if fast.kind == 'subset':
+                members = set(fast.members)
+                probabilities = self._member_probabilities(feature_matrix, lambda name: name in members)
+                if len(probabilities) == len(members):
+                    with metrics.stage('ensemble'):
+                        combined = np.mean(list(probabilities.values()), axis=0)
+                    return probabilities, combined, f'fast:{fast.name}'
+            else:
+                with metrics.stage('predict_proba', model=fast.name):
+                    combined = fast.predict_proba(feature_matrix)
+                return {fast.name: combined}, combined, f'fast:{fast.name}'
+        
+        # Get probabilities from every member once; the soft-vote result is
+        # their (weighted) average, so the ensemble needs no second pass
+        probabilities = self._member_probabilities(feature_matrix)
+        
+        if not probabilities:
+            raise Exception("No models available for prediction")
+        
+        with metrics.stage('ensemble'):
+            combined, primary_model = self._ensemble_probabilities(probabilities)
+        return probabilities, combined, primary_model
+    
+    def _cascade_probabilities(self, feature_matrix, cascade=None):
+        """
+        First-tier probabilities, with low-margin rows escalated to the full vote
+        
+        Returns ({first tier: its probabilities}, combined matrix, escalated mask)
+        """
+        cascade = cascade or self.cascade
+        members = [name for name, _ in self._serving_members()]
+        if cascade is None or cascade.member not in members:
+            # No first tier to gate on: everything escalates
+            probabilities, combined, _ = self._profile_probabilities(feature_matrix, 'full')
+            return probabilities, combined, np.ones(len(combined), dtype=bool)
+        
+        first = self._member_probabilities(feature_matrix, lambda name: name == cascade.member)[cascade.member]
+        with metrics.stage('cascade_gate'):
+            escalated = ~cascade.confident(first)
+        combined = first.copy()
+        rows = np.flatnonzero(escalated)
+        if len(rows):
+            rest = self._member_probabilities(feature_matrix[rows], lambda name: name != cascade.member)
+            rest[cascade.member] = first[rows]
+            # The soft vote's weights follow the member order
+            ordered = {name: rest[name] for name in members if name in rest}
+            with metrics.stage('ensemble'):
+                combined[rows] = self._ensemble_probabilities(ordered)[0]
+        if metrics.ENABLED:
+            metrics.CASCADE_ROWS.inc(cascade.member, amount=len(escalated) - len(rows))
+            metrics.CASCADE_ROWS.inc('voting_ensemble', amount=len(rows))
+        return {cascade.member: first}, combined, escalated
+    
+    def _member_probabilities(self, feature_matrix, include=None):
+        """Class probability matrices from the serving members, keyed by model name"""
+        probabilities = {}
+        for name, model in self._serving_members():
+            if include is not None and not include(name):
+                continue
+            try:
+                with metrics.stage('predict_proba', model=name):
+                    probabilities[name] = model.predict_proba(feature_matrix)
+            except Exception as e:
+                print(f"Error with {name}: {e}")
+                continue
+        return probabilities
+    
+    def _ensemble_probabilities(self, probabilities):
+        """Combine member probabilities into the ensemble distribution"""
+        voting = self.models.get('voting_ensemble')
+        if voting is not None and len(probabilities) == len(voting.estimators_):
+            # Same computation as VotingClassifier(voting='soft').predict_proba
+            ensemble_proba = np.average(list(probabilities.values()), axis=0, weights=voting.weights)
+            return ensemble_proba, 'voting_ensemble'
+        
+        # Ensemble prediction (weighted average based on validation performance)
+        if self.model_performance:
+            weights = {}
+            total_weight = 0
+            for name in probabilities.keys():
+                if name in self.model_performance:
+                    weight = self.model_performance[name]['validation_accuracy']
+                    weights[name] = weight
+                    total_weight += weight
+            
+            # Normalize weights
+            if total_weight > 0:
+                for name in weights:
+                    weights[name] /= total_weight
+            else:
+                weights = {name: 1/len(probabilities) for name in probabilities.keys()}
+        else:
+            # Equal weights if no performance data
+            weights = {name: 1/len(probabilities) for name in probabilities.keys()}
+        
+        # Calculate ensemble probabilities
+        ensemble_proba = np.zeros_like(next(iter(probabilities.values())), dtype=float)
+        for name, proba in probabilities.items():
+            ensemble_proba += weights.get(name, 0) * proba
+        
+        return ensemble_proba, 'ensemble'
+    
+    def _classes(self):
+        """Class labels aligned with the probability vectors"""
+        if 'voting_ensemble' in self.models:
+            return self.models['voting_ensemble'].classes_
+        return list(self.models.values())[0].classes_
     
     def get_model_summary(self):
         """Return model performance summary"""
         if not self.model_performance:
             return {
-                'training_samples': len(self.training_data) if self.training_data is not None else 0,
-                'testing_samples': len(self.testing_data) if self.testing_data is not None else 0,
+                'training_samples': self.training_samples,
+                'testing_samples': self.testing_samples,
                 'num_features': len(self.symptom_columns),
-                'num_diseases': len(self.y_train_full.unique()) if hasattr(self, 'y_train_full') else 0,
+                'num_diseases': len(self.diseases),
                 'models_trained': list(self.models.keys()),
                 'status': 'Models loaded but performance not evaluated'
             }
@@ -540,11 +1319,11 @@ class DiseasePredictor:
         )
         
         return {
-            'training_samples': len(self.training_data),
-            'testing_samples': len(self.testing_data),
-            'validation_samples': len(self.X_val),
+            'training_samples': self.training_samples,
+            'testing_samples': self.testing_samples,
+            'validation_samples': self.metadata.get('validation_samples'),
             'num_features': len(self.symptom_columns),
-            'num_diseases': len(self.y_train_full.unique()),
+            'num_diseases': len(self.diseases),
             'models_trained': list(self.models.keys()),
             'best_model': best_model[0],
             'best_model_accuracy': best_model[1]['test_accuracy'],
@@ -558,6 +1337,22 @@ class DiseasePredictor:
             }
         }
     
+    def settings(self):
+        """Constructor arguments that rebuild this predictor in another process"""
+        return {
+            'training_csv_path': os.path.abspath(self.training_csv_path),
+            'testing_csv_path': os.path.abspath(self.testing_csv_path),
+            'dataset_cache_dir': self.dataset_cache_dir and os.path.abspath(self.dataset_cache_dir),
+            'model_dir': os.path.abspath(self.model_dir),
+            'profile': self.profile,
+            'tree_backend': self.tree_backend,
+            'svm_backend': self.svm_backend,
+            'model_memory': self.model_memory,
+            'exact_match': self.exact_match,
+            'compact_training': self.compact_training,
+            'verbose': self.verbose
+        }
+    
     def get_all_symptoms(self):
         """Return list of all possible symptoms"""
         return self.symptom_columns
@@ -0,0 +1,221 @@
+"""
+Distillation of the voting ensemble into a fast serving model
+Features:
+- Minimal ensemble subset that matches the full ensemble's accuracy
+- Compact students trained on the ensemble's soft probabilities
+- Accuracy-vs-latency report used to pick the "fast" serving profile
+
+Usage (distill from the saved models without retraining):
+    python distillation.py [--model-dir models] [--tolerance 0.01]
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+
+DEFAULT_TOLERANCE = 0.01
+# Teacher probabilities below this are dropped from the soft-label expansion
+SOFT_LABEL_MIN_PROB = 1e-3
+LATENCY_RUNS = 30
+
+
+# Student estimators import sklearn only when distilling: serving unpickles
+# FastModel (and cascade imports this module) without needing them
+def _logistic_regression():
+    from sklearn.linear_model import LogisticRegression
+    return LogisticRegression(C=10.0, max_iter=2000)
+
+
+def _decision_tree():
+    from sklearn.tree import DecisionTreeClassifier
+    return DecisionTreeClassifier(max_depth=16, random_state=42)
+
+
+def _small_forest():
+    from sklearn.ensemble import RandomForestClassifier
+    return RandomForestClassifier(n_estimators=20, max_depth=12, random_state=42, n_jobs=1)
+
+
+STUDENT_FACTORIES = {
+    'logistic_regression': _logistic_regression,
+    'decision_tree': _decision_tree,
+    'small_forest': _small_forest
+}
+
+
+class FastModel:
+    """
+    Serving model for the "fast" profile
+
+    Either a subset of the ensemble members (stored by name, evaluated with
+    the predictor's already-loaded models) or a standalone student estimator.
+    """
+
+    def __init__(self, kind, name, classes, members=None, estimator=None):
+        self.kind = kind            # 'subset' or 'student'
+        self.name = name
+        self.classes_ = np.asarray(classes)
+        self.members = list(members or [])
+        self.estimator = estimator
+        self._column_map = None
+        if estimator is not None:
+            positions = {label: idx for idx, label in enumerate(self.classes_)}
+            self._column_map = np.array([positions[label] for label in estimator.classes_])
+
+    def predict_proba(self, X, member_models=None):
+        """Class probabilities aligned with classes_"""
+        if self.kind == 'subset':
+            return np.mean([member_models[name].predict_proba(X) for name in self.members], axis=0)
+        proba = np.zeros((X.shape[0], len(self.classes_)))
+        # A student may not have seen every class; unseen ones get zero
+        proba[:, self._column_map] = self.estimator.predict_proba(X)
+        return proba
+
+    def describe(self):
+        return {'kind': self.kind, 'name': self.name, 'members': self.members}
+
+
+def soft_label_dataset(X, teacher_proba, classes, min_prob=SOFT_LABEL_MIN_PROB):
+    """
+    Expand (X, teacher distribution) into weighted hard-label rows
+
+    Fitting a classifier on this expansion with the probabilities as sample
+    weights minimizes cross-entropy against the teacher's soft labels.
+    """
+    rows, cols = np.nonzero(teacher_proba >= min_prob)
+    return X[rows], np.asarray(classes)[cols], teacher_proba[rows, cols]
+
+
+def single_row_latency_ms(predict_proba, X, runs=LATENCY_RUNS):
+    """Median wall time of a one-row predict_proba call"""
+    samples = []
+    for i in range(runs):
+        row = X[i % len(X):i % len(X) + 1]
+        start = time.perf_counter()
+        predict_proba(row)
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples) * 1000)
+
+
+def batch_rows_per_s(predict_proba, X):
+    start = time.perf_counter()
+    predict_proba(X)
+    return float(len(X) / (time.perf_counter() - start))
+
+
+def _evaluate(name, kind, predict_proba, classes, eval_sets, teacher_predictions, X_latency, split_proba=None):
+    # split_proba: probabilities per split already at hand (accuracy only;
+    # latency and throughput always run predict_proba)
+    report = {'name': name, 'kind': kind}
+    for split, (X, y) in eval_sets.items():
+        proba = split_proba[split] if split_proba is not None else predict_proba(X)
+        predicted = classes[np.argmax(proba, axis=1)]
+        report[f'{split}_accuracy'] = float(np.mean(predicted == np.asarray(y)))
+        report[f'{split}_agreement'] = float(np.mean(predicted == teacher_predictions[split]))
+    report['latency_ms'] = single_row_latency_ms(predict_proba, X_latency)
+    report['rows_per_s'] = batch_rows_per_s(predict_proba, eval_sets['validation'][0])
+    return report
+
+
+def distill(predictor, tolerance=DEFAULT_TOLERANCE, students=tuple(STUDENT_FACTORIES)):
+    """
+    Build the fast serving model for a trained predictor
+
+    Candidates are every subset of the ensemble members plus each student;
+    the one with the lowest single-row latency whose validation accuracy is
+    within tolerance of the full ensemble wins.
+
+    Returns:
+        (FastModel, report dict)
+    """
+    X_train, X_val, X_test = predictor.selected_feature_splits()
+    member_models = dict(predictor._serving_members())
+    classes = np.asarray(predictor._classes())
+    eval_sets = {'validation': (X_val, predictor.y_val), 'test': (X_test, predictor.y_test)}
+
+    # Teacher = full soft-vote ensemble
+    def teacher_proba(X):
+        return predictor._ensemble_probabilities(predictor._member_probabilities(X))[0]
+
+    # Member probabilities are computed once per split: the teacher and every
+    # subset's accuracy are averages of these cached arrays
+    member_proba = {split: predictor._member_probabilities(X) for split, (X, _) in eval_sets.items()}
+    teacher_split_proba = {split: predictor._ensemble_probabilities(proba)[0]
+                           for split, proba in member_proba.items()}
+    teacher_predictions = {
+        split: classes[np.argmax(proba, axis=1)] for split, proba in teacher_split_proba.items()
+    }
+    teacher = _evaluate('full_ensemble', 'teacher', teacher_proba, classes, eval_sets,
+                        teacher_predictions, X_val, split_proba=teacher_split_proba)
+
+    candidates = []
+
+    # Ensemble subsets: accuracy from the cached member probabilities;
+    # latency and throughput are measured on the real members
+    names = list(member_models)
+    for size in range(1, len(names)):
+        for subset in itertools.combinations(names, size):
+            model = FastModel('subset', 'subset:' + '+'.join(subset), classes, members=subset)
+            split_proba = {split: np.mean([proba[name] for name in subset], axis=0)
+                           for split, proba in member_proba.items()}
+            report = _evaluate(model.name, 'subset',
+                               lambda X, m=model: m.predict_proba(X, member_models),
+                               classes, eval_sets, teacher_predictions, X_val, split_proba=split_proba)
+            candidates.append((model, report))
+
+    # Students fitted on the teacher's soft labels over the training split
+    X_soft, y_soft, w_soft = soft_label_dataset(X_train, teacher_proba(X_train), classes)
+    for name in students:
+        print(f"Distilling {name}...")
+        estimator = STUDENT_FACTORIES[name]()
+        estimator.fit(X_soft, y_soft, sample_weight=w_soft)
+        model = FastModel('student', name, classes, estimator=estimator)
+        report = _evaluate(name, 'student', model.predict_proba, classes, eval_sets,
+                           teacher_predictions, X_val)
+        candidates.append((model, report))
+
+    eligible = [
+        (model, report) for model, report in candidates
+        if report['validation_accuracy'] >= teacher['validation_accuracy'] - tolerance
+    ]
+    selected = min(eligible, key=lambda item: item[1]['latency_ms'])[0] if eligible else None
+
+    report = {
+        'tolerance': tolerance,
+        'teacher': teacher,
+        'selected': selected.name if selected else None,
+        'candidates': sorted((r for _, r in candidates), key=lambda r: r['latency_ms'])
+    }
+    return selected, report
+
+
+def print_report(report):
+    print(f"{'candidate':<48} {'val acc':>8} {'test acc':>8} {'agree':>7} {'ms/row':>8} {'rows/s':>10}")
+    for row in [report['teacher']] + report['candidates']:
+        marker = ' *' if row['name'] == report['selected'] else ''
+        print(f"{row['name']:<48} {row['validation_accuracy']:>8.4f} {row['test_accuracy']:>8.4f} "
+              f"{row['validation_agreement']:>7.4f} {row['latency_ms']:>8.3f} {row['rows_per_s']:>10.0f}{marker}")
+
+
+def main(argv=None):
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from disease_predictor import DiseasePredictor
+
+    parser = argparse.ArgumentParser(description='Distill the ensemble into a fast serving model')
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    predictor = DiseasePredictor(model_dir=args.model_dir)
+    predictor.distill_fast_profile(tolerance=args.tolerance)
+    predictor.save_fast_profile()
+    print_report(predictor.fast_profile_report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,289 @@
+"""
+Compiled inference for the tree-ensemble members
+Features:
+- Exports fitted sklearn RandomForest / ExtraTrees / GradientBoosting trees into flat NumPy node arrays
+- Vectorized traversal of every tree at once (no joblib dispatch)
+- Bit-test splits for binary symptom inputs
+- Persisted per model version as memory-mappable .npy files (models saved
+  without a version are keyed on a content hash of their trees instead)
+- Large batches go back to sklearn's per-tree Cython loops, which win past a few hundred rows
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+COMPILED_FORMAT_VERSION = 2
+# Rows traversed together; bounds the (rows, trees, outputs) leaf gather
+CHUNK_ROWS = 256
+# Above this many rows the level-by-level NumPy gathers cost more than sklearn
+BATCH_FALLBACK_ROWS = 256
+ARRAY_NAMES = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+# Model versions that do not identify one fitted model (metadata without 'version')
+UNVERSIONED = (None, 'unknown')
+
+
+def _flatten_trees(trees, node_values):
+    """
+    Concatenate sklearn Tree objects into flat node arrays
+
+    node_values(tree) gives the per-node outputs stored in 'value'.
+    Returns (arrays, max_depth, binary_splits).
+    """
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for tree in trees:
+        n_nodes = tree.node_count
+        is_leaf = tree.children_left == -1
+        own_index = np.arange(n_nodes) + offset
+
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(np.where(is_leaf, 0, tree.threshold).astype(np.float32))
+        lefts.append(np.where(is_leaf, own_index, tree.children_left + offset).astype(np.int32))
+        rights.append(np.where(is_leaf, own_index, tree.children_right + offset).astype(np.int32))
+        values.append(node_values(tree))
+        roots.append(offset)
+
+        max_depth = max(max_depth, tree.max_depth)
+        offset += n_nodes
+
+    threshold = np.concatenate(thresholds)
+    left = np.concatenate(lefts)
+    internal = left != np.arange(offset)
+    arrays = {
+        'feature': np.concatenate(features),
+        'threshold': threshold,
+        'left': left,
+        'right': np.concatenate(rights),
+        'value': np.concatenate(values),
+        'roots': np.asarray(roots, dtype=np.int32)
+    }
+    binary_splits = bool(np.all((threshold[internal] >= 0) & (threshold[internal] < 1)))
+    return arrays, max_depth, binary_splits
+
+
+class CompiledTrees:
+    """Flat node arrays for a tree ensemble; subclasses turn leaves into probabilities"""
+
+    kind = None
+    # Arrays saved alongside ARRAY_NAMES
+    extra_arrays = ()
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, classes, binary_splits):
+        self.feature = feature          # (n_nodes,) int32, 0 at leaves
+        self.threshold = threshold      # (n_nodes,) float32
+        self.left = left                # (n_nodes,) int32, leaves point to themselves
+        self.right = right              # (n_nodes,) int32
+        self.value = value              # per-node outputs, see subclasses
+        self.roots = roots              # (n_trees,) int32
+        self.max_depth = int(max_depth)
+        self.classes_ = np.asarray(classes)
+        # Every split is "x <= t" with 0 <= t < 1, i.e. a test of whether the bit is set
+        self.binary_splits = bool(binary_splits)
+        # Optional sklearn estimator used for large batches
+        self.batch_estimator = None
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def apply(self, X):
+        """Leaf node index per (row, tree)"""
+        X = np.asarray(X)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.repeat(self.roots[None, :], len(X), axis=0)
+        if self.binary_splits:
+            bits = X != 0
+            for _ in range(self.max_depth):
+                nodes = np.where(bits[rows, self.feature[nodes]], self.right[nodes], self.left[nodes])
+        else:
+            for _ in range(self.max_depth):
+                go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+                nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        if self.batch_estimator is not None and len(X) > BATCH_FALLBACK_ROWS:
+            return self.batch_estimator.predict_proba(X)
+        proba = np.empty((len(X), len(self.classes_)))
+        for start in range(0, len(X), CHUNK_ROWS):
+            proba[start:start + CHUNK_ROWS] = self._leaf_probabilities(self.apply(X[start:start + CHUNK_ROWS]))
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def save(self, directory, model_version):
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAY_NAMES + self.extra_arrays:
+            # Replace rather than overwrite: readers may have the old file mapped
+            path = os.path.join(directory, f'{name}.npy')
+            np.save(f'{path}.tmp-{os.getpid()}.npy', getattr(self, name))
+            os.replace(f'{path}.tmp-{os.getpid()}.npy', path)
+        # Written last (and atomically, other workers may be loading): marks
+        # a complete export for this model version
+        meta_path = os.path.join(directory, 'meta.json')
+        with open(f'{meta_path}.tmp-{os.getpid()}', 'w') as f:
+            json.dump({
+                'format_version': COMPILED_FORMAT_VERSION,
+                'kind': self.kind,
+                'model_version': model_version,
+                'n_trees': self.n_trees,
+                'max_depth': self.max_depth,
+                'binary_splits': self.binary_splits,
+                'classes': [str(c) for c in self.classes_]
+            }, f)
+        os.replace(f'{meta_path}.tmp-{os.getpid()}', meta_path)
+
+    @classmethod
+    def load(cls, directory, model_version=None, mmap_mode='r'):
+        """Load an export, or return None if it is missing or for another model version"""
+        meta_path = os.path.join(directory, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta.get('format_version') != COMPILED_FORMAT_VERSION:
+            return None
+        if model_version is not None and meta.get('model_version') != model_version:
+            return None
+        compiled_cls = COMPILED_KINDS[meta['kind']]
+        if not issubclass(compiled_cls, cls):
+            return None
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+                  for name in ARRAY_NAMES + compiled_cls.extra_arrays}
+        return compiled_cls(max_depth=meta['max_depth'], classes=meta['classes'],
+                            binary_splits=meta['binary_splits'], **arrays)
+
+
+class CompiledForest(CompiledTrees):
+    """Flat-array form of a fitted RandomForest / ExtraTrees classifier"""
+
+    kind = 'forest'
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        def class_proportions(tree):
+            node_values = tree.value[:, 0, :]
+            return (node_values / node_values.sum(axis=1, keepdims=True)).astype(np.float32)
+
+        arrays, max_depth, binary_splits = _flatten_trees(
+            [estimator.tree_ for estimator in forest.estimators_], class_proportions)
+        return cls(max_depth=max_depth, classes=forest.classes_, binary_splits=binary_splits, **arrays)
+
+    def _leaf_probabilities(self, leaves):
+        # value: (n_nodes, n_classes) float32 class proportions, averaged over trees
+        return self.value[leaves].mean(axis=1, dtype=np.float64)
+
+
+class CompiledBoosting(CompiledTrees):
+    """
+    Flat-array form of a fitted multiclass GradientBoostingClassifier
+
+    Trees are stored stage-major (one regression tree per class per stage)
+    with the learning rate folded into their leaf values.
+    """
+
+    kind = 'boosting'
+    extra_arrays = ('init_raw',)
+
+    def __init__(self, init_raw, **arrays):
+        super().__init__(**arrays)
+        self.init_raw = init_raw        # (n_classes,) float64 raw scores before the first stage
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Compiled form of model, or None for binary problems or a feature-dependent init"""
+        n_stages, n_classes = model.estimators_.shape
+        if n_classes < 3:
+            return None
+        probe = np.zeros((2, model.n_features_in_))
+        probe[1] = 1
+        init_raw = _initial_raw_scores(model, probe)
+        if init_raw is None or not np.allclose(init_raw[0], init_raw[1]):
+            return None
+
+        learning_rate = model.learning_rate
+        trees = [model.estimators_[stage, k].tree_ for stage in range(n_stages) for k in range(n_classes)]
+        arrays, max_depth, binary_splits = _flatten_trees(
+            trees, lambda tree: tree.value[:, 0, 0] * learning_rate)
+        compiled = cls(init_raw=np.asarray(init_raw[0], dtype=np.float64), max_depth=max_depth,
+                       classes=model.classes_, binary_splits=binary_splits, **arrays)
+        # The init scores come from a private sklearn method: keep the sklearn
+        # path unless the compiled form reproduces the model's probabilities
+        if not np.allclose(compiled.predict_proba(probe), model.predict_proba(probe), atol=1e-9):
+            return None
+        return compiled
+
+    def _leaf_probabilities(self, leaves):
+        n_classes = len(self.classes_)
+        raw = self.value[leaves].reshape(len(leaves), -1, n_classes).sum(axis=1) + self.init_raw
+        # Softmax of the raw scores, as the multinomial loss does
+        raw -= raw.max(axis=1, keepdims=True)
+        np.exp(raw, out=raw)
+        return raw / raw.sum(axis=1, keepdims=True)
+
+
+def _initial_raw_scores(model, X):
+    """Raw scores of a GradientBoostingClassifier before its first stage, or None"""
+    try:
+        return np.asarray(model._raw_predict_init(X), dtype=np.float64)
+    except (AttributeError, TypeError, ValueError):
+        # Private API: gone or changed in this sklearn version
+        return None
+
+
+COMPILED_KINDS = {compiled_cls.kind: compiled_cls for compiled_cls in (CompiledForest, CompiledBoosting)}
+
+
+def compile_trees(model):
+    """Compiled form of a supported tree ensemble, else None"""
+    from sklearn.ensemble import ExtraTreesClassifier, GradientBoostingClassifier, RandomForestClassifier
+
+    if isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)):
+        return CompiledForest.from_sklearn(model)
+    if isinstance(model, GradientBoostingClassifier):
+        return CompiledBoosting.from_sklearn(model)
+    return None
+
+
+def model_fingerprint(model):
+    """Content hash of a fitted tree ensemble: classes, parameters and every tree's arrays"""
+    digest = hashlib.sha256()
+    digest.update(repr([str(c) for c in model.classes_]).encode('utf-8'))
+    digest.update(repr(sorted(model.get_params(deep=False).items())).encode('utf-8'))
+    for estimator in np.ravel(model.estimators_):
+        tree = estimator.tree_
+        for array in (tree.children_left, tree.children_right, tree.feature, tree.threshold, tree.value):
+            digest.update(np.ascontiguousarray(array).tobytes())
+    init = getattr(model, 'init_', None)
+    for name in ('class_prior_', 'classes_'):
+        if hasattr(init, name):
+            digest.update(np.asarray(getattr(init, name)).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def load_or_compile(model, directory, model_version):
+    """
+    Compiled form of a tree ensemble, reusing the export saved for model_version
+
+    Unversioned models (UNVERSIONED) are keyed on model_fingerprint, so a
+    retrained model never picks up another model's export.
+    """
+    if model_version in UNVERSIONED:
+        model_version = f'sha256-{model_fingerprint(model)}'
+    compiled = CompiledTrees.load(directory, model_version)
+    if compiled is None or list(compiled.classes_) != [str(c) for c in model.classes_]:
+        compiled = compile_trees(model)
+        if compiled is None:
+            return None
+        try:
+            compiled.save(directory, model_version)
+        except OSError as e:
+            print(f"Warning: could not persist compiled trees: {e}")
+    compiled.batch_estimator = model
+    return compiled
@@ -0,0 +1,406 @@
+"""
+Background jobs for bulk scoring and retraining
+Features:
+- Persistent SQLite queue shared by every server process on the host
+- Local process pool with a host-wide concurrency bound
+- Progress polling, paged results and cancellation (retraining runs in its own process so it can be stopped)
+- Runner heartbeats: jobs whose server process is gone are requeued, whatever became of its pid
+- Low-priority, single-threaded workers so interactive /predict stays flat
+
+Environment variables:
+    ML_JOBS_DIR          queue database, job inputs and retrained models (default ml-service/.jobs)
+    ML_JOB_CONCURRENCY   jobs running at once across the host (default 1)
+    ML_JOB_NICE          niceness added to job worker processes (default 10)
+"""
+
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+
+DEFAULT_JOBS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.jobs')
+JOB_KINDS = ('batch_predict', 'retrain')
+FINAL_STATUSES = ('succeeded', 'failed', 'cancelled')
+# Rows scored between progress updates / cancellation checks
+CHUNK_ROWS = 1000
+POLL_SECONDS = 0.5
+# Runners refresh their running jobs' heartbeat this often; a running job
+# whose heartbeat is older than ORPHAN_SECONDS has lost its runner
+HEARTBEAT_SECONDS = 5
+ORPHAN_SECONDS = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    runner_pid INTEGER,
+    heartbeat_at REAL,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT NOT NULL,
+    start_row INTEGER NOT NULL,
+    stop_row INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, start_row)
+);
+"""
+
+
+def _now():
+    return datetime.now().isoformat()
+
+
+class JobStore:
+    """SQLite-backed job queue; safe to share between processes"""
+
+    def __init__(self, jobs_dir=None):
+        self.jobs_dir = jobs_dir or os.environ.get('ML_JOBS_DIR', DEFAULT_JOBS_DIR)
+        os.makedirs(os.path.join(self.jobs_dir, 'inputs'), exist_ok=True)
+        self.db_path = os.path.join(self.jobs_dir, 'jobs.sqlite3')
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}
+            if 'heartbeat_at' not in columns:
+                # Queues created before runner heartbeats
+                conn.execute('ALTER TABLE jobs ADD COLUMN heartbeat_at REAL')
+
+    def _connect(self):
+        # Autocommit; multi-statement updates use explicit transactions
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def input_paths(self, job_id):
+        base = os.path.join(self.jobs_dir, 'inputs', job_id)
+        return f'{base}.npy', f'{base}.index.npy'
+
+    def model_dir(self, job_id):
+        return os.path.join(self.jobs_dir, 'models', job_id)
+
+    def submit(self, kind, params=None, symptom_matrix=None, patient_index=None):
+        """Queue a job; batch jobs carry their encoded symptom matrix"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f'Unknown job kind: {kind}')
+        job_id = uuid.uuid4().hex
+        total = 0
+        if symptom_matrix is not None:
+            matrix_path, index_path = self.input_paths(job_id)
+            np.save(matrix_path, np.ascontiguousarray(symptom_matrix, dtype=np.uint8))
+            np.save(index_path, np.asarray(patient_index, dtype=np.int64))
+            total = len(symptom_matrix)
+        with closing(self._connect()) as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, status, params, total, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, kind, 'queued', json.dumps(params or {}), total, _now()))
+        return job_id
+
+    def get(self, job_id):
+        with closing(self._connect()) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._describe(row) if row else None
+
+    def list(self, status=None, limit=50):
+        query = 'SELECT * FROM jobs'
+        args = []
+        if status:
+            query += ' WHERE status = ?'
+            args.append(status)
+        query += ' ORDER BY created_at DESC LIMIT ?'
+        args.append(limit)
+        with closing(self._connect()) as conn:
+            conn.row_factory = sqlite3.Row
+            return [self._describe(row) for row in conn.execute(query, args)]
+
+    @staticmethod
+    def _describe(row):
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        job['progress'] = job['done'] / job['total'] if job['total'] else (1.0 if job['status'] == 'succeeded' else 0.0)
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a queued job now, or flag a running one to stop at its next check"""
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                conn.execute('ROLLBACK')
+                return None
+            if row[0] == 'queued':
+                conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ?", (_now(), job_id))
+            elif row[0] == 'running':
+                conn.execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ?', (job_id,))
+            conn.execute('COMMIT')
+        return self.get(job_id)
+
+    def claim(self, max_running):
+        """Atomically move the oldest queued job to running, if under the host-wide bound"""
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            running = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+            row = None
+            if running < max_running:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = 'running', runner_pid = ?, heartbeat_at = ?, started_at = ? "
+                             "WHERE id = ?", (os.getpid(), time.time(), _now(), row[0]))
+            conn.execute('COMMIT')
+        return row[0] if row else None
+
+    def heartbeat(self, job_ids):
+        """Mark jobs as still owned by a live runner"""
+        if not job_ids:
+            return
+        with closing(self._connect()) as conn:
+            conn.executemany('UPDATE jobs SET heartbeat_at = ? WHERE id = ?',
+                             [(time.time(), job_id) for job_id in job_ids])
+
+    def requeue_orphans(self, max_age=ORPHAN_SECONDS):
+        """
+        Put back running jobs whose runner stopped sending heartbeats
+
+        The heartbeat, not the runner's pid, decides: after a restart the
+        old pids are usually reused by the new server processes.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute("SELECT id FROM jobs WHERE status = 'running' "
+                                "AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                                (time.time() - max_age,)).fetchall()
+            for (job_id,) in rows:
+                conn.execute("UPDATE jobs SET status = 'queued', runner_pid = NULL, heartbeat_at = NULL, done = 0 "
+                             "WHERE id = ?", (job_id,))
+                conn.execute('DELETE FROM job_results WHERE job_id = ?', (job_id,))
+            conn.execute('COMMIT')
+        return [job_id for (job_id,) in rows]
+
+    def record_progress(self, job_id, done, start_row=None, data=None):
+        """Store one results chunk and the rows done; returns True if cancellation was requested"""
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if data is not None:
+                conn.execute('INSERT OR REPLACE INTO job_results VALUES (?, ?, ?, ?)',
+                             (job_id, start_row, done, json.dumps(data)))
+            conn.execute('UPDATE jobs SET done = ? WHERE id = ?', (done, job_id))
+            cancel = conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()[0]
+            conn.execute('COMMIT')
+        return bool(cancel)
+
+    def finish(self, job_id, status, result=None, error=None):
+        with closing(self._connect()) as conn:
+            conn.execute('UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?',
+                         (status, json.dumps(result) if result is not None else None, error, _now(), job_id))
+
+    def results(self, job_id, offset=0, limit=500):
+        """Columnar batch results for rows [offset, offset + limit) that are done"""
+        with closing(self._connect()) as conn:
+            chunks = conn.execute(
+                'SELECT start_row, data FROM job_results WHERE job_id = ? AND stop_row > ? AND start_row < ? '
+                'ORDER BY start_row', (job_id, offset, offset + limit)).fetchall()
+        page = {'patient_index': [], 'top_indices': [], 'top_probabilities': []}
+        for start_row, data in chunks:
+            data = json.loads(data)
+            lo = max(offset - start_row, 0)
+            hi = offset + limit - start_row
+            for key in page:
+                page[key].extend(data[key][lo:hi])
+        return page
+
+
+# ---------------------------------------------------------------------------
+# Worker side (runs inside the pool processes)
+# ---------------------------------------------------------------------------
+
+_worker_predictor = None
+_worker_settings = None
+
+
+def _init_worker(predictor_settings, nice):
+    global _worker_settings
+    _worker_settings = predictor_settings
+    if nice and hasattr(os, 'nice'):
+        os.nice(nice)
+    # One thread per job worker; the serving workers keep the rest of the CPU
+    from serving_config import ServingConfig
+    ServingConfig(estimator_jobs=1, native_threads=1).apply()
+
+
+def _get_worker_predictor(model_dir=None):
+    """Predictor for model_dir (the one served when the job was submitted), kept between jobs"""
+    global _worker_predictor
+    if _worker_predictor is None or (
+            model_dir is not None and os.path.abspath(model_dir) != os.path.abspath(_worker_predictor.model_dir)):
+        from disease_predictor import DiseasePredictor
+        settings = _worker_settings if model_dir is None else dict(_worker_settings, model_dir=model_dir)
+        _worker_predictor = DiseasePredictor(**settings)
+    return _worker_predictor
+
+
+def execute_job(jobs_dir, job_id):
+    """Run one claimed job to completion; returns its final status"""
+    store = JobStore(jobs_dir)
+    job = store.get(job_id)
+    try:
+        if job['kind'] == 'batch_predict':
+            status, result = _run_batch_predict(store, job)
+        else:
+            status, result = _run_retrain(store, job)
+        store.finish(job_id, status, result=result)
+        return status
+    except Exception as e:
+        store.finish(job_id, 'failed', error=str(e))
+        return 'failed'
+
+
+def _run_batch_predict(store, job):
+    predictor = _get_worker_predictor(job['params'].get('model_dir'))
+    matrix_path, index_path = store.input_paths(job['id'])
+    symptom_matrix = np.load(matrix_path, mmap_mode='r')
+    patient_index = np.load(index_path)
+    params = job['params']
+    for start in range(0, len(symptom_matrix), CHUNK_ROWS):
+        stop = min(start + CHUNK_ROWS, len(symptom_matrix))
+        result = predictor.predict_matrix(np.asarray(symptom_matrix[start:stop]),
+                                          profile=params.get('profile'), top_k=params.get('top_k', 5))
+        chunk = {
+            'patient_index': patient_index[start:stop].tolist(),
+            'top_indices': result['top_indices'].tolist(),
+            'top_probabilities': result['top_probabilities'].tolist()
+        }
+        if store.record_progress(job['id'], stop, start_row=start, data=chunk):
+            return 'cancelled', None
+    catalog = predictor.class_catalog()
+    return 'succeeded', {'rows': len(symptom_matrix), 'model_version': catalog['version'],
+                         'classes_etag': catalog['etag']}
+
+
+def _retrain_process(settings):
+    from serving_config import ServingConfig
+    ServingConfig(estimator_jobs=1, native_threads=1).apply()
+    from disease_predictor import DiseasePredictor
+    DiseasePredictor(**settings)
+
+
+def _run_retrain(store, job):
+    # Trains from scratch into a fresh directory; serving models are untouched.
+    # The fit runs in a child process so a cancel stops it instead of waiting
+    # for the whole training run
+    model_dir = store.model_dir(job['id'])
+    settings = dict(_worker_settings, model_dir=model_dir)
+    process = multiprocessing.get_context('spawn').Process(target=_retrain_process, args=(settings,),
+                                                           name=f"retrain-{job['id']}")
+    process.start()
+    while process.is_alive():
+        process.join(POLL_SECONDS)
+        if process.is_alive() and store.get(job['id'])['cancel_requested']:
+            process.terminate()
+            process.join()
+            shutil.rmtree(model_dir, ignore_errors=True)
+            return 'cancelled', None
+    if process.exitcode != 0:
+        raise RuntimeError(f'Retrain process exited with code {process.exitcode}')
+    with open(os.path.join(model_dir, 'metadata.json'), 'r') as f:
+        metadata = json.load(f)
+    return 'succeeded', {'model_dir': os.path.abspath(model_dir), 'model_version': metadata.get('version'),
+                         'performance': metadata.get('performance', {})}
+
+
+# ---------------------------------------------------------------------------
+# Runner (lives in each server process)
+# ---------------------------------------------------------------------------
+
+class JobRunner:
+    """Claims queued jobs and runs them on a local process pool"""
+
+    def __init__(self, store, predictor_settings, concurrency=None, nice=None):
+        self.store = store
+        self.concurrency = concurrency or int(os.environ.get('ML_JOB_CONCURRENCY', '1'))
+        nice = int(os.environ.get('ML_JOB_NICE', '10')) if nice is None else nice
+        # spawn: never fork the server's threads and sockets into job workers
+        self.pool = ProcessPoolExecutor(max_workers=self.concurrency,
+                                        mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_init_worker, initargs=(predictor_settings, nice))
+        self._active = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._last_heartbeat = time.monotonic()
+        self.store.requeue_orphans()
+        self._thread = threading.Thread(target=self._loop, name='job-runner', daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stopped:
+            if time.monotonic() - self._last_heartbeat >= HEARTBEAT_SECONDS:
+                with self._lock:
+                    active = list(self._active)
+                self.store.heartbeat(active)
+                self.store.requeue_orphans()
+                self._last_heartbeat = time.monotonic()
+            with self._lock:
+                free = self.concurrency - len(self._active)
+            while free > 0:
+                job_id = self.store.claim(self.concurrency)
+                if job_id is None:
+                    break
+                self._start(job_id)
+                free -= 1
+            self._wake.wait(POLL_SECONDS)
+            self._wake.clear()
+
+    def _start(self, job_id):
+        with self._lock:
+            self._active.add(job_id)
+        future = self.pool.submit(execute_job, self.store.jobs_dir, job_id)
+        future.add_done_callback(lambda f, job_id=job_id: self._done(job_id, f))
+
+    def _done(self, job_id, future):
+        with self._lock:
+            self._active.discard(job_id)
+        error = future.exception()
+        if error is not None:
+            # The worker process died before it could record an outcome
+            self.store.finish(job_id, 'failed', error=str(error))
+        self.wake()
+
+    def shutdown(self, wait=True):
+        self._stopped = True
+        self.wake()
+        self.pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def wait_for(store, job_id, timeout=60.0):
+    """Poll until a job reaches a final status (scripts and tests)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = store.get(job_id)
+        if job['status'] in FINAL_STATUSES:
+            return job
+        time.sleep(0.1)
+    raise TimeoutError(f'Job {job_id} did not finish within {timeout}s')
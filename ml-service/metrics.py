@@ -0,0 +1,233 @@
+"""
+Prometheus-style metrics for the ml-service
+Features:
+- Request, error and latency metrics per endpoint
+- Per-stage timing inside the prediction path
+- /metrics endpoint in the Prometheus text exposition format
+
+Set ML_METRICS_ENABLED=false to turn everything into no-ops.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+
+ENABLED = os.environ.get('ML_METRICS_ENABLED', 'true').lower() == 'true'
+
+# Seconds; tuned for sub-millisecond stages up to multi-second batch calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """Monotonic counter keyed by label values"""
+
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, dict(zip(self.labelnames, labels)), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (plus +Inf), running sum
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def total(self, *labels):
+        series = self._series.get(labels)
+        return series[1] if series else 0.0
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in items:
+            base = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket', dict(base, le=_format_bound(bound)), cumulative
+            yield f'{self.name}_sum', base, total
+            yield f'{self.name}_count', base, cumulative
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+REGISTRY = MetricsRegistry()
+
+REQUESTS = REGISTRY.counter(
+    'ml_http_requests_total', 'HTTP requests handled', ('endpoint', 'method', 'status'))
+ERRORS = REGISTRY.counter(
+    'ml_http_errors_total', 'HTTP responses with a 4xx/5xx status', ('endpoint', 'status'))
+REQUEST_LATENCY = REGISTRY.histogram(
+    'ml_http_request_duration_seconds', 'HTTP request latency', ('endpoint',))
+STAGE_LATENCY = REGISTRY.histogram(
+    'ml_stage_duration_seconds', 'Latency of prediction pipeline stages', ('stage', 'model'))
+CASCADE_ROWS = REGISTRY.counter(
+    'ml_cascade_rows_total', 'Rows answered by each tier of the cascade profile', ('tier',))
+PATTERN_TABLE_ROWS = REGISTRY.counter(
+    'ml_pattern_table_rows_total', 'Rows looked up in the exact-match pattern table', ('result',))
+PREDICTION_LOG_ROWS = REGISTRY.counter(
+    'ml_prediction_log_rows_total', 'Served prediction rows written to (or dropped from) the prediction log',
+    ('outcome',))
+
+
+class _StageTimer:
+    __slots__ = ('stage', 'model', 'start')
+
+    def __init__(self, stage, model):
+        self.stage = stage
+        self.model = model
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        STAGE_LATENCY.observe(time.perf_counter() - self.start, self.stage, self.model)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def stage(name, model=''):
+    """Context manager timing one pipeline stage (a shared no-op when disabled)"""
+    if not ENABLED:
+        return _NULL_TIMER
+    return _StageTimer(name, model)
+
+
+def _endpoint_label():
+    from flask import request
+    # Route templates keep the label set bounded (no raw paths or IDs)
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def _start_timer():
+    from flask import g
+    g._metrics_start = time.perf_counter()
+
+
+def _record_request(response):
+    from flask import g, request
+    start = getattr(g, '_metrics_start', None)
+    if start is None:
+        return response
+    endpoint = _endpoint_label()
+    if endpoint == '/metrics':
+        return response
+    status = str(response.status_code)
+    REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint)
+    REQUESTS.inc(endpoint, request.method, status)
+    if response.status_code >= 400:
+        ERRORS.inc(endpoint, status)
+    return response
+
+
+def metrics_endpoint():
+    """Expose all metrics in the Prometheus text format"""
+    from flask import Response
+    body = REGISTRY.render() if ENABLED else '# metrics disabled\n'
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+def instrument_app(app):
+    """Add request metrics hooks and the /metrics route to a Flask app"""
+    if ENABLED:
+        app.before_request(_start_timer)
+        app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint, methods=['GET'])
+    return app
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Shared model bundle for multi-worker serving
+Features:
+- One loader process exports the voting ensemble into models/bundle/<version>/
+- Tree ensembles stored as flat .npy node arrays, the SVC / MLP members as joblib pickles
+- Workers memory-map the bundle: the page cache holds one copy of the model arrays for all workers
+- Class and symptom tables stored with the bundle
+- Per-process RSS / PSS from /proc/<pid>/smaps_rollup
+- Workers lease the version they attach to; only unleased old bundles are removed
+
+Usage:
+    python model_bundle.py --model-dir models
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import joblib
+import numpy as np
+
+from forest_inference import CompiledTrees, compile_trees
+
+BUNDLE_FORMAT_VERSION = 1
+# Copy-on-write maps: libsvm needs writable buffers but never writes to them
+PICKLE_MMAP_MODE = 'c'
+# One file per serving process, naming the bundle version it maps
+LEASE_DIR = '.leases'
+
+
+class SharedVotingEnsemble:
+    """Soft-vote ensemble over memory-mapped members, in place of VotingClassifier"""
+
+    voting = 'soft'
+
+    def __init__(self, named_estimators, weights, classes):
+        self.named_estimators_ = dict(named_estimators)
+        self.estimators_ = list(self.named_estimators_.values())
+        self.weights = weights
+        self.classes_ = np.asarray(classes, dtype=object)
+
+    def predict_proba(self, X):
+        return np.average([model.predict_proba(X) for model in self.estimators_], axis=0, weights=self.weights)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def bundle_path(model_dir, model_version):
+    return os.path.join(model_dir, 'bundle', model_version)
+
+
+def _read_meta(directory):
+    meta_path = os.path.join(directory, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r') as f:
+        meta = json.load(f)
+    return meta if meta.get('format_version') == BUNDLE_FORMAT_VERSION else None
+
+
+def build_bundle(model_dir, model_version):
+    """Export the saved models of model_dir into the bundle for model_version"""
+    directory = bundle_path(model_dir, model_version)
+    staging = f'{directory}.tmp-{os.getpid()}'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    voting = joblib.load(os.path.join(model_dir, 'voting_ensemble.pkl'))
+    members = []
+    for key, model in voting.named_estimators_.items():
+        compiled = compile_trees(model)
+        if compiled is not None:
+            compiled.save(os.path.join(staging, key), model_version)
+            members.append({'key': key, 'format': 'compiled'})
+        else:
+            joblib.dump(model, os.path.join(staging, f'{key}.pkl'))
+            members.append({'key': key, 'format': 'pickle'})
+    shutil.copy(os.path.join(model_dir, 'feature_selector.pkl'), os.path.join(staging, 'feature_selector.pkl'))
+
+    symptom_columns_file = os.path.join(model_dir, 'symptom_columns.pkl')
+    symptom_columns = joblib.load(symptom_columns_file) if os.path.exists(symptom_columns_file) else None
+    with open(os.path.join(staging, 'meta.json'), 'w') as f:
+        json.dump({
+            'format_version': BUNDLE_FORMAT_VERSION,
+            'model_version': model_version,
+            'members': members,
+            'weights': voting.weights,
+            'classes': [str(c) for c in voting.classes_],
+            'symptom_columns': None if symptom_columns is None else list(symptom_columns)
+        }, f)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.rename(staging, directory)
+    _remove_stale_bundles(model_dir, model_version)
+    return directory
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def lease_bundle(model_dir, model_version):
+    """Record that this process maps model_version (replacing its previous lease)"""
+    directory = os.path.join(model_dir, 'bundle', LEASE_DIR)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, str(os.getpid()))
+    with open(f'{path}.tmp', 'w') as f:
+        f.write(model_version)
+    os.replace(f'{path}.tmp', path)
+
+
+def leased_versions(model_dir):
+    """Bundle versions leased by live processes; leases of exited ones are dropped"""
+    directory = os.path.join(model_dir, 'bundle', LEASE_DIR)
+    versions = set()
+    if not os.path.isdir(directory):
+        return versions
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not name.isdigit():
+            continue
+        if not _pid_alive(int(name)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        try:
+            with open(path, 'r') as f:
+                versions.add(f.read())
+        except FileNotFoundError:
+            continue
+    return versions
+
+
+def _remove_stale_bundles(model_dir, model_version):
+    # Runs under the bundle lock; a bundle another worker still leases stays until it moves on
+    keep = leased_versions(model_dir) | {model_version}
+    root = os.path.join(model_dir, 'bundle')
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name not in keep and os.path.isdir(path) and _read_meta(path) is not None:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def ensure_bundle(model_dir, model_version):
+    """
+    Bundle directory for model_version, building it if needed
+
+    The first worker to arrive builds the bundle in a separate loader process
+    (so the unpickled models never live in a serving worker); the others wait
+    on the lock and attach to the result. The calling process leases the
+    version so later builds leave it in place while it is still mapped.
+    """
+    import fcntl
+
+    directory = bundle_path(model_dir, model_version)
+    # Lease before looking: a concurrent cleanup either sees it or has already finished
+    lease_bundle(model_dir, model_version)
+    meta = _read_meta(directory)
+    if meta is not None and meta['model_version'] == model_version:
+        return directory
+
+    with open(os.path.join(os.path.dirname(directory), '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        meta = _read_meta(directory)
+        if meta is None or meta['model_version'] != model_version:
+            print(f"Building shared model bundle for version {model_version}...")
+            loader = subprocess.run([sys.executable, os.path.abspath(__file__), '--model-dir', model_dir,
+                                     '--build-version', model_version])
+            if loader.returncode != 0:
+                raise RuntimeError(f"Model bundle loader exited with code {loader.returncode}")
+    return directory
+
+
+def load_bundle(directory):
+    """(SharedVotingEnsemble, feature selector, symptom columns) attached to a bundle"""
+    meta = _read_meta(directory)
+    if meta is None:
+        raise FileNotFoundError(f"No model bundle in {directory}")
+    members = {}
+    for member in meta['members']:
+        key = member['key']
+        if member['format'] == 'compiled':
+            members[key] = CompiledTrees.load(os.path.join(directory, key), meta['model_version'])
+        else:
+            members[key] = joblib.load(os.path.join(directory, f'{key}.pkl'), mmap_mode=PICKLE_MMAP_MODE)
+    voting = SharedVotingEnsemble(members, meta['weights'], meta['classes'])
+    feature_selector = joblib.load(os.path.join(directory, 'feature_selector.pkl'))
+    return voting, feature_selector, meta['symptom_columns']
+
+
+def memory_usage(pid=None):
+    """Resident and proportional set size of a process in MB (None where /proc is unavailable)"""
+    path = f'/proc/{pid or os.getpid()}/smaps_rollup'
+    if not os.path.exists(path):
+        return None
+    fields = {}
+    with open(path, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'rss_mb': round(fields.get('Rss', 0.0), 1),
+        'pss_mb': round(fields.get('Pss', 0.0), 1),
+        'shared_mb': round(fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the shared model bundle for the saved models')
+    parser.add_argument('--model-dir', default='models')
+    # Used by ensure_bundle's loader process, which already holds the lock
+    parser.add_argument('--build-version', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.build_version:
+        build_bundle(args.model_dir, args.build_version)
+        return
+    with open(os.path.join(args.model_dir, 'metadata.json'), 'r') as f:
+        model_version = json.load(f).get('version', 'unknown')
+    print(ensure_bundle(args.model_dir, model_version))
+
+
+if __name__ == '__main__':
+    main()
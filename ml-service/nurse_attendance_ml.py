@@ -2,33 +2,62 @@
 ML-Powered Nurse Attendance Management System
 Features:
 - Attendance pattern prediction
-- Absence risk prediction
-- Optimal shift scheduling
+- Absence risk prediction (calibrated on out-of-fold scores)
+- Optimal shift scheduling, and what-if simulation of schedules (schedule_simulation)
 - Workload balancing
 - Anomaly detection
+- Real-time event ingestion with incremental aggregates and alerts (attendance_stream),
+  served only by a single-worker process (the endpoints answer 503 when ML_WORKERS > 1)
+- Flask blueprint mounted by the main service (app.py); sklearn estimators are
+  imported when a model is first trained or loaded, not at import
+
+Environment variables:
+    ML_ATTENDANCE_MODEL_DIR  absence model files (default: ML_MODEL_DIR, else models)
 """
 
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingRegressor
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
+from calibration import CalibrationTable
+from attendance_stream import (ABSENCE_ALERT_RATE, EXCESSIVE_BREAKS, LATE_ALERT_RATE, LONG_SHIFT_HOURS,
+                               SHORT_SHIFT_HOURS, StreamOwnershipError, StreamProcessor)
+from schedule_simulation import (DEFAULT_DRAWS, DEFAULT_REQUIRED, SHIFTS, SimulationBusyError,
+                                 SimulationRequestError, pool_size, rank_shift, shift_factors,
+                                 shift_score_matrix, simulate_schedules)
 import joblib
 import json
+import os
+
+# Weekly hour thresholds used by the workload analyses
+OVERWORKED_HOURS = 45
+UNDERUTILIZED_HOURS = 30
+WORKLOAD_PERCENTILES = (10, 25, 50, 75, 90)
+# Risk level cut-offs on the (calibrated) absence probability
+HIGH_RISK = 0.7
+MEDIUM_RISK = 0.4
+# Per-chunk workload aggregates are merged once they outgrow the merged total
+# this many times over (keeps the fold linear in the number of events)
+WEEKLY_MERGE_FACTOR = 2
+# Out-of-fold predictions the absence calibration is fitted on
+CALIBRATION_FOLDS = 3
+# Nurse payloads whose absence risk is remembered between schedule requests
+RISK_CACHE_SIZE = 10000
 
 class NurseAttendanceML:
-    def __init__(self):
+    def __init__(self, model_dir='models'):
+        self.model_dir = model_dir
         self.absence_predictor = None
+        self.absence_calibration = None
+        self._risk_cache = {}
         self.workload_predictor = None
-        self.scaler = StandardScaler()
+        self.scaler = None
         self.shift_optimizer = None
         
     def prepare_features(self, attendance_data):
         """
         Prepare features from attendance data
         """
-        df = pd.DataFrame(attendance_data)
+        df = self._attendance_frame(attendance_data)
         
         features = {
             'day_of_week': df['date'].dt.dayofweek,
@@ -44,6 +73,13 @@ class NurseAttendanceML:
         
         return pd.DataFrame(features)
     
+    def _attendance_frame(self, attendance_data):
+        """DataFrame of attendance records with 'date' parsed (JSON payloads send strings)"""
+        df = pd.DataFrame(attendance_data)
+        if 'date' in df and not pd.api.types.is_datetime64_any_dtype(df['date']):
+            df['date'] = pd.to_datetime(df['date'])
+        return df
+    
     def _calculate_previous_absences(self, df):
         """Calculate number of absences in last 30 days"""
         absences = []
@@ -101,10 +137,14 @@ class NurseAttendanceML:
         """
         Train model to predict absence probability
         """
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.preprocessing import StandardScaler
+        
         features = self.prepare_features(historical_data)
         labels = (historical_data['status'] == 'Absent').astype(int)
         
         # Scale features
+        self.scaler = StandardScaler()
         features_scaled = self.scaler.fit_transform(features)
         
         # Train Random Forest
@@ -114,49 +154,108 @@ class NurseAttendanceML:
             random_state=42
         )
         self.absence_predictor.fit(features_scaled, labels)
+        calibration = self._calibrate_absence_risk(features_scaled, labels)
+        self._risk_cache = {}
         
         # Save model
-        joblib.dump(self.absence_predictor, 'models/absence_predictor.pkl')
-        joblib.dump(self.scaler, 'models/scaler.pkl')
+        calibration_path = os.path.join(self.model_dir, 'absence_calibration.json')
+        joblib.dump(self.absence_predictor, os.path.join(self.model_dir, 'absence_predictor.pkl'))
+        joblib.dump(self.scaler, os.path.join(self.model_dir, 'scaler.pkl'))
+        if calibration is not None:
+            with open(calibration_path, 'w') as f:
+                json.dump(calibration, f, indent=2)
+        elif os.path.exists(calibration_path):
+            # A table from an earlier model would not match this one
+            os.remove(calibration_path)
         
         return {
             'accuracy': self.absence_predictor.score(features_scaled, labels),
             'feature_importance': dict(zip(features.columns, 
-                                          self.absence_predictor.feature_importances_))
+                                          self.absence_predictor.feature_importances_)),
+            'calibration': calibration
         }
     
+    def _calibrate_absence_risk(self, features_scaled, labels):
+        """
+        Fit the absence probability calibration on out-of-fold forest scores
+        
+        Returns the calibration report (table, reliability before/after,
+        threshold table), or None when a class is too rare to hold out.
+        """
+        from calibration import calibration_report
+        from sklearn.base import clone
+        from sklearn.model_selection import cross_val_predict
+        
+        folds = min(CALIBRATION_FOLDS, int(np.bincount(labels, minlength=2).min()))
+        if folds < 2:
+            self.absence_calibration = None
+            return None
+        held_out = cross_val_predict(clone(self.absence_predictor), features_scaled, labels,
+                                     cv=folds, method='predict_proba')[:, 1]
+        self.absence_calibration, report = calibration_report(held_out, labels)
+        return report
+    
     def predict_absence_risk(self, nurse_data):
         """
         Predict probability of absence for a nurse
         Returns: risk score (0-1) and risk level
         """
         if not self.absence_predictor:
-            self.absence_predictor = joblib.load('models/absence_predictor.pkl')
-            self.scaler = joblib.load('models/scaler.pkl')
+            calibration_path = os.path.join(self.model_dir, 'absence_calibration.json')
+            self.absence_predictor = joblib.load(os.path.join(self.model_dir, 'absence_predictor.pkl'))
+            self.scaler = joblib.load(os.path.join(self.model_dir, 'scaler.pkl'))
+            if os.path.exists(calibration_path):
+                with open(calibration_path, 'r') as f:
+                    self.absence_calibration = CalibrationTable.from_dict(json.load(f)['table'])
+            serving_config.apply(self.absence_predictor)
         
         features = self.prepare_features([nurse_data])
         features_scaled = self.scaler.transform(features)
         
-        risk_score = self.absence_predictor.predict_proba(features_scaled)[0][1]
+        raw_score = self.absence_predictor.predict_proba(features_scaled)[0][1]
+        risk_score = raw_score
+        if self.absence_calibration is not None:
+            risk_score = self.absence_calibration.apply(raw_score)
         
-        if risk_score > 0.7:
+        if risk_score > HIGH_RISK:
             risk_level = 'High'
-        elif risk_score > 0.4:
+        elif risk_score > MEDIUM_RISK:
             risk_level = 'Medium'
         else:
             risk_level = 'Low'
         
         return {
             'risk_score': float(risk_score),
+            'raw_score': float(raw_score),
+            'calibrated': self.absence_calibration is not None,
             'risk_level': risk_level,
             'recommendations': self._generate_recommendations(risk_score, nurse_data)
         }
     
+    def absence_risks(self, nurses_data):
+        """
+        Absence risk score per nurse, in order
+        
+        Scores are cached by the nurse's payload, so rosters re-sent with small
+        changes (or many scenarios over one roster) only score new nurses.
+        """
+        risks = np.empty(len(nurses_data))
+        for i, nurse in enumerate(nurses_data):
+            key = json.dumps(nurse, sort_keys=True, default=str)
+            risk = self._risk_cache.get(key)
+            if risk is None:
+                risk = self.predict_absence_risk(nurse)['risk_score']
+                if len(self._risk_cache) >= RISK_CACHE_SIZE:
+                    self._risk_cache.pop(next(iter(self._risk_cache)))
+                self._risk_cache[key] = risk
+            risks[i] = risk
+        return risks
+    
     def _generate_recommendations(self, risk_score, nurse_data):
         """Generate recommendations based on risk score"""
         recommendations = []
         
-        if risk_score > 0.7:
+        if risk_score > HIGH_RISK:
             recommendations.append("High absence risk detected. Consider backup staffing.")
             recommendations.append("Schedule wellness check-in with nurse.")
         
@@ -182,70 +281,44 @@ class NurseAttendanceML:
         Returns:
             Optimized schedule
         """
-        schedule = {
-            'Morning': [],
-            'Evening': [],
-            'Night': []
-        }
-        
-        # Calculate nurse scores for each shift
-        for nurse in nurses_data:
-            nurse_id = nurse['id']
-            
-            # Factors to consider:
-            # 1. Absence risk
-            # 2. Recent hours worked
-            # 3. Shift preferences
-            # 4. Consecutive days
-            # 5. Last shift type
-            
-            absence_risk = self.predict_absence_risk(nurse)['risk_score']
-            recent_hours = nurse.get('hours_worked_week', 0)
-            consecutive_days = nurse.get('consecutive_days', 0)
-            
-            # Calculate suitability score for each shift
-            for shift in ['Morning', 'Evening', 'Night']:
-                score = 1.0
-                
-                # Penalize high absence risk
-                score *= (1 - absence_risk)
-                
-                # Penalize overworked nurses
-                if recent_hours > 40:
-                    score *= 0.7
-                
-                # Penalize too many consecutive days
-                if consecutive_days > 5:
-                    score *= 0.6
-                
-                # Prefer nurse's preferred shift
-                if nurse.get('preferred_shift') == shift:
-                    score *= 1.3
-                
-                # Avoid same shift repeatedly
-                if nurse.get('last_shift') == shift:
-                    score *= 0.8
-                
-                schedule[shift].append({
-                    'nurse_id': nurse_id,
-                    'name': nurse['name'],
-                    'score': score,
-                    'absence_risk': absence_risk
-                })
+        # Factors considered per nurse and shift: absence risk, recent hours
+        # worked, consecutive days, shift preference and last shift type
+        risks = self.absence_risks(nurses_data)
+        scores = shift_score_matrix(shift_factors(nurses_data), risks)
         
-        # Sort and select top nurses for each shift
+        # Select the top nurses for each shift
         optimized_schedule = {}
-        for shift, nurses in schedule.items():
-            sorted_nurses = sorted(nurses, key=lambda x: x['score'], reverse=True)
-            required_count = requirements.get(shift, 3)
-            optimized_schedule[shift] = sorted_nurses[:required_count]
+        for column, shift in enumerate(SHIFTS):
+            required_count = requirements.get(shift, DEFAULT_REQUIRED)
+            optimized_schedule[shift] = [
+                {
+                    'nurse_id': nurses_data[i]['id'],
+                    'name': nurses_data[i]['name'],
+                    'score': float(scores[i, column]),
+                    'absence_risk': float(risks[i])
+                }
+                for i in rank_shift(scores[:, column], required_count)
+            ]
         
         return optimized_schedule
     
+    def simulate_schedules(self, nurses_data, scenarios, draws=None, seed=0, workers=None):
+        """
+        Evaluate what-if scenarios over one roster
+        
+        Each scenario (requirements, absence_multiplier, absence_increase,
+        removed_nurses) gets its schedule and Monte Carlo coverage shortfall
+        probabilities; absence risks are predicted once for all of them.
+        """
+        return simulate_schedules(self, nurses_data, scenarios, draws=DEFAULT_DRAWS if draws is None else draws,
+                                  seed=seed, workers=pool_size(serving_config) if workers is None else workers)
+    
     def detect_attendance_anomalies(self, attendance_records):
         """
         Detect unusual attendance patterns using clustering
         """
+        from sklearn.cluster import KMeans
+        
         features = self.prepare_features(attendance_records)
         
         # Use KMeans to find anomalies
@@ -277,13 +350,13 @@ class NurseAttendanceML:
         """Identify why a record is anomalous"""
         reasons = []
         
-        if record.get('totalHours', 0) > 12:
+        if record.get('totalHours', 0) > LONG_SHIFT_HOURS:
             reasons.append("Unusually long shift")
         
-        if record.get('totalHours', 0) < 2:
+        if record.get('totalHours', 0) < SHORT_SHIFT_HOURS:
             reasons.append("Unusually short shift")
         
-        if len(record.get('breaks', [])) > 5:
+        if len(record.get('breaks', [])) > EXCESSIVE_BREAKS:
             reasons.append("Excessive breaks")
         
         if record.get('status') == 'Late' and record.get('late_arrivals', 0) == 0:
@@ -296,7 +369,7 @@ class NurseAttendanceML:
         Predict staffing needs for upcoming days
         """
         # Analyze historical patterns
-        df = pd.DataFrame(historical_data)
+        df = self._attendance_frame(historical_data)
         
         predictions = []
         for day in range(forecast_days):
@@ -310,6 +383,9 @@ class NurseAttendanceML:
             same_day_data = df[df['date'].dt.dayofweek == day_of_week]
             avg_present = same_day_data[same_day_data['status'] == 'Present'].groupby('date').size().mean()
             avg_absent = same_day_data[same_day_data['status'] == 'Absent'].groupby('date').size().mean()
+            # Days without any matching history count as zero
+            avg_present = np.nan_to_num(avg_present)
+            avg_absent = np.nan_to_num(avg_absent)
             
             # Adjust for trends
             if is_weekend:
@@ -326,53 +402,275 @@ class NurseAttendanceML:
         
         return predictions
     
-    def analyze_workload_balance(self, nurses_data):
+    def analyze_workload_balance(self, nurses_data, overworked_hours=OVERWORKED_HOURS,
+                                 underutilized_hours=UNDERUTILIZED_HOURS):
         """
         Analyze workload distribution among nurses
+        
+        One entry per roster row, as before; analyze_workload_distribution
+        is the aggregated (per-nurse, per-unit) view.
         """
         df = pd.DataFrame(nurses_data)
+        hours = pd.to_numeric(df['totalHours'], errors='coerce')
+        stats = self._distribution_stats(hours.dropna().to_numpy(dtype='float64'))
         
         analysis = {
-            'total_nurses': len(df),
-            'avg_hours_per_nurse': df['totalHours'].mean(),
-            'std_hours': df['totalHours'].std(),
-            'max_hours': df['totalHours'].max(),
-            'min_hours': df['totalHours'].min(),
+            'total_nurses': stats['count'],
+            'avg_hours_per_nurse': stats['mean'],
+            'std_hours': stats['std'],
+            'max_hours': stats['max'],
+            'min_hours': stats['min'],
             'overworked_nurses': [],
             'underutilized_nurses': [],
             'balance_score': 0
         }
         
-        # Identify overworked nurses (>45 hours/week)
-        overworked = df[df['totalHours'] > 45]
+        # Identify overworked nurses (>45 hours/week by default)
+        overworked = df[hours > overworked_hours]
         analysis['overworked_nurses'] = overworked[['nurse_id', 'name', 'totalHours']].to_dict('records')
         
-        # Identify underutilized nurses (<30 hours/week)
-        underutilized = df[df['totalHours'] < 30]
+        # Identify underutilized nurses (<30 hours/week by default)
+        underutilized = df[hours < underutilized_hours]
         analysis['underutilized_nurses'] = underutilized[['nurse_id', 'name', 'totalHours']].to_dict('records')
         
         # Calculate balance score (0-100, higher is better)
         # Lower standard deviation = better balance
-        max_std = 20  # Maximum expected std
-        balance_score = max(0, 100 - (analysis['std_hours'] / max_std * 100))
-        analysis['balance_score'] = round(balance_score, 2)
+        balance_score = self._balance_score(stats['std'])
+        analysis['balance_score'] = balance_score
         
         # Recommendations
-        analysis['recommendations'] = []
-        if balance_score < 70:
-            analysis['recommendations'].append("Workload imbalance detected. Redistribute shifts.")
-        if len(overworked) > 0:
-            analysis['recommendations'].append(f"{len(overworked)} nurses are overworked. Reduce their hours.")
-        if len(underutilized) > 0:
-            analysis['recommendations'].append(f"{len(underutilized)} nurses are underutilized. Assign more shifts.")
+        analysis['recommendations'] = self._workload_recommendations(
+            balance_score, len(overworked), len(underutilized))
         
         return analysis
     
+    def analyze_workload_distribution(self, records, unit_key='unit',
+                                      overworked_hours=OVERWORKED_HOURS,
+                                      underutilized_hours=UNDERUTILIZED_HOURS,
+                                      percentiles=WORKLOAD_PERCENTILES,
+                                      offset=0, limit=100):
+        """
+        Analyze workload distribution for a large roster or raw attendance events
+        
+        Args:
+            records: Roster rows (one per nurse, ``totalHours`` = weekly hours) or
+                raw attendance events (``nurse_id``, ``date``, ``totalHours``).
+                Accepts a list of dicts, a DataFrame, or an iterable of DataFrame
+                chunks (e.g. ``pd.read_csv(..., chunksize=...)``) so event logs
+                can be aggregated without holding them in memory.
+            unit_key: Column grouping nurses into units/wards
+            offset, limit: Page window applied to the outlier lists
+        
+        Returns:
+            Overall and per-unit distribution statistics plus paginated outliers
+        """
+        weekly = self._nurse_weekly_hours(records, unit_key=unit_key)
+        hours = weekly['hours'].to_numpy()
+        
+        overall = self._distribution_stats(hours, percentiles)
+        units = self._unit_distribution_stats(weekly, percentiles)
+        overworked = self._workload_outliers(weekly, hours > overworked_hours, descending=True,
+                                             offset=offset, limit=limit)
+        underutilized = self._workload_outliers(weekly, hours < underutilized_hours, descending=False,
+                                                offset=offset, limit=limit)
+        balance_score = self._balance_score(overall['std'])
+        
+        return {
+            'total_nurses': overall['count'],
+            'overall': overall,
+            'units': units,
+            'thresholds': {
+                'overworked_hours': overworked_hours,
+                'underutilized_hours': underutilized_hours
+            },
+            'overworked_nurses': overworked,
+            'underutilized_nurses': underutilized,
+            'balance_score': balance_score,
+            'recommendations': self._workload_recommendations(
+                balance_score, overworked['total'], underutilized['total'])
+        }
+    
+    def _nurse_weekly_hours(self, records, unit_key='unit'):
+        """
+        Reduce roster rows or attendance events to one row per nurse with
+        average weekly hours, using categorical columns to keep memory low
+        
+        Each chunk is reduced to (nurse_id, week) totals and dropped; the
+        chunk totals are merged whenever they outgrow the merged table
+        WEEKLY_MERGE_FACTOR times, so memory follows the number of
+        nurse-weeks and the merging stays linear in the number of events.
+        """
+        if isinstance(records, pd.DataFrame) or (isinstance(records, list) and records and isinstance(records[0], dict)):
+            chunks = [records]
+        else:
+            chunks = records
+        
+        pending, pending_rows, merged_rows = [], 0, 0
+        for chunk in chunks:
+            df = chunk if isinstance(chunk, pd.DataFrame) else pd.DataFrame(chunk)
+            if df.empty:
+                continue
+            partial = pd.DataFrame({
+                'nurse_id': df['nurse_id'].astype(str),
+                'unit': df[unit_key].astype(str) if unit_key in df else 'All',
+                'hours': pd.to_numeric(df['totalHours'], errors='coerce').fillna(0).astype('float64')
+            })
+            if 'name' in df:
+                partial['name'] = df['name'].astype(str)
+            else:
+                partial['name'] = ''
+            if 'date' in df:
+                dates = pd.to_datetime(df['date'])
+                partial['week'] = dates.dt.normalize() - pd.to_timedelta(dates.dt.dayofweek, unit='D')
+            else:
+                # Roster rows already hold weekly hours
+                partial['week'] = pd.Timestamp(0)
+            pending.append(self._sum_nurse_weeks(partial))
+            pending_rows += len(pending[-1])
+            del df, partial
+            if len(pending) > 1 and pending_rows > WEEKLY_MERGE_FACTOR * max(merged_rows, len(pending[-1])):
+                pending = [self._sum_nurse_weeks(pd.concat(pending))]
+                pending_rows = merged_rows = len(pending[0])
+        
+        if not pending:
+            return pd.DataFrame({
+                'nurse_id': pd.Series(dtype=str),
+                'name': pd.Series(dtype=str),
+                'unit': pd.Categorical([]),
+                'hours': pd.Series(dtype='float64')
+            })
+        
+        # Chunks may split a nurse's week (earlier chunks first, so 'first'
+        # keeps the earliest unit / name)
+        weeks = (self._sum_nurse_weeks(pd.concat(pending)) if len(pending) > 1 else pending[0]).reset_index()
+        weekly = (weeks.groupby('nurse_id', sort=False)
+                  .agg(unit=('unit', 'first'), name=('name', 'first'), hours=('hours', 'mean'))
+                  .reset_index())
+        weekly['unit'] = weekly['unit'].astype('category')
+        return weekly
+    
+    @staticmethod
+    def _sum_nurse_weeks(frame):
+        """(nurse_id, week)-indexed hour totals with the first unit and name"""
+        # Keys may be columns (a chunk) or index levels (earlier totals)
+        return (frame.groupby(['nurse_id', 'week'], sort=False)
+                .agg(unit=('unit', 'first'), name=('name', 'first'), hours=('hours', 'sum')))
+    
+    def _distribution_stats(self, hours, percentiles=()):
+        """Summary statistics for a flat array of weekly hours"""
+        count = len(hours)
+        if count == 0:
+            return {'count': 0, 'mean': 0.0, 'std': 0.0, 'min': 0.0, 'max': 0.0,
+                    'percentiles': {f'p{q:g}': 0.0 for q in percentiles}, 'gini': 0.0}
+        sorted_hours = np.sort(hours)
+        total = sorted_hours.sum()
+        ranks = np.arange(1, count + 1)
+        gini = float(((2 * ranks - count - 1) * sorted_hours).sum() / (count * total)) if total > 0 else 0.0
+        return {
+            'count': int(count),
+            'mean': float(total / count),
+            'std': float(sorted_hours.std(ddof=1)) if count > 1 else 0.0,
+            'min': float(sorted_hours[0]),
+            'max': float(sorted_hours[-1]),
+            'percentiles': {
+                f'p{q:g}': float(v) for q, v in zip(percentiles, np.percentile(sorted_hours, percentiles))
+            } if len(percentiles) else {},
+            'gini': gini
+        }
+    
+    def _unit_distribution_stats(self, weekly, percentiles):
+        """
+        Per-unit count/mean/std/min/max/percentiles/Gini in a single sorted pass
+        
+        Rows are sorted once by (unit, hours); every statistic is then a
+        segment reduction over the contiguous unit blocks.
+        """
+        if weekly.empty:
+            return []
+        codes = weekly['unit'].cat.codes.to_numpy()
+        hours = weekly['hours'].to_numpy()
+        order = np.lexsort((hours, codes))
+        codes = codes[order]
+        hours = hours[order]
+        
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        counts = np.diff(np.r_[starts, len(hours)])
+        ends = starts + counts - 1
+        
+        sums = np.add.reduceat(hours, starts)
+        means = sums / counts
+        # Squared deviations from each unit's own mean (same as std(ddof=1)
+        # in _distribution_stats, without the cancellation of E[x^2] - E[x]^2)
+        deviations = hours - np.repeat(means, counts)
+        squares = np.add.reduceat(deviations * deviations, starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            stds = np.where(counts > 1, np.sqrt(squares / np.maximum(counts - 1, 1)), 0.0)
+        
+        # Rank within unit (1-based) drives the Gini numerator
+        ranks = np.arange(len(hours)) - np.repeat(starts, counts) + 1
+        gini_num = np.add.reduceat((2 * ranks - np.repeat(counts, counts) - 1) * hours, starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ginis = np.where(sums > 0, gini_num / (counts * sums), 0.0)
+        
+        # Linear-interpolated percentiles, matching np.percentile's default
+        unit_percentiles = {}
+        for q in percentiles:
+            position = starts + (counts - 1) * (q / 100.0)
+            lower = np.floor(position).astype(int)
+            upper = np.minimum(lower + 1, ends)
+            fraction = position - lower
+            unit_percentiles[f'p{q:g}'] = hours[lower] + (hours[upper] - hours[lower]) * fraction
+        
+        categories = weekly['unit'].cat.categories
+        units = []
+        for i, start in enumerate(starts):
+            units.append({
+                'unit': categories[codes[start]],
+                'count': int(counts[i]),
+                'mean': float(means[i]),
+                'std': float(stds[i]),
+                'min': float(hours[start]),
+                'max': float(hours[ends[i]]),
+                'percentiles': {key: float(values[i]) for key, values in unit_percentiles.items()},
+                'gini': float(ginis[i])
+            })
+        return units
+    
+    def _workload_outliers(self, weekly, mask, descending, offset=0, limit=None):
+        """Return one page of nurses selected by mask, sorted by hours"""
+        mask = np.asarray(mask)
+        indices = np.flatnonzero(mask)
+        hours = weekly['hours'].to_numpy()[indices]
+        order = np.argsort(-hours if descending else hours, kind='stable')
+        page = indices[order][offset:None if limit is None else offset + limit]
+        rows = weekly.iloc[page]
+        items = [
+            {'nurse_id': nurse_id, 'name': name, 'unit': str(unit), 'totalHours': float(total)}
+            for nurse_id, name, unit, total in zip(rows['nurse_id'], rows['name'], rows['unit'], rows['hours'])
+        ]
+        return {'total': int(len(indices)), 'offset': offset, 'limit': limit, 'items': items}
+    
+    def _balance_score(self, std_hours):
+        """Balance score (0-100, higher is better) from the spread of weekly hours"""
+        max_std = 20  # Maximum expected std
+        return round(max(0, 100 - (std_hours / max_std * 100)), 2)
+    
+    def _workload_recommendations(self, balance_score, overworked_count, underutilized_count):
+        """Recommendations shared by the workload analyses"""
+        recommendations = []
+        if balance_score < 70:
+            recommendations.append("Workload imbalance detected. Redistribute shifts.")
+        if overworked_count > 0:
+            recommendations.append(f"{overworked_count} nurses are overworked. Reduce their hours.")
+        if underutilized_count > 0:
+            recommendations.append(f"{underutilized_count} nurses are underutilized. Assign more shifts.")
+        return recommendations
+    
     def generate_attendance_insights(self, attendance_data):
         """
         Generate comprehensive insights from attendance data
         """
-        df = pd.DataFrame(attendance_data)
+        df = self._attendance_frame(attendance_data)
         
         insights = {
             'overall_attendance_rate': (len(df[df['status'] == 'Present']) / len(df) * 100),
@@ -429,10 +727,12 @@ class NurseAttendanceML:
         alerts = []
         
         recent_data = df[df['date'] >= datetime.now() - timedelta(days=7)]
+        if recent_data.empty:
+            return alerts
         
         # High absence rate alert
         absence_rate = len(recent_data[recent_data['status'] == 'Absent']) / len(recent_data) * 100
-        if absence_rate > 15:
+        if absence_rate > ABSENCE_ALERT_RATE:
             alerts.append({
                 'level': 'High',
                 'message': f'Absence rate is {absence_rate:.1f}% in the last 7 days',
@@ -441,7 +741,7 @@ class NurseAttendanceML:
         
         # Late arrival spike
         late_rate = len(recent_data[recent_data['status'] == 'Late']) / len(recent_data) * 100
-        if late_rate > 20:
+        if late_rate > LATE_ALERT_RATE:
             alerts.append({
                 'level': 'Medium',
                 'message': f'Late arrival rate is {late_rate:.1f}%',
@@ -450,20 +750,39 @@ class NurseAttendanceML:
         
         return alerts
 
-# Flask API endpoints
-from flask import Flask, request, jsonify
+# Flask API endpoints, mounted by app.py (or by create_app() when run standalone)
+from flask import Blueprint, Flask, request, jsonify
+import metrics
+from serving_config import ServingConfig
+
+blueprint = Blueprint('nurse_attendance', __name__, url_prefix='/ml/nurse-attendance')
+serving_config = ServingConfig.from_env()  # app.py replaces this with its own (one thread budget per worker)
+ml_system = NurseAttendanceML(model_dir=os.environ.get('ML_ATTENDANCE_MODEL_DIR', os.environ.get('ML_MODEL_DIR', 'models')))
+# Live aggregates and alerts from /events; only a single-worker server owns the stream
+stream_processor = None
+stream_unavailable = None
+try:
+    stream_processor = StreamProcessor.from_env(workers=serving_config.workers)
+except StreamOwnershipError as e:
+    stream_unavailable = str(e)
+    print(f"Attendance stream disabled: {e}")
 
-app = Flask(__name__)
-ml_system = NurseAttendanceML()
+def create_app():
+    """Attendance-only service; the combined service registers the blueprint in app.py"""
+    standalone = Flask(__name__)
+    metrics.instrument_app(standalone)  # Request metrics + /metrics endpoint
+    serving_config.apply()  # Cap BLAS/OpenMP threads per worker
+    standalone.register_blueprint(blueprint)
+    return standalone
 
-@app.route('/ml/nurse-attendance/predict-absence', methods=['POST'])
+@blueprint.route('/predict-absence', methods=['POST'])
 def predict_absence():
     """Predict absence risk for a nurse"""
     data = request.json
     result = ml_system.predict_absence_risk(data)
     return jsonify(result)
 
-@app.route('/ml/nurse-attendance/optimize-schedule', methods=['POST'])
+@blueprint.route('/optimize-schedule', methods=['POST'])
 def optimize_schedule():
     """Optimize shift schedule"""
     data = request.json
@@ -472,14 +791,33 @@ def optimize_schedule():
     result = ml_system.optimize_shift_schedule(nurses_data, requirements)
     return jsonify(result)
 
-@app.route('/ml/nurse-attendance/detect-anomalies', methods=['POST'])
+@blueprint.route('/simulate-schedule', methods=['POST'])
+def simulate_schedule():
+    """What-if scenarios over one roster: schedules plus coverage shortfall probabilities"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'No simulation request provided'}), 400
+    try:
+        seed = int(data.get('seed', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'seed must be an integer'}), 400
+    try:
+        result = ml_system.simulate_schedules(data.get('nurses', []), data.get('scenarios') or [{'name': 'baseline'}],
+                                              draws=data.get('draws'), seed=seed)
+    except SimulationRequestError as e:
+        return jsonify({'error': str(e)}), 400
+    except SimulationBusyError as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify(result)
+
+@blueprint.route('/detect-anomalies', methods=['POST'])
 def detect_anomalies():
     """Detect attendance anomalies"""
     data = request.json
     result = ml_system.detect_attendance_anomalies(pd.DataFrame(data))
     return jsonify({'anomalies': result})
 
-@app.route('/ml/nurse-attendance/predict-staffing', methods=['POST'])
+@blueprint.route('/predict-staffing', methods=['POST'])
 def predict_staffing():
     """Predict staffing needs"""
     data = request.json
@@ -488,19 +826,71 @@ def predict_staffing():
     result = ml_system.predict_staffing_needs(historical_data, forecast_days)
     return jsonify({'predictions': result})
 
-@app.route('/ml/nurse-attendance/analyze-workload', methods=['POST'])
+@blueprint.route('/analyze-workload', methods=['POST'])
 def analyze_workload():
     """Analyze workload balance"""
     data = request.json
-    result = ml_system.analyze_workload_balance(data)
+    if isinstance(data, dict):
+        # Large roster / event payloads get per-unit stats and paged outliers
+        thresholds = data.get('thresholds', {})
+        result = ml_system.analyze_workload_distribution(
+            data.get('events', data.get('roster', [])),
+            unit_key=data.get('unit_key', 'unit'),
+            overworked_hours=thresholds.get('overworked_hours', OVERWORKED_HOURS),
+            underutilized_hours=thresholds.get('underutilized_hours', UNDERUTILIZED_HOURS),
+            offset=int(data.get('offset', 0)),
+            limit=int(data.get('limit', 100))
+        )
+    else:
+        result = ml_system.analyze_workload_balance(data)
     return jsonify(result)
 
-@app.route('/ml/nurse-attendance/insights', methods=['POST'])
+@blueprint.route('/insights', methods=['POST'])
 def get_insights():
     """Generate attendance insights"""
     data = request.json
     result = ml_system.generate_attendance_insights(data)
     return jsonify(result)
 
+@blueprint.route('/events', methods=['POST'])
+def ingest_events():
+    """
+    Ingest clock-in / clock-out / break / absence events
+    
+    Accepts one event or {'events': [...]}; alerts raised by these events
+    are returned immediately.
+    """
+    if stream_processor is None:
+        return jsonify({'error': stream_unavailable}), 503
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'error': 'No events provided'}), 400
+    events = data.get('events', [data]) if isinstance(data, dict) else data
+    accepted, rejected, alerts = stream_processor.ingest(events)
+    return jsonify({'accepted': accepted, 'rejected': rejected, 'alerts': alerts}), 200 if accepted or not rejected else 400
+
+@blueprint.route('/alerts', methods=['GET'])
+def get_alerts():
+    """Alert feed; ?after=<last id seen> returns only newer alerts"""
+    if stream_processor is None:
+        return jsonify({'error': stream_unavailable}), 503
+    return jsonify({'alerts': stream_processor.alerts_after(after=request.args.get('after', 0, type=int),
+                                                            limit=request.args.get('limit', 100, type=int))})
+
+@blueprint.route('/aggregates', methods=['GET'])
+def get_aggregates():
+    """Daily or weekly aggregates per nurse or unit (?window=, ?scope=, ?key=, ?start=, ?end=)"""
+    if stream_processor is None:
+        return jsonify({'error': stream_unavailable}), 503
+    try:
+        rows = stream_processor.aggregates(window=request.args.get('window', 'daily'),
+                                           scope=request.args.get('scope', 'nurse'),
+                                           key=request.args.get('key'),
+                                           start=request.args.get('start'), end=request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'aggregates': rows, 'stream': stream_processor.describe()})
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    # app.py serves these endpoints on 5001; a standalone process needs another port
+    create_app().run(host='0.0.0.0', port=int(os.environ.get('PORT', 5002)), debug=True)
@@ -0,0 +1,163 @@
+"""
+Exact-match tier for frequent symptom combinations
+Features:
+- Full-ensemble outputs precomputed for every distinct training pattern (plus observed production patterns)
+- Hash table keyed by the np.packbits'd symptom row: a hit costs one dict lookup, no model runs
+- Versioned with the model (models/pattern_table.npz), ignored once the model version changes
+- Counts the patterns that missed so a refresh can add the most frequent ones
+
+Usage (rebuild the table for the saved models, adding observed patterns):
+    python pattern_table.py [--model-dir models] [--patterns observed.npy | --prediction-logs DIR] [--top-misses 1000]
+"""
+
+import argparse
+import os
+import sys
+import threading
+from collections import Counter
+
+import numpy as np
+
+PATTERN_TABLE_FORMAT_VERSION = 1
+PATTERN_TABLE_FILE = 'pattern_table.npz'
+# Upper bound on stored patterns (each costs one probability row)
+MAX_PATTERNS = 50000
+# Distinct missed patterns counted between refreshes
+MAX_TRACKED_MISSES = 10000
+
+
+def pack_rows(symptom_matrix):
+    """Packed bitset per row (same layout as application/x-symptom-bitset bodies)"""
+    return np.packbits(np.asarray(symptom_matrix) != 0, axis=1)
+
+
+def distinct_patterns(symptom_matrix):
+    """Distinct rows of a binary symptom matrix, as uint8"""
+    return np.unique((np.asarray(symptom_matrix) != 0).astype(np.uint8), axis=0)
+
+
+class PatternTable:
+    """Precomputed prediction outputs for known symptom patterns"""
+
+    def __init__(self, patterns, probabilities, member_predictions, primary_model, model_version, n_columns):
+        self.patterns = patterns                        # (n_patterns, n_bytes) uint8 packed rows
+        self.probabilities = probabilities              # (n_patterns, n_classes) combined probabilities
+        self.member_predictions = member_predictions    # {member: (n_patterns,) class index}
+        self.primary_model = primary_model
+        self.model_version = model_version
+        self.n_columns = int(n_columns)
+        self._slots = {row.tobytes(): slot for slot, row in enumerate(patterns)}
+        self._misses = Counter()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.lookups = 0
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def lookup(self, symptom_matrix, record_misses=True):
+        """Table slot per row, -1 where the pattern is not stored"""
+        packed = pack_rows(symptom_matrix)
+        slots = np.fromiter((self._slots.get(row.tobytes(), -1) for row in packed), dtype=np.int64,
+                            count=len(packed))
+        missed = slots < 0
+        with self._lock:
+            self.lookups += len(slots)
+            self.hits += len(slots) - int(missed.sum())
+            if record_misses:
+                for row in packed[missed]:
+                    key = row.tobytes()
+                    if key in self._misses or len(self._misses) < MAX_TRACKED_MISSES:
+                        self._misses[key] += 1
+        return slots
+
+    def top_misses(self, n):
+        """Unpacked symptom rows of the n most frequent missed patterns"""
+        with self._lock:
+            keys = [key for key, _ in self._misses.most_common(n)]
+        if not keys:
+            return np.zeros((0, self.n_columns), dtype=np.uint8)
+        packed = np.frombuffer(b''.join(keys), dtype=np.uint8).reshape(len(keys), -1)
+        return np.unpackbits(packed, axis=1, count=self.n_columns)
+
+    def unpacked_patterns(self):
+        return np.unpackbits(self.patterns, axis=1, count=self.n_columns)
+
+    def stats(self):
+        return {
+            'model_version': self.model_version,
+            'patterns': len(self),
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'hit_rate': self.hits / self.lookups if self.lookups else None,
+            'tracked_misses': len(self._misses)
+        }
+
+    def save(self, model_dir):
+        path = os.path.join(model_dir, PATTERN_TABLE_FILE)
+        arrays = {f'member__{name}': predicted for name, predicted in self.member_predictions.items()}
+        # Replace rather than overwrite: other workers may be reading the old table
+        with open(f'{path}.tmp-{os.getpid()}', 'wb') as f:
+            np.savez(f, patterns=self.patterns, probabilities=self.probabilities,
+                     format_version=PATTERN_TABLE_FORMAT_VERSION, primary_model=self.primary_model,
+                     model_version=self.model_version, n_columns=self.n_columns, **arrays)
+        os.replace(f'{path}.tmp-{os.getpid()}', path)
+
+    @classmethod
+    def load(cls, model_dir, model_version, n_columns):
+        """Table saved for model_version, or None if missing or stale"""
+        path = os.path.join(model_dir, PATTERN_TABLE_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if (int(data['format_version']) != PATTERN_TABLE_FORMAT_VERSION
+                    or str(data['model_version']) != model_version or int(data['n_columns']) != n_columns):
+                return None
+            member_predictions = {key[len('member__'):]: data[key] for key in data.files if key.startswith('member__')}
+            return cls(data['patterns'], data['probabilities'], member_predictions, str(data['primary_model']),
+                       model_version, n_columns)
+
+
+def build_pattern_table(predictor, patterns, max_patterns=MAX_PATTERNS):
+    """
+    PatternTable of the predictor's full-ensemble outputs for patterns
+
+    patterns is a binary symptom matrix in symptom_columns order; duplicates
+    are dropped and at most max_patterns rows (in the given order) are kept.
+    """
+    patterns = (np.asarray(patterns) != 0).astype(np.uint8)
+    _, first = np.unique(pack_rows(patterns), axis=0, return_index=True)
+    patterns = patterns[np.sort(first)[:max_patterns]]
+    member_predictions, probabilities, primary_model, _ = predictor._model_outputs(patterns, 'full')
+    return PatternTable(pack_rows(patterns), probabilities, member_predictions, primary_model,
+                        predictor.metadata.get('version', 'unknown'), patterns.shape[1])
+
+
+def main(argv=None):
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from disease_predictor import DiseasePredictor
+
+    parser = argparse.ArgumentParser(description='Rebuild the exact-match pattern table')
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--patterns', help='.npy symptom matrix of observed production rows')
+    parser.add_argument('--prediction-logs', help='Prediction log directory to read observed rows from')
+    parser.add_argument('--top-misses', type=int, default=1000,
+                        help='Most frequent observed patterns to add')
+    args = parser.parse_args(argv)
+
+    predictor = DiseasePredictor(model_dir=args.model_dir)
+    observed = np.load(args.patterns) if args.patterns else None
+    if args.prediction_logs:
+        from prediction_log import logged_cases
+        observed, _, _, _ = logged_cases(args.prediction_logs, predictor.symptom_columns)
+    if observed is not None:
+        # Most frequent observed patterns first
+        unique, counts = np.unique((observed != 0).astype(np.uint8), axis=0, return_counts=True)
+        observed = unique[np.argsort(-counts, kind='stable')][:args.top_misses]
+    table = predictor.refresh_pattern_table(observed)
+    print(f"Pattern table: {len(table)} patterns for model version {table.model_version}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
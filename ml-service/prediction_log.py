@@ -0,0 +1,354 @@
+"""
+Asynchronous log of served predictions, for audit and retraining
+Features:
+- Request handlers enqueue one compact entry per request (packed symptom bitsets, top-k,
+  model version, latency); no file I/O on the response path
+- A bounded queue (counted in rows): when the writer falls behind, new entries are
+  dropped and counted rather than slowing requests down
+- A background writer appends batches of NDJSON lines to size-rotated files and prunes
+  the oldest files beyond a retention count
+- Readers turn the logs back into symptom matrices: observed patterns for the pattern
+  table, or a Training.csv-layout file of new cases for DiseasePredictor
+
+Each file starts a catalog line ({"type": "catalog", ...} with the symptom columns and
+classes) whenever the model version changes, so rows stay decodable across versions.
+
+Environment variables:
+    ML_PREDICTION_LOG_DIR        directory for the log files (default: logging disabled)
+    ML_PREDICTION_LOG_QUEUE      rows waiting to be written before new ones are dropped (default 100000)
+    ML_PREDICTION_LOG_FILE_MB    size at which a file is rotated (default 64)
+    ML_PREDICTION_LOG_FILES      files kept in the directory (default 50)
+
+Usage (export logged cases, appended to the training data, as a CSV):
+    python prediction_log.py --log-dir logs/predictions --output retrain.csv \
+        [--base ../Training.csv] [--since 1760000000] [--min-confidence 0.9]
+"""
+
+import argparse
+import base64
+import glob
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+import metrics
+
+LOG_FORMAT_VERSION = 1
+FILE_PREFIX = 'predictions-'
+FILE_SUFFIX = '.ndjson'
+DEFAULT_QUEUE_ROWS = 100000
+DEFAULT_FILE_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_FILES = 50
+# Most queued entries drained into one write (batches form on their own under load)
+BATCH_ENTRIES = 256
+# Candidates kept per row; enough for audit without storing every class probability
+LOGGED_TOP_K = 3
+# Files modified this recently may still be open in another worker and are never pruned
+ACTIVE_FILE_SECONDS = 300
+
+_STOP = object()
+
+
+class PredictionLogger:
+    """Bounded queue of served predictions drained to NDJSON files by one background thread"""
+
+    def __init__(self, log_dir, max_queue_rows=DEFAULT_QUEUE_ROWS, max_file_bytes=DEFAULT_FILE_BYTES,
+                 max_files=DEFAULT_MAX_FILES):
+        self.log_dir = log_dir
+        self.max_queue_rows = int(max_queue_rows)
+        self.max_file_bytes = int(max_file_bytes)
+        self.max_files = int(max_files)
+        os.makedirs(log_dir, exist_ok=True)
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._queued_rows = 0
+        self.counts = {'logged': 0, 'written': 0, 'dropped': 0, 'batches': 0, 'files': 0, 'errors': 0}
+
+        self._file = None
+        self._file_path = None
+        self._file_catalogs = set()
+        self._sequence = 0
+        self._writer = threading.Thread(target=self._run, name='prediction-log', daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def from_env(cls):
+        """Logger configured from ML_PREDICTION_LOG_*, or None when ML_PREDICTION_LOG_DIR is unset"""
+        log_dir = os.environ.get('ML_PREDICTION_LOG_DIR')
+        if not log_dir:
+            return None
+        return cls(log_dir,
+                   max_queue_rows=int(os.environ.get('ML_PREDICTION_LOG_QUEUE', DEFAULT_QUEUE_ROWS)),
+                   max_file_bytes=int(float(os.environ.get('ML_PREDICTION_LOG_FILE_MB', '64')) * 1024 * 1024),
+                   max_files=int(os.environ.get('ML_PREDICTION_LOG_FILES', DEFAULT_MAX_FILES)))
+
+    def log(self, endpoint, predictor, symptom_matrix, result, latency_ms, profile=None):
+        """
+        Queue one served request (symptom_matrix rows in predictor.symptom_columns
+        order, result from predict_matrix); False if it was dropped
+        """
+        n_rows = len(symptom_matrix)
+        with self._lock:
+            if self._queued_rows + n_rows > self.max_queue_rows:
+                self.counts['dropped'] += n_rows
+                metrics.PREDICTION_LOG_ROWS.inc('dropped', amount=n_rows)
+                return False
+            self._queued_rows += n_rows
+            self.counts['logged'] += n_rows
+        # Only cheap array slicing here; the writer does the formatting
+        self._queue.put({
+            'ts': time.time(),
+            'endpoint': endpoint,
+            'latency_ms': float(latency_ms),
+            'profile': profile or predictor.profile,
+            'symptoms': predictor.symptom_catalog(),
+            'classes': predictor.class_catalog(),
+            'packed': np.packbits(np.asarray(symptom_matrix) != 0, axis=1),
+            'top_indices': np.array(result['top_indices'][:, :LOGGED_TOP_K]),
+            'top_probabilities': np.array(result['top_probabilities'][:, :LOGGED_TOP_K]),
+            'exact_match': np.array(result['exact_match']) if 'exact_match' in result else None
+        })
+        return True
+
+    def describe(self):
+        with self._lock:
+            return dict(self.counts, log_dir=os.path.abspath(self.log_dir), queued_rows=self._queued_rows,
+                        max_queue_rows=self.max_queue_rows, current_file=self._file_path)
+
+    def flush(self, timeout=10):
+        """Wait until everything queued so far is on disk"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                if self._queued_rows == 0:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def close(self, timeout=10):
+        self._queue.put(_STOP)
+        self._writer.join(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < BATCH_ENTRIES and batch[-1] is not _STOP:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            stop = batch[-1] is _STOP
+            entries = [entry for entry in batch if entry is not _STOP]
+            if entries:
+                self._write(entries)
+            if stop:
+                if self._file is not None:
+                    self._file.close()
+                return
+
+    def _write(self, entries):
+        n_rows = sum(len(entry['packed']) for entry in entries)
+        try:
+            if self._file is None or self._file.tell() >= self.max_file_bytes:
+                self._rotate()
+            lines = []
+            for entry in entries:
+                lines.extend(self._lines(entry))
+            self._write_lines(lines)
+            with self._lock:
+                self.counts['written'] += n_rows
+                self.counts['batches'] += 1
+            metrics.PREDICTION_LOG_ROWS.inc('written', amount=n_rows)
+        except Exception as e:
+            print(f"Prediction log write failed: {e}")
+            # Catalog lines may not have made it to the file; repeat them next time
+            self._file_catalogs = set()
+            with self._lock:
+                self.counts['errors'] += 1
+                self.counts['dropped'] += n_rows
+            metrics.PREDICTION_LOG_ROWS.inc('dropped', amount=n_rows)
+        finally:
+            with self._lock:
+                self._queued_rows -= n_rows
+
+    def _lines(self, entry):
+        symptoms, classes = entry['symptoms'], entry['classes']
+        catalog_key = (symptoms['etag'], classes['etag'])
+        if catalog_key not in self._file_catalogs:
+            self._file_catalogs.add(catalog_key)
+            yield json.dumps({
+                'type': 'catalog',
+                'format_version': LOG_FORMAT_VERSION,
+                'model_version': classes['version'],
+                'symptoms_etag': symptoms['etag'],
+                'classes_etag': classes['etag'],
+                'symptom_columns': symptoms['symptoms'],
+                'classes': classes['classes']
+            })
+        request = {
+            'ts': round(entry['ts'], 3),
+            'endpoint': entry['endpoint'],
+            'model_version': classes['version'],
+            'symptoms_etag': symptoms['etag'],
+            'profile': entry['profile'],
+            'latency_ms': round(entry['latency_ms'], 3),
+            'batch_size': len(entry['packed'])
+        }
+        for row in range(len(entry['packed'])):
+            record = dict(request,
+                          symptoms=base64.b64encode(entry['packed'][row].tobytes()).decode('ascii'),
+                          top=[[int(c), round(float(p), 5)] for c, p in
+                               zip(entry['top_indices'][row], entry['top_probabilities'][row])])
+            if entry['exact_match'] is not None:
+                record['exact_match'] = bool(entry['exact_match'][row])
+            yield json.dumps(record)
+
+    def _write_lines(self, lines):
+        self._file.write('\n'.join(lines) + '\n')
+        self._file.flush()
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+        self._sequence += 1
+        # The pid keeps workers sharing a directory out of each other's files
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.gmtime())
+        self._file_path = os.path.join(self.log_dir, f'{FILE_PREFIX}{stamp}-{os.getpid()}-{self._sequence:04d}{FILE_SUFFIX}')
+        self._file = open(self._file_path, 'a')
+        self._file_catalogs = set()
+        with self._lock:
+            self.counts['files'] += 1
+        self._prune()
+
+    def _prune(self):
+        files = log_files(self.log_dir)
+        now = time.time()
+        for path in files[:max(0, len(files) - self.max_files)]:
+            try:
+                if path != self._file_path and now - os.path.getmtime(path) > ACTIVE_FILE_SECONDS:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def log_files(log_dir):
+    """Log files oldest first"""
+    return sorted(glob.glob(os.path.join(log_dir, f'{FILE_PREFIX}*{FILE_SUFFIX}')))
+
+
+def read_records(log_dir, since=None):
+    """
+    (catalog, record) for every logged row with ts > since, oldest file first
+
+    catalog is the file's catalog line for the record's model version; a
+    partially written last line (the writer is appending) is skipped.
+    """
+    for path in log_files(log_dir):
+        if since is not None and os.path.getmtime(path) <= since:
+            continue
+        catalogs = {}
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('type') == 'catalog':
+                    catalogs[record['symptoms_etag'], record['model_version']] = record
+                    continue
+                if since is not None and record['ts'] <= since:
+                    continue
+                catalog = catalogs.get((record['symptoms_etag'], record['model_version']))
+                if catalog is not None:
+                    yield catalog, record
+
+
+def logged_cases(log_dir, symptom_columns, since=None, min_confidence=0.0):
+    """
+    Logged rows as a training increment
+
+    Returns (symptom matrix in symptom_columns order, predicted disease
+    names, top-1 probabilities, last timestamp read). Labels are the served
+    top-1 prediction, so min_confidence keeps only the cases the model was
+    sure about; pass the returned timestamp as since to read only newer rows.
+    """
+    from shadow import align_columns
+
+    groups = {}
+    last_ts = since
+    for catalog, record in read_records(log_dir, since=since):
+        last_ts = max(last_ts or 0.0, record['ts'])
+        top_class, top_probability = record['top'][0]
+        if top_probability < min_confidence:
+            continue
+        rows = groups.setdefault(catalog['symptoms_etag'], (catalog, [], [], []))
+        rows[1].append(base64.b64decode(record['symptoms']))
+        rows[2].append(catalog['classes'][top_class])
+        rows[3].append(top_probability)
+
+    matrices, labels, confidence = [], [], []
+    for catalog, packed, names, probabilities in groups.values():
+        columns = catalog['symptom_columns']
+        packed = np.frombuffer(b''.join(packed), dtype=np.uint8).reshape(len(names), -1)
+        matrix = np.unpackbits(packed, axis=1, count=len(columns))
+        matrices.append(align_columns(matrix, columns, symptom_columns))
+        labels.extend(names)
+        confidence.extend(probabilities)
+    if not matrices:
+        return np.zeros((0, len(symptom_columns)), dtype=np.uint8), np.array([], dtype=object), np.zeros(0), last_ts
+    return np.vstack(matrices), np.array(labels, dtype=object), np.array(confidence), last_ts
+
+
+def export_training_csv(log_dir, output, base_csv=None, since=None, min_confidence=0.0):
+    """
+    Write logged cases in Training.csv layout (symptom columns + prognosis),
+    after the rows of base_csv when given; returns (rows exported, last timestamp)
+    """
+    import pandas as pd
+
+    if base_csv:
+        base = pd.read_csv(base_csv)
+        base = base.loc[:, ~base.columns.str.startswith('Unnamed')]
+        symptom_columns = [column for column in base.columns if column != 'prognosis']
+    else:
+        base = None
+        symptom_columns = None
+        for catalog, _ in read_records(log_dir, since=since):
+            symptom_columns = catalog['symptom_columns']
+            break
+        if symptom_columns is None:
+            raise ValueError(f"No logged predictions in {log_dir}")
+
+    matrix, labels, _, last_ts = logged_cases(log_dir, symptom_columns, since=since, min_confidence=min_confidence)
+    frame = pd.DataFrame(matrix, columns=symptom_columns)
+    frame['prognosis'] = labels
+    if base is not None:
+        frame = pd.concat([base, frame], ignore_index=True)
+    frame.to_csv(output, index=False)
+    return len(matrix), last_ts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export logged predictions as a training CSV')
+    parser.add_argument('--log-dir', required=True)
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--base', help='Training CSV whose rows come first (and fixes the column order)')
+    parser.add_argument('--since', type=float, help='Only rows logged after this Unix timestamp')
+    parser.add_argument('--min-confidence', type=float, default=0.0,
+                        help='Skip rows whose served top-1 probability is lower')
+    args = parser.parse_args(argv)
+
+    exported, last_ts = export_training_csv(args.log_dir, args.output, base_csv=args.base, since=args.since,
+                                            min_confidence=args.min_confidence)
+    print(f"Exported {exported} logged cases to {args.output} (next --since {last_ts})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
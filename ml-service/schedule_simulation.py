@@ -0,0 +1,248 @@
+"""
+What-if simulation of shift schedules
+Features:
+- One roster, many scenarios: different requirements, absence-rate shocks, removed nurses
+- Absence risks are predicted once per roster (cached by NurseAttendanceML) and the
+  nurse x shift score matrix is built once; a scenario only rescales and re-ranks it
+- Coverage shortfall probabilities from Monte Carlo draws of the scheduled nurses'
+  absences, vectorized over all draws at once
+- Every scenario sees the same random draws (common random numbers), so differences
+  between scenarios are not sampling noise
+- Large scenario lists are spread over one long-lived (spawned, not forked) process pool per
+  server worker, sized to that worker's CPU share; each pool process rebuilds the shared
+  matrices once per chunk of scenarios, not per scenario
+- Roster size, draws and scenario count are validated up front (the draws matrix is
+  draws x nurses), and a bounded number of simulations run at once per server worker
+
+A scenario is a dict with any of:
+    name                 label echoed in the result
+    requirements         {shift: nurses needed} (default 3 per shift)
+    absence_multiplier   every absence risk multiplied by this (default 1.0)
+    absence_increase     added to every absence risk after the multiplier (default 0.0)
+    removed_nurses       nurse ids unavailable in this scenario
+
+Environment variables:
+    ML_SIMULATION_WORKERS      pool processes per server worker, at most its CPU share
+                               (default: that share, from serving_config)
+    ML_SIMULATION_CONCURRENCY  simulations running at once per server worker (default 1)
+"""
+
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+SHIFTS = ('Morning', 'Evening', 'Night')
+DEFAULT_REQUIRED = 3
+DEFAULT_DRAWS = 5000
+MAX_DRAWS = 100000
+# Request limits: roster size, scenarios, and draws x nurses (4 bytes per uniform)
+MAX_NURSES = 2000
+MAX_SCENARIOS = 200
+MAX_DRAW_CELLS = 5000000
+# Fewer scenarios than this run in-process (a pool costs more than it saves)
+MIN_PARALLEL_SCENARIOS = 8
+# Seconds a request waits for a simulation slot before it is turned away
+SIMULATION_WAIT_SECONDS = 30
+
+# Shift score factors of optimize_shift_schedule
+OVERWORKED_WEEK_HOURS = 40
+OVERWORKED_FACTOR = 0.7
+MAX_CONSECUTIVE_DAYS = 5
+CONSECUTIVE_FACTOR = 0.6
+PREFERRED_FACTOR = 1.3
+REPEATED_SHIFT_FACTOR = 0.8
+
+
+class SimulationRequestError(ValueError):
+    """A roster, scenario list or draws value outside the limits (reported as a 400)"""
+
+
+class SimulationBusyError(RuntimeError):
+    """Every simulation slot of this server worker stayed busy (reported as a 503)"""
+
+
+def validate_request(nurses_data, scenarios, draws):
+    """Reject simulations that are malformed or would not fit the memory budget"""
+    if isinstance(draws, bool) or not isinstance(draws, int) or not 1 <= draws <= MAX_DRAWS:
+        raise SimulationRequestError(f"draws must be an integer between 1 and {MAX_DRAWS}")
+    if not isinstance(nurses_data, list) or not 1 <= len(nurses_data) <= MAX_NURSES:
+        raise SimulationRequestError(f"nurses must be a list of 1 to {MAX_NURSES} nurses")
+    if not isinstance(scenarios, list) or not 1 <= len(scenarios) <= MAX_SCENARIOS:
+        raise SimulationRequestError(f"scenarios must be a list of 1 to {MAX_SCENARIOS} scenarios")
+    if draws * len(nurses_data) > MAX_DRAW_CELLS:
+        raise SimulationRequestError(
+            f"draws x nurses must be at most {MAX_DRAW_CELLS} (at most {MAX_DRAW_CELLS // len(nurses_data)} "
+            f"draws for {len(nurses_data)} nurses)")
+
+
+def pool_size(config):
+    """Simulation processes for one server worker: its CPU share, lowered by ML_SIMULATION_WORKERS"""
+    budget = max(1, config.native_threads)
+    override = os.environ.get('ML_SIMULATION_WORKERS')
+    return max(1, min(budget, int(override))) if override else budget
+
+
+def shift_factors(nurses_data):
+    """
+    (n_nurses, n_shifts) score multipliers that do not depend on absence risk,
+    in the order optimize_shift_schedule applies them
+    """
+    n = len(nurses_data)
+    hours = np.array([nurse.get('hours_worked_week', 0) for nurse in nurses_data], dtype=np.float64)
+    consecutive = np.array([nurse.get('consecutive_days', 0) for nurse in nurses_data], dtype=np.float64)
+    preferred = np.array([[nurse.get('preferred_shift') == shift for shift in SHIFTS] for nurse in nurses_data],
+                         dtype=bool).reshape(n, len(SHIFTS))
+    last = np.array([[nurse.get('last_shift') == shift for shift in SHIFTS] for nurse in nurses_data],
+                    dtype=bool).reshape(n, len(SHIFTS))
+    return [
+        np.repeat(np.where(hours > OVERWORKED_WEEK_HOURS, OVERWORKED_FACTOR, 1.0)[:, None], len(SHIFTS), axis=1),
+        np.repeat(np.where(consecutive > MAX_CONSECUTIVE_DAYS, CONSECUTIVE_FACTOR, 1.0)[:, None], len(SHIFTS), axis=1),
+        np.where(preferred, PREFERRED_FACTOR, 1.0),
+        np.where(last, REPEATED_SHIFT_FACTOR, 1.0)
+    ]
+
+
+def shift_score_matrix(factors, risks):
+    """Suitability of every nurse for every shift: (1 - absence risk) times the factors"""
+    scores = np.repeat((1 - np.asarray(risks, dtype=np.float64))[:, None], len(SHIFTS), axis=1)
+    for factor in factors:
+        scores = scores * factor
+    return scores
+
+
+def rank_shift(scores, required, available=None):
+    """Indices of the `required` best-scoring nurses for one shift (ties keep roster order)"""
+    order = np.argsort(-scores, kind='stable')
+    if available is not None:
+        order = order[available[order]]
+    return order[:required]
+
+
+class ScheduleSimulator:
+    """Scenario evaluation over one roster's cached risks, score factors and random draws"""
+
+    def __init__(self, nurses, risks, factors, draws=DEFAULT_DRAWS, seed=0):
+        self.nurses = nurses  # [{'nurse_id', 'name'}] in roster order
+        self.positions = {str(nurse['nurse_id']): i for i, nurse in enumerate(nurses)}
+        self.risks = np.asarray(risks, dtype=np.float64)
+        self.factors = factors
+        self.base_scores = shift_score_matrix(factors, self.risks)
+        self.draws = min(int(draws), MAX_DRAWS)
+        self.seed = seed
+        # One uniform per (draw, nurse): a nurse is absent in a draw when it is below their risk
+        self.uniforms = np.random.default_rng(seed).random((self.draws, len(self.risks)), dtype=np.float32)
+
+    @classmethod
+    def for_roster(cls, nurses_data, risks, draws=DEFAULT_DRAWS, seed=0):
+        nurses = [{'nurse_id': nurse['id'], 'name': nurse.get('name', '')} for nurse in nurses_data]
+        return cls(nurses, risks, shift_factors(nurses_data), draws=draws, seed=seed)
+
+    def state(self):
+        """Arguments that rebuild this simulator (and its draws) in another process"""
+        return self.nurses, self.risks, self.factors, self.draws, self.seed
+
+    def evaluate(self, scenario):
+        """Schedule and coverage shortfall statistics for one scenario"""
+        requirements = scenario.get('requirements', {})
+        multiplier = float(scenario.get('absence_multiplier', 1.0))
+        increase = float(scenario.get('absence_increase', 0.0))
+        risks = self.risks
+        scores = self.base_scores
+        if multiplier != 1.0 or increase != 0.0:
+            risks = np.clip(risks * multiplier + increase, 0.0, 1.0)
+            scores = shift_score_matrix(self.factors, risks)
+        available = np.ones(len(risks), dtype=bool)
+        removed = [self.positions[str(nurse_id)] for nurse_id in scenario.get('removed_nurses', [])
+                   if str(nurse_id) in self.positions]
+        available[removed] = False
+
+        absent = self.uniforms < risks  # (draws, nurses), shared by every shift
+        any_short = np.zeros(self.draws, dtype=bool)
+        schedule, coverage = {}, {}
+        for column, shift in enumerate(SHIFTS):
+            required = int(requirements.get(shift, DEFAULT_REQUIRED))
+            assigned = rank_shift(scores[:, column], required, available)
+            schedule[shift] = [dict(self.nurses[i], score=float(scores[i, column]), absence_risk=float(risks[i]))
+                               for i in assigned]
+            present = len(assigned) - np.count_nonzero(absent[:, assigned], axis=1)
+            shortfall = np.maximum(required - present, 0)
+            any_short |= shortfall > 0
+            coverage[shift] = {
+                'required': required,
+                'assigned': int(len(assigned)),
+                'expected_present': float(len(assigned) - risks[assigned].sum()),
+                'shortfall_probability': float(np.mean(shortfall > 0)),
+                'expected_shortfall': float(shortfall.mean()),
+                'present_p10': float(np.percentile(present, 10))
+            }
+        return {
+            'name': scenario.get('name'),
+            'schedule': schedule,
+            'coverage': coverage,
+            'any_shortfall_probability': float(any_short.mean()),
+            'removed_nurses': len(removed)
+        }
+
+    def run(self, scenarios, workers=1):
+        """Evaluate scenarios in order, on the process pool when the list is large"""
+        if workers <= 1 or len(scenarios) < MIN_PARALLEL_SCENARIOS:
+            return [self.evaluate(scenario) for scenario in scenarios]
+        # A few chunks per process; each chunk carries the state its process rebuilds from
+        chunksize = max(1, -(-len(scenarios) // (4 * workers)))
+        chunks = [scenarios[i:i + chunksize] for i in range(0, len(scenarios), chunksize)]
+        key = uuid.uuid4().hex
+        pool = _get_pool(workers)
+        return [result for results in pool.map(_evaluate_chunk, [key] * len(chunks), [self.state()] * len(chunks),
+                                                chunks)
+                for result in results]
+
+
+# Long-lived pool per server worker; spawned, since forking a threaded server
+# copies locks other threads may hold
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+_simulations = threading.BoundedSemaphore(int(os.environ.get('ML_SIMULATION_CONCURRENCY', '1')))
+# Pool process side: the simulator of the run whose chunk it last evaluated
+_worker_simulator = None
+_worker_key = None
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def _evaluate_chunk(key, state, scenarios):
+    global _worker_simulator, _worker_key
+    if _worker_key != key:
+        _worker_simulator, _worker_key = ScheduleSimulator(*state), key
+    return [_worker_simulator.evaluate(scenario) for scenario in scenarios]
+
+
+def simulate_schedules(ml_system, nurses_data, scenarios, draws=DEFAULT_DRAWS, seed=0, workers=1):
+    """Absence risks from ml_system (cached per nurse), then every scenario on the same roster"""
+    validate_request(nurses_data, scenarios, draws)
+    if not _simulations.acquire(timeout=SIMULATION_WAIT_SECONDS):
+        raise SimulationBusyError("Too many simulations are running; retry shortly")
+    try:
+        risks = ml_system.absence_risks(nurses_data)
+        simulator = ScheduleSimulator.for_roster(nurses_data, risks, draws=draws, seed=seed)
+        return {
+            'nurses': len(nurses_data),
+            'draws': simulator.draws,
+            'seed': seed,
+            'scenarios': simulator.run(scenarios, workers=workers)
+        }
+    finally:
+        _simulations.release()
@@ -0,0 +1,98 @@
+"""
+Serving-time parallelism policy for the ml-service
+Features:
+- Per-worker thread budget derived from the worker count and CPU count
+- Overrides n_jobs on loaded estimators (the pickles carry the training-time n_jobs=-1)
+- Caps BLAS/OpenMP thread pools used by the SVM kernel and MLP matmuls
+
+Environment variables:
+    ML_WORKERS          WSGI worker processes sharing the machine (default 1)
+    ML_ESTIMATOR_JOBS   n_jobs set on loaded estimators (default 1)
+    ML_NATIVE_THREADS   BLAS/OpenMP threads per worker (default: CPUs / workers)
+    ML_THREAD_POLICY    set to false to leave estimators and thread pools untouched
+"""
+
+import os
+
+from threadpoolctl import threadpool_limits
+
+
+def cpu_count():
+    """CPUs available to this process (respects affinity masks)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return default if value in (None, '') else int(value)
+
+
+class ServingConfig:
+    """Thread budget applied to a serving process"""
+
+    def __init__(self, workers=1, estimator_jobs=1, native_threads=None, enabled=True):
+        self.workers = max(1, int(workers))
+        self.estimator_jobs = estimator_jobs
+        # Split the machine between workers so workers x threads <= CPUs
+        self.native_threads = native_threads or max(1, cpu_count() // self.workers)
+        self.enabled = enabled
+        self._limits = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            workers=_env_int('ML_WORKERS', 1),
+            estimator_jobs=_env_int('ML_ESTIMATOR_JOBS', 1),
+            native_threads=_env_int('ML_NATIVE_THREADS', None),
+            enabled=os.environ.get('ML_THREAD_POLICY', 'true').lower() == 'true'
+        )
+
+    def apply(self, *estimators):
+        """Set n_jobs on the given estimators and cap native thread pools for this process"""
+        if not self.enabled:
+            return self
+        for estimator in estimators:
+            set_estimator_jobs(estimator, self.estimator_jobs)
+        if self._limits is None:
+            # Process-wide; kept referenced so the limits stay in effect
+            self._limits = threadpool_limits(limits=self.native_threads)
+        return self
+
+    def release(self):
+        """Restore the native thread pools to their previous limits"""
+        if self._limits is not None:
+            self._limits.restore_original_limits()
+            self._limits = None
+
+    def apply_to_predictor(self, predictor):
+        estimators = list(predictor.models.values())
+        if predictor.fast_model is not None and predictor.fast_model.estimator is not None:
+            estimators.append(predictor.fast_model.estimator)
+        return self.apply(*estimators)
+
+    def describe(self):
+        return {
+            'enabled': self.enabled,
+            'workers': self.workers,
+            'estimator_jobs': self.estimator_jobs,
+            'native_threads': self.native_threads,
+            'cpus': cpu_count()
+        }
+
+
+def set_estimator_jobs(estimator, n_jobs):
+    """Override n_jobs on an estimator and any meta-estimator members; returns the count changed"""
+    changed = 0
+    if hasattr(estimator, 'n_jobs'):
+        estimator.n_jobs = n_jobs
+        changed += 1
+    # VotingClassifier / Stacking members, and the search wrappers' refit estimator
+    members = list(getattr(estimator, 'named_estimators_', {}).values())
+    if hasattr(estimator, 'best_estimator_'):
+        members.append(estimator.best_estimator_)
+    for member in members:
+        changed += set_estimator_jobs(member, n_jobs)
+    return changed
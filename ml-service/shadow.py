@@ -0,0 +1,379 @@
+"""
+Shadow evaluation of a candidate model version on live traffic
+Features:
+- A configurable fraction of prediction requests re-scored by a candidate DiseasePredictor
+- Re-scoring runs on a small background thread pool, off the response path; a bounded
+  backlog skips (and counts) requests rather than queueing without limit
+- Agreement rate, probability drift (total variation distance) and latency deltas per candidate
+- The active candidate lives in a control file every server process follows; each process
+  publishes its own stats file next to it and reads merge them, so any worker answers for all
+- Promotion is one atomic rename of the serving pointer file, which every worker follows
+- Candidates must already hold the full saved model set; they are loaded, never trained
+
+Environment variables:
+    ML_SHADOW_MODEL_DIR        candidate model directory to shadow from startup (default: none)
+    ML_SHADOW_FRACTION         fraction of requests re-scored (default 0.1)
+    ML_SHADOW_WORKERS          background scoring threads per server process (default 1)
+    ML_SHADOW_CONTROL          file naming the shadowed candidate (default ml-service/shadow.json)
+    ML_SHADOW_CANDIDATES_DIR   only model directories under this one can be shadowed
+                               (default: the retrained models under ML_JOBS_DIR)
+    ML_SERVING_POINTER         file naming the promoted model directory (default ml-service/serving.json)
+"""
+
+import json
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_POINTER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serving.json')
+DEFAULT_CONTROL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shadow.json')
+DEFAULT_FRACTION = 0.1
+# Requests waiting for (or in) re-scoring per scoring thread before new ones are skipped
+PENDING_PER_WORKER = 4
+# Per-request latency samples kept for the percentiles
+LATENCY_SAMPLES = 1000
+# Seconds between a process's stats file updates while it scores
+PUBLISH_SECONDS = 1.0
+
+
+def align_columns(symptom_matrix, columns, target_columns):
+    """symptom_matrix (in columns order) rearranged to target_columns; unknown columns stay 0"""
+    if list(columns) == list(target_columns):
+        return symptom_matrix
+    positions = {column: idx for idx, column in enumerate(columns)}
+    aligned = np.zeros((len(symptom_matrix), len(target_columns)), dtype=symptom_matrix.dtype)
+    for target, column in enumerate(target_columns):
+        if column in positions:
+            aligned[:, target] = symptom_matrix[:, positions[column]]
+    return aligned
+
+
+def align_probabilities(probabilities, classes, target_classes):
+    """Probability columns rearranged to target_classes; classes the model lacks get 0"""
+    if list(classes) == list(target_classes):
+        return probabilities
+    positions = {str(name): idx for idx, name in enumerate(classes)}
+    aligned = np.zeros((len(probabilities), len(target_classes)))
+    for target, name in enumerate(target_classes):
+        if str(name) in positions:
+            aligned[:, target] = probabilities[:, positions[str(name)]]
+    return aligned
+
+
+def _percentile(samples, q):
+    return float(np.percentile(samples, q)) if samples else None
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+
+def _write_json(path, payload):
+    """Replace path with payload in one rename"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(f'{path}.tmp-{os.getpid()}', 'w') as f:
+        json.dump(payload, f)
+    os.replace(f'{path}.tmp-{os.getpid()}', path)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def summarize(snapshots):
+    """Comparison figures over ShadowStats.snapshot() dicts from any number of processes"""
+    totals = {key: sum(snap[key] for snap in snapshots)
+              for key in ('requests', 'rows', 'skipped', 'failed', 'agreed_rows', 'drift_sum')}
+    rows = totals['rows']
+    serving = [ms for snap in snapshots for ms in snap['serving_ms']]
+    candidate = [ms for snap in snapshots for ms in snap['candidate_ms']]
+    deltas = [c - s for snap in snapshots for s, c in zip(snap['serving_ms'], snap['candidate_ms'])]
+    return {
+        'requests': totals['requests'],
+        'rows': rows,
+        'skipped': totals['skipped'],
+        'failed': totals['failed'],
+        'agreement_rate': totals['agreed_rows'] / rows if rows else None,
+        'mean_drift': totals['drift_sum'] / rows if rows else None,
+        'max_drift': max((snap['drift_max'] for snap in snapshots), default=0.0),
+        'latency_ms': {
+            'serving_p50': _percentile(serving, 50),
+            'serving_p95': _percentile(serving, 95),
+            'candidate_p50': _percentile(candidate, 50),
+            'candidate_p95': _percentile(candidate, 95),
+            'delta_p50': _percentile(deltas, 50),
+            'delta_p95': _percentile(deltas, 95)
+        }
+    }
+
+
+class ShadowStats:
+    """Running comparison of candidate and serving outputs"""
+
+    def __init__(self):
+        self.requests = 0
+        self.skipped = 0
+        self.failed = 0
+        self.rows = 0
+        self.agreed_rows = 0
+        self.drift_sum = 0.0
+        self.drift_max = 0.0
+        self.serving_ms = deque(maxlen=LATENCY_SAMPLES)
+        self.candidate_ms = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    def record(self, agreed, drift, serving_ms, candidate_ms):
+        with self._lock:
+            self.requests += 1
+            self.rows += len(agreed)
+            self.agreed_rows += int(np.count_nonzero(agreed))
+            self.drift_sum += float(drift.sum())
+            self.drift_max = max(self.drift_max, float(drift.max(initial=0.0)))
+            self.serving_ms.append(serving_ms)
+            self.candidate_ms.append(candidate_ms)
+
+    def count(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def snapshot(self):
+        """Raw counters and latency samples (what summarize() merges across processes)"""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'rows': self.rows,
+                'skipped': self.skipped,
+                'failed': self.failed,
+                'agreed_rows': self.agreed_rows,
+                'drift_sum': self.drift_sum,
+                'drift_max': self.drift_max,
+                'serving_ms': list(self.serving_ms),
+                'candidate_ms': list(self.candidate_ms)
+            }
+
+    def describe(self):
+        return summarize([self.snapshot()])
+
+
+class ShadowEvaluator:
+    """Re-scores sampled requests with a candidate predictor on background threads"""
+
+    def __init__(self, candidate, fraction=DEFAULT_FRACTION, workers=1, seed=None, control=None, shadow_id=None):
+        self.candidate = candidate
+        self.fraction = float(fraction)
+        self.workers = int(workers)
+        self.max_pending = PENDING_PER_WORKER * self.workers
+        self.stats = ShadowStats()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='shadow')
+        self._random = random.Random(seed)
+        self._pending = 0
+        self._lock = threading.Lock()
+        # Stats are published to control (a ShadowControl) under shadow_id
+        self.control = control
+        self.shadow_id = shadow_id
+        self._published_at = 0.0
+
+    @classmethod
+    def for_model_dir(cls, settings, model_dir, **kwargs):
+        """Evaluator for the saved models in model_dir, loaded with the serving predictor's settings"""
+        from disease_predictor import DiseasePredictor, has_enhanced_models
+
+        # A candidate must already be trained: never fit models on the serving host
+        if not has_enhanced_models(model_dir):
+            raise FileNotFoundError(f"No complete saved model set in {model_dir}")
+        return cls(DiseasePredictor(**dict(settings, model_dir=model_dir, allow_training=False)), **kwargs)
+
+    def sample(self):
+        """Whether to shadow the current request"""
+        return self.fraction > 0 and self._random.random() < self.fraction
+
+    def submit(self, symptom_matrix, columns, classes, probabilities, serving_ms, profile=None):
+        """Queue a served request for re-scoring; False if the backlog is full"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.stats.count('skipped')
+                return False
+            self._pending += 1
+        self._executor.submit(self._score, np.array(symptom_matrix), list(columns), list(classes),
+                              np.array(probabilities), serving_ms, profile)
+        return True
+
+    def _score(self, symptom_matrix, columns, classes, probabilities, serving_ms, profile):
+        try:
+            symptom_matrix = align_columns(symptom_matrix, columns, self.candidate.symptom_columns)
+            start = time.perf_counter()
+            result = self.candidate.predict_matrix(symptom_matrix, profile=profile, top_k=1, record_misses=False)
+            candidate_ms = (time.perf_counter() - start) * 1000
+            candidate_proba = align_probabilities(result['probabilities'],
+                                                  self.candidate.class_catalog()['classes'], classes)
+            agreed = np.argmax(candidate_proba, axis=1) == np.argmax(probabilities, axis=1)
+            drift = 0.5 * np.abs(candidate_proba - probabilities).sum(axis=1)
+            self.stats.record(agreed, drift, serving_ms, candidate_ms)
+        except Exception as e:
+            print(f"Shadow scoring failed: {e}")
+            self.stats.count('failed')
+        finally:
+            with self._lock:
+                self._pending -= 1
+            if time.time() - self._published_at >= PUBLISH_SECONDS:
+                self.publish()
+
+    def publish(self):
+        """Write this process's stats where the other processes read them"""
+        if self.control is not None:
+            self._published_at = time.time()
+            with self._lock:
+                pending = self._pending
+            self.control.write_stats(self.shadow_id, dict(self.stats.snapshot(), pending=pending))
+
+    def describe(self):
+        with self._lock:
+            pending = self._pending
+        return dict({
+            'candidate': {
+                'model_dir': os.path.abspath(self.candidate.model_dir),
+                'model_version': self.candidate.metadata.get('version', 'unknown')
+            },
+            'fraction': self.fraction,
+            'workers': self.workers,
+            'pending': pending
+        }, **self.stats.describe())
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        self.publish()
+
+
+class ShadowControl:
+    """
+    File naming the shadowed candidate, plus one stats file per server process
+
+    Starting or stopping a shadow replaces (or removes) the file; each
+    process polls it like the serving pointer and loads or drops its own
+    evaluator, so every worker shadows the same candidate.
+    """
+
+    def __init__(self, path=DEFAULT_CONTROL_PATH):
+        self.path = path
+        self.stats_dir = f'{path}.stats'
+        self._lock = threading.Lock()
+        # None: a process that starts with a shadow running reports it on its first poll
+        self._seen = None
+
+    def read(self):
+        """{'id', 'model_dir', 'model_version', 'fraction', 'workers', 'started_at'}, or None"""
+        return _read_json(self.path)
+
+    def start(self, model_dir, model_version, fraction, workers):
+        state = {
+            'id': uuid.uuid4().hex,
+            'model_dir': os.path.abspath(model_dir),
+            'model_version': model_version,
+            'fraction': float(fraction),
+            'workers': int(workers),
+            'started_at': time.time()
+        }
+        # Stats of earlier candidates are never read again
+        shutil.rmtree(self.stats_dir, ignore_errors=True)
+        _write_json(self.path, state)
+        return state
+
+    def stop(self):
+        """Remove the control file; returns the state it held, or None"""
+        state = self.read()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        return state
+
+    def poll(self):
+        """(changed, state): changed is True once per change of the control file"""
+        stamp = _file_stamp(self.path)
+        if stamp == self._seen:
+            return False, None
+        with self._lock:
+            if stamp == self._seen:
+                return False, None
+            self._seen = stamp
+        return True, self.read()
+
+    def write_stats(self, shadow_id, snapshot, worker=None):
+        _write_json(os.path.join(self.stats_dir, f'{worker or os.getpid()}.json'),
+                    {'id': shadow_id, 'stats': snapshot})
+
+    def collect(self, shadow_id):
+        """Every process's latest stats snapshot for shadow_id"""
+        try:
+            names = sorted(name for name in os.listdir(self.stats_dir) if name.endswith('.json'))
+        except FileNotFoundError:
+            return []
+        entries = (_read_json(os.path.join(self.stats_dir, name)) for name in names)
+        return [entry['stats'] for entry in entries if entry and entry.get('id') == shadow_id]
+
+    def describe(self, state):
+        """The merged comparison for a control state from read()"""
+        snapshots = self.collect(state['id'])
+        return dict({
+            'candidate': {'model_dir': state['model_dir'], 'model_version': state['model_version']},
+            'fraction': state['fraction'],
+            'workers': state['workers'],
+            'reporting_processes': len(snapshots),
+            'pending': sum(snap.get('pending', 0) for snap in snapshots)
+        }, **summarize(snapshots))
+
+
+class ServingPointer:
+    """
+    File naming the promoted model directory
+
+    Promotion replaces the file in one rename; each server process polls
+    it (one stat per request) and switches when it changes.
+    """
+
+    def __init__(self, path=DEFAULT_POINTER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._seen = _file_stamp(path)
+
+    def read(self):
+        """{'model_dir', 'model_version', 'promoted_at'} of the last promotion, or None"""
+        return _read_json(self.path)
+
+    def promote(self, model_dir, model_version):
+        pointer = {
+            'model_dir': os.path.abspath(model_dir),
+            'model_version': model_version,
+            'promoted_at': time.time()
+        }
+        with self._lock:
+            _write_json(self.path, pointer)
+            # This process switches itself; only the others need to notice
+            self._seen = _file_stamp(self.path)
+        return pointer
+
+    def poll(self):
+        """The pointer if it changed since the last poll (reported to one caller), else None"""
+        stamp = _file_stamp(self.path)
+        if stamp == self._seen:
+            return None
+        with self._lock:
+            if stamp == self._seen:
+                return None
+            self._seen = stamp
+        return self.read()
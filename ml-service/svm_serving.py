@@ -0,0 +1,126 @@
+"""
+Batched inference for the SVC ensemble member
+Features:
+- Kernel rows for a whole batch from one matrix multiply (precomputed support-vector norms)
+- One-vs-one decisions from per-class coefficient blocks (no 820-column dense weight matrix)
+- libsvm's Platt scaling and pairwise coupling, vectorized over rows
+
+Probabilities match SVC.predict_proba up to libsvm's coupling tolerance: libsvm
+stops its fixed-point iteration at 0.005/n_classes, this module solves the same
+quadratic problem exactly.
+"""
+
+import numpy as np
+from scipy.special import expit
+
+SUPPORTED_KERNELS = ('rbf', 'linear', 'poly', 'sigmoid')
+# libsvm clips pairwise probabilities to [MIN_PROB, 1 - MIN_PROB]
+MIN_PROB = 1e-7
+
+
+class CompiledSVC:
+    """Dense-array form of a fitted multiclass SVC(probability=True)"""
+
+    def __init__(self, svc):
+        self.classes_ = np.asarray(svc.classes_)
+        self.kernel = svc.kernel
+        self.gamma = float(svc._gamma)
+        self.coef0 = float(svc.coef0)
+        self.degree = int(svc.degree)
+        self.support_vectors = np.ascontiguousarray(svc.support_vectors_, dtype=np.float64)
+        self.sv_norms = np.einsum('ij,ij->i', self.support_vectors, self.support_vectors)
+
+        n_classes = len(self.classes_)
+        pair_i, pair_j = np.triu_indices(n_classes, k=1)
+        self.pair_i = pair_i
+        self.pair_j = pair_j
+        self.intercept = np.asarray(svc.intercept_, dtype=np.float64)
+        # Private attributes: the public probA_/probB_ warn as deprecated in newer sklearn
+        self.prob_a = np.asarray(svc._probA, dtype=np.float64)
+        self.prob_b = np.asarray(svc._probB, dtype=np.float64)
+
+        # decision(i, j) = sum over the SVs of classes i and j of coef * K + intercept.
+        # Class c's SVs carry one coefficient row per other class, so a
+        # (n_c, n_classes - 1) matmul per class yields all of c's pair terms;
+        # class i's term for pair (i, j) is column j - 1, class j's is column i.
+        self.sv_starts = np.concatenate([[0], np.cumsum(svc.n_support_)])
+        self.class_coef = [
+            np.ascontiguousarray(svc.dual_coef_[:, start:stop].T, dtype=np.float64)
+            for start, stop in zip(self.sv_starts[:-1], self.sv_starts[1:])
+        ]
+
+        # Gather map building libsvm's coupling system [[Q, 1], [1', 0]] from
+        # [off-diagonal terms (one per pair), diagonal (one per class), 1, 0]
+        n_pairs = len(pair_i)
+        index = np.full((n_classes + 1, n_classes + 1), n_pairs + n_classes)
+        index[pair_i, pair_j] = index[pair_j, pair_i] = np.arange(n_pairs)
+        index[np.arange(n_classes), np.arange(n_classes)] = n_pairs + np.arange(n_classes)
+        index[n_classes, :n_classes] = index[:n_classes, n_classes] = n_pairs + n_classes + 1
+        self.system_index = index.ravel()
+        # Q[t, t] = sum_j r[j, t]^2: r[j, t] is p_jt for pairs (j, t), 1 - p_tj for pairs (t, j)
+        self.second_class = np.eye(n_classes)[pair_j]
+        self.first_class = np.eye(n_classes)[pair_i]
+
+    @classmethod
+    def from_sklearn(cls, svc):
+        """Compiled form of svc, or None when it cannot be served this way"""
+        if (svc.kernel not in SUPPORTED_KERNELS or not getattr(svc, 'probability', False)
+                or len(svc.classes_) < 3 or len(getattr(svc, '_probA', ())) == 0):
+            return None
+        return cls(svc)
+
+    def kernel_matrix(self, X):
+        dot = X @ self.support_vectors.T
+        if self.kernel == 'rbf':
+            x_norms = np.einsum('ij,ij->i', X, X)
+            sq_dist = np.maximum(x_norms[:, None] + self.sv_norms[None, :] - 2.0 * dot, 0.0)
+            return np.exp(-self.gamma * sq_dist)
+        if self.kernel == 'poly':
+            return (self.gamma * dot + self.coef0) ** self.degree
+        if self.kernel == 'sigmoid':
+            return np.tanh(self.gamma * dot + self.coef0)
+        return dot
+
+    def decision_function(self, X):
+        """One-vs-one decision values, columns ordered as libsvm's (i, j) pairs"""
+        X = np.asarray(X, dtype=np.float64)
+        kernel = self.kernel_matrix(X)
+        terms = np.stack([
+            kernel[:, start:stop] @ coef
+            for start, stop, coef in zip(self.sv_starts[:-1], self.sv_starts[1:], self.class_coef)
+        ], axis=1)
+        return terms[:, self.pair_i, self.pair_j - 1] + terms[:, self.pair_j, self.pair_i] + self.intercept
+
+    def pairwise_probabilities(self, decisions):
+        """Platt-scaled P(class i | i or j) for every pair, libsvm's sigmoid_predict"""
+        proba = expit(-(decisions * self.prob_a + self.prob_b))
+        return np.clip(proba, MIN_PROB, 1.0 - MIN_PROB, out=proba)
+
+    def couple(self, pairwise):
+        """
+        Multiclass probabilities from pairwise ones (Wu, Lin & Weng 2004, method 2)
+
+        Minimizes p'Qp subject to sum(p) = 1 by solving the KKT system for
+        every row at once.
+        """
+        n_rows, n_classes = len(pairwise), len(self.classes_)
+        complement = 1.0 - pairwise
+        terms = np.concatenate([
+            -pairwise * complement,     # Q[i, j] = Q[j, i] = -r[j, i] r[i, j]
+            (pairwise ** 2) @ self.second_class + (complement ** 2) @ self.first_class,
+            np.zeros((n_rows, 1)),
+            np.ones((n_rows, 1))
+        ], axis=1)
+        system = terms.take(self.system_index, axis=1).reshape(n_rows, n_classes + 1, n_classes + 1)
+
+        rhs = np.zeros((n_rows, n_classes + 1, 1))
+        rhs[:, n_classes, 0] = 1.0
+        proba = np.linalg.solve(system, rhs)[:, :n_classes, 0]
+        proba = np.maximum(proba, 0.0)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, X):
+        return self.couple(self.pairwise_probabilities(self.decision_function(X)))
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
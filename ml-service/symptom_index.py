@@ -0,0 +1,198 @@
+"""
+Search index over the symptom catalogue
+Features:
+- Built once per model version (keyed by the symptom catalog ETag)
+- Ranked prefix, word-prefix, substring and typo-tolerant matching
+- Synonyms ("temperature" -> high_fever / mild_fever)
+- Normalization map resolving free-text symptom names to matrix columns in O(1)
+"""
+
+import re
+from functools import lru_cache
+
+# Everyday terms -> symptom columns. Synonyms naming one column also resolve
+# in predict requests; the others only widen search.
+SYMPTOM_SYNONYMS = {
+    'fever': ['high_fever', 'mild_fever'],
+    'temperature': ['high_fever', 'mild_fever'],
+    'pyrexia': ['high_fever', 'mild_fever'],
+    'rash': ['skin_rash'],
+    'itch': ['itching'],
+    'tired': ['fatigue'],
+    'tiredness': ['fatigue'],
+    'exhaustion': ['fatigue'],
+    'shortness of breath': ['breathlessness'],
+    'dyspnea': ['breathlessness'],
+    'throwing up': ['vomiting'],
+    'emesis': ['vomiting'],
+    'nauseous': ['nausea'],
+    'diarrhea': ['diarrhoea'],
+    'loose stools': ['diarrhoea'],
+    'stomach ache': ['stomach_pain', 'abdominal_pain', 'belly_pain'],
+    'tummy ache': ['stomach_pain', 'abdominal_pain', 'belly_pain'],
+    'heartburn': ['acidity'],
+    'jaundice': ['yellowish_skin', 'yellowing_of_eyes'],
+    'sneezing': ['continuous_sneezing'],
+    'blocked nose': ['congestion'],
+    'stuffy nose': ['congestion'],
+    'dizzy': ['dizziness'],
+    'vertigo': ['dizziness', 'spinning_movements'],
+    'tachycardia': ['fast_heart_rate'],
+    'dysuria': ['burning_micturition'],
+    'frequent urination': ['polyuria'],
+    'no appetite': ['loss_of_appetite'],
+    'arthralgia': ['joint_pain'],
+    'myalgia': ['muscle_pain'],
+    'body ache': ['muscle_pain'],
+    'sore throat': ['throat_irritation', 'patches_in_throat'],
+    'high blood sugar': ['irregular_sugar_level'],
+    'swollen glands': ['swelled_lymph_nodes'],
+    'confusion': ['altered_sensorium'],
+    'acne': ['pus_filled_pimples', 'blackheads'],
+    'bloating': ['distention_of_abdomen', 'passage_of_gases'],
+    'flatulence': ['passage_of_gases']
+}
+
+# Ranks, lower is better: the whole name equals / starts with the query, else
+# WORD_RANK plus each query word's rank (same word 0, word prefix 1,
+# substring 2, typo 3 + edit distance)
+EXACT_RANK = 0
+PREFIX_RANK = 1
+WORD_RANK = 2
+# Added when the match is through a synonym rather than the symptom's own name
+SYNONYM_PENALTY = 1
+MAX_PAGE_SIZE = 200
+
+
+def normalize_key(text):
+    """Canonical lookup key: lowercase words joined by '_' (drops stray spaces and punctuation)"""
+    return '_'.join(re.findall(r'[a-z0-9]+', str(text).lower()))
+
+
+def max_typos(token):
+    if len(token) >= 8:
+        return 2
+    return 1 if len(token) >= 4 else 0
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance, or limit + 1 once it is certain to exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _token_rank(query_token, tokens):
+    """Best rank of one query word against a name's words, None if nothing matches"""
+    best = None
+    for token in tokens:
+        if token == query_token:
+            return 0
+        if token.startswith(query_token):
+            rank = 1
+        elif len(query_token) >= 3 and query_token in token:
+            rank = 2
+        else:
+            # Typo-tolerant, also against the start of longer words ("diabet" ~ "diabets")
+            limit = max_typos(query_token)
+            if not limit:
+                continue
+            distance = min(edit_distance(query_token, token, limit),
+                           edit_distance(query_token, token[:len(query_token)], limit))
+            if distance > limit:
+                continue
+            rank = 3 + distance
+        best = rank if best is None else min(best, rank)
+    return best
+
+
+class SymptomIndex:
+    """Precomputed display entries, search keys and name lookup for one symptom list"""
+
+    def __init__(self, symptom_columns, etag, synonyms=SYMPTOM_SYNONYMS):
+        self.etag = etag
+        self.columns = list(symptom_columns)
+        self.entries = [
+            {'id': symptom, 'name': symptom.replace('_', ' ').title(), 'value': symptom}
+            for symptom in self.columns
+        ]
+        positions = {symptom: position for position, symptom in enumerate(self.columns)}
+
+        # Searchable phrases per column: its own name first, then its synonyms
+        self._phrases = [[(normalize_key(symptom).split('_'), 0)] for symptom in self.columns]
+        for phrase, targets in synonyms.items():
+            for target in targets:
+                if target in positions:
+                    self._phrases[positions[target]].append((normalize_key(phrase).split('_'), SYNONYM_PENALTY))
+
+        # Exact column names win over normalized forms, which win over synonyms
+        self._lookup = {}
+        for phrase, targets in synonyms.items():
+            present = [target for target in targets if target in positions]
+            if len(present) == 1:
+                self._lookup[normalize_key(phrase)] = positions[present[0]]
+        for symptom, position in positions.items():
+            self._lookup[normalize_key(symptom)] = position
+        self._lookup.update(positions)
+
+        self._ranked = lru_cache(maxsize=1024)(self._rank)
+
+    def position(self, name):
+        """Matrix column of a free-text symptom name, or None"""
+        position = self._lookup.get(name)
+        if position is None:
+            position = self._lookup.get(normalize_key(name))
+        return position
+
+    def resolve(self, name):
+        """Symptom column name for free text, or None"""
+        position = self.position(name)
+        return None if position is None else self.columns[position]
+
+    def search(self, query, limit=20, offset=0):
+        """Ranked page of catalogue entries matching query"""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        offset = max(0, int(offset))
+        ranked = self._ranked(normalize_key(query))
+        return {
+            'query': query,
+            'total_count': len(ranked),
+            'offset': offset,
+            'limit': limit,
+            'symptoms': [dict(self.entries[position], rank=rank)
+                         for rank, position in ranked[offset:offset + limit]]
+        }
+
+    def _rank(self, key):
+        """(rank, position) for every matching symptom, best first"""
+        if not key:
+            return tuple((0, position) for position in range(len(self.columns)))
+        query_tokens = key.split('_')
+        matches = []
+        for position, phrases in enumerate(self._phrases):
+            best = None
+            for tokens, penalty in phrases:
+                joined = '_'.join(tokens)
+                if joined == key:
+                    rank = EXACT_RANK
+                elif joined.startswith(key):
+                    rank = PREFIX_RANK
+                else:
+                    word_ranks = [_token_rank(token, tokens) for token in query_tokens]
+                    if None in word_ranks:
+                        continue
+                    rank = WORD_RANK + sum(word_ranks)
+                rank += penalty
+                best = rank if best is None else min(best, rank)
+            if best is not None:
+                matches.append((best, len(self.columns[position]), position))
+        matches.sort()
+        return tuple((rank, position) for rank, _, position in matches)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Tests for the disease service response paths (offline, Flask test client)
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+import wire_format
+from disease_predictor import top_k_indices
+
+PATIENTS = [
+    {'symptoms': {'itching': 1, 'skin_rash': 1, 'nodal_skin_eruptions': 1}},
+    {'symptoms': {}},
+    {'symptoms': {'continuous_sneezing': 1, 'shivering': 1, 'chills': 1}},
+    {'symptoms': {'cough': 'often'}}
+]
+
+
+def test_top_k_indices_matches_full_sort():
+    proba = np.random.default_rng(0).random((50, 41))
+    expected = np.argsort(-proba, axis=1)[:, :5]
+    np.testing.assert_array_equal(top_k_indices(proba, 5), expected)
+    assert top_k_indices(proba[:, :3], 5).shape == (50, 3)
+    with pytest.raises(ValueError):
+        top_k_indices(proba, 0)
+
+
+def test_top_k_below_one_is_rejected_on_every_batch_path(client, predictor):
+    body = wire_format.encode_npy(np.ones((2, len(predictor.symptom_columns)), dtype=np.uint8))
+    for top_k in (0, -3, 'two', True):
+        assert client.post('/batch_predict', json={'patients': PATIENTS, 'top_k': top_k}).status_code == 400
+        assert client.post('/jobs', json={'patients': PATIENTS, 'top_k': top_k}).status_code == 400
+        response = client.post(f'/batch_predict?top_k={top_k}', data=body, content_type=wire_format.NPY_TYPE)
+        assert response.status_code == 400
+
+
+def test_batch_is_columnar_and_matches_single_predictions(client, predictor):
+    response = client.post('/batch_predict', json={'patients': PATIENTS, 'expand_names': True,
+                                                          'format': 'columnar'})
+    assert response.status_code == 200
+    body = response.get_json()
+    columns = body['results']
+
+    assert columns['patient_index'] == [0, 2]
+    assert [error['patient_index'] for error in body['errors']] == [1, 3]
+    assert body['successful_predictions'] == 2
+    assert body['classes_etag'] == predictor.class_catalog()['etag']
+    assert 'probabilities' not in columns
+
+    classes = predictor.class_catalog()['classes']
+    for position, patient_index in enumerate(columns['patient_index']):
+        single = predictor.predict(PATIENTS[patient_index]['symptoms'])
+        top = [p['disease'] for p in single['top_predictions']]
+        assert [classes[idx] for idx in columns['top_indices'][position]] == top
+        assert columns['top_diseases'][position] == top
+        np.testing.assert_allclose(columns['top_probabilities'][position],
+                                   [p['probability'] for p in single['top_predictions']])
+
+
+def test_batch_records_format_keeps_per_patient_objects(client):
+    # Records stay the default for existing clients; columnar is opt-in
+    response = client.post('/batch_predict', json={'patients': PATIENTS})
+    body = response.get_json()
+    assert [r['status'] for r in body['results']] == ['success', 'error', 'success', 'error']
+    assert len(body['results'][0]['prediction']['all_probabilities']) == 41
+
+
+def test_predict_does_not_build_training_splits(client, model_dir, monkeypatch):
+    import app as disease_app
+    from conftest import TESTING_CSV, TRAINING_CSV
+    from disease_predictor import DiseasePredictor
+
+    serving = DiseasePredictor(training_csv_path=TRAINING_CSV, testing_csv_path=TESTING_CSV,
+                               dataset_cache_dir=os.path.join(os.path.dirname(model_dir), 'cache'),
+                               model_dir=model_dir, verbose=False)
+    monkeypatch.setattr(disease_app, 'predictor', serving)
+    assert client.post('/predict', json=PATIENTS[0]).status_code == 200
+    assert client.post('/batch_predict', json={'patients': PATIENTS}).status_code == 200
+    assert serving.X_train is None and serving.X_val is None
+
+
+def test_classes_endpoint_revalidates_with_etag(client, predictor):
+    response = client.get('/classes')
+    assert response.status_code == 200
+    assert response.get_json()['classes'] == [str(c) for c in predictor._classes()]
+    etag = response.headers['ETag']
+
+    assert client.get('/classes', headers={'If-None-Match': etag}).status_code == 304
+
+    compact = client.post('/predict', json={'symptoms': PATIENTS[0]['symptoms'], 'compact': True})
+    prediction = compact.get_json()['prediction']
+    assert 'all_probabilities' not in prediction
+    assert len(prediction['probabilities']) == 41
+    assert etag.strip('"') == prediction['classes_etag']
+
+
+def test_attendance_blueprint_is_served_by_the_main_service(client, tmp_path, monkeypatch):
+    import subprocess
+    import nurse_attendance_ml
+    from attendance_stream import StreamProcessor
+
+    monkeypatch.setattr(nurse_attendance_ml, 'stream_processor', StreamProcessor())
+    response = client.post('/ml/nurse-attendance/events', json={
+        'type': 'clock_in', 'nurse_id': 'N1', 'timestamp': '2026-03-02T07:00:00', 'late': True})
+    assert response.status_code == 200 and response.get_json()['accepted'] == 1
+    assert 'nurse_attendance' in client.get('/health').get_json()['services']
+    assert 'endpoint="/ml/nurse-attendance/events"' in client.get('/metrics').get_data(as_text=True)
+
+    # Importing either service loads no attendance estimators; a disease-only
+    # deployment does not import the attendance module at all
+    script = ("import sys, app; print(sorted(m for m in ('nurse_attendance_ml', 'sklearn.cluster') if m in sys.modules)); "
+              "import nurse_attendance_ml; print('sklearn.cluster' in sys.modules)")
+    env = dict(os.environ, ML_PRELOAD_MODELS='false', ML_SERVICES='disease',
+               ML_ATTENDANCE_SNAPSHOT=str(tmp_path / 'stream.pkl'))
+    output = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                            capture_output=True, text=True, check=True).stdout.splitlines()
+    assert output[-2:] == ['[]', 'False']
+
+
+def test_symptom_values_are_validated_and_round_trip_through_training_encoding(client, predictor, tmp_path):
+    from conftest import TRAINING_CSV
+    from dataset_cache import load_symptom_csv
+
+    matrix = predictor.encode_symptoms([{'itching': 2, 'skin_rash': True, 'chills': 0, 'cough': 1.0}])
+    assert matrix.dtype == np.uint8 and matrix.max() == 1
+    assert sorted(np.flatnonzero(matrix[0])) == sorted(predictor.symptom_columns.index(s)
+                                                       for s in ('itching', 'skin_rash', 'cough'))
+    for value in ('yes', None, [1]):
+        response = client.post('/predict', json={'symptoms': {'itching': value}})
+        assert response.status_code == 400
+        assert 'itching' in response.get_json()['error']
+
+    # The training loader's uint8 rows and label categories are what serving encodes and returns
+    train = load_symptom_csv(TRAINING_CSV, cache_dir=str(tmp_path))
+    labels = train.label_series()
+    assert list(labels.cat.categories) == predictor.class_catalog()['classes']
+    rows = np.unique(np.asarray(train.labels), return_index=True)[1]
+    positions = [train.columns.index(column) for column in predictor.symptom_columns]
+    symptom_dicts = [{column: int(train.features[row, positions[idx]])
+                      for idx, column in enumerate(predictor.symptom_columns)} for row in rows]
+    encoded = predictor.encode_symptoms(symptom_dicts)
+    np.testing.assert_array_equal(encoded, np.asarray(train.features)[rows][:, positions])
+    result = predictor.predict_matrix(encoded)
+    predicted = np.asarray(predictor.class_catalog()['classes'], dtype=object)[result['top_indices'][:, 0]]
+    assert np.mean(predicted == np.asarray(labels.iloc[rows], dtype=object)) > 0.9
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Tests for the real-time attendance stream processor
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from attendance_stream import StreamOwnershipError, StreamProcessor
+
+
+def _event(kind, nurse_id, timestamp, **fields):
+    return dict({'type': kind, 'nurse_id': nurse_id, 'timestamp': timestamp}, **fields)
+
+
+def test_anomaly_rules_fire_as_events_arrive():
+    stream = StreamProcessor()
+    _, _, alerts = stream.ingest([_event('clock_in', 'N1', '2026-03-02T07:00:00', unit='ICU', late=True)])
+    assert [a['message'] for a in alerts] == ['Uncharacteristic late arrival']
+
+    breaks = [_event('break_start', 'N1', f'2026-03-02T{9 + i:02d}:00:00') for i in range(7)]
+    _, _, alerts = stream.ingest(breaks)
+    assert [a['message'] for a in alerts] == ['Excessive breaks']
+
+    _, _, alerts = stream.ingest([_event('clock_out', 'N1', '2026-03-02T20:30:00')])
+    assert [a['message'] for a in alerts] == ['Unusually long shift']
+    assert alerts[0]['nurse_id'] == 'N1' and alerts[0]['unit'] == 'ICU'
+
+    # A second late arrival within 30 days is not uncharacteristic
+    _, _, alerts = stream.ingest([_event('clock_in', 'N1', '2026-03-10T07:10:00', late=True),
+                                  _event('clock_out', 'N1', '2026-03-10T15:10:00')])
+    assert alerts == []
+
+    accepted, rejected, _ = stream.ingest([_event('clock_out', 'N1', '2026-03-10T16:00:00'),
+                                           _event('absence', 'N1', '2026-03-01T00:00:00'),
+                                           _event('shift_swap', 'N1', '2026-03-10T16:00:00')])
+    assert accepted == 0 and [r['index'] for r in rejected] == [0, 1, 2]
+    assert [a['id'] for a in stream.alerts_after(after=1)] == [2, 3]
+
+
+def test_unit_rate_alert_and_tumbling_aggregates():
+    stream = StreamProcessor(min_alert_records=10)
+    events = []
+    for i in range(10):
+        nurse = f'N{i}'
+        if i < 2:
+            events.append(_event('absence', nurse, '2026-03-04T06:00:00', unit='ER'))
+        else:
+            events.append(_event('clock_in', nurse, '2026-03-04T07:00:00', unit='ER'))
+            events.append(_event('clock_out', nurse, '2026-03-04T15:00:00'))
+    _, _, alerts = stream.ingest(events)
+    assert [(a['type'], a['rate']) for a in alerts] == [('absence_rate', 20.0)]
+
+    # Still above the threshold the next day: no repeat alert
+    _, _, alerts = stream.ingest([_event('absence', 'N2', '2026-03-05T06:00:00')])
+    assert alerts == []
+
+    daily = stream.aggregates(window='daily', scope='unit', key='ER')
+    assert [(row['window_start'], row['records'], row['absent'], row['hours']) for row in daily] == [
+        ('2026-03-04', 10, 2, 64.0), ('2026-03-05', 1, 1, 0.0)]
+    weekly = stream.aggregates(window='weekly', scope='nurse', key='N2')
+    assert [(row['window_start'], row['records'], row['present'], row['absent']) for row in weekly] == [
+        ('2026-03-02', 2, 1, 1)]
+
+
+def test_snapshot_restore_and_endpoints(tmp_path, monkeypatch):
+    import nurse_attendance_ml
+
+    path = str(tmp_path / 'stream.pkl')
+    stream = StreamProcessor(snapshot_path=path, snapshot_seconds=0)
+    monkeypatch.setattr(nurse_attendance_ml, 'stream_processor', stream)
+    client = nurse_attendance_ml.create_app().test_client()
+
+    response = client.post('/ml/nurse-attendance/events', json={'events': [
+        _event('clock_in', 'N1', '2026-03-02T07:00:00', unit='ICU'),
+        _event('clock_out', 'N1', '2026-03-02T08:00:00')]})
+    assert response.status_code == 200
+    assert [a['message'] for a in response.get_json()['alerts']] == ['Unusually short shift']
+    assert client.post('/ml/nurse-attendance/events', json=_event('clock_out', 'N9', 0)).status_code == 400
+    feed = client.get('/ml/nurse-attendance/alerts?after=0').get_json()['alerts']
+    assert [a['id'] for a in feed] == [1]
+
+    stream.snapshot()
+    restored = StreamProcessor(snapshot_path=path)
+    assert restored.aggregates(scope='unit') == stream.aggregates(scope='unit')
+    assert restored.alerts_after() == stream.alerts_after()
+    _, _, alerts = restored.ingest([_event('clock_in', 'N1', '2026-03-03T07:00:00', late=True)])
+    assert alerts[0]['id'] == 2
+    aggregates = client.get('/ml/nurse-attendance/aggregates?window=weekly&scope=nurse&key=N1').get_json()
+    assert aggregates['aggregates'][0]['hours'] == 1.0
+
+
+def test_stream_refuses_more_than_one_worker(tmp_path, monkeypatch):
+    import nurse_attendance_ml
+
+    monkeypatch.setenv('ML_ATTENDANCE_SNAPSHOT', str(tmp_path / 'stream.pkl'))
+    with pytest.raises(StreamOwnershipError):
+        StreamProcessor.from_env(workers=2)
+    assert StreamProcessor.from_env(workers=1).snapshot_path == str(tmp_path / 'stream.pkl')
+
+    # A multi-worker server answers the stream endpoints with 503 instead of splitting the state
+    monkeypatch.setattr(nurse_attendance_ml, 'stream_processor', None)
+    monkeypatch.setattr(nurse_attendance_ml, 'stream_unavailable', 'single worker only')
+    client = nurse_attendance_ml.create_app().test_client()
+    for response in (client.post('/ml/nurse-attendance/events', json=_event('clock_in', 'N1', 0)),
+                     client.get('/ml/nurse-attendance/alerts'),
+                     client.get('/ml/nurse-attendance/aggregates')):
+        assert response.status_code == 503 and response.get_json()['error'] == 'single worker only'
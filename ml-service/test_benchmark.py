@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test script for the benchmark tooling
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+import benchmark
+
+
+def test_compare_flags_slower_latency_and_lower_throughput():
+    baseline = {'results': {'batch_predict': {'batch_10_p50_ms': 100.0, 'batch_10_rows_per_s': 100.0}}}
+    current = {'results': {'batch_predict': {'batch_10_p50_ms': 140.0, 'batch_10_rows_per_s': 70.0}}}
+    rows = benchmark.compare_results(current, baseline, tolerance=0.25)
+    assert {row['metric']: row['regression'] for row in rows} == {
+        'batch_10_p50_ms': True,
+        'batch_10_rows_per_s': True
+    }
+
+
+def test_compare_ignores_improvements_and_new_metrics():
+    baseline = {'results': {'predict_latency': {'predict_p50_ms': 50.0}}}
+    current = {'results': {'predict_latency': {'predict_p50_ms': 20.0, 'predict_p95_ms': 30.0}}}
+    rows = benchmark.compare_results(current, baseline)
+    assert len(rows) == 1
+    assert not rows[0]['regression']
+
+
+def test_nurse_benchmarks_run_offline(tmp_path):
+    output = tmp_path / 'bench.json'
+    status = benchmark.main(['--quick', '--groups', 'nurse', '--output', str(output)])
+    assert status == 0
+    assert output.exists()
+
+
+def test_serving_startup_is_within_budget(model_dir):
+    cache_dir = os.path.join(os.path.dirname(model_dir), 'cache')
+    trace = benchmark.construction_trace(model_dir, dataset_cache_dir=cache_dir)
+    # Training-only work is deferred: no sklearn at import, no datasets read or split, no progress lines
+    assert not trace['sklearn_at_import'] and not trace['splits_built']
+    assert trace['log_lines'] == 0
+    assert set(trace['phases_s']) >= {'load_or_train', 'joblib_load'}
+    assert 'load_datasets' not in trace['phases_s'] and 'preprocess_data' not in trace['phases_s']
+    assert [key for key, limit in benchmark.STARTUP_BUDGET.items() if trace[key] > limit] == []
+
+    imports = benchmark.import_profile('disease_predictor')
+    assert 'sklearn' not in imports['packages_ms'] and 'pandas' in imports['direct_ms']
+
+
+def test_serving_reads_columns_and_classes_from_the_saved_models(model_dir):
+    import json
+    import joblib
+    from conftest import TESTING_CSV, TRAINING_CSV
+    from disease_predictor import DiseasePredictor
+
+    predictor = DiseasePredictor(training_csv_path=TRAINING_CSV, testing_csv_path=TESTING_CSV,
+                                 dataset_cache_dir=os.path.join(os.path.dirname(model_dir), 'cache'),
+                                 model_dir=model_dir, verbose=False)
+    with open(os.path.join(model_dir, 'metadata.json')) as f:
+        saved_diseases = json.load(f)['diseases']
+    saved_columns = list(joblib.load(os.path.join(model_dir, 'symptom_columns.pkl')))
+    assert predictor.training_data is None and predictor.X_train is None
+    assert predictor.symptom_columns == saved_columns and predictor.diseases == saved_diseases
+
+    # The datasets are read when a split is first needed, in the saved column order
+    predictor.ensure_splits()
+    assert predictor.symptom_columns == saved_columns
+    assert predictor.X_train.shape[1] == len(saved_columns) and predictor.training_data is None
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for the calibration tables and their use in the disease predictor
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(__file__))
+
+from calibration import CalibrationTable, calibration_report, fit_calibration, reliability, threshold_table
+
+
+def test_calibration_tables_reduce_calibration_error():
+    rng = np.random.default_rng(0)
+    scores = rng.uniform(size=4000)
+    # Overconfident model: the true rate is score ** 2
+    labels = rng.uniform(size=len(scores)) < scores ** 2
+
+    for method in ('isotonic', 'platt'):
+        table, report = calibration_report(scores, labels, method=method)
+        assert report['method'] == method
+        assert np.all(np.diff(table.apply(np.linspace(0, 1, 50))) >= 0)
+        assert (report['calibrated']['expected_calibration_error']
+                < report['raw']['expected_calibration_error'] / 2)
+        restored = CalibrationTable.from_dict(report['table'])
+        assert np.array_equal(restored.apply(scores), table.apply(scores))
+    assert fit_calibration(scores[:100], labels[:100]).method == 'platt'
+    assert fit_calibration(scores, labels).method == 'isotonic'
+
+
+def test_diagnostics_on_small_example():
+    probabilities = np.array([0.05, 0.15, 0.55, 0.95])
+    labels = np.array([0, 0, 1, 1])
+    diagnostics = reliability(probabilities, labels)
+    assert [b['count'] for b in diagnostics['bins']] == [1, 1, 1, 1]
+    assert np.isclose(diagnostics['expected_calibration_error'], (0.05 + 0.15 + 0.45 + 0.05) / 4)
+    assert np.isclose(diagnostics['brier_score'], np.mean((probabilities - labels) ** 2))
+
+    rows = threshold_table(probabilities, labels, thresholds=(0.1, 0.6))
+    assert rows[0] == {'threshold': 0.1, 'flagged_rate': 0.75, 'precision': 2 / 3, 'recall': 1.0}
+    assert rows[1] == {'threshold': 0.6, 'flagged_rate': 0.25, 'precision': 1.0, 'recall': 0.5}
+
+    # One class only: a smoothed constant instead of a degenerate fit
+    constant = fit_calibration(probabilities, np.ones(4))
+    assert constant.method == 'constant' and np.allclose(constant.apply(probabilities), 5 / 6)
+
+
+def test_predictions_report_calibrated_confidence(client, predictor, tmp_path, monkeypatch):
+    # Calibrate the shared predictor for this test only, saving into a scratch directory
+    for attribute in ('calibration', 'calibration_report'):
+        monkeypatch.setattr(predictor, attribute, getattr(predictor, attribute))
+    monkeypatch.setattr(predictor, 'metadata', dict(predictor.metadata))
+    monkeypatch.setattr(predictor, 'model_dir', str(tmp_path))
+    served = dict(predictor.models)
+    predictor.calibrate_confidence()
+    # The folds refit copies; the served members are untouched
+    assert predictor.models == served
+    predictor.save_calibration()
+    fitted = predictor.calibration
+    predictor.load_calibration()
+    assert set(predictor.calibration) >= {'full', 'cascade'}
+    assert np.array_equal(predictor.calibration['full'].y, fitted['full'].y)
+    assert {'thresholds', 'test', 'held_out'} <= set(predictor.metadata['calibration']['full'])
+    # Fitted on out-of-fold scores over the whole training split, not the validation rows
+    assert predictor.metadata['calibration']['full']['calibrated']['n_samples'] == len(predictor.X_train)
+
+    result = predictor.predict_matrix(predictor.X_val[:5], profile='full')
+    expected = predictor.calibration['full'].apply(result['top_probabilities'][:, 0])
+    assert np.allclose(result['confidence'], expected)
+    record = predictor.prediction_record(result, 0)
+    assert record['confidence'] == expected[0]
+    assert record['raw_confidence'] == result['top_probabilities'][0, 0]
+
+    column = predictor.symptom_columns[0]
+    batch = client.post('/batch_predict', json={'patients': [{'symptoms': {column: 1}}] * 2,
+                                               'format': 'columnar'}).get_json()
+    assert len(batch['results']['confidence']) == 2
+    performance = client.get('/model_performance').get_json()
+    assert performance['calibration']['full']['method'] == predictor.calibration['full'].method
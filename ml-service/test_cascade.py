@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for the confidence-gated cascade profile
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(__file__))
+
+from cascade import Cascade, cascade_report, top_margin
+
+
+def test_margin_gate():
+    proba = np.array([[0.7, 0.2, 0.1], [0.4, 0.35, 0.25], [0.5, 0.5, 0.0]])
+    np.testing.assert_allclose(top_margin(proba), [0.5, 0.05, 0.0])
+    assert Cascade('extra_trees', 0.3).confident(proba).tolist() == [True, False, False]
+
+
+def test_cascade_profile_escalates_low_margin_rows(predictor, monkeypatch):
+    monkeypatch.setattr(predictor, 'cascade', Cascade('random_forest', 0.5))
+    rng = np.random.default_rng(0)
+    # Clean validation rows clear the gate, random symptom sets mostly do not
+    random_rows = (rng.random((50, len(predictor.symptom_columns))) < 0.05).astype(np.uint8)
+    symptoms = np.vstack([predictor.X_val[:50], random_rows])
+    result = predictor.predict_matrix(symptoms, profile='cascade')
+    full = predictor.predict_matrix(symptoms, profile='full')
+    first = predictor.predict_matrix(symptoms, profile='full')['member_predictions']['random_forest']
+
+    escalated = result['tiers'] == 'voting_ensemble'
+    assert result['primary_model'] == 'cascade:random_forest'
+    assert 0 < escalated.sum() < len(symptoms)
+    np.testing.assert_allclose(result['probabilities'][escalated], full['probabilities'][escalated])
+    assert np.all(result['top_indices'][~escalated, 0] == first[~escalated])
+
+    record = predictor.prediction_record(result, int(np.flatnonzero(escalated)[0]))
+    assert record['tier'] == 'voting_ensemble'
+    assert 'tier' not in predictor.prediction_record(full, 0)
+
+
+def test_report_selects_cheapest_setting_within_tolerance(predictor):
+    selected, report = cascade_report(predictor, thresholds=(0.3, 0.9), tolerance=0.02)
+    floor = report['teacher']['validation_accuracy'] - 0.02
+    eligible = [c for c in report['candidates'] if c['validation_accuracy'] >= floor]
+    assert report['selected']['expected_latency_ms'] == min(c['expected_latency_ms'] for c in eligible)
+    assert selected.describe() == {'member': report['selected']['member'],
+                                   'threshold': report['selected']['threshold']}
+    assert {c['threshold'] for c in report['candidates']} == {0.3, 0.9}
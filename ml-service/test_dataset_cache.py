@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test script for the binary dataset cache
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+import numpy as np
+
+from dataset_cache import load_symptom_csv
+
+CSV = "itching,skin_rash,cough,prognosis,\n1,0,0,Fungal infection,\n0,1,1,Allergy,\n1,,1,Fungal infection,\n"
+
+
+def _write_csv(tmp_path, content=CSV):
+    path = tmp_path / 'Training.csv'
+    path.write_text(content)
+    return str(path)
+
+
+def test_first_load_parses_and_writes_cache(tmp_path):
+    csv_path = _write_csv(tmp_path)
+    dataset = load_symptom_csv(csv_path, cache_dir=str(tmp_path / 'cache'))
+    
+    assert not dataset.from_cache
+    assert dataset.columns == ['itching', 'skin_rash', 'cough']
+    assert dataset.features.dtype == np.uint8
+    assert dataset.features.tolist() == [[1, 0, 0], [0, 1, 1], [1, 0, 1]]
+    assert list(dataset.label_series()) == ['Fungal infection', 'Allergy', 'Fungal infection']
+    assert any(name.endswith('.features.npy') for name in os.listdir(tmp_path / 'cache'))
+
+
+def test_second_load_memory_maps_cache(tmp_path):
+    csv_path = _write_csv(tmp_path)
+    first = load_symptom_csv(csv_path, cache_dir=str(tmp_path / 'cache'))
+    second = load_symptom_csv(csv_path, cache_dir=str(tmp_path / 'cache'))
+    
+    assert second.from_cache
+    assert isinstance(second.features, np.memmap)
+    assert np.array_equal(first.features, second.features)
+    assert second.classes == first.classes
+
+
+def test_changed_content_invalidates_cache(tmp_path):
+    csv_path = _write_csv(tmp_path)
+    load_symptom_csv(csv_path, cache_dir=str(tmp_path / 'cache'))
+    _write_csv(tmp_path, CSV + "0,0,1,Common Cold,\n")
+    
+    dataset = load_symptom_csv(csv_path, cache_dir=str(tmp_path / 'cache'))
+    assert not dataset.from_cache
+    assert len(dataset) == 4
+    assert 'Common Cold' in dataset.classes
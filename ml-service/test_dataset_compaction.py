@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for training-set compaction
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(__file__))
+
+from dataset_compaction import CompactTrainingSet, group_folds, weighted_tree_params
+
+
+def test_compaction_counts_duplicates_and_groups_patterns():
+    X = np.array([[1, 0], [0, 1], [1, 0], [1, 0], [0, 1], [1, 0]], dtype=np.uint8)
+    y = pd.Series(pd.Categorical(['a', 'b', 'a', 'c', 'b', 'a']))
+    compact = CompactTrainingSet.from_rows(X, y)
+
+    assert compact.X.tolist() == [[1, 0], [0, 1], [1, 0]]
+    assert list(compact.y) == ['a', 'b', 'c']
+    assert compact.sample_weight.tolist() == [3, 2, 1]
+    # Same symptoms with a different label stay in one CV group
+    assert compact.groups[0] == compact.groups[2] != compact.groups[1]
+    assert compact.describe() == {'rows': 6, 'unique_rows': 3, 'symptom_patterns': 2, 'compaction_ratio': 2.0}
+
+    # Estimators without sample_weight get the original rows back
+    X_rows, y_rows, groups = compact.expanded()
+    assert sorted(zip(map(tuple, X_rows.tolist()), y_rows)) == sorted(zip(map(tuple, X.tolist()), y))
+    assert list(y_rows.cat.categories) == ['a', 'b', 'c']
+    assert groups.tolist() == [compact.groups[0]] * 3 + [compact.groups[1]] * 2 + [compact.groups[2]]
+
+
+def test_weighted_fit_matches_duplicated_rows(predictor):
+    from sklearn.ensemble import GradientBoostingClassifier
+
+    X, y = predictor.X_train[:1500], np.asarray(predictor.y_train)[:1500]
+    compact = CompactTrainingSet.from_rows(X, y)
+    assert len(compact.X) < len(X) / 5
+
+    full = GradientBoostingClassifier(n_estimators=3, max_depth=3, random_state=42).fit(X, y)
+    weighted = GradientBoostingClassifier(n_estimators=3, max_depth=3, random_state=42).fit(
+        compact.X, compact.y, **compact.fit_params())
+    # Same weighted loss at every stage; trees may differ only where split gains tie
+    np.testing.assert_allclose(weighted.train_score_, full.train_score_)
+    assert np.mean(weighted.predict(predictor.X_val) == full.predict(predictor.X_val)) > 0.99
+
+    # No symptom pattern lands on both sides of a fold
+    for train, test in group_folds(3).split(compact.X, compact.y, compact.groups):
+        assert not set(compact.groups[train]) & set(compact.groups[test])
+
+
+def test_tree_limits_move_to_sample_weight():
+    assert weighted_tree_params({'min_samples_split': 5, 'min_samples_leaf': 2, 'max_depth': 20}, 1000) == {
+        'min_samples_split': 2, 'min_samples_leaf': 1, 'min_weight_fraction_leaf': 0.002, 'max_depth': 20}
+    grid = weighted_tree_params({'min_samples_split': [2, 5], 'min_samples_leaf': [1, 2]}, 100)
+    assert grid == {'min_samples_split': [2], 'min_samples_leaf': [1], 'min_weight_fraction_leaf': [0.01, 0.02]}
+
+
+def test_soft_vote_reuses_fitted_members(predictor):
+    from sklearn.base import clone
+    from sklearn.model_selection import cross_val_score
+
+    from disease_predictor import fitted_soft_vote
+
+    members = list(predictor.models['voting_ensemble'].named_estimators_.items())
+    voting = fitted_soft_vote(members)
+    X_val = predictor.feature_selector.transform(predictor.X_val[:200])
+    # The served vote holds the very members trained before it, not refitted clones
+    assert all(voting.named_estimators_[name] is model for name, model in members)
+    expected = np.mean([model.predict_proba(X_val) for _, model in members], axis=0)
+    np.testing.assert_allclose(voting.predict_proba(X_val), expected)
+    assert list(voting.predict(X_val)) == list(voting.classes_[np.argmax(expected, axis=1)])
+    # Still an ordinary VotingClassifier for CV (which clones and refits it)
+    assert clone(voting).get_params()['voting'] == 'soft'
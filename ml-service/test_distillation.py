@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test script for the fast-profile distillation
+"""
+
+import subprocess
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+import numpy as np
+
+from distillation import FastModel, soft_label_dataset
+
+
+def test_soft_label_expansion_keeps_teacher_mass():
+    X = np.array([[1, 0], [0, 1]], dtype=np.uint8)
+    teacher = np.array([[0.7, 0.3, 0.0], [0.0, 0.0004, 0.9996]])
+    X_soft, y_soft, weights = soft_label_dataset(X, teacher, np.array(['a', 'b', 'c']))
+    assert y_soft.tolist() == ['a', 'b', 'c']
+    assert np.allclose(weights, [0.7, 0.3, 0.9996])
+    assert X_soft.tolist() == [[1, 0], [1, 0], [0, 1]]
+
+
+def test_distilled_profile_serves_fast_predictions(predictor):
+    predictor.distill_fast_profile(tolerance=0.05)
+    report = predictor.fast_profile_report
+    assert report['selected'] is not None
+    selected = next(c for c in report['candidates'] if c['name'] == report['selected'])
+    assert selected['validation_accuracy'] >= report['teacher']['validation_accuracy'] - 0.05
+    assert selected['latency_ms'] == min(
+        c['latency_ms'] for c in report['candidates']
+        if c['validation_accuracy'] >= report['teacher']['validation_accuracy'] - 0.05)
+    # Subset accuracies come from cached member probabilities; they match the real members
+    _, X_val, _ = predictor.selected_feature_splits()
+    members = dict(predictor._serving_members())
+    classes = np.asarray(predictor._classes())
+    for candidate in [c for c in report['candidates'] if c['kind'] == 'subset'][:3]:
+        subset = FastModel('subset', candidate['name'], classes, members=candidate['name'][7:].split('+'))
+        predicted = classes[np.argmax(subset.predict_proba(X_val, members), axis=1)]
+        assert candidate['validation_accuracy'] == np.mean(predicted == np.asarray(predictor.y_val))
+    
+    symptoms = {'itching': 1, 'skin_rash': 1, 'nodal_skin_eruptions': 1}
+    fast = predictor.predict(symptoms, profile='fast')
+    assert fast['primary_model'] == f"fast:{report['selected']}"
+    assert np.isclose(sum(fast['all_probabilities'].values()), 1.0)
+    full = predictor.predict(symptoms)
+    assert full['primary_model'] == 'voting_ensemble'
+
+
+def test_student_probabilities_align_with_ensemble_classes():
+    from sklearn.linear_model import LogisticRegression
+    X = np.array([[0, 1], [1, 0], [1, 1]])
+    student = LogisticRegression().fit(X, ['b', 'c', 'c'])
+    model = FastModel('student', 'logistic_regression', ['a', 'b', 'c'], estimator=student)
+    proba = model.predict_proba(X)
+    assert proba.shape == (3, 3)
+    assert np.all(proba[:, 0] == 0)
+    assert np.allclose(proba.sum(axis=1), 1.0)
+
+
+def test_serving_imports_skip_the_student_estimators():
+    # load_fast_profile / load_cascade import this module on every serving start
+    code = ('import sys, distillation, cascade; '
+            'print(any(name.split(".")[0] == "sklearn" for name in sys.modules))')
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    assert output.strip() == 'False'
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests for the leave-one-symptom-out explanations
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(__file__))
+
+from explanations import ExplanationCache, perturbed_rows
+
+
+def test_perturbed_rows_clear_one_active_symptom_each():
+    matrix = np.array([[1, 0, 1], [0, 0, 0], [0, 1, 0]], dtype=np.uint8)
+    perturbed, source, columns = perturbed_rows(matrix, [0, 1, 2])
+    assert source.tolist() == [0, 0, 2]
+    assert columns.tolist() == [0, 2, 1]
+    assert perturbed.tolist() == [[0, 0, 1], [1, 0, 0], [0, 0, 0]]
+
+
+def test_contributions_match_single_row_deltas(predictor, monkeypatch):
+    monkeypatch.setattr(predictor, 'explanation_cache', ExplanationCache())
+    matrix = np.vstack([predictor.X_val[:3], np.zeros((1, predictor.X_val.shape[1]), dtype=np.uint8)])
+    result = predictor.explain(matrix, predictor.predict_matrix(matrix, profile='full'), profile='full')
+
+    predicted, contributions = result['explanations'][0]
+    assert predicted == result['top_indices'][0, 0]
+    assert sorted(position for position, _ in contributions) == np.flatnonzero(matrix[0]).tolist()
+    deltas = [delta for _, delta in contributions]
+    assert deltas == sorted(deltas, reverse=True)
+    position, delta = contributions[0]
+    without = matrix[:1].copy()
+    without[0, position] = 0
+    expected = (result['probabilities'][0, predicted]
+                - predictor.predict_matrix(without, profile='full')['probabilities'][0, predicted])
+    assert np.isclose(delta, expected)
+    assert result['explanations'][3][1] == []
+
+    # Repeated patterns come from the cache
+    predictor.explain(matrix, predictor.predict_matrix(matrix, profile='full'), profile='full')
+    assert predictor.explanation_cache.stats()['hits'] == 4
+
+
+def test_predict_endpoints_return_explanations(client, predictor):
+    column = predictor.symptom_columns[0]
+    prediction = client.post('/predict', json={'symptoms': {column: 1, predictor.symptom_columns[1]: 1}}).get_json()
+    explanation = prediction['prediction']['explanation']
+    assert explanation['disease'] == prediction['prediction']['predicted_condition']
+    assert {item['symptom'] for item in explanation['contributions']} == set(predictor.symptom_columns[:2])
+    assert 'explanation' not in client.post('/predict', json={'symptoms': {column: 1}, 'explain': False}
+                                            ).get_json()['prediction']
+
+    batch = client.post('/batch_predict', json={'patients': [{'symptoms': {column: 1}}], 'explain': True,
+                                                'format': 'columnar'}).get_json()
+    assert [item['symptom'] for item in batch['results']['explanations'][0]] == [column]
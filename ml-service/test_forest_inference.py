@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Tests for the compiled tree-ensemble inference backend
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(__file__))
+
+from forest_inference import CompiledBoosting, CompiledForest, CompiledTrees, load_or_compile
+
+
+def _binary_rows(predictor, n_rows=200):
+    rng = np.random.default_rng(0)
+    X_val = predictor.selected_feature_splits()[1]
+    random_rows = (rng.random((n_rows, X_val.shape[1])) < 0.05).astype(np.uint8)
+    return np.vstack([X_val, random_rows])
+
+
+def test_compiled_forests_match_sklearn_probabilities(predictor):
+    X = _binary_rows(predictor)
+    voting = predictor.models['voting_ensemble']
+    for key in ('rf', 'et'):
+        forest = voting.named_estimators_[key]
+        compiled = CompiledForest.from_sklearn(forest)
+        assert compiled.binary_splits
+        assert compiled.n_trees == len(forest.estimators_)
+        np.testing.assert_allclose(compiled.predict_proba(X), forest.predict_proba(X), atol=1e-6)
+        np.testing.assert_array_equal(compiled.predict(X), forest.predict(X))
+
+
+def test_compiled_boosting_matches_sklearn_probabilities(predictor):
+    X = _binary_rows(predictor)
+    boosting = predictor.models['voting_ensemble'].named_estimators_['gb']
+    compiled = CompiledBoosting.from_sklearn(boosting)
+    assert compiled.n_trees == boosting.estimators_.size
+    # Three-stage test models leave many exact ties, so compare probabilities only
+    np.testing.assert_allclose(compiled.predict_proba(X), boosting.predict_proba(X), atol=1e-9)
+
+
+def test_export_is_reused_per_model_version(predictor, tmp_path):
+    forest = predictor.models['voting_ensemble'].named_estimators_['rf']
+    directory = str(tmp_path / 'random_forest')
+    X = _binary_rows(predictor, n_rows=20)
+
+    first = load_or_compile(forest, directory, 'v1')
+    reloaded = CompiledTrees.load(directory, 'v1')
+    assert isinstance(reloaded, CompiledForest)
+    assert isinstance(reloaded.value, np.memmap)
+    np.testing.assert_array_equal(reloaded.apply(X), first.apply(X))
+
+    # A different model version must not pick up the stale export
+    assert CompiledForest.load(directory, 'v2') is None
+    load_or_compile(forest, directory, 'v2')
+    assert CompiledForest.load(directory, 'v2') is not None
+
+
+def test_predictor_serves_compiled_forests(predictor):
+    members = dict(predictor._serving_members())
+    assert isinstance(members['random_forest'], CompiledForest)
+    assert isinstance(members['extra_trees'], CompiledForest)
+    assert isinstance(members['gradient_boosting'], CompiledBoosting)
+
+    X = predictor.selected_feature_splits()[1]
+    voting = predictor.models['voting_ensemble']
+    combined, primary = predictor._ensemble_probabilities(predictor._member_probabilities(X))
+    assert primary == 'voting_ensemble'
+    np.testing.assert_allclose(combined, voting.predict_proba(X), atol=1e-6)
+
+
+def test_unversioned_exports_are_keyed_on_content_and_private_api_is_guarded(predictor, tmp_path, monkeypatch):
+    from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+
+    voting = predictor.models['voting_ensemble']
+    X, y = predictor.selected_feature_splits()[1], np.asarray(predictor.y_val)
+    directory = str(tmp_path / 'random_forest')
+    load_or_compile(voting.named_estimators_['rf'], directory, 'unknown')
+
+    # A retrained model saved without a version must not reuse that export
+    retrained = RandomForestClassifier(n_estimators=3, random_state=7).fit(X, y)
+    compiled = load_or_compile(retrained, directory, 'unknown')
+    np.testing.assert_allclose(compiled.predict_proba(X), retrained.predict_proba(X), atol=1e-6)
+
+    # Without the private init-score method, boosting stays on the sklearn path
+    def removed(self, X):
+        raise AttributeError('_raw_predict_init')
+    monkeypatch.setattr(GradientBoostingClassifier, '_raw_predict_init', removed)
+    assert CompiledBoosting.from_sklearn(voting.named_estimators_['gb']) is None
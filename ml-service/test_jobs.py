@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for the background job queue
+"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(__file__))
+
+import jobs
+
+PATIENTS = [{'symptoms': {'itching': 1, 'skin_rash': 1}},
+            {'symptoms': {}},
+            {'symptoms': {'continuous_sneezing': 1, 'chills': 1}}] * 10
+
+
+def _matrix(predictor, n_rows=25):
+    matrix = (np.random.default_rng(0).random((n_rows, len(predictor.symptom_columns))) < 0.05).astype(np.uint8)
+    matrix[:, 0] = 1
+    return matrix
+
+
+def test_claim_respects_bound_and_queued_jobs_cancel(tmp_path):
+    store = jobs.JobStore(str(tmp_path))
+    first = store.submit('retrain')
+    second = store.submit('retrain')
+
+    assert store.claim(max_running=1) == first
+    assert store.claim(max_running=1) is None
+    assert store.cancel(second)['status'] == 'cancelled'
+    assert store.cancel(first)['cancel_requested']
+
+    # A fresh heartbeat keeps the job; a stale one sends it back to the queue,
+    # even when its pid now belongs to a live process (a restarted container)
+    assert store.requeue_orphans() == []
+    store.heartbeat([first])
+    assert store.get(first)['status'] == 'running'
+    with store._connect() as conn:
+        conn.execute('UPDATE jobs SET runner_pid = ?, heartbeat_at = ? WHERE id = ?',
+                     (os.getpid(), time.time() - jobs.ORPHAN_SECONDS - 1, first))
+    assert store.requeue_orphans() == [first]
+    assert store.get(first)['status'] == 'queued'
+
+
+def test_batch_job_pages_match_direct_prediction(tmp_path, predictor, monkeypatch):
+    monkeypatch.setattr(jobs, '_worker_predictor', predictor)
+    monkeypatch.setattr(jobs, 'CHUNK_ROWS', 10)
+    store = jobs.JobStore(str(tmp_path))
+    matrix = _matrix(predictor)
+    job_id = store.submit('batch_predict', {'top_k': 3}, matrix, np.arange(100, 125))
+
+    assert store.claim(1) == job_id
+    assert jobs.execute_job(store.jobs_dir, job_id) == 'succeeded'
+    job = store.get(job_id)
+    assert job['progress'] == 1.0
+    assert job['result']['classes_etag'] == predictor.class_catalog()['etag']
+
+    expected = predictor.predict_matrix(matrix, top_k=3)
+    page = store.results(job_id, offset=5, limit=12)
+    assert page['patient_index'] == list(range(105, 117))
+    np.testing.assert_array_equal(page['top_indices'], expected['top_indices'][5:17])
+    np.testing.assert_allclose(page['top_probabilities'], expected['top_probabilities'][5:17])
+
+
+def test_running_job_stops_at_next_chunk_when_cancelled(tmp_path, predictor, monkeypatch):
+    monkeypatch.setattr(jobs, '_worker_predictor', predictor)
+    monkeypatch.setattr(jobs, 'CHUNK_ROWS', 10)
+    store = jobs.JobStore(str(tmp_path))
+    job_id = store.submit('batch_predict', {}, _matrix(predictor), np.arange(25))
+    store.claim(1)
+    store.cancel(job_id)
+
+    assert jobs.execute_job(store.jobs_dir, job_id) == 'cancelled'
+    assert store.get(job_id)['done'] == 10
+
+
+def test_cancel_stops_a_running_retrain(tmp_path, predictor, monkeypatch):
+    monkeypatch.setattr(jobs, '_worker_settings', dict(predictor.settings(), verbose=False))
+    store = jobs.JobStore(str(tmp_path))
+    job_id = store.submit('retrain')
+    store.claim(1)
+    outcome = []
+    runner = threading.Thread(target=lambda: outcome.append(jobs.execute_job(store.jobs_dir, job_id)))
+    runner.start()
+    time.sleep(2)
+    started = time.monotonic()
+    store.cancel(job_id)
+    runner.join(timeout=60)
+
+    # The training child is terminated at the next poll, not after the full fit
+    assert outcome == ['cancelled']
+    assert time.monotonic() - started < 30
+    assert store.get(job_id)['status'] == 'cancelled'
+    assert not os.path.exists(store.model_dir(job_id))
+
+
+def test_jobs_endpoints_run_on_the_process_pool(client, tmp_path, monkeypatch):
+    import app as disease_app
+
+    monkeypatch.setenv('ML_JOBS_DIR', str(tmp_path))
+    monkeypatch.setattr(disease_app, 'job_store', None)
+    monkeypatch.setattr(disease_app, 'job_runner', None)
+    try:
+        response = client.post('/jobs', json={'patients': PATIENTS, 'top_k': 2})
+        assert response.status_code == 202
+        job_id = response.get_json()['id']
+        assert response.headers['Location'] == f'/jobs/{job_id}'
+
+        job = jobs.wait_for(disease_app.job_store, job_id, timeout=120)
+        assert job['status'] == 'succeeded', job['error']
+        # Pinned to the served model, so a later promotion does not change the scoring
+        assert job['params']['model_dir'] == os.path.abspath(disease_app.predictor.model_dir)
+
+        body = client.get(f'/jobs/{job_id}/results?offset=0&limit=15').get_json()
+        assert body['total'] == 20
+        assert body['results']['patient_index'][:4] == [0, 2, 3, 5]
+        assert len(body['results']['top_indices']) == 15
+        assert [error['patient_index'] for error in body['errors']] == list(range(1, 30, 3))
+        assert client.get('/jobs/missing').status_code == 404
+    finally:
+        if disease_app.job_runner is not None:
+            disease_app.job_runner.shutdown()
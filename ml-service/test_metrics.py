@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test script for the metrics instrumentation
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+import numpy as np
+
+import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = metrics.MetricsRegistry()
+    histogram = registry.histogram('demo_seconds', 'Demo', ('endpoint',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, '/a')
+    histogram.observe(0.5, '/a')
+    histogram.observe(5.0, '/a')
+    text = registry.render()
+    assert 'demo_seconds_bucket{endpoint="/a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{endpoint="/a",le="1.0"} 2' in text
+    assert 'demo_seconds_bucket{endpoint="/a",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{endpoint="/a"} 3' in text
+
+
+def test_single_pass_ensemble_matches_voting_classifier(predictor):
+    symptoms = {'itching': 1, 'skin_rash': 1, 'nodal_skin_eruptions': 1}
+    result = predictor.predict(symptoms)
+    vector = np.zeros((1, len(predictor.symptom_columns)), dtype=np.uint8)
+    for symptom in symptoms:
+        vector[0, predictor.symptom_columns.index(symptom)] = 1
+    expected = predictor.models['voting_ensemble'].predict_proba(predictor.feature_selector.transform(vector))[0]
+    classes = predictor.models['voting_ensemble'].classes_
+    assert result['primary_model'] == 'voting_ensemble'
+    assert np.allclose([result['all_probabilities'][c] for c in classes], expected)
+    assert set(result['individual_predictions']) == {
+        'random_forest', 'svm', 'gradient_boosting', 'extra_trees', 'neural_network'
+    }
+
+
+def test_metrics_endpoint_reports_requests_and_stages(client):
+    before = metrics.REQUESTS.value('/predict', 'POST', '200')
+    response = client.post('/predict', json={'symptoms': {'itching': 1, 'skin_rash': 1}})
+    assert response.status_code == 200
+    client.post('/predict', json={})
+    
+    assert metrics.REQUESTS.value('/predict', 'POST', '200') == before + 1
+    assert metrics.ERRORS.value('/predict', '400') >= 1
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'ml_http_request_duration_seconds_bucket{endpoint="/predict"' in text
+    for stage in ('json_parse', 'encode', 'feature_selection', 'ensemble', 'serialize'):
+        assert f'ml_stage_duration_seconds_count{{stage="{stage}",model=""}}' in text
+    assert 'ml_stage_duration_seconds_count{stage="predict_proba",model="svm"}' in text
+
+
+def test_disabled_stage_is_shared_noop(monkeypatch):
+    monkeypatch.setattr(metrics, 'ENABLED', False)
+    assert metrics.stage('encode') is metrics.stage('ensemble')
+    with metrics.stage('encode'):
+        pass
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared (memory-mapped) model bundle
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from conftest import TESTING_CSV, TRAINING_CSV
+from model_bundle import (BUNDLE_FORMAT_VERSION, SharedVotingEnsemble, _remove_stale_bundles, bundle_path,
+                          lease_bundle, memory_usage)
+
+
+@pytest.fixture(scope='module')
+def shared_predictor(model_dir):
+    from disease_predictor import DiseasePredictor
+    return DiseasePredictor(
+        training_csv_path=TRAINING_CSV,
+        testing_csv_path=TESTING_CSV,
+        dataset_cache_dir=os.path.join(os.path.dirname(model_dir), 'cache'),
+        model_dir=model_dir,
+        model_memory='shared'
+    )
+
+
+def test_shared_predictor_matches_private(predictor, shared_predictor):
+    assert isinstance(shared_predictor.models['voting_ensemble'], SharedVotingEnsemble)
+    assert set(shared_predictor.models) == set(predictor.models)
+    assert shared_predictor.class_catalog() == predictor.class_catalog()
+    assert shared_predictor.symptom_catalog() == predictor.symptom_catalog()
+
+    rng = np.random.default_rng(0)
+    symptoms = (rng.random((200, len(predictor.symptom_columns))) < 0.05).astype(np.uint8)
+    private = predictor.predict_matrix(symptoms)
+    shared = shared_predictor.predict_matrix(symptoms)
+    np.testing.assert_allclose(shared['probabilities'], private['probabilities'], atol=1e-6)
+    np.testing.assert_array_equal(shared['top_indices'][:, 0], private['top_indices'][:, 0])
+
+
+def test_bundle_members_are_memory_mapped(shared_predictor, model_dir):
+    assert os.path.isdir(bundle_path(model_dir, 'test'))
+    members = shared_predictor.models['voting_ensemble'].named_estimators_
+    assert isinstance(members['rf'].value, np.memmap)
+    assert isinstance(members['gb'].value, np.memmap)
+    assert isinstance(members['svm'].support_vectors_, np.memmap)
+    assert isinstance(members['nn'].coefs_[0], np.memmap)
+
+
+@pytest.mark.skipif(memory_usage() is None, reason='needs /proc/<pid>/smaps_rollup')
+def test_stale_bundles_leased_by_live_workers_are_kept(tmp_path):
+    model_dir = str(tmp_path)
+    for version in ('v1', 'v2', 'v3'):
+        os.makedirs(bundle_path(model_dir, version))
+        with open(os.path.join(bundle_path(model_dir, version), 'meta.json'), 'w') as f:
+            json.dump({'format_version': BUNDLE_FORMAT_VERSION, 'model_version': version}, f)
+    lease_bundle(model_dir, 'v1')
+    exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+    with open(os.path.join(model_dir, 'bundle', '.leases', exited.stdout.strip()), 'w') as f:
+        f.write('v2')
+
+    _remove_stale_bundles(model_dir, 'v3')
+
+    assert os.path.isdir(bundle_path(model_dir, 'v1'))
+    assert not os.path.exists(bundle_path(model_dir, 'v2'))
+    assert os.path.isdir(bundle_path(model_dir, 'v3'))
+    assert os.listdir(os.path.join(model_dir, 'bundle', '.leases')) == [str(os.getpid())]
+
+
+def test_memory_usage_reports_rss_and_pss():
+    usage = memory_usage()
+    assert usage['rss_mb'] > 0
+    assert 0 < usage['pss_mb'] <= usage['rss_mb']
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script for the NurseAttendanceML analytics
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from nurse_attendance_ml import NurseAttendanceML
+
+
+def _roster(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'nurse_id': [f'N{i}' for i in range(n)],
+        'name': [f'Nurse {i}' for i in range(n)],
+        'totalHours': rng.normal(38, 6, n),
+        'unit': rng.choice(['ICU', 'ER', 'Ward A'], n)
+    })
+
+
+def test_workload_balance_keeps_flat_roster_shape():
+    ml = NurseAttendanceML()
+    roster = [
+        {'nurse_id': 'N1', 'name': 'A', 'totalHours': 50},
+        {'nurse_id': 'N2', 'name': 'B', 'totalHours': 20},
+        {'nurse_id': 'N3', 'name': 'C', 'totalHours': 38},
+        {'nurse_id': 'N1', 'name': 'A', 'totalHours': 46},
+    ]
+    analysis = ml.analyze_workload_balance(roster)
+    # Row-level, as the endpoint always was: repeated nurse_ids are not merged
+    assert analysis['total_nurses'] == 4
+    assert analysis['max_hours'] == 50
+    assert analysis['overworked_nurses'] == [{'nurse_id': 'N1', 'name': 'A', 'totalHours': 50},
+                                             {'nurse_id': 'N1', 'name': 'A', 'totalHours': 46}]
+    assert [n['nurse_id'] for n in analysis['underutilized_nurses']] == ['N2']
+    assert analysis['std_hours'] == pytest.approx(pd.Series([50, 20, 38, 46]).std())
+
+
+def test_workload_distribution_matches_pandas_per_unit():
+    ml = NurseAttendanceML()
+    roster = _roster()
+    result = ml.analyze_workload_distribution(roster, limit=10)
+    grouped = roster.groupby('unit')['totalHours']
+    
+    for unit in result['units']:
+        hours = roster.loc[roster['unit'] == unit['unit'], 'totalHours']
+        assert unit['count'] == len(hours)
+        assert np.isclose(unit['mean'], hours.mean())
+        assert np.isclose(unit['std'], grouped.std()[unit['unit']])
+        assert np.isclose(unit['percentiles']['p90'], hours.quantile(0.9))
+        sorted_hours = np.sort(hours.to_numpy())
+        ranks = np.arange(1, len(sorted_hours) + 1)
+        gini = ((2 * ranks - len(sorted_hours) - 1) * sorted_hours).sum() / (len(sorted_hours) * sorted_hours.sum())
+        assert np.isclose(unit['gini'], gini)
+    
+    overworked = result['overworked_nurses']
+    assert overworked['total'] == int((roster['totalHours'] > 45).sum())
+    assert len(overworked['items']) == min(10, overworked['total'])
+    page_hours = [n['totalHours'] for n in overworked['items']]
+    assert page_hours == sorted(page_hours, reverse=True)
+
+    # Large hours with a tiny spread: E[x^2] - E[x]^2 would cancel to noise here
+    shifted = roster.assign(totalHours=roster['totalHours'] * 1e-4 + 1e8)
+    for unit in ml.analyze_workload_distribution(shifted)['units']:
+        hours = shifted.loc[shifted['unit'] == unit['unit'], 'totalHours']
+        assert np.isclose(unit['std'], hours.std(), rtol=1e-6)
+
+
+def test_workload_distribution_aggregates_event_chunks():
+    ml = NurseAttendanceML()
+    days = pd.date_range('2026-01-05', periods=14)
+    events = pd.DataFrame({
+        'nurse_id': np.repeat(['N1', 'N2'], len(days)),
+        'date': np.tile(days, 2),
+        'totalHours': np.r_[np.full(len(days), 8.0), np.full(len(days), 4.0)],
+        'unit': 'ICU'
+    })
+    chunks = (events.iloc[i:i + 5] for i in range(0, len(events), 5))
+    result = ml.analyze_workload_distribution(chunks, overworked_hours=50, underutilized_hours=30)
+    assert result['total_nurses'] == 2
+    assert [n['totalHours'] for n in result['overworked_nurses']['items']] == [56.0]
+    assert [n['totalHours'] for n in result['underutilized_nurses']['items']] == [28.0]
+
+
+def test_absence_risk_is_calibrated_on_held_out_scores(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('models')
+    rng = np.random.default_rng(1)
+    dates = pd.date_range('2026-01-01', periods=90)
+    history = pd.DataFrame({
+        'nurse_id': 'N1',
+        'date': dates,
+        'shift': rng.choice(['Morning', 'Evening', 'Night'], len(dates)),
+        'status': np.where(rng.uniform(size=len(dates)) < 0.3, 'Absent', 'Present'),
+        'totalHours': rng.uniform(4, 12, len(dates)),
+        'breaks': [[]] * len(dates)
+    })
+    trained = NurseAttendanceML().train_absence_predictor(history)
+    assert os.path.exists('models/absence_calibration.json')
+    assert trained['calibration']['calibrated']['n_samples'] == len(dates)
+
+    ml = NurseAttendanceML()
+    day = history.iloc[10].to_dict()
+    risk = ml.predict_absence_risk(day)
+    assert risk['calibrated']
+    assert np.isclose(risk['risk_score'], ml.absence_calibration.apply(risk['raw_score']))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests for the exact-match pattern table tier
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(__file__))
+
+from pattern_table import PatternTable, build_pattern_table
+
+
+def _mixed_rows(predictor):
+    # Stored training patterns interleaved with random (unstored) symptom sets
+    rng = np.random.default_rng(1)
+    random_rows = (rng.random((20, len(predictor.symptom_columns))) < 0.05).astype(np.uint8)
+    rows = np.vstack([predictor.training_patterns[:20], random_rows])
+    return rows[rng.permutation(len(rows))]
+
+
+def test_table_hits_match_the_models(predictor, monkeypatch):
+    table = build_pattern_table(predictor, predictor.training_patterns)
+    rows = _mixed_rows(predictor)
+    reference = predictor.predict_matrix(rows, profile='full')
+    monkeypatch.setattr(predictor, 'pattern_table', table)
+    result = predictor.predict_matrix(rows, profile='full')
+
+    stored = table.lookup(rows) >= 0
+    assert np.array_equal(result['exact_match'], stored) and 0 < stored.sum() < len(rows)
+    np.testing.assert_allclose(result['probabilities'], reference['probabilities'])
+    assert np.array_equal(result['top_indices'], reference['top_indices'])
+    assert result['member_predictions'].keys() == reference['member_predictions'].keys()
+    for name, predicted in reference['member_predictions'].items():
+        assert np.array_equal(result['member_predictions'][name], predicted)
+    assert result['primary_model'] == reference['primary_model']
+
+    cascade = predictor.predict_matrix(rows, profile='cascade')
+    assert set(cascade['tiers'][stored]) == {'pattern_table'}
+    assert 'pattern_table' not in set(cascade['tiers'][~stored])
+    assert predictor.prediction_record(result, int(np.flatnonzero(stored)[0]))['exact_match'] is True
+
+
+def test_save_load_is_versioned(predictor, tmp_path):
+    table = build_pattern_table(predictor, predictor.training_patterns[:10])
+    table.save(tmp_path)
+    loaded = PatternTable.load(tmp_path, table.model_version, len(predictor.symptom_columns))
+    assert len(loaded) == 10
+    assert np.array_equal(loaded.unpacked_patterns(), predictor.training_patterns[:10])
+    np.testing.assert_allclose(loaded.probabilities, table.probabilities)
+    assert PatternTable.load(tmp_path, 'another-version', len(predictor.symptom_columns)) is None
+
+
+def test_refresh_adds_frequent_misses(predictor, monkeypatch, tmp_path):
+    monkeypatch.setattr(predictor, 'model_dir', str(tmp_path))
+    monkeypatch.setattr(predictor, 'pattern_table', build_pattern_table(predictor, predictor.training_patterns))
+    unseen = np.ones((1, len(predictor.symptom_columns)), dtype=np.uint8)
+    assert predictor.pattern_table.lookup(unseen)[0] == -1
+    predictor.predict_matrix(np.repeat(unseen, 3, axis=0), profile='full')
+
+    table = predictor.refresh_pattern_table(top_misses=1)
+    assert len(table) == len(predictor.training_patterns) + 1
+    assert predictor.predict_matrix(unseen, profile='full')['exact_match'].tolist() == [True]
+    assert os.path.exists(tmp_path / 'pattern_table.npz')
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for the asynchronous prediction log and its training-set reader
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(__file__))
+
+from prediction_log import PredictionLogger, export_training_csv, log_files, logged_cases
+
+
+def test_logged_rows_read_back_as_training_cases(predictor, tmp_path):
+    logger = PredictionLogger(str(tmp_path), max_file_bytes=2048)
+    matrix = predictor.X_val[:40]
+    result = predictor.predict_matrix(matrix)
+    try:
+        for start in range(0, len(matrix), 10):
+            part = predictor.predict_matrix(matrix[start:start + 10])
+            assert logger.log('/batch_predict', predictor, matrix[start:start + 10], part, latency_ms=1.5)
+            assert logger.flush()
+    finally:
+        logger.close()
+
+    stats = logger.describe()
+    assert stats['written'] == 40 and stats['dropped'] == 0
+    # Every rotated file carries its own catalog line
+    assert len(log_files(str(tmp_path))) > 1
+    for path in log_files(str(tmp_path)):
+        with open(path) as f:
+            assert json.loads(f.readline())['type'] == 'catalog'
+
+    reversed_columns = predictor.symptom_columns[::-1]
+    cases, labels, confidence, last_ts = logged_cases(str(tmp_path), reversed_columns)
+    assert np.array_equal(cases, matrix[:, ::-1])
+    classes = predictor.class_catalog()['classes']
+    assert labels.tolist() == [classes[i] for i in result['top_indices'][:, 0]]
+    assert np.allclose(confidence, result['top_probabilities'][:, 0], atol=1e-5)
+    assert len(logged_cases(str(tmp_path), reversed_columns, since=last_ts)[0]) == 0
+
+
+def test_full_queue_drops_and_counts(predictor, tmp_path):
+    logger = PredictionLogger(str(tmp_path), max_queue_rows=5)
+    matrix = predictor.X_val[:10]
+    try:
+        assert not logger.log('/batch_predict', predictor, matrix, predictor.predict_matrix(matrix), latency_ms=1.0)
+        assert logger.log('/predict', predictor, matrix[:1], predictor.predict_matrix(matrix[:1]), latency_ms=1.0)
+        assert logger.flush()
+    finally:
+        logger.close()
+    stats = logger.describe()
+    assert stats['dropped'] == 10 and stats['written'] == 1
+
+
+def test_endpoints_log_and_export(client, predictor, tmp_path, monkeypatch):
+    import app as disease_app
+    logger = PredictionLogger(str(tmp_path / 'logs'))
+    monkeypatch.setattr(disease_app, 'prediction_logger', logger)
+
+    column = predictor.symptom_columns[0]
+    assert client.post('/predict', json={'symptoms': {column: 1}}).status_code == 200
+    assert client.post('/batch_predict', json={'patients': [{'symptoms': {column: 1}}] * 3}).status_code == 200
+    try:
+        assert logger.flush()
+    finally:
+        logger.close()
+    assert client.get('/model_performance').get_json()['prediction_log']['written'] == 4
+
+    base = tmp_path / 'base.csv'
+    pd.DataFrame([[1] + [0] * (len(predictor.symptom_columns) - 1) + ['Seed']],
+                 columns=list(predictor.symptom_columns) + ['prognosis']).to_csv(base, index=False)
+    exported, _ = export_training_csv(str(tmp_path / 'logs'), str(tmp_path / 'retrain.csv'), base_csv=str(base))
+    frame = pd.read_csv(tmp_path / 'retrain.csv')
+    assert exported == 4 and len(frame) == 5
+    assert frame['prognosis'].iloc[0] == 'Seed'
+    assert (frame[column].iloc[1:] == 1).all()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Tests for the what-if schedule simulation
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from schedule_simulation import MAX_DRAW_CELLS, SHIFTS, ScheduleSimulator, pool_size
+
+
+@pytest.fixture
+def attendance_ml(tmp_path, monkeypatch):
+    """NurseAttendanceML with a small absence model trained in a scratch models/ directory"""
+    from nurse_attendance_ml import NurseAttendanceML
+
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('models')
+    rng = np.random.default_rng(2)
+    dates = pd.date_range('2026-01-01', periods=60)
+    ml = NurseAttendanceML()
+    ml.train_absence_predictor(pd.DataFrame({
+        'date': dates,
+        'shift': rng.choice(['Morning', 'Evening', 'Night'], len(dates)),
+        'status': np.where(rng.uniform(size=len(dates)) < 0.3, 'Absent', 'Present'),
+        'totalHours': rng.uniform(4, 12, len(dates)),
+        'breaks': [[]] * len(dates)
+    }))
+    return ml
+
+
+def _roster(n=12):
+    return [{
+        'id': f'N{i}', 'name': f'Nurse {i}', 'date': f'2026-03-{1 + i % 7:02d}',
+        'shift': SHIFTS[i % 3], 'status': 'Present', 'totalHours': 6 + i % 5, 'breaks': [],
+        'hours_worked_week': 30 + 3 * i, 'consecutive_days': i % 8,
+        'preferred_shift': SHIFTS[i % 3], 'last_shift': SHIFTS[(i + 1) % 3]
+    } for i in range(n)]
+
+
+def test_shortfall_probabilities_match_closed_form():
+    nurses = [{'id': i, 'name': ''} for i in range(5)]
+    simulator = ScheduleSimulator.for_roster(nurses, np.full(5, 0.2), draws=40000, seed=0)
+    only_morning = {'Morning': 4, 'Evening': 0, 'Night': 0}
+    baseline, removed, shocked = [simulator.evaluate(dict({'requirements': only_morning}, **scenario)) for scenario in (
+        {}, {'removed_nurses': [3], 'requirements': {'Morning': 5}}, {'absence_multiplier': 2.0})]
+
+    # Four nurses scheduled: short whenever any of them is absent
+    morning = baseline['coverage']['Morning']
+    assert abs(morning['shortfall_probability'] - (1 - 0.8 ** 4)) < 0.01
+    assert abs(morning['expected_shortfall'] - 4 * 0.2) < 0.02
+    # Only four nurses left for five places: always short by one plus the absences
+    assert [n['nurse_id'] for n in removed['schedule']['Morning']] == [0, 1, 2, 4]
+    assert removed['coverage']['Morning']['shortfall_probability'] == 1.0
+    assert abs(removed['coverage']['Morning']['expected_shortfall'] - 1.8) < 0.02
+    assert np.isclose(shocked['coverage']['Morning']['expected_present'], 4 * 0.6)
+    # Common random numbers: a shock can only add shortfalls
+    assert shocked['any_shortfall_probability'] > baseline['any_shortfall_probability'] + 0.2
+
+
+def test_scenarios_reuse_cached_risks_and_match_optimizer(attendance_ml, monkeypatch):
+    roster = _roster()
+    calls = []
+    predict = attendance_ml.predict_absence_risk
+    monkeypatch.setattr(attendance_ml, 'predict_absence_risk', lambda nurse: calls.append(nurse) or predict(nurse))
+
+    requirements = {'Morning': 4, 'Evening': 3, 'Night': 2}
+    optimized = attendance_ml.optimize_shift_schedule(roster, requirements)
+    simulated = attendance_ml.simulate_schedules(roster, [{'requirements': requirements},
+                                                          {'requirements': requirements, 'absence_increase': 0.1}],
+                                                 workers=1)
+    assert len(calls) == len(roster)
+
+    # The previous per-nurse scoring loop, for reference
+    risks = attendance_ml.absence_risks(roster)
+    for shift in SHIFTS:
+        scores = []
+        for nurse, risk in zip(roster, risks):
+            score = 1.0
+            score *= (1 - risk)
+            if nurse['hours_worked_week'] > 40:
+                score *= 0.7
+            if nurse['consecutive_days'] > 5:
+                score *= 0.6
+            if nurse['preferred_shift'] == shift:
+                score *= 1.3
+            if nurse['last_shift'] == shift:
+                score *= 0.8
+            scores.append((nurse['id'], score))
+        expected = sorted(scores, key=lambda x: x[1], reverse=True)[:requirements[shift]]
+        assert [(n['nurse_id'], n['score']) for n in optimized[shift]] == expected
+        assert [n['nurse_id'] for n in simulated['scenarios'][0]['schedule'][shift]] == [i for i, _ in expected]
+
+
+def test_process_pool_matches_serial_and_endpoint(attendance_ml, monkeypatch):
+    import nurse_attendance_ml
+
+    roster = _roster()
+    risks = attendance_ml.absence_risks(roster)
+    simulator = ScheduleSimulator.for_roster(roster, risks, draws=2000, seed=3)
+    scenarios = [{'name': f's{i}', 'requirements': {'Morning': 1 + i % 4}, 'absence_multiplier': 1 + i / 10,
+                  'removed_nurses': [f'N{i}']} for i in range(8)]
+    assert simulator.run(scenarios, workers=2) == simulator.run(scenarios, workers=1)
+
+    monkeypatch.setattr(nurse_attendance_ml, 'ml_system', attendance_ml)
+    client = nurse_attendance_ml.create_app().test_client()
+    response = client.post('/ml/nurse-attendance/simulate-schedule',
+                           json={'nurses': roster, 'scenarios': scenarios[:2], 'draws': 500})
+    body = response.get_json()
+    assert response.status_code == 200 and body['draws'] == 500
+    assert [s['name'] for s in body['scenarios']] == ['s0', 's1']
+    assert body['scenarios'][1]['removed_nurses'] == 1
+
+
+def test_simulation_requests_are_validated_and_pool_follows_the_thread_budget(attendance_ml, monkeypatch):
+    import nurse_attendance_ml
+    from serving_config import ServingConfig
+
+    monkeypatch.setattr(nurse_attendance_ml, 'ml_system', attendance_ml)
+    client = nurse_attendance_ml.create_app().test_client()
+    roster = _roster(4)
+    for body in ({'nurses': roster, 'draws': -1}, {'nurses': roster, 'draws': 0}, {'nurses': roster, 'draws': 'many'},
+                 {'nurses': roster, 'draws': 10 ** 6}, {'nurses': []}, {'nurses': roster, 'seed': 'x'},
+                 {'nurses': roster, 'draws': MAX_DRAW_CELLS // 4 + 1}):
+        response = client.post('/ml/nurse-attendance/simulate-schedule', json=body)
+        assert response.status_code == 400, body
+    assert client.post('/ml/nurse-attendance/simulate-schedule', json={'nurses': roster}).status_code == 200
+
+    monkeypatch.delenv('ML_SIMULATION_WORKERS', raising=False)
+    assert pool_size(ServingConfig(workers=1, native_threads=3)) == 3
+    monkeypatch.setenv('ML_SIMULATION_WORKERS', '16')
+    assert pool_size(ServingConfig(workers=4, native_threads=2)) == 2
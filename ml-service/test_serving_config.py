@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests for the serving-time thread policy
+"""
+
+import os
+import sys
+
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier, VotingClassifier
+from threadpoolctl import threadpool_info
+
+sys.path.append(os.path.dirname(__file__))
+
+from serving_config import ServingConfig, set_estimator_jobs
+
+
+def _fitted_voting():
+    X = [[0, 1], [1, 0], [1, 1], [0, 0]] * 5
+    y = [0, 1, 1, 0] * 5
+    voting = VotingClassifier([
+        ('rf', RandomForestClassifier(n_estimators=3, n_jobs=-1, random_state=0)),
+        ('et', ExtraTreesClassifier(n_estimators=3, n_jobs=-1, random_state=0))
+    ], voting='soft', n_jobs=-1)
+    return voting.fit(X, y)
+
+
+def test_set_estimator_jobs_reaches_fitted_members():
+    voting = _fitted_voting()
+    assert set_estimator_jobs(voting, 1) == 3
+    assert voting.n_jobs == 1
+    assert all(member.n_jobs == 1 for member in voting.named_estimators_.values())
+
+
+def test_config_from_env_splits_threads_between_workers(monkeypatch):
+    monkeypatch.setenv('ML_WORKERS', '4')
+    monkeypatch.setenv('ML_ESTIMATOR_JOBS', '2')
+    monkeypatch.delenv('ML_NATIVE_THREADS', raising=False)
+    config = ServingConfig.from_env()
+    assert config.workers == 4
+    assert config.estimator_jobs == 2
+    assert config.native_threads == max(1, config.describe()['cpus'] // 4)
+
+
+def test_disabled_policy_leaves_estimators_alone():
+    voting = _fitted_voting()
+    ServingConfig(enabled=False).apply(voting)
+    assert voting.named_estimators_['rf'].n_jobs == -1
+
+
+def test_apply_caps_native_thread_pools():
+    config = ServingConfig(native_threads=1).apply()
+    try:
+        assert all(pool['num_threads'] == 1 for pool in threadpool_info())
+    finally:
+        config.release()
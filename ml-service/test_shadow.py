@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Tests for shadow evaluation and promotion of a candidate model version
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(__file__))
+
+from shadow import ServingPointer, ShadowControl, ShadowEvaluator, ShadowStats, align_columns, align_probabilities
+
+
+def _wait_for(condition, timeout=30):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out waiting for shadow scoring'
+        time.sleep(0.05)
+
+
+def test_alignment_between_model_versions():
+    matrix = np.array([[1, 0, 1]], dtype=np.uint8)
+    assert align_columns(matrix, ['a', 'b', 'c'], ['c', 'd', 'a']).tolist() == [[1, 0, 1]]
+    proba = np.array([[0.2, 0.8]])
+    assert align_probabilities(proba, ['x', 'y'], ['y', 'z', 'x']).tolist() == [[0.8, 0.0, 0.2]]
+
+
+def test_identical_candidate_agrees_and_backlog_is_bounded(predictor):
+    evaluator = ShadowEvaluator(predictor, fraction=1.0, workers=1, seed=0)
+    classes = predictor.class_catalog()['classes']
+    rows = predictor.X_val[:20]
+    result = predictor.predict_matrix(rows)
+    try:
+        assert evaluator.sample()
+        for _ in range(evaluator.max_pending + 5):
+            evaluator.submit(rows, predictor.symptom_columns, classes, result['probabilities'], serving_ms=1.0)
+        _wait_for(lambda: evaluator.describe()['pending'] == 0)
+    finally:
+        evaluator.shutdown(wait=True)
+
+    stats = evaluator.describe()
+    assert stats['requests'] + stats['skipped'] == evaluator.max_pending + 5
+    assert stats['requests'] >= 1 and stats['skipped'] >= 1
+    assert stats['agreement_rate'] == 1.0
+    assert stats['max_drift'] < 1e-9
+    assert stats['latency_ms']['candidate_p50'] > 0
+
+
+def test_control_file_is_shared_and_stats_merge_across_processes(tmp_path):
+    writer, reader = ShadowControl(str(tmp_path / 'shadow.json')), ShadowControl(str(tmp_path / 'shadow.json'))
+    assert reader.poll() == (False, None)
+    state = writer.start('/models/v2', 'v2', fraction=0.5, workers=1)
+    changed, seen = reader.poll()
+    assert changed and seen['id'] == state['id']
+    assert reader.poll() == (False, None)
+
+    for worker, agreed in (('a', [True, True]), ('b', [False, True])):
+        stats = ShadowStats()
+        stats.record(np.array(agreed), np.array([0.0, 0.2]), serving_ms=1.0, candidate_ms=2.0)
+        writer.write_stats(state['id'], stats.snapshot(), worker=worker)
+    writer.write_stats('an-earlier-shadow', ShadowStats().snapshot(), worker='c')
+    merged = reader.describe(state)
+    assert merged['reporting_processes'] == 2
+    assert merged['rows'] == 4 and merged['agreement_rate'] == 0.75
+    assert merged['max_drift'] == 0.2
+    assert merged['latency_ms']['delta_p50'] == 1.0
+
+    assert writer.stop()['id'] == state['id']
+    assert reader.poll() == (True, None)
+
+
+def _admin(token='secret'):
+    return {'X-Admin-Token': token}
+
+
+def test_shadow_admin_endpoints_need_the_token(client, tmp_path, monkeypatch):
+    import app as disease_app
+    monkeypatch.setattr(disease_app, 'shadow_control', ShadowControl(str(tmp_path / 'shadow.json')))
+    monkeypatch.delenv('ML_ADMIN_TOKEN', raising=False)
+    assert client.post('/shadow/promote').status_code == 403
+    monkeypatch.setenv('ML_ADMIN_TOKEN', 'secret')
+    for method in (client.post, client.delete):
+        assert method('/shadow').status_code == 401
+        assert method('/shadow', headers=_admin('wrong')).status_code == 401
+    assert client.post('/shadow/promote', headers=_admin()).status_code == 409
+
+
+def test_shadow_refuses_directories_it_would_have_to_train(client, tmp_path, monkeypatch):
+    import app as disease_app
+    monkeypatch.setattr(disease_app, 'shadow_control', ShadowControl(str(tmp_path / 'shadow.json')))
+    monkeypatch.setenv('ML_ADMIN_TOKEN', 'secret')
+    monkeypatch.setenv('ML_SHADOW_CANDIDATES_DIR', str(tmp_path / 'candidates'))
+
+    outside = client.post('/shadow', json={'model_dir': str(tmp_path)}, headers=_admin())
+    assert outside.status_code == 400
+    escaping = str(tmp_path / 'candidates' / '..' / 'elsewhere')
+    assert client.post('/shadow', json={'model_dir': escaping}, headers=_admin()).status_code == 400
+
+    metadata_only = tmp_path / 'candidates' / 'v2'
+    metadata_only.mkdir(parents=True)
+    (metadata_only / 'metadata.json').write_text('{"version": "v2"}')
+    assert client.post('/shadow', json={'model_dir': str(metadata_only)}, headers=_admin()).status_code == 404
+    assert os.listdir(metadata_only) == ['metadata.json']
+    assert disease_app.shadow_control.read() is None
+
+
+def test_shadow_endpoints_and_promotion(client, predictor, model_dir, tmp_path, monkeypatch):
+    import app as disease_app
+    monkeypatch.setattr(disease_app, 'serving_pointer', ServingPointer(str(tmp_path / 'serving.json')))
+    monkeypatch.setattr(disease_app, 'shadow_control', ShadowControl(str(tmp_path / 'shadow.json')))
+    monkeypatch.setattr(disease_app, 'shadow_evaluator', None)
+    monkeypatch.setenv('ML_ADMIN_TOKEN', 'secret')
+    monkeypatch.setenv('ML_SHADOW_CANDIDATES_DIR', os.path.dirname(model_dir))
+
+    missing = os.path.join(os.path.dirname(model_dir), 'missing')
+    assert client.post('/shadow', json={'model_dir': missing}, headers=_admin()).status_code == 404
+    started = client.post('/shadow', json={'model_dir': model_dir, 'fraction': 1.0}, headers=_admin())
+    assert started.status_code == 201
+    # Every worker (here: another control reader) sees the candidate
+    assert ShadowControl(disease_app.shadow_control.path).poll()[1]['model_dir'] == os.path.abspath(model_dir)
+    _wait_for(lambda: disease_app.shadow_evaluator is not None)
+    candidate = disease_app.shadow_evaluator.candidate
+    assert candidate is not predictor
+
+    column = predictor.symptom_columns[0]
+    assert client.post('/predict', json={'symptoms': {column: 1}}).status_code == 200
+    assert client.post('/batch_predict', json={'patients': [{'symptoms': {column: 1}}] * 3}).status_code == 200
+    _wait_for(lambda: client.get('/shadow').get_json()['shadow']['rows'] >= 4)
+    shadow = client.get('/shadow').get_json()['shadow']
+    assert shadow['agreement_rate'] == 1.0
+    assert shadow['candidate']['model_version'] == predictor.metadata['version']
+
+    # Another worker notices the promotion on its next poll
+    other_worker = ServingPointer(disease_app.serving_pointer.path)
+    promoted = client.post('/shadow/promote', headers=_admin()).get_json()
+    assert disease_app.predictor is candidate and disease_app.shadow_evaluator is None
+    assert promoted['promoted']['model_dir'] == os.path.abspath(model_dir)
+    assert other_worker.poll()['model_dir'] == os.path.abspath(model_dir)
+    assert other_worker.poll() is None
+    assert client.get('/shadow').get_json()['active'] is False
+
+
+def test_other_workers_load_a_promoted_version_off_the_request_path(client, predictor, model_dir, tmp_path,
+                                                                    monkeypatch):
+    import shutil
+    import app as disease_app
+    monkeypatch.setattr(disease_app, 'serving_pointer', ServingPointer(str(tmp_path / 'serving.json')))
+    monkeypatch.setattr(disease_app, 'shadow_control', ShadowControl(str(tmp_path / 'shadow.json')))
+    promoted_dir = str(tmp_path / 'promoted')
+    shutil.copytree(model_dir, promoted_dir)
+
+    # Promoted by another worker: this one keeps serving until the new version is loaded
+    ServingPointer(disease_app.serving_pointer.path).promote(promoted_dir, 'test')
+    assert client.get('/health').status_code == 200
+    _wait_for(lambda: disease_app.predictor.model_dir == os.path.abspath(promoted_dir))
+    assert disease_app.predictor is not predictor
+    column = predictor.symptom_columns[0]
+    assert client.post('/predict', json={'symptoms': {column: 1}}).status_code == 200
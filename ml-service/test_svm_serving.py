@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests for the batched SVC serving backend
+"""
+
+import copy
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(__file__))
+
+from conftest import TESTING_CSV, TRAINING_CSV
+from svm_serving import CompiledSVC
+
+
+def _rows(predictor, n_random=200):
+    rng = np.random.default_rng(1)
+    X_val = predictor.selected_feature_splits()[1]
+    random_rows = (rng.random((n_random, X_val.shape[1])) < 0.05).astype(np.uint8)
+    return np.vstack([X_val, random_rows])
+
+
+def test_decisions_match_libsvm_one_vs_one(predictor):
+    svc = predictor.models['voting_ensemble'].named_estimators_['svm']
+    ovo = copy.deepcopy(svc)
+    ovo.decision_function_shape = 'ovo'
+    X = _rows(predictor)
+    np.testing.assert_allclose(CompiledSVC.from_sklearn(svc).decision_function(X),
+                               ovo.decision_function(X), atol=1e-9)
+
+
+def test_probabilities_match_within_coupling_tolerance(predictor):
+    svc = predictor.models['voting_ensemble'].named_estimators_['svm']
+    X = _rows(predictor)
+    expected = svc.predict_proba(X)
+    proba = CompiledSVC.from_sklearn(svc).predict_proba(X)
+    np.testing.assert_allclose(proba.sum(axis=1), 1.0)
+    # libsvm stops its fixed-point coupling at 0.005 / n_classes
+    np.testing.assert_allclose(proba, expected, atol=2e-3)
+    np.testing.assert_array_equal(proba.argmax(axis=1), expected.argmax(axis=1))
+
+
+def test_predictor_svm_backend_is_optional(predictor, model_dir):
+    from disease_predictor import DiseasePredictor
+
+    assert not isinstance(dict(predictor._serving_members())['svm'], CompiledSVC)
+    compiled = DiseasePredictor(
+        training_csv_path=TRAINING_CSV,
+        testing_csv_path=TESTING_CSV,
+        dataset_cache_dir=os.path.join(os.path.dirname(model_dir), 'cache'),
+        model_dir=model_dir,
+        svm_backend='compiled'
+    )
+    assert isinstance(dict(compiled._serving_members())['svm'], CompiledSVC)
+    symptoms = {'itching': 1, 'skin_rash': 1, 'nodal_skin_eruptions': 1}
+    assert compiled.predict(symptoms)['predicted_condition'] == predictor.predict(symptoms)['predicted_condition']
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for the symptom search index and free-text symptom resolution
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+
+from symptom_index import SymptomIndex
+
+COLUMNS = ['itching', 'skin_rash', 'high_fever', 'mild_fever', 'stomach_pain', 'spotting_ urination',
+           'fatigue', 'fast_heart_rate']
+
+
+def test_search_ranks_prefix_synonym_and_typo_matches():
+    index = SymptomIndex(COLUMNS, 'etag')
+    assert [entry['id'] for entry in index.search('fev')['symptoms']] == ['high_fever', 'mild_fever']
+    assert {entry['id'] for entry in index.search('temperature')['symptoms']} == {'high_fever', 'mild_fever'}
+    assert index.search('itchng')['symptoms'][0]['id'] == 'itching'
+    assert index.search('stomch pain')['symptoms'][0]['id'] == 'stomach_pain'
+    # Own-name prefix beats a word match further into the name
+    assert [entry['id'] for entry in index.search('f')['symptoms']][:2] == ['fatigue', 'fast_heart_rate']
+
+    page = index.search('', limit=3, offset=6)
+    assert page['total_count'] == len(COLUMNS)
+    assert [entry['id'] for entry in page['symptoms']] == COLUMNS[6:]
+
+
+def test_resolve_normalizes_free_text_names():
+    index = SymptomIndex(COLUMNS, 'etag')
+    assert index.resolve('Skin Rash') == 'skin_rash'
+    assert index.resolve(' spotting urination ') == 'spotting_ urination'
+    assert index.resolve('tiredness') == 'fatigue'
+    # Synonyms naming several columns only widen search
+    assert index.resolve('temperature') is None
+    assert index.resolve('not a symptom') is None
+
+
+def test_symptoms_endpoint_search_and_unrecognized(client, predictor):
+    full = client.get('/symptoms')
+    assert full.status_code == 200
+    assert full.get_json()['total_count'] == len(predictor.symptom_columns)
+    assert client.get('/symptoms', headers={'If-None-Match': full.headers['ETag']}).status_code == 304
+
+    page = client.get('/symptoms?q=fever&limit=1').get_json()
+    assert page['limit'] == 1 and len(page['symptoms']) == 1
+    assert 'fever' in page['symptoms'][0]['id']
+    assert page['symptoms_etag'] == full.get_json()['symptoms_etag']
+
+    column = predictor.symptom_columns[0]
+    response = client.post('/predict', json={'symptoms': {column.replace('_', ' ').title(): 1, 'zzz': 1}})
+    prediction = response.get_json()['prediction']
+    assert prediction['unrecognized_symptoms'] == ['zzz']
+    reference = predictor.predict({column: 1})
+    assert prediction['predicted_condition'] == reference['predicted_condition']
+
+    batch = client.post('/batch_predict', json={'patients': [{'symptoms': {column: 1}},
+                                                             {'symptoms': {column: 1, 'zzz': 1}}]})
+    assert [r['prediction']['unrecognized_symptoms'] for r in batch.get_json()['results']] == [[], ['zzz']]
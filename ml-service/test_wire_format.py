@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for the binary batch prediction wire formats
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+import wire_format
+
+
+def _matrix(n_rows=20, n_columns=132, seed=0):
+    return (np.random.default_rng(seed).random((n_rows, n_columns)) < 0.05).astype(np.uint8)
+
+
+def test_npy_and_bitset_round_trip():
+    matrix = _matrix()
+    decoded = wire_format.decode_npy(wire_format.encode_npy(matrix), 132)
+    np.testing.assert_array_equal(decoded, matrix)
+    # A view over the request bytes, not a copy
+    assert not decoded.flags.owndata
+
+    np.testing.assert_array_equal(wire_format.decode_npy(wire_format.encode_npy(matrix.astype(bool)), 132), matrix)
+    np.testing.assert_array_equal(wire_format.decode_bitset(wire_format.encode_bitset(matrix), 132), matrix)
+
+
+def test_malformed_payloads_are_rejected():
+    with pytest.raises(wire_format.WireFormatError):
+        wire_format.decode_npy(wire_format.encode_npy(_matrix(n_columns=10)), 132)
+    with pytest.raises(wire_format.WireFormatError):
+        wire_format.decode_npy(wire_format.encode_npy(_matrix())[:-3], 132)
+    with pytest.raises(wire_format.WireFormatError):
+        wire_format.decode_npy(b'not an npy file', 132)
+    for value in (2, 255):
+        matrix = _matrix()
+        matrix[3, 7] = value
+        with pytest.raises(wire_format.WireFormatError, match='0 or 1'):
+            wire_format.decode_npy(wire_format.encode_npy(matrix), 132)
+    with pytest.raises(wire_format.WireFormatError):
+        wire_format.decode_bitset(b'\x00' * 5, 132)
+
+
+def test_binary_batch_matches_json_batch(client, predictor):
+    matrix = _matrix(n_rows=30, n_columns=len(predictor.symptom_columns), seed=3)
+    matrix[:, 0] = 1  # no empty rows, which the JSON path reports as errors
+    patients = [{'symptoms': {predictor.symptom_columns[j]: 1 for j in np.flatnonzero(row)}} for row in matrix]
+    columns = client.post('/batch_predict', json={'patients': patients, 'format': 'columnar'}).get_json()['results']
+
+    etag = client.get('/symptoms').get_json()['symptoms_etag']
+    for content_type, body in ((wire_format.NPY_TYPE, wire_format.encode_npy(matrix)),
+                               (wire_format.BITSET_TYPE, wire_format.encode_bitset(matrix))):
+        response = client.post('/batch_predict?include_probabilities=true', data=body,
+                               content_type=content_type, headers={'X-Symptoms-ETag': etag})
+        assert response.status_code == 200
+        assert response.mimetype == wire_format.NPZ_TYPE
+        assert response.headers['X-Classes-ETag'] == predictor.class_catalog()['etag']
+        arrays = wire_format.decode_arrays(response.get_data())
+        np.testing.assert_array_equal(arrays['top_indices'], columns['top_indices'])
+        np.testing.assert_allclose(arrays['top_probabilities'], columns['top_probabilities'], rtol=1e-6)
+        assert arrays['probabilities'].shape == (30, 41)
+
+    stale = client.post('/batch_predict', data=wire_format.encode_npy(matrix),
+                        content_type=wire_format.NPY_TYPE, headers={'X-Symptoms-ETag': 'old'})
+    assert stale.status_code == 412
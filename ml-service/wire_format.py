@@ -0,0 +1,89 @@
+"""
+Binary wire formats for batch prediction
+Features:
+- application/x-npy: (rows x symptoms) 0/1 uint8/bool matrix, decoded zero-copy
+- application/x-symptom-bitset: rows of np.packbits'd symptom flags
+- application/x-npz responses holding the columnar prediction arrays
+
+Matrix columns follow the /symptoms order; clients can pin it by sending the
+X-Symptoms-ETag header they got from /symptoms.
+"""
+
+import io
+
+import numpy as np
+
+NPY_TYPE = 'application/x-npy'
+BITSET_TYPE = 'application/x-symptom-bitset'
+NPZ_TYPE = 'application/x-npz'
+REQUEST_TYPES = (NPY_TYPE, BITSET_TYPE)
+MATRIX_DTYPES = (np.dtype(np.uint8), np.dtype(np.bool_))
+
+
+class WireFormatError(ValueError):
+    """Malformed or misaligned binary batch payload"""
+
+
+def decode_npy(body, n_columns):
+    """View an .npy payload as a (rows, n_columns) uint8 matrix without copying"""
+    stream = io.BytesIO(body)
+    try:
+        version = np.lib.format.read_magic(stream)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+    except ValueError as e:
+        raise WireFormatError(f'Invalid .npy payload: {e}')
+    if dtype not in MATRIX_DTYPES:
+        raise WireFormatError(f'Unsupported dtype {dtype}; send uint8 or bool')
+    if len(shape) != 2 or shape[1] != n_columns:
+        raise WireFormatError(f'Expected shape (rows, {n_columns}), got {shape}')
+    count = shape[0] * shape[1]
+    if len(body) - stream.tell() != count:
+        raise WireFormatError('Payload size does not match the .npy header')
+    matrix = np.frombuffer(body, dtype=np.uint8, count=count, offset=stream.tell())
+    # Same rule as the JSON path: symptom flags are 0 / 1 (the pattern table and
+    # compiled trees test X != 0, the other members would see the raw value)
+    if count and matrix.max() > 1:
+        raise WireFormatError('Symptom values must be 0 or 1')
+    return matrix.reshape(shape, order='F' if fortran_order else 'C')
+
+
+def decode_bitset(body, n_columns):
+    """Unpack np.packbits(matrix, axis=1) rows into a (rows, n_columns) uint8 matrix"""
+    row_bytes = (n_columns + 7) // 8
+    if len(body) % row_bytes:
+        raise WireFormatError(f'Bitset payload must be a multiple of {row_bytes} bytes per row')
+    packed = np.frombuffer(body, dtype=np.uint8).reshape(-1, row_bytes)
+    return np.unpackbits(packed, axis=1, count=n_columns)
+
+
+def decode_matrix(body, content_type, n_columns):
+    if content_type == NPY_TYPE:
+        return decode_npy(body, n_columns)
+    if content_type == BITSET_TYPE:
+        return decode_bitset(body, n_columns)
+    raise WireFormatError(f'Unsupported content type {content_type}')
+
+
+def encode_npy(matrix):
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(matrix, dtype=np.uint8), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def encode_bitset(matrix):
+    return np.packbits(np.asarray(matrix, dtype=bool), axis=1).tobytes()
+
+
+def encode_arrays(arrays):
+    """Uncompressed .npz of named arrays (responses)"""
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def decode_arrays(body):
+    with np.load(io.BytesIO(body), allow_pickle=False) as archive:
+        return {name: archive[name] for name in archive.files}